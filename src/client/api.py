@@ -1,16 +1,52 @@
 """Public API for agent instrumentation."""
 
-from typing import Any, Callable, Optional, TypeVar, cast
+import os
+import sys
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar, cast
 
-from .instrumentation import AgentInstrumentor
+# Only the public entry point is imported with the package; OpenTelemetry,
+# the SDK and the exporters load when the first agent is instrumented.
+if TYPE_CHECKING:
+    from ..collector.costs import PricingTable
+    from .caching import ResponseCache
+    from .profiling import StackSampler
+    from .sampling import HeadSampler, TailSampler
+    from .tokenization import TokenCounter
 
 T = TypeVar('T')
 
 
+def __getattr__(name: str) -> Any:
+    # The instrumentation modules, and with them the SDK, load on first use
+    if name in ("AgentInstrumentor", "deep_instrumentation"):
+        from . import deep as deep_instrumentation
+        from .instrumentation import AgentInstrumentor
+        globals().setdefault("AgentInstrumentor", AgentInstrumentor)
+        globals().setdefault("deep_instrumentation", deep_instrumentation)
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def tracing_enabled() -> bool:
+    """Return False when ``OTEL_SDK_DISABLED`` is set to ``true``."""
+    return os.environ.get("OTEL_SDK_DISABLED", "").strip().lower() != "true"
+
+
 def instrument_agent(agent: T, 
                      service_name: str = "agent-service", 
                      agent_id: Optional[str] = None, 
-                     endpoint: str = "http://localhost:4317") -> T:
+                     endpoint: str = "http://localhost:4317",
+                     fast_path: bool = False,
+                     head_sampler: Optional["HeadSampler"] = None,
+                     tail_sampler: Optional["TailSampler"] = None,
+                     token_counter: Optional["TokenCounter"] = None,
+                     deep: bool = False,
+                     protocol: str = "grpc",
+                     enabled: Optional[bool] = None,
+                     pricing: Optional["PricingTable"] = None,
+                     model: Optional[str] = None,
+                     cache: Optional["ResponseCache"] = None,
+                     profiler: Optional["StackSampler"] = None) -> T:
     """
     Instrument an agent with OpenTelemetry tracing.
     
@@ -22,21 +58,73 @@ def instrument_agent(agent: T,
         service_name: Name of the service running this agent
         agent_id: Optional unique identifier for this agent instance
         endpoint: OTLP endpoint for telemetry export
+        fast_path: Use the low-overhead wrappers for hot agents
+        head_sampler: Optional ratio sampler applied before each run
+        tail_sampler: Optional outcome-based sampler applied after each run
+        token_counter: Optional counter for input and output tokens
+        deep: Also create child spans for each step, tool call and model
+            call. The classes behind the agent, its model and its tools are
+            patched once and shared by every agent using them.
+        protocol: OTLP transport, ``grpc`` or ``http/protobuf``. The HTTP
+            exporter does not load grpc; its endpoint is the full URL,
+            e.g. ``http://localhost:4318/v1/traces``.
+        enabled: Set to False to return the agent untouched without
+            importing OpenTelemetry. Defaults to on unless the
+            ``OTEL_SDK_DISABLED`` environment variable is ``true``.
+        pricing: Optional model pricing table; each run's cost is then
+            recorded in an ``agent.cost`` span attribute
+        model: Model the agent runs on. Defaults to the ``model_id`` of
+            the agent's ``model``, as on smolagents agents.
+        cache: Optional :class:`~.caching.ResponseCache` answering
+            repeated runs without calling the agent. Streaming runs are
+            not cached. Share one cache only between agents that answer
+            alike.
+        profiler: Optional :class:`~.profiling.StackSampler` sampling
+            the Python stacks of each run; the folded stacks are attached
+            to the run's span or written to the sampler's directory
         
     Returns:
         The instrumented agent (same instance, modified in-place)
     """
-    instrumentor = AgentInstrumentor(service_name, agent_id, endpoint)
+    if not (tracing_enabled() if enabled is None else enabled):
+        return agent
+
+    import inspect
+
+    if model is None:
+        model = getattr(getattr(agent, "model", None), "model_id", None)
+        model = str(model) if model is not None else None
+
+    module = sys.modules[__name__]
+    instrumentor = module.AgentInstrumentor(service_name, agent_id, endpoint,
+                                     fast_path=fast_path,
+                                     head_sampler=head_sampler,
+                                     tail_sampler=tail_sampler,
+                                     token_counter=token_counter,
+                                     protocol=protocol,
+                                     pricing=pricing,
+                                     model=model,
+                                     cache=cache,
+                                     profiler=profiler)
     
     # Check if the agent has a run method
     if hasattr(agent, "run") and callable(getattr(agent, "run")):
         original_run = getattr(agent, "run")
         
-        # Determine if async or sync
-        if hasattr(original_run, "__await__"):
+        # Determine if async or sync, and whether the response is streamed;
+        # sync and async runs returning a generator are handled when called
+        if inspect.isasyncgenfunction(original_run):
+            wrapped_run = instrumentor.wrap_async_stream_agent(original_run)
+        elif inspect.isgeneratorfunction(original_run):
+            wrapped_run = instrumentor.wrap_stream_agent(original_run)
+        elif inspect.iscoroutinefunction(original_run):
             wrapped_run = instrumentor.wrap_async_agent(original_run)
         else:
             wrapped_run = instrumentor.wrap_agent(original_run)
+        
+        if deep:
+            module.deep_instrumentation.patch_agent(agent)
+            wrapped_run = module.deep_instrumentation.bind_run(instrumentor, wrapped_run)
             
         # Replace the method
         setattr(agent, "run", wrapped_run)
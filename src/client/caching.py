@@ -0,0 +1,380 @@
+"""Response cache for agent runs.
+
+Runs are looked up by a hash of their normalized arguments and, when an
+embedding function is given, by cosine similarity of their input text to
+earlier inputs made with the same other arguments. Entries expire after a
+TTL and the least recently used ones are evicted beyond an entry count or
+memory budget. The embedding index needs numpy, which is imported only
+when an embedding function is configured.
+"""
+
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from ..collector.metrics import AgentMetricsCollector
+
+# Span attributes describing the cache lookup of a run
+CACHE_HIT_ATTRIBUTE = "agent.cache.hit"
+CACHE_MATCH_ATTRIBUTE = "agent.cache.match"
+CACHE_SIMILARITY_ATTRIBUTE = "agent.cache.similarity"
+CACHE_SAVED_ATTRIBUTE = "agent.cache.saved_ms"
+
+EXACT = "exact"
+SEMANTIC = "semantic"
+
+# Bookkeeping per entry beyond its value: the entry object, its key and
+# its slots in the LRU and index
+_ENTRY_OVERHEAD = 240
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for exact matching.
+
+    Args:
+        text: Text to normalize
+
+    Returns:
+        The case-folded text with whitespace runs collapsed
+    """
+    return " ".join(text.casefold().split())
+
+
+def _canonical(value: Any) -> Any:
+    """Rebuild a value with normalized strings and ordered mappings."""
+    if isinstance(value, str):
+        return normalize_text(value)
+    if isinstance(value, dict):
+        return sorted((str(key), _canonical(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return repr(value)
+
+
+def _digest(value: Any) -> bytes:
+    encoded = json.dumps(value, separators=(",", ":"), default=repr).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+def _size_of(value: Any, depth: int = 0) -> int:
+    """Approximate the memory held by a cached value."""
+    size = sys.getsizeof(value)
+    if depth < 4:
+        if isinstance(value, dict):
+            size += sum(_size_of(key, depth + 1) + _size_of(item, depth + 1) for key, item in value.items())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            size += sum(_size_of(item, depth + 1) for item in value)
+    return size
+
+
+class _Entry:
+    """A cached response."""
+
+    __slots__ = ("key", "context", "value", "expires", "size", "latency_ms", "row")
+
+    def __init__(self, key: bytes, context: bytes, value: Any, expires: Optional[float], size: int,
+                 latency_ms: float):
+        self.key = key
+        self.context = context
+        self.value = value
+        self.expires = expires
+        self.size = size
+        self.latency_ms = latency_ms
+        self.row = -1
+
+
+class CacheLookup:
+    """Outcome of looking a run up, passed back to :meth:`ResponseCache.store` on a miss."""
+
+    __slots__ = ("key", "context", "text", "vector", "value", "match", "similarity", "saved_ms")
+
+    def __init__(self, key: bytes, context: bytes, text: Optional[str]):
+        self.key = key
+        self.context = context
+        self.text = text
+        self.vector = None
+        self.value = None
+        # EXACT or SEMANTIC on a hit, None on a miss
+        self.match: Optional[str] = None
+        self.similarity: Optional[float] = None
+        self.saved_ms = 0.0
+
+    @property
+    def hit(self) -> bool:
+        return self.match is not None
+
+    def attributes(self) -> Dict[str, Any]:
+        """Span attributes describing this lookup."""
+        if self.match is None:
+            return {CACHE_HIT_ATTRIBUTE: False}
+        attributes = {CACHE_HIT_ATTRIBUTE: True, CACHE_MATCH_ATTRIBUTE: self.match,
+                      CACHE_SAVED_ATTRIBUTE: self.saved_ms}
+        if self.similarity is not None:
+            attributes[CACHE_SIMILARITY_ATTRIBUTE] = self.similarity
+        return attributes
+
+
+class ResponseCache:
+    """Exact and semantic cache of agent responses with TTL and LRU eviction."""
+
+    def __init__(self,
+                 max_entries: int = 10_000,
+                 max_bytes: Optional[int] = 64 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = 3600.0,
+                 embed: Optional[Callable[[str], Sequence[float]]] = None,
+                 similarity_threshold: float = 0.95,
+                 metrics: Optional["AgentMetricsCollector"] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_entries: Maximum number of cached responses
+            max_bytes: Approximate memory budget of the cached responses
+                and their embeddings, or None for no budget
+            ttl_seconds: Seconds a response stays valid, or None to keep it
+                until evicted
+            embed: Optional function from input text to an embedding
+                vector, enabling similarity matches of near repeats
+            similarity_threshold: Minimum cosine similarity of a
+                semantic match
+            metrics: Optional collector that hits, misses and saved
+                latency are recorded to
+            clock: Monotonic time source in seconds, for tests
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+        if not -1.0 <= similarity_threshold <= 1.0:
+            raise ValueError("similarity_threshold must be between -1 and 1")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.metrics = metrics
+        self.clock = clock
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_ms = 0.0
+        self.bytes = 0
+        self._entries: "OrderedDict[bytes, _Entry]" = OrderedDict()
+        self._metric_attributes: Dict[Optional[str], Any] = {}
+        self._lock = threading.Lock()
+
+        # Embedding index: one unit vector per row, the entry in each row
+        # and the hash of the arguments other than the input text
+        self._vectors = None
+        self._rows: list = []
+        self._contexts = None
+        self._free_rows: list = []
+
+    def lookup(self, args: Tuple[Any, ...], kwargs: Dict[str, Any], agent_id: Optional[str] = None) -> CacheLookup:
+        """
+        Look a run up by its arguments.
+
+        Args:
+            args: Positional arguments of the run
+            kwargs: Keyword arguments of the run
+            agent_id: Agent recorded with the hit and miss metrics
+
+        Returns:
+            The lookup, whose ``value`` is the cached response on a hit
+        """
+        start = time.perf_counter()
+        if "input" in kwargs:
+            text, rest = kwargs["input"], (args, {key: value for key, value in kwargs.items() if key != "input"})
+        elif args:
+            text, rest = args[0], (args[1:], kwargs)
+        else:
+            text, rest = None, (args, kwargs)
+        rest = _canonical(rest)
+        result = CacheLookup(_digest([_canonical(text), rest]), _digest(rest),
+                             text if isinstance(text, str) else None)
+
+        if self.embed is not None and result.text is not None:
+            # Embedded outside the lock; reused by store() on a miss
+            result.vector = self._unit_vector(self.embed(result.text))
+
+        with self._lock:
+            now = self.clock()
+            entry = self._entries.get(result.key)
+            if entry is not None and self._expired(entry, now):
+                self._remove(entry)
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                result.match = EXACT
+            elif result.vector is not None and self._rows:
+                entry, similarity = self._nearest(result.vector, result.context, now)
+                if entry is not None:
+                    result.match = SEMANTIC
+                    result.similarity = similarity
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(entry.key)
+                result.value = entry.value
+                self.hits += 1
+                if result.match == SEMANTIC:
+                    self.semantic_hits += 1
+                result.saved_ms = max(0.0, entry.latency_ms - (time.perf_counter() - start) * 1000)
+                self.saved_ms += result.saved_ms
+
+        if self.metrics is not None:
+            self.metrics.record_cache(result.match, result.saved_ms, self._attributes(agent_id))
+        return result
+
+    def store(self, lookup: CacheLookup, value: Any, latency_ms: float) -> bool:
+        """
+        Cache the response of a run that missed.
+
+        Args:
+            lookup: The run's lookup
+            value: The response
+            latency_ms: Latency of the run, saved by each later hit
+
+        Returns:
+            True if the response was cached; iterators, which can be
+            consumed only once, and responses larger than the memory budget
+            are not
+        """
+        if hasattr(value, "__next__") or hasattr(value, "__anext__"):
+            return False
+        vector = lookup.vector
+        size = _size_of(value) + _ENTRY_OVERHEAD + (vector.nbytes if vector is not None else 0)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
+        expires = self.clock() + self.ttl_seconds if self.ttl_seconds is not None else None
+        entry = _Entry(lookup.key, lookup.context, value, expires, size, latency_ms)
+
+        with self._lock:
+            previous = self._entries.get(entry.key)
+            if previous is not None:
+                self._remove(previous)
+            self._entries[entry.key] = entry
+            self.bytes += size
+            if vector is not None:
+                self._index(entry, vector)
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None
+                                                            and self.bytes > self.max_bytes):
+                self._remove(next(iter(self._entries.values())))
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        """Drop every cached response."""
+        with self._lock:
+            for entry in list(self._entries.values()):
+                self._remove(entry)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Summarize the cache.
+
+        Returns:
+            Dictionary with ``hits`` (of which ``semantic_hits``),
+            ``misses``, ``hit_rate``, total ``saved_ms``, ``evictions``,
+            ``expirations``, ``entries`` and ``bytes``
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_ms": self.saved_ms,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _attributes(self, agent_id: Optional[str]) -> Any:
+        attributes = self._metric_attributes.get(agent_id)
+        if attributes is None:
+            attributes = self.metrics.attributes({"agent.id": agent_id} if agent_id is not None else {})
+            if len(self._metric_attributes) < 1000:
+                self._metric_attributes[agent_id] = attributes
+        return attributes
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return entry.expires is not None and entry.expires <= now
+
+    def _remove(self, entry: _Entry):
+        """Drop an entry; the caller holds the lock."""
+        del self._entries[entry.key]
+        self.bytes -= entry.size
+        if entry.row >= 0:
+            self._rows[entry.row] = None
+            self._free_rows.append(entry.row)
+            entry.row = -1
+
+    @staticmethod
+    def _unit_vector(embedding: Sequence[float]):
+        import numpy as np
+
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def _index(self, entry: _Entry, vector):
+        """Add an entry's embedding to the index; the caller holds the lock."""
+        import numpy as np
+
+        if self._vectors is None:
+            self._vectors = np.zeros((16, vector.shape[0]), dtype=np.float32)
+            self._contexts = np.zeros(16, dtype=np.int64)
+        elif vector.shape[0] != self._vectors.shape[1]:
+            raise ValueError("embedding dimension changed")
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = len(self._rows)
+            self._rows.append(None)
+            if row == self._vectors.shape[0]:
+                self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+                self._contexts = np.concatenate([self._contexts, np.zeros_like(self._contexts)])
+        self._vectors[row] = vector
+        self._contexts[row] = int.from_bytes(entry.context[:8], "little", signed=True)
+        self._rows[row] = entry
+        entry.row = row
+
+    def _nearest(self, vector, context: bytes, now: float) -> Tuple[Optional[_Entry], Optional[float]]:
+        """Most similar live entry with the same context; the caller holds the lock."""
+        import numpy as np
+
+        if vector.shape[0] != self._vectors.shape[1]:
+            return None, None
+        size = len(self._rows)
+        similarities = self._vectors[:size] @ vector
+        # Free rows and other contexts never match
+        similarities[self._contexts[:size] != int.from_bytes(context[:8], "little", signed=True)] = -np.inf
+        for row in self._free_rows:
+            similarities[row] = -np.inf
+        while True:
+            row = int(np.argmax(similarities))
+            similarity = float(similarities[row])
+            if similarity < self.similarity_threshold:
+                return None, None
+            entry = self._rows[row]
+            if not self._expired(entry, now):
+                return entry, similarity
+            self._remove(entry)
+            self.expirations += 1
+            similarities[row] = -np.inf
@@ -0,0 +1,424 @@
+"""Opt-in step, tool and model-call spans for multi-step agents.
+
+Deep instrumentation patches methods once per class, not per instance: the
+step method of the agent's class, the model's ``generate`` or ``__call__``
+and each tool's ``__call__``, following smolagents' layout. Patched methods
+only create spans while an instrumented run is in progress, so agents,
+models and tools used outside one pay a single context variable lookup.
+"""
+
+import contextvars
+import functools
+import inspect
+import time
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, Optional
+
+from opentelemetry import context, trace
+from opentelemetry.trace import Status, StatusCode
+
+STEP = "agent.step"
+TOOL = "agent.tool"
+LLM = "agent.llm"
+
+# Methods patched per kind; where a class has several, the nested calls
+# yield a single span
+STEP_METHODS = ("step", "_step_stream")
+MODEL_METHODS = ("generate", "__call__")
+TOOL_METHODS = ("__call__",)
+
+# Instrumentor of the run in progress
+_current: contextvars.ContextVar = contextvars.ContextVar("nexushive_deep_instrumentor", default=None)
+# Innermost patched call, so a patched override calling a patched super()
+# method yields one span
+_active: contextvars.ContextVar = contextvars.ContextVar("nexushive_deep_active", default=None)
+# Enclosing step, which totals the tokens of its model calls
+_step: contextvars.ContextVar = contextvars.ContextVar("nexushive_deep_step", default=None)
+
+
+def _defining_class(cls: type, name: str) -> Optional[type]:
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            return klass
+    return None
+
+
+def patch_method(cls: type, name: str, kind: str) -> bool:
+    """
+    Wrap a method of a class with span creation, once.
+
+    The method is patched where it is defined in the class's MRO, so every
+    class sharing that definition is covered by one patch.
+
+    Args:
+        cls: Class whose method to patch
+        name: Method name
+        kind: Span name, one of ``agent.step``, ``agent.tool`` or ``agent.llm``
+
+    Returns:
+        True if the method was patched by this call
+    """
+    owner = _defining_class(cls, name)
+    if owner is None or owner is object:
+        return False
+    original = owner.__dict__[name]
+    if getattr(original, "__nexushive_kind__", None) is not None or not inspect.isfunction(original):
+        return False
+
+    if inspect.isasyncgenfunction(original) or inspect.isgeneratorfunction(original):
+        wrapper = _wrap_generator(original, kind)
+    elif inspect.iscoroutinefunction(original):
+        wrapper = _wrap_async(original, kind)
+    else:
+        wrapper = _wrap_sync(original, kind)
+    wrapper.__nexushive_kind__ = kind
+    setattr(owner, name, wrapper)
+    return True
+
+
+def restore_method(cls: type, name: str) -> bool:
+    """
+    Undo :func:`patch_method`.
+
+    Args:
+        cls: Class whose method was patched
+        name: Method name
+
+    Returns:
+        True if a patched method was restored
+    """
+    owner = _defining_class(cls, name)
+    method = owner.__dict__.get(name) if owner is not None else None
+    if getattr(method, "__nexushive_kind__", None) is None:
+        return False
+    setattr(owner, name, method.__wrapped__)
+    return True
+
+
+def patch_agent(agent: Any) -> int:
+    """
+    Patch the classes behind an agent's steps, model and tools.
+
+    Args:
+        agent: Agent with a ``step`` method and optionally ``model`` and
+            ``tools`` attributes, as in smolagents
+
+    Returns:
+        Number of methods newly patched; 0 when every class was patched before
+    """
+    patched = _patch_all(type(agent), STEP_METHODS, STEP)
+    model = getattr(agent, "model", None)
+    if model is not None:
+        patched += _patch_all(type(model), MODEL_METHODS, LLM)
+    tools = getattr(agent, "tools", None) or {}
+    for tool in tools.values() if isinstance(tools, dict) else tools:
+        patched += _patch_all(type(tool), TOOL_METHODS, TOOL)
+    return patched
+
+
+def _patch_all(cls: type, names: Iterable[str], kind: str) -> int:
+    """Patch every candidate method the class has; nested ones yield one span."""
+    return sum(patch_method(cls, name, kind) for name in names if _defining_class(cls, name) not in (None, object))
+
+
+def bind_run(instrumentor: Any, run: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Make an instrumented run the parent of the spans of patched methods.
+
+    Args:
+        instrumentor: The agent's instrumentor
+        run: The instrumented run method, a plain, coroutine, generator or
+            async generator function
+
+    Returns:
+        The run method, setting the current instrumentor while it runs,
+        including while a stream it returns is consumed
+    """
+    if inspect.isasyncgenfunction(run):
+        @functools.wraps(run)
+        async def bound_async_stream(*args, **kwargs):
+            async for item in _bind_async_stream(instrumentor, run(*args, **kwargs)):
+                yield item
+
+        return bound_async_stream
+
+    if inspect.isgeneratorfunction(run):
+        @functools.wraps(run)
+        def bound_stream(*args, **kwargs):
+            return (yield from _bind_stream(instrumentor, run(*args, **kwargs)))
+
+        return bound_stream
+
+    if inspect.iscoroutinefunction(run):
+        @functools.wraps(run)
+        async def bound_async_run(*args, **kwargs):
+            token = _current.set(instrumentor)
+            try:
+                result = await run(*args, **kwargs)
+            finally:
+                _current.reset(token)
+            return _bind_result(instrumentor, result)
+
+        return bound_async_run
+
+    @functools.wraps(run)
+    def bound_run(*args, **kwargs):
+        token = _current.set(instrumentor)
+        try:
+            result = run(*args, **kwargs)
+        finally:
+            _current.reset(token)
+        return _bind_result(instrumentor, result)
+
+    return bound_run
+
+
+def _bind_result(instrumentor: Any, result: Any) -> Any:
+    if inspect.isgenerator(result):
+        return _bind_stream(instrumentor, result)
+    if inspect.isasyncgen(result):
+        return _bind_async_stream(instrumentor, result)
+    return result
+
+
+def _bind_stream(instrumentor: Any, stream: Iterator[Any]) -> Iterator[Any]:
+    """Set the current instrumentor each time the stream resumes."""
+    try:
+        while True:
+            token = _current.set(instrumentor)
+            try:
+                item = next(stream)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                _current.reset(token)
+            yield item
+    finally:
+        stream.close()
+
+
+async def _bind_async_stream(instrumentor: Any, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    try:
+        while True:
+            token = _current.set(instrumentor)
+            try:
+                item = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield item
+    finally:
+        await stream.aclose()
+
+
+class _Call:
+    """A patched method call in progress and its span."""
+
+    __slots__ = ("instrumentor", "kind", "owner", "span", "start_ns", "input_tokens", "output_tokens", "_tokens")
+
+    def __init__(self, instrumentor: Any, kind: str, owner: Any, args: tuple):
+        self.instrumentor = instrumentor
+        self.kind = kind
+        self.owner = owner
+        self.input_tokens = 0
+        self.output_tokens = 0
+        attributes = {"agent.id": instrumentor.agent_id}
+        if kind == STEP:
+            step_number = getattr(args[0], "step_number", None) if args else None
+            if step_number is not None:
+                attributes["agent.step.number"] = step_number
+        elif kind == TOOL:
+            attributes["agent.tool.name"] = getattr(owner, "name", type(owner).__name__)
+        else:
+            model_id = getattr(owner, "model_id", None)
+            if model_id is not None:
+                attributes["agent.llm.model"] = str(model_id)
+        self.span = instrumentor.tracer.start_span(kind, attributes=attributes)
+        self.start_ns = time.perf_counter_ns()
+
+    def enter(self):
+        """Make the span current while the wrapped method runs."""
+        self._tokens = (
+            context.attach(trace.set_span_in_context(self.span)),
+            _active.set((id(self.owner), self.kind)),
+            _step.set(self) if self.kind == STEP else None,
+        )
+
+    def exit(self):
+        attach_token, active_token, step_token = self._tokens
+        context.detach(attach_token)
+        _active.reset(active_token)
+        if step_token is not None:
+            _step.reset(step_token)
+
+    def finish(self, args: tuple, kwargs: dict, result: Any):
+        """Record latency, and tokens for model calls and steps, and end the span."""
+        attributes = {"agent.latency_ms": (time.perf_counter_ns() - self.start_ns) / 1e6}
+        if self.kind == LLM:
+            usage = _llm_tokens(self.instrumentor, self.owner, args, kwargs, result)
+            attributes.update(usage)
+            step = _step.get()
+            if step is not None:
+                step.input_tokens += usage.get("agent.tokens.input", 0)
+                step.output_tokens += usage.get("agent.tokens.output", 0)
+        elif self.kind == STEP and (self.input_tokens or self.output_tokens):
+            attributes["agent.tokens.input"] = self.input_tokens
+            attributes["agent.tokens.output"] = self.output_tokens
+        self.span.set_attributes(attributes)
+        self.span.end()
+
+    def fail(self, error: BaseException):
+        self.span.record_exception(error)
+        self.span.set_status(Status(StatusCode.ERROR, str(error)))
+        self.span.set_attributes({
+            "agent.error": str(error),
+            "agent.latency_ms": (time.perf_counter_ns() - self.start_ns) / 1e6,
+        })
+        self.span.end()
+
+
+def _llm_tokens(instrumentor: Any, model: Any, args: tuple, kwargs: dict, result: Any) -> dict:
+    """Token usage of a model call, from the provider's report when available."""
+    usage = getattr(result, "token_usage", None)
+    input_tokens = getattr(usage, "input_tokens", None)
+    output_tokens = getattr(usage, "output_tokens", None)
+    if input_tokens is None:
+        input_tokens = getattr(model, "last_input_token_count", None)
+        output_tokens = getattr(model, "last_output_token_count", None)
+    if input_tokens is None:
+        counter = instrumentor.token_counter
+        input_tokens = counter.count_input(kwargs.get("messages", args[0] if args else None))
+        output_tokens = counter.count_input(getattr(result, "content", result))
+    attributes = {}
+    if input_tokens is not None:
+        attributes["agent.tokens.input"] = input_tokens
+    if output_tokens is not None:
+        attributes["agent.tokens.output"] = output_tokens
+    return attributes
+
+
+def _instrumentor_for(owner: Any, kind: str) -> Optional[Any]:
+    """Instrumentor to record a call with, or None to pass it through."""
+    instrumentor = _current.get()
+    if instrumentor is None or _active.get() == (id(owner), kind):
+        return None
+    # Head-sampled runs have no span to nest under
+    if not trace.get_current_span().is_recording():
+        return None
+    return instrumentor
+
+
+def _wrap_sync(original: Callable[..., Any], kind: str) -> Callable[..., Any]:
+    @functools.wraps(original)
+    def wrapper(self, *args, **kwargs):
+        instrumentor = _instrumentor_for(self, kind)
+        if instrumentor is None:
+            return original(self, *args, **kwargs)
+        call = _Call(instrumentor, kind, self, args)
+        call.enter()
+        try:
+            result = original(self, *args, **kwargs)
+        except BaseException as e:
+            call.exit()
+            call.fail(e)
+            raise
+        call.finish(args, kwargs, result)
+        call.exit()
+        return result
+
+    return wrapper
+
+
+def _wrap_async(original: Callable[..., Any], kind: str) -> Callable[..., Any]:
+    @functools.wraps(original)
+    async def wrapper(self, *args, **kwargs):
+        instrumentor = _instrumentor_for(self, kind)
+        if instrumentor is None:
+            return await original(self, *args, **kwargs)
+        call = _Call(instrumentor, kind, self, args)
+        call.enter()
+        try:
+            result = await original(self, *args, **kwargs)
+        except BaseException as e:
+            call.exit()
+            call.fail(e)
+            raise
+        call.finish(args, kwargs, result)
+        call.exit()
+        return result
+
+    return wrapper
+
+
+def _wrap_generator(original: Callable[..., Any], kind: str) -> Callable[..., Any]:
+    """Span a generator method from its first item until it is exhausted or closed.
+
+    Other code runs between items, so the span is only current while the
+    wrapped generator itself runs.
+    """
+    if inspect.isasyncgenfunction(original):
+        @functools.wraps(original)
+        async def async_wrapper(self, *args, **kwargs):
+            instrumentor = _instrumentor_for(self, kind)
+            if instrumentor is None:
+                async for item in original(self, *args, **kwargs):
+                    yield item
+                return
+            call = _Call(instrumentor, kind, self, args)
+            iterator = original(self, *args, **kwargs)
+            item = None
+            failed = False
+            try:
+                while True:
+                    call.enter()
+                    try:
+                        item = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        call.exit()
+                        break
+                    except BaseException as e:
+                        failed = True
+                        call.exit()
+                        call.fail(e)
+                        raise
+                    call.exit()
+                    yield item
+            finally:
+                if not failed:
+                    # Exhausted, or closed early by the consumer
+                    await iterator.aclose()
+                    call.finish(args, kwargs, item)
+
+        return async_wrapper
+
+    @functools.wraps(original)
+    def wrapper(self, *args, **kwargs):
+        instrumentor = _instrumentor_for(self, kind)
+        if instrumentor is None:
+            return (yield from original(self, *args, **kwargs))
+        call = _Call(instrumentor, kind, self, args)
+        iterator = original(self, *args, **kwargs)
+        item = None
+        failed = False
+        try:
+            while True:
+                call.enter()
+                try:
+                    item = next(iterator)
+                except StopIteration as stop:
+                    call.exit()
+                    return stop.value
+                except BaseException as e:
+                    failed = True
+                    call.exit()
+                    call.fail(e)
+                    raise
+                call.exit()
+                yield item
+        finally:
+            if not failed:
+                # Exhausted, or closed early by the consumer
+                iterator.close()
+                call.finish(args, kwargs, item)
+
+    return wrapper
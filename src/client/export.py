@@ -0,0 +1,571 @@
+"""Non-blocking span export with a bounded queue and disk spillover."""
+
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import Event, ReadableSpan, SpanProcessor
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.sdk.util.instrumentation import InstrumentationScope
+from opentelemetry.trace import Link, SpanContext, SpanKind, Status, StatusCode, TraceFlags, TraceState
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+# Spill record header: CRC32 of the payload, span count, payload length
+_RECORD = struct.Struct("<III")
+
+# OTLP span flag telling that the parent or linked span context is remote
+_SPAN_FLAGS_PARENT_IS_REMOTE = 0x200
+
+
+def __getattr__(name: str):
+    # The gRPC exporter moved to its own module so that importing this one
+    # does not load grpc; keep the old import path working
+    if name == "FailFastOTLPSpanExporter":
+        from .grpc_exporter import FailFastOTLPSpanExporter
+        return FailFastOTLPSpanExporter
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def encode_spans(spans: Sequence[ReadableSpan]) -> bytes:
+    """
+    Serialize finished spans for the spill log.
+
+    Batches are stored as OTLP ``ExportTraceServiceRequest`` protobuf
+    bytes, a data-only format, so that reading a spill directory never runs
+    code from it.
+
+    Args:
+        spans: Finished spans
+
+    Returns:
+        Bytes that :func:`decode_spans` turns back into equivalent spans
+    """
+    # The protobuf modules load only once something is spilled
+    from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans as encode_request
+
+    return encode_request(spans).SerializeToString()
+
+
+def decode_spans(data: bytes) -> List[ReadableSpan]:
+    """
+    Rebuild spans serialized by :func:`encode_spans`.
+
+    Args:
+        data: Serialized spans
+
+    Returns:
+        Spans ready to hand to a span exporter
+
+    Raises:
+        ValueError: If the data is not an OTLP trace export request
+    """
+    from google.protobuf.message import DecodeError
+    from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+
+    try:
+        request = ExportTraceServiceRequest.FromString(data)
+    except DecodeError as e:
+        raise ValueError(f"Corrupt spilled batch: {e}") from e
+
+    spans = []
+    for resource_spans in request.resource_spans:
+        resource = Resource(_decode_attributes(resource_spans.resource.attributes), resource_spans.schema_url)
+        for scope_spans in resource_spans.scope_spans:
+            scope = None
+            if scope_spans.HasField("scope"):
+                scope = InstrumentationScope(scope_spans.scope.name, scope_spans.scope.version or None,
+                                             scope_spans.schema_url or None)
+            for span in scope_spans.spans:
+                trace_id = int.from_bytes(span.trace_id, "big")
+                context = SpanContext(trace_id, int.from_bytes(span.span_id, "big"), False,
+                                      TraceFlags(TraceFlags.SAMPLED), _decode_trace_state(span.trace_state))
+                parent = None
+                if span.parent_span_id:
+                    parent = SpanContext(trace_id, int.from_bytes(span.parent_span_id, "big"),
+                                         bool(span.flags & _SPAN_FLAGS_PARENT_IS_REMOTE),
+                                         TraceFlags(TraceFlags.SAMPLED))
+                spans.append(ReadableSpan(
+                    name=span.name,
+                    context=context,
+                    parent=parent,
+                    resource=resource,
+                    attributes=_decode_attributes(span.attributes),
+                    events=[Event(event.name, _decode_attributes(event.attributes), event.time_unix_nano)
+                            for event in span.events],
+                    links=[Link(SpanContext(int.from_bytes(link.trace_id, "big"),
+                                            int.from_bytes(link.span_id, "big"),
+                                            bool(link.flags & _SPAN_FLAGS_PARENT_IS_REMOTE)),
+                                _decode_attributes(link.attributes))
+                           for link in span.links],
+                    # OTLP span kinds count from an UNSPECIFIED value
+                    kind=SpanKind(max(span.kind - 1, 0)),
+                    instrumentation_scope=scope,
+                    status=Status(StatusCode(span.status.code), span.status.message or None),
+                    start_time=span.start_time_unix_nano,
+                    end_time=span.end_time_unix_nano,
+                ))
+    return spans
+
+
+def _decode_attributes(key_values) -> Dict[str, Any]:
+    return {key_value.key: _decode_value(key_value.value) for key_value in key_values}
+
+
+def _decode_value(value) -> Any:
+    kind = value.WhichOneof("value")
+    if kind is None:
+        return None
+    if kind == "array_value":
+        return tuple(_decode_value(item) for item in value.array_value.values)
+    if kind == "kvlist_value":
+        return _decode_attributes(value.kvlist_value.values)
+    return getattr(value, kind)
+
+
+def _decode_trace_state(header: str) -> Optional[TraceState]:
+    if not header:
+        return None
+    return TraceState([tuple(member.split("=", 1)) for member in header.split(",") if "=" in member])
+
+
+class SpillLog:
+    """Append-only segment files holding span batches awaiting export.
+
+    Batches are appended to the active segment, which is rotated once it
+    reaches ``segment_bytes``. Segments left by an earlier process are
+    picked up and replayed too. When the log outgrows ``max_bytes`` the
+    oldest segment is discarded.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 4 << 20, max_bytes: int = 256 << 20):
+        """
+        Open or create a spill log.
+
+        Args:
+            directory: Directory holding the segment files
+            segment_bytes: Size at which the active segment is rotated
+            max_bytes: Total size above which the oldest segments are discarded
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Closed segments, oldest first, as (path, bytes, spans)
+        self._segments: List[Tuple[str, int, int]] = []
+        self._active = None
+        self._active_path = None
+        self._active_bytes = 0
+        self._active_spans = 0
+        self.discarded_spans = 0
+
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+        for name in names:
+            path = os.path.join(directory, name)
+            spans = sum(count for count, _ in self._read(path))
+            self._segments.append((path, os.path.getsize(path), spans))
+        self._next_sequence = int(names[-1][:-4]) + 1 if names else 0
+
+    @property
+    def pending_spans(self) -> int:
+        """Number of spans waiting on disk."""
+        with self._lock:
+            return self._active_spans + sum(spans for _, _, spans in self._segments)
+
+    @property
+    def pending_bytes(self) -> int:
+        """Size of the spill log on disk."""
+        with self._lock:
+            return self._active_bytes + sum(size for _, size, _ in self._segments)
+
+    def append(self, payload: bytes, count: int) -> int:
+        """
+        Append one batch.
+
+        Args:
+            payload: Serialized batch
+            count: Number of spans in the batch
+
+        Returns:
+            Number of older spans discarded to stay within ``max_bytes``
+        """
+        record = _RECORD.pack(zlib.crc32(payload), count, len(payload)) + payload
+        with self._lock:
+            if self._active is None:
+                self._active_path = os.path.join(self.directory, f"{self._next_sequence:012d}.seg")
+                self._next_sequence += 1
+                self._active = open(self._active_path, "ab")
+            self._active.write(record)
+            # Reach the OS before returning so a process crash loses nothing
+            self._active.flush()
+            self._active_bytes += len(record)
+            self._active_spans += count
+            if self._active_bytes >= self.segment_bytes:
+                self._rotate()
+            return self._enforce_limit()
+
+    def replay(self, export: Callable[[bytes], bool]) -> int:
+        """
+        Export spilled batches, oldest first, until one fails.
+
+        A segment is removed, or rewritten without its exported batches,
+        only after those batches were exported, so a crash during replay
+        may send a batch twice but never loses one.
+
+        Args:
+            export: Callable exporting one serialized batch, returning
+                whether it succeeded
+
+        Returns:
+            Number of spans replayed
+        """
+        with self._lock:
+            self._rotate()
+            paths = [path for path, _, _ in self._segments]
+
+        replayed = 0
+        for path in paths:
+            with self._lock:
+                if not any(segment[0] == path for segment in self._segments):
+                    # Discarded by the size limit meanwhile
+                    continue
+                records = self._read(path)
+
+            for position, (count, payload) in enumerate(records):
+                if not export(payload):
+                    # Keep the rest in place so ordering is kept
+                    if position:
+                        self._rewrite(path, records[position:])
+                    return replayed
+                replayed += count
+            with self._lock:
+                self._drop(path)
+        return replayed
+
+    def close(self):
+        """Close the active segment; its contents stay on disk for replay."""
+        with self._lock:
+            self._rotate()
+
+    def _rotate(self):
+        if self._active is None:
+            return
+        self._active.close()
+        self._segments.append((self._active_path, self._active_bytes, self._active_spans))
+        self._active = None
+        self._active_bytes = 0
+        self._active_spans = 0
+
+    def _enforce_limit(self) -> int:
+        discarded = 0
+        total = self._active_bytes + sum(size for _, size, _ in self._segments)
+        while total > self.max_bytes and self._segments:
+            path, size, spans = self._segments.pop(0)
+            os.remove(path)
+            total -= size
+            discarded += spans
+        self.discarded_spans += discarded
+        return discarded
+
+    def _drop(self, path: str):
+        """Forget and delete a segment, unless the size limit already did."""
+        for segment in self._segments:
+            if segment[0] == path:
+                self._segments.remove(segment)
+                os.remove(path)
+                return
+
+    def _rewrite(self, path: str, records: List[Tuple[int, bytes]]):
+        """Atomically replace a segment's records with the ones not yet exported."""
+        data = b"".join(_RECORD.pack(zlib.crc32(payload), count, len(payload)) + payload
+                        for count, payload in records)
+        with self._lock:
+            for index, segment in enumerate(self._segments):
+                if segment[0] == path:
+                    with open(path + ".tmp", "wb") as f:
+                        f.write(data)
+                    os.replace(path + ".tmp", path)
+                    self._segments[index] = (path, len(data), sum(count for count, _ in records))
+                    return
+
+    @staticmethod
+    def _read(path: str) -> List[Tuple[int, bytes]]:
+        """Read a segment's records, stopping at a torn or corrupt one."""
+        with open(path, "rb") as f:
+            data = f.read()
+        records = []
+        position = 0
+        while position + _RECORD.size <= len(data):
+            crc, count, length = _RECORD.unpack_from(data, position)
+            payload = data[position + _RECORD.size:position + _RECORD.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            records.append((count, payload))
+            position += _RECORD.size + length
+        return records
+
+
+class BufferedSpanProcessor(SpanProcessor):
+    """Span processor exporting from a bounded queue on a background thread.
+
+    ``on_end`` never waits on the network. When the queue is full the
+    overflow policy decides which span gives way: ``drop_oldest`` evicts
+    the oldest queued span, ``drop_newest`` turns away the new one and
+    ``block`` waits up to ``block_timeout`` for room first. Spans that give
+    way, and batches the exporter rejects, go to the spill log when
+    ``spill_dir`` is set and are replayed once the endpoint recovers,
+    probed every ``retry_interval`` while the queue is idle; without one
+    they are dropped and counted.
+    """
+
+    def __init__(self,
+                 exporter: SpanExporter,
+                 max_queue_size: int = 2048,
+                 overflow: str = DROP_OLDEST,
+                 block_timeout: float = 1.0,
+                 max_export_batch_size: int = 512,
+                 schedule_delay: float = 1.0,
+                 retry_interval: float = 1.0,
+                 spill_dir: Optional[str] = None,
+                 max_spill_bytes: int = 256 << 20):
+        """
+        Initialize the processor and start its export thread.
+
+        Args:
+            exporter: Span exporter that receives batches
+            max_queue_size: Capacity of the in-memory queue
+            overflow: One of ``drop_oldest``, ``drop_newest`` or ``block``
+            block_timeout: Seconds ``block`` waits for room
+            max_export_batch_size: Spans per export call
+            schedule_delay: Seconds between exports of a partial batch
+            retry_interval: Seconds to wait after a failed export
+            spill_dir: Directory for the spill log, or None to drop instead
+            max_spill_bytes: Size cap of the spill log
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        if max_queue_size < 1 or max_export_batch_size < 1:
+            raise ValueError("max_queue_size and max_export_batch_size must be positive")
+        self.exporter = exporter
+        self.max_queue_size = max_queue_size
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.max_export_batch_size = max_export_batch_size
+        self.schedule_delay = schedule_delay
+        self.retry_interval = retry_interval
+        self.spill = SpillLog(spill_dir, max_bytes=max_spill_bytes) if spill_dir else None
+
+        self._queue: deque = deque()
+        # Spans pushed out of the queue, spilled in batches
+        self._overflowed: List[ReadableSpan] = []
+        self._condition = threading.Condition()
+        self._export_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._shutdown = False
+        self._healthy = True
+
+        self.exported_spans = 0
+        self.dropped_spans = 0
+        self.spilled_spans = 0
+        self.replayed_spans = 0
+        self.failed_exports = 0
+
+        self._worker = threading.Thread(target=self._run, name="BufferedSpanProcessor", daemon=True)
+        self._worker.start()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of spans waiting in memory."""
+        return len(self._queue)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the export counters.
+
+        Returns:
+            Queue and spill depths plus exported, dropped, spilled and
+            replayed span counts and the number of failed exports
+        """
+        return {
+            "queue_depth": self.queue_depth,
+            "spill_depth": self.spill.pending_spans if self.spill else 0,
+            "exported_spans": self.exported_spans,
+            "dropped_spans": self.dropped_spans + (self.spill.discarded_spans if self.spill else 0),
+            "spilled_spans": self.spilled_spans,
+            "replayed_spans": self.replayed_spans,
+            "failed_exports": self.failed_exports,
+        }
+
+    def on_start(self, span, parent_context=None):
+        pass
+
+    def on_end(self, span: ReadableSpan):
+        if not span.context.trace_flags.sampled or self._shutdown:
+            return
+        spill = None
+        with self._condition:
+            if len(self._queue) >= self.max_queue_size and self.overflow == BLOCK:
+                self._condition.wait_for(
+                    lambda: len(self._queue) < self.max_queue_size or self._shutdown,
+                    self.block_timeout,
+                )
+            if len(self._queue) >= self.max_queue_size:
+                if self.overflow == DROP_OLDEST:
+                    self._overflowed.append(self._queue.popleft())
+                    self._queue.append(span)
+                else:
+                    self._overflowed.append(span)
+                if len(self._overflowed) >= self.max_export_batch_size:
+                    spill, self._overflowed = self._overflowed, []
+            else:
+                self._queue.append(span)
+                if len(self._queue) >= self.max_export_batch_size:
+                    self._condition.notify_all()
+        if spill:
+            self._give_up(spill)
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        """
+        Export everything queued, replaying the spill log first.
+
+        Returns:
+            Whether everything was exported; false if the time ran out or
+            any spans were spilled or dropped instead
+        """
+        deadline = time.monotonic() + timeout_millis / 1000
+        with self._export_lock:
+            exported = self._replay()
+            while time.monotonic() < deadline:
+                batch = self._take(self.max_export_batch_size)
+                if not batch:
+                    break
+                exported = self._export(batch) and exported
+            exported = not self._spill_overflowed() and exported
+        return exported and not self._queue
+
+    def shutdown(self):
+        with self._condition:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            self._condition.notify_all()
+        self._worker.join()
+        # Anything left goes to the spill log for the next process
+        with self._export_lock:
+            if self._healthy:
+                self._replay()
+            while True:
+                batch = self._take(self.max_export_batch_size)
+                if not batch:
+                    break
+                if not self._healthy:
+                    self._give_up(batch)
+                else:
+                    self._export(batch)
+            self._spill_overflowed()
+        if self.spill:
+            self.spill.close()
+        self.exporter.shutdown()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._shutdown and len(self._queue) < self.max_export_batch_size:
+                    self._condition.wait(self.schedule_delay if self._healthy else self.retry_interval)
+                if self._shutdown:
+                    return
+            with self._export_lock:
+                # An idle worker probes a down endpoint with the spill log,
+                # so that it is replayed without waiting for new spans
+                if self.spill is not None and (self._healthy or not self._queue):
+                    if self._replay():
+                        self._healthy = True
+                batch = self._take(self.max_export_batch_size)
+                if batch:
+                    self._export(batch)
+                self._spill_overflowed()
+            if not self._healthy:
+                # Back off instead of hammering an endpoint that is down
+                with self._condition:
+                    self._condition.wait_for(lambda: self._shutdown, self.retry_interval)
+
+    def _take(self, count: int) -> List[ReadableSpan]:
+        with self._condition:
+            batch = [self._queue.popleft() for _ in range(min(count, len(self._queue)))]
+            if batch:
+                # Wake producers blocked on a full queue
+                self._condition.notify_all()
+            return batch
+
+    def _export(self, batch: List[ReadableSpan]) -> bool:
+        try:
+            result = self.exporter.export(batch)
+        except Exception:
+            logger.exception("Span exporter raised")
+            result = SpanExportResult.FAILURE
+        if result is SpanExportResult.SUCCESS:
+            self.exported_spans += len(batch)
+            if not self._healthy:
+                self._healthy = True
+                self._replay()
+            return True
+        self.failed_exports += 1
+        self._healthy = False
+        self._give_up(batch)
+        return False
+
+    def _replay(self) -> bool:
+        """Replay the spill log; whether nothing is left in it."""
+        if self.spill is None:
+            return True
+
+        def export(payload: bytes) -> bool:
+            try:
+                spans = decode_spans(payload)
+            except ValueError:
+                # Unreadable, such as a batch spilled by an older version
+                logger.warning("Discarding an unreadable spilled batch")
+                return True
+            try:
+                ok = self.exporter.export(spans) is SpanExportResult.SUCCESS
+            except Exception:
+                ok = False
+            if ok:
+                self.replayed_spans += len(spans)
+            else:
+                self.failed_exports += 1
+                self._healthy = False
+            return ok
+
+        self.spill.replay(export)
+        return self.spill.pending_spans == 0
+
+    def _spill_overflowed(self) -> int:
+        """Spill or drop the spans pushed out of the queue; how many there were."""
+        with self._condition:
+            overflowed, self._overflowed = self._overflowed, []
+        if overflowed:
+            self._give_up(overflowed)
+        return len(overflowed)
+
+    def _give_up(self, spans: List[ReadableSpan]):
+        """Spill spans that could not be queued or exported, or drop them."""
+        if self.spill is None:
+            with self._counter_lock:
+                self.dropped_spans += len(spans)
+            return
+        self.spill.append(encode_spans(spans), len(spans))
+        with self._counter_lock:
+            self.spilled_spans += len(spans)
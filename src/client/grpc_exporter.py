@@ -0,0 +1,69 @@
+"""Single-attempt OTLP/gRPC exporters.
+
+Kept apart from :mod:`.export` so that grpc is only imported by pipelines
+that export over gRPC.
+"""
+
+import logging
+from typing import Any
+
+from grpc import RpcError
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.trace.export import SpanExportResult
+
+logger = logging.getLogger(__name__)
+
+# Internals of the SDK's OTLPExporterMixin that a single-attempt export
+# relies on. The SDK is pinned below 1.32 in pyproject.toml; should a
+# release rename them, exporters fall back to the stock retrying export
+_SDK_INTERNALS = ("_shutdown", "_export_lock", "_client", "_translate_data", "_headers", "_timeout", "_endpoint")
+_warned_fallback = False
+
+
+class FailFastExportMixin:
+    """Replace the retrying ``_export`` of an OTLP gRPC exporter with one attempt.
+
+    Mixed in ahead of an SDK span or metric exporter; subclasses set the
+    ``_success`` and ``_failure`` results of their signal.
+    """
+
+    _success: Any = None
+    _failure: Any = None
+
+    def _export(self, data):
+        if not all(hasattr(self, name) for name in _SDK_INTERNALS):
+            _warn_fallback(type(self).__name__)
+            return super()._export(data)
+        if self._shutdown:
+            return self._failure
+        with self._export_lock:
+            try:
+                self._client.Export(
+                    request=self._translate_data(data),
+                    metadata=self._headers,
+                    timeout=self._timeout,
+                )
+                return self._success
+            except RpcError as error:
+                logger.debug("Export to %s failed: %s", self._endpoint, error.code())
+                return self._failure
+
+
+def _warn_fallback(name: str):
+    global _warned_fallback
+    if not _warned_fallback:
+        _warned_fallback = True
+        logger.warning("%s: OTLP exporter internals changed; exports retry as in the SDK", name)
+
+
+class FailFastOTLPSpanExporter(FailFastExportMixin, OTLPSpanExporter):
+    """OTLP gRPC exporter that makes a single attempt per batch.
+
+    The stock exporter retries transient errors with backoff for up to a
+    minute while holding the export thread. Behind a
+    :class:`~.export.BufferedSpanProcessor` retries belong to the export
+    stage, which can spill the batch and keep draining the queue instead.
+    """
+
+    _success = SpanExportResult.SUCCESS
+    _failure = SpanExportResult.FAILURE
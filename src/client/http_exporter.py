@@ -0,0 +1,33 @@
+"""Single-attempt OTLP/HTTP span exporter.
+
+The HTTP/protobuf exporter avoids loading grpc altogether, which makes it
+the lighter choice for short-lived jobs.
+"""
+
+import logging
+
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.trace.export import SpanExportResult
+from requests.exceptions import RequestException
+
+logger = logging.getLogger(__name__)
+
+
+class FailFastOTLPHTTPSpanExporter(OTLPSpanExporter):
+    """OTLP HTTP/protobuf exporter that makes a single attempt per batch.
+
+    Like :class:`~.grpc_exporter.FailFastOTLPSpanExporter`, it leaves
+    retries to a :class:`~.export.BufferedSpanProcessor` instead of sleeping
+    on the export thread, and reports connection errors as failures.
+    """
+
+    def _export_serialized_spans(self, serialized_data):
+        try:
+            response = self._export(serialized_data)
+        except RequestException as error:
+            logger.debug("Exporting spans to %s failed: %s", self._endpoint, error)
+            return SpanExportResult.FAILURE
+        if response.ok:
+            return SpanExportResult.SUCCESS
+        logger.debug("Exporting spans to %s failed: HTTP %s", self._endpoint, response.status_code)
+        return SpanExportResult.FAILURE
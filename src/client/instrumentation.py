@@ -1,20 +1,44 @@
 """Agent instrumentation utilities."""
 
+import inspect
+import logging
+import re
+import sys
 import time
 import uuid
-from typing import Any, Callable, Awaitable
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Awaitable, Iterator, Optional, Union
 
-from opentelemetry import trace
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry import context, trace
+from opentelemetry.trace import Status, StatusCode
+
+from .caching import CACHE_HIT_ATTRIBUTE, ResponseCache
+from .pipeline import GRPC, get_pipeline
+from .profiling import RunProfile, StackSampler
+from .sampling import DROPPED_ATTRIBUTE, HeadSampler, TailSampler
+from .tokenization import TokenCounter, default_token_counter
+
+if TYPE_CHECKING:
+    from ..collector.costs import PricingTable
+
+logger = logging.getLogger(__name__)
+
+# Characters of an agent id not kept in profile file names
+_UNSAFE_FILE_CHARS = re.compile(r"[^A-Za-z0-9._-]")
 
 
 class AgentInstrumentor:
     """Instrument AI agents with OpenTelemetry tracing."""
 
-    def __init__(self, service_name: str, agent_id: str = None, endpoint: str = "http://localhost:4317"):
+    def __init__(self, service_name: str, agent_id: str = None, endpoint: str = "http://localhost:4317",
+                 fast_path: bool = False,
+                 head_sampler: Optional[HeadSampler] = None,
+                 tail_sampler: Optional[TailSampler] = None,
+                 token_counter: Optional[TokenCounter] = None,
+                 protocol: str = GRPC,
+                 pricing: Optional["PricingTable"] = None,
+                 model: Optional[str] = None,
+                 cache: Optional[ResponseCache] = None,
+                 profiler: Optional[StackSampler] = None):
         """
         Initialize the agent instrumentor.
         
@@ -22,20 +46,42 @@ class AgentInstrumentor:
             service_name: The name of the service
             agent_id: Unique identifier for this agent
             endpoint: OTLP endpoint for exporting telemetry
+            fast_path: Use the low-overhead wrappers, which batch span
+                attributes and time with ``perf_counter_ns``
+            head_sampler: Optional sampler deciding per run, before it
+                starts, whether to create a span at all
+            tail_sampler: Optional sampler deciding per run, after it
+                finishes, whether to export its span
+            token_counter: Counter for input and output tokens. Defaults
+                to the shared, cached byte-level BPE counter.
+            protocol: OTLP transport, ``grpc`` or ``http/protobuf``
+            pricing: Optional pricing table; runs of a priced ``model``
+                get their cost in an ``agent.cost`` attribute
+            model: Name of the model the agent runs on, recorded as
+                ``agent.model``
+            cache: Optional response cache consulted before each
+                non-streaming run; hits return the cached response and
+                are recorded in ``agent.cache.*`` attributes
+            profiler: Optional stack sampler profiling each non-streaming
+                run that reaches the agent; the folded stacks, or the path
+                of the file holding them, go in ``agent.profile.*``
+                attributes
         """
         self.agent_id = agent_id or str(uuid.uuid4())
+        self.model = model
+        # Per-token prices are looked up once, not per run
+        self._price = pricing.price(model) if pricing is not None and model else None
+        self.fast_path = fast_path
+        self.head_sampler = head_sampler
+        self.tail_sampler = tail_sampler
+        self.token_counter = token_counter or default_token_counter()
+        self.cache = cache
+        self.profiler = profiler
         
-        resource = Resource.create({
-            "service.name": service_name,
-            "agent.id": agent_id
-        })
-        
-        trace_provider = TracerProvider(resource=resource)
-        otlp_exporter = OTLPSpanExporter(endpoint=endpoint)
-        trace_provider.add_span_processor(BatchSpanProcessor(otlp_exporter))
-        trace.set_tracer_provider(trace_provider)
-        
-        self.tracer = trace.get_tracer(__name__)
+        # All agents of a service share one provider, exporter and export
+        # thread; the agent identity travels on each span instead.
+        self.pipeline = get_pipeline(service_name, endpoint, protocol)
+        self.tracer = self.pipeline.get_tracer(__name__)
     
     def wrap_agent(self, run_func: Callable[..., Any]) -> Callable[..., Any]:
         """
@@ -47,38 +93,69 @@ class AgentInstrumentor:
         Returns:
             A wrapped function that records telemetry
         """
+        # Runs dropped by head sampling are not profiled either
+        untraced = self._cached(run_func) if self.cache is not None else run_func
+        if self.profiler is not None:
+            run_func = self._profiled(run_func)
+        if self.cache is not None:
+            run_func = self._cached(run_func)
+        if self.fast_path:
+            return self._wrap_agent_fast(run_func, untraced)
+        
         def wrapped_run(*args, **kwargs):
-            with self.tracer.start_as_current_span("agent.run") as span:
+            if not self._head_sample():
+                return untraced(*args, **kwargs)
+            
+            with self.tracer.start_as_current_span("agent.run", end_on_exit=False) as span:
                 start_time = time.time()
                 
                 # Add basic attributes
                 span.set_attribute("agent.id", self.agent_id)
+                if self.model:
+                    span.set_attribute("agent.model", self.model)
                 
                 # Count input tokens if possible
-                input_text = kwargs.get("input", "")
-                if isinstance(input_text, str):
-                    input_tokens = len(input_text.split())
+                input_tokens = self.token_counter.count_input(kwargs.get("input"))
+                if input_tokens is not None:
                     span.set_attribute("agent.tokens.input", input_tokens)
                 
+                failed = False
+                streaming = False
                 try:
                     # Run the original function
                     result = run_func(*args, **kwargs)
                     
-                    # Record output tokens if result is a string
-                    if isinstance(result, str):
-                        output_tokens = len(result.split())
+                    # A returned stream ends the span once it is consumed
+                    if _is_stream(result):
+                        streaming = True
+                        elapsed_ns = int((time.time() - start_time) * 1e9)
+                        return self._trace_stream(result, span, time.perf_counter_ns() - elapsed_ns)
+                    
+                    # Record output tokens if the result can be counted
+                    output_tokens = self.token_counter.count_input(result)
+                    if output_tokens is not None:
                         span.set_attribute("agent.tokens.output", output_tokens)
+                    cost = self._span_cost(span, output_tokens)
+                    if cost is not None:
+                        span.set_attribute("agent.cost", cost)
                     
                     return result
                     
                 except Exception as e:
+                    failed = True
                     span.record_exception(e)
+                    # The span ends before use_span sees the exception
+                    span.set_status(Status(StatusCode.ERROR, str(e)))
                     span.set_attribute("agent.error", str(e))
                     raise
                 finally:
-                    # Calculate and record latency
-                    latency_ms = (time.time() - start_time) * 1000
-                    span.set_attribute("agent.latency_ms", latency_ms)
+                    if not streaming:
+                        # Calculate and record latency
+                        latency_ms = (time.time() - start_time) * 1000
+                        span.set_attribute("agent.latency_ms", latency_ms)
+                        if self._tail_drop(latency_ms, failed):
+                            span.set_attribute(DROPPED_ATTRIBUTE, True)
+                        span.end()
         
         return wrapped_run
     
@@ -92,37 +169,454 @@ class AgentInstrumentor:
         Returns:
             A wrapped async function that records telemetry
         """
+        # Runs dropped by head sampling are not profiled either
+        untraced = self._cached_async(run_func) if self.cache is not None else run_func
+        if self.profiler is not None:
+            run_func = self._profiled_async(run_func)
+        if self.cache is not None:
+            run_func = self._cached_async(run_func)
+        if self.fast_path:
+            return self._wrap_async_agent_fast(run_func, untraced)
+        
         async def wrapped_run(*args, **kwargs):
-            with self.tracer.start_as_current_span("agent.run") as span:
+            if not self._head_sample():
+                return await untraced(*args, **kwargs)
+            
+            with self.tracer.start_as_current_span("agent.run", end_on_exit=False) as span:
                 start_time = time.time()
                 
                 # Add basic attributes
                 span.set_attribute("agent.id", self.agent_id)
+                if self.model:
+                    span.set_attribute("agent.model", self.model)
                 
                 # Count input tokens if possible
-                input_text = kwargs.get("input", "")
-                if isinstance(input_text, str):
-                    input_tokens = len(input_text.split())
+                input_tokens = self.token_counter.count_input(kwargs.get("input"))
+                if input_tokens is not None:
                     span.set_attribute("agent.tokens.input", input_tokens)
                 
+                failed = False
+                streaming = False
                 try:
                     # Run the original function
                     result = await run_func(*args, **kwargs)
                     
-                    # Record output tokens if result is a string
-                    if isinstance(result, str):
-                        output_tokens = len(result.split())
+                    # A returned stream ends the span once it is consumed
+                    if _is_stream(result):
+                        streaming = True
+                        elapsed_ns = int((time.time() - start_time) * 1e9)
+                        return self._trace_stream(result, span, time.perf_counter_ns() - elapsed_ns)
+                    
+                    # Record output tokens if the result can be counted
+                    output_tokens = self.token_counter.count_input(result)
+                    if output_tokens is not None:
                         span.set_attribute("agent.tokens.output", output_tokens)
+                    cost = self._span_cost(span, output_tokens)
+                    if cost is not None:
+                        span.set_attribute("agent.cost", cost)
                     
                     return result
                     
                 except Exception as e:
+                    failed = True
                     span.record_exception(e)
+                    # The span ends before use_span sees the exception
+                    span.set_status(Status(StatusCode.ERROR, str(e)))
                     span.set_attribute("agent.error", str(e))
                     raise
                 finally:
-                    # Calculate and record latency
-                    latency_ms = (time.time() - start_time) * 1000
-                    span.set_attribute("agent.latency_ms", latency_ms)
+                    if not streaming:
+                        # Calculate and record latency
+                        latency_ms = (time.time() - start_time) * 1000
+                        span.set_attribute("agent.latency_ms", latency_ms)
+                        if self._tail_drop(latency_ms, failed):
+                            span.set_attribute(DROPPED_ATTRIBUTE, True)
+                        span.end()
         
         return wrapped_run
+    
+    def wrap_stream_agent(self, run_func: Callable[..., Iterator[Any]]) -> Callable[..., Iterator[Any]]:
+        """
+        Wrap an agent's run function that yields its response in chunks
+        
+        The span starts when iteration starts and ends when the stream is
+        exhausted, fails or is closed. Chunks are passed on as they arrive.
+        
+        Args:
+            run_func: The agent's generator run function to wrap
+            
+        Returns:
+            A wrapped generator function that records telemetry
+        """
+        def wrapped_run(*args, **kwargs):
+            if not self._head_sample():
+                return (yield from run_func(*args, **kwargs))
+            
+            span = self.tracer.start_span("agent.run", attributes=self._start_attributes(kwargs))
+            start_ns = time.perf_counter_ns()
+            return (yield from self._trace_stream(run_func(*args, **kwargs), span, start_ns))
+        
+        return wrapped_run
+    
+    def wrap_async_stream_agent(self, run_func: Callable[..., AsyncIterator[Any]]) -> Callable[..., AsyncIterator[Any]]:
+        """
+        Wrap an agent's async generator run function with telemetry
+        
+        Args:
+            run_func: The agent's async generator run function to wrap
+            
+        Returns:
+            A wrapped async generator function that records telemetry
+        """
+        async def wrapped_run(*args, **kwargs):
+            if not self._head_sample():
+                async for chunk in run_func(*args, **kwargs):
+                    yield chunk
+                return
+            
+            span = self.tracer.start_span("agent.run", attributes=self._start_attributes(kwargs))
+            start_ns = time.perf_counter_ns()
+            async for chunk in self._trace_stream(run_func(*args, **kwargs), span, start_ns):
+                yield chunk
+        
+        return wrapped_run
+    
+    def _head_sample(self) -> bool:
+        """Decide whether the next run gets a span."""
+        return self.head_sampler is None or self.head_sampler.should_sample(self.agent_id)
+    
+    def _tail_drop(self, latency_ms: float, failed: bool) -> bool:
+        """Decide whether a finished run's span should be dropped."""
+        return self.tail_sampler is not None and not self.tail_sampler.should_keep(latency_ms, failed)
+    
+    def _start_attributes(self, kwargs: dict) -> dict:
+        """Build the attributes known when an agent run starts."""
+        attributes = {"agent.id": self.agent_id}
+        if self.model:
+            attributes["agent.model"] = self.model
+        input_tokens = self.token_counter.count_input(kwargs.get("input"))
+        if input_tokens is not None:
+            attributes["agent.tokens.input"] = input_tokens
+        return attributes
+    
+    def _cost(self, input_tokens: Optional[int], output_tokens: Optional[int]) -> Optional[float]:
+        """Price a run from its token counts, or None without a price or counts."""
+        if self._price is None or (input_tokens is None and output_tokens is None):
+            return None
+        return (input_tokens or 0) * self._price[0] + (output_tokens or 0) * self._price[1]
+    
+    def _span_cost(self, span: trace.Span, output_tokens: Optional[int]) -> Optional[float]:
+        """Price a run whose input tokens were set on its span when it started."""
+        if self._price is None:
+            return None
+        attributes = getattr(span, "attributes", None) or {}
+        if attributes.get(CACHE_HIT_ATTRIBUTE):
+            # Cached responses make no model call
+            return 0.0
+        return self._cost(attributes.get("agent.tokens.input"), output_tokens)
+    
+    def _cached(self, run_func: Callable[..., Any]) -> Callable[..., Any]:
+        """Answer runs from the response cache, storing the responses of misses."""
+        cache = self.cache
+        agent_id = self.agent_id
+        perf_counter_ns = time.perf_counter_ns
+        
+        def cached_run(*args, **kwargs):
+            lookup = cache.lookup(args, kwargs, agent_id)
+            _set_current_attributes(lookup.attributes())
+            if lookup.hit:
+                return lookup.value
+            start_ns = perf_counter_ns()
+            result = run_func(*args, **kwargs)
+            cache.store(lookup, result, (perf_counter_ns() - start_ns) / 1e6)
+            return result
+        
+        return cached_run
+    
+    def _cached_async(self, run_func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """Async variant of :meth:`_cached`."""
+        cache = self.cache
+        agent_id = self.agent_id
+        perf_counter_ns = time.perf_counter_ns
+        
+        async def cached_run(*args, **kwargs):
+            lookup = cache.lookup(args, kwargs, agent_id)
+            _set_current_attributes(lookup.attributes())
+            if lookup.hit:
+                return lookup.value
+            start_ns = perf_counter_ns()
+            result = await run_func(*args, **kwargs)
+            cache.store(lookup, result, (perf_counter_ns() - start_ns) / 1e6)
+            return result
+        
+        return cached_run
+    
+    def _profiled(self, run_func: Callable[..., Any]) -> Callable[..., Any]:
+        """Sample the stacks of each run, attaching them to its span."""
+        profiler = self.profiler
+        
+        def profiled_run(*args, **kwargs):
+            run = profiler.start(sys._getframe())
+            try:
+                return run_func(*args, **kwargs)
+            finally:
+                self._finish_profile(run)
+        
+        return profiled_run
+    
+    def _profiled_async(self, run_func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """Async variant of :meth:`_profiled`."""
+        profiler = self.profiler
+        
+        async def profiled_run(*args, **kwargs):
+            # The coroutine's frame is on the loop thread's stack whenever
+            # the run is executing
+            run = profiler.start(sys._getframe())
+            try:
+                return await run_func(*args, **kwargs)
+            finally:
+                self._finish_profile(run)
+        
+        return profiled_run
+    
+    def _finish_profile(self, run: RunProfile):
+        """Attach a finished run's profile to its span."""
+        try:
+            attributes = self.profiler.finish(run, self._profile_name())
+        except OSError as e:
+            # A profile that cannot be written must not replace the run's
+            # own result or exception
+            logger.warning("Could not write the profile of agent %s: %s", self.agent_id, e)
+            return
+        _set_current_attributes(attributes)
+    
+    def _profile_name(self) -> Optional[str]:
+        """File name stem of the current run's profile."""
+        span_context = trace.get_current_span().get_span_context()
+        if not span_context.is_valid:
+            return None
+        # Agent ids are caller-supplied; keep them from naming paths
+        agent = _UNSAFE_FILE_CHARS.sub("_", self.agent_id)[:64]
+        return f"{agent}-{span_context.trace_id:032x}-{span_context.span_id:016x}"
+    
+    def _wrap_agent_fast(self, run_func: Callable[..., Any], untraced: Callable[..., Any]) -> Callable[..., Any]:
+        """Fast-path variant of :meth:`wrap_agent`."""
+        tracer = self.tracer
+        perf_counter_ns = time.perf_counter_ns
+        
+        def wrapped_run(*args, **kwargs):
+            if not self._head_sample():
+                return untraced(*args, **kwargs)
+            
+            span = tracer.start_span("agent.run", attributes=self._start_attributes(kwargs))
+            token = context.attach(trace.set_span_in_context(span))
+            start_ns = perf_counter_ns()
+            try:
+                result = run_func(*args, **kwargs)
+            except BaseException as e:
+                # Cancellation and interrupts end the span too
+                self._end_with_error(span, e, perf_counter_ns() - start_ns)
+                raise
+            finally:
+                context.detach(token)
+            
+            if _is_stream(result):
+                return self._trace_stream(result, span, start_ns)
+            self._end_with_result(span, result, perf_counter_ns() - start_ns)
+            return result
+        
+        return wrapped_run
+    
+    def _wrap_async_agent_fast(self, run_func: Callable[..., Awaitable[Any]],
+                               untraced: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """Fast-path variant of :meth:`wrap_async_agent`."""
+        tracer = self.tracer
+        perf_counter_ns = time.perf_counter_ns
+        
+        async def wrapped_run(*args, **kwargs):
+            if not self._head_sample():
+                return await untraced(*args, **kwargs)
+            
+            span = tracer.start_span("agent.run", attributes=self._start_attributes(kwargs))
+            token = context.attach(trace.set_span_in_context(span))
+            start_ns = perf_counter_ns()
+            try:
+                result = await run_func(*args, **kwargs)
+            except BaseException as e:
+                # Cancellation and interrupts end the span too
+                self._end_with_error(span, e, perf_counter_ns() - start_ns)
+                raise
+            finally:
+                context.detach(token)
+            
+            if _is_stream(result):
+                return self._trace_stream(result, span, start_ns)
+            self._end_with_result(span, result, perf_counter_ns() - start_ns)
+            return result
+        
+        return wrapped_run
+    
+    def _trace_stream(self, stream: Union[Iterator[Any], AsyncIterator[Any]], span: trace.Span,
+                      start_ns: int) -> Union[Iterator[Any], AsyncIterator[Any]]:
+        """
+        Pass a stream through, ending the span once it is consumed.
+        
+        The span is current only while the stream produces a chunk, since
+        the consumer's own code runs in between.
+        
+        Args:
+            stream: Generator or async generator returned by the agent
+            span: The run's span, still open
+            start_ns: ``perf_counter_ns`` at the start of the run
+            
+        Returns:
+            A generator of the same kind yielding the same chunks
+        """
+        stats = _StreamStats(start_ns, self.token_counter)
+        if inspect.isasyncgen(stream):
+            return self._trace_async_stream(stream, span, stats)
+        return self._trace_sync_stream(stream, span, stats)
+    
+    def _trace_sync_stream(self, stream: Iterator[Any], span: trace.Span, stats: "_StreamStats") -> Iterator[Any]:
+        failed = False
+        try:
+            while True:
+                token = context.attach(trace.set_span_in_context(span))
+                try:
+                    chunk = next(stream)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    context.detach(token)
+                stats.add(chunk)
+                yield chunk
+        except Exception as e:
+            failed = True
+            span.set_attributes(stats.attributes())
+            self._end_with_error(span, e, time.perf_counter_ns() - stats.start_ns)
+            raise
+        finally:
+            # Exhausted, or closed early by the consumer
+            stream.close()
+            if not failed:
+                self._end_stream(span, stats)
+    
+    async def _trace_async_stream(self, stream: AsyncIterator[Any], span: trace.Span,
+                                  stats: "_StreamStats") -> AsyncIterator[Any]:
+        failed = False
+        try:
+            while True:
+                token = context.attach(trace.set_span_in_context(span))
+                try:
+                    chunk = await stream.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    context.detach(token)
+                stats.add(chunk)
+                yield chunk
+        except Exception as e:
+            failed = True
+            span.set_attributes(stats.attributes())
+            self._end_with_error(span, e, time.perf_counter_ns() - stats.start_ns)
+            raise
+        finally:
+            await stream.aclose()
+            if not failed:
+                self._end_stream(span, stats)
+    
+    def _end_stream(self, span: trace.Span, stats: "_StreamStats"):
+        """Set the stream's timing and token attributes and end the span."""
+        latency_ms = (time.perf_counter_ns() - stats.start_ns) / 1e6
+        attributes = stats.attributes()
+        attributes["agent.latency_ms"] = latency_ms
+        cost = self._span_cost(span, attributes.get("agent.tokens.output"))
+        if cost is not None:
+            attributes["agent.cost"] = cost
+        if self._tail_drop(latency_ms, False):
+            attributes[DROPPED_ATTRIBUTE] = True
+        span.set_attributes(attributes)
+        span.end()
+    
+    def _end_with_result(self, span: trace.Span, result: Any, elapsed_ns: int):
+        """Set the end-of-run attributes in one batch and end the span."""
+        latency_ms = elapsed_ns / 1e6
+        attributes = {"agent.latency_ms": latency_ms}
+        output_tokens = self.token_counter.count_input(result)
+        if output_tokens is not None:
+            attributes["agent.tokens.output"] = output_tokens
+        cost = self._span_cost(span, output_tokens)
+        if cost is not None:
+            attributes["agent.cost"] = cost
+        if self._tail_drop(latency_ms, False):
+            attributes[DROPPED_ATTRIBUTE] = True
+        span.set_attributes(attributes)
+        span.end()
+    
+    def _end_with_error(self, span: trace.Span, error: BaseException, elapsed_ns: int):
+        """Record a failed run on the span and end it."""
+        latency_ms = elapsed_ns / 1e6
+        span.record_exception(error)
+        span.set_status(Status(StatusCode.ERROR, str(error)))
+        # Failed runs are always kept by the tail sampler
+        self._tail_drop(latency_ms, True)
+        span.set_attributes({"agent.error": str(error), "agent.latency_ms": latency_ms})
+        span.end()
+
+
+
+def _set_current_attributes(attributes: dict):
+    """Set attributes on the current span, if a run is being traced."""
+    span = trace.get_current_span()
+    if span.is_recording():
+        span.set_attributes(attributes)
+
+
+def _is_stream(value: Any) -> bool:
+    """Whether a run returned a generator to be consumed by the caller."""
+    return inspect.isgenerator(value) or inspect.isasyncgen(value)
+
+
+class _StreamStats:
+    """Running timing and token totals of a streamed response.
+
+    Chunks are counted as they pass and never kept. Gaps between chunks
+    include the time the consumer takes between reads.
+    """
+
+    __slots__ = ("start_ns", "token_counter", "chunks", "tokens", "counted", "first_ns", "last_ns", "max_gap_ns")
+
+    def __init__(self, start_ns: int, token_counter: TokenCounter):
+        self.start_ns = start_ns
+        self.token_counter = token_counter
+        self.chunks = 0
+        self.tokens = 0
+        self.counted = False
+        self.first_ns = 0
+        self.last_ns = 0
+        self.max_gap_ns = 0
+
+    def add(self, chunk: Any):
+        now = time.perf_counter_ns()
+        if self.chunks:
+            self.max_gap_ns = max(self.max_gap_ns, now - self.last_ns)
+        else:
+            self.first_ns = now
+        self.last_ns = now
+        self.chunks += 1
+        # Stream deltas carry their text in ``content``, as in smolagents
+        tokens = self.token_counter.count_input(getattr(chunk, "content", chunk))
+        if tokens is not None:
+            self.tokens += tokens
+            self.counted = True
+
+    def attributes(self) -> dict:
+        attributes = {"agent.stream.chunks": self.chunks}
+        if self.chunks:
+            attributes["agent.stream.time_to_first_token_ms"] = (self.first_ns - self.start_ns) / 1e6
+        if self.chunks > 1:
+            attributes["agent.stream.inter_token_latency_ms"] = (self.last_ns - self.first_ns) / (self.chunks - 1) / 1e6
+            attributes["agent.stream.inter_token_latency_max_ms"] = self.max_gap_ns / 1e6
+        if self.counted:
+            attributes["agent.tokens.output"] = self.tokens
+        return attributes
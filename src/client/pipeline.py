@@ -0,0 +1,250 @@
+"""Shared tracer pipelines for agent instrumentation."""
+
+import hashlib
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter
+
+from .export import DROP_OLDEST, BufferedSpanProcessor
+from .sampling import TailSamplingSpanProcessor
+
+# OTLP transport protocols, named as in OTEL_EXPORTER_OTLP_PROTOCOL
+GRPC = "grpc"
+HTTP_PROTOBUF = "http/protobuf"
+PROTOCOLS = (GRPC, HTTP_PROTOBUF)
+
+# Builds the span processor of a pipeline from its exporter, service name and
+# endpoint; factories with a true ``takes_protocol`` attribute also get the
+# pipeline's protocol
+ProcessorFactory = Callable[[SpanExporter, str, str], SpanProcessor]
+
+
+def _otlp_exporter(endpoint: str, protocol: str = GRPC) -> SpanExporter:
+    """Create the default OTLP span exporter for an endpoint."""
+    # Exporters are imported on first use; grpc alone takes longer to
+    # import than the rest of the SDK
+    if protocol == HTTP_PROTOBUF:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    else:
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    return OTLPSpanExporter(endpoint=endpoint)
+
+
+def _fail_fast_otlp_exporter(endpoint: str, protocol: str = GRPC) -> SpanExporter:
+    """Create an OTLP span exporter that leaves retries to the export stage."""
+    if protocol == HTTP_PROTOBUF:
+        from .http_exporter import FailFastOTLPHTTPSpanExporter
+        return FailFastOTLPHTTPSpanExporter(endpoint=endpoint)
+    from .grpc_exporter import FailFastOTLPSpanExporter
+    return FailFastOTLPSpanExporter(endpoint=endpoint)
+
+
+# Default factories, which also take the protocol of the pipeline
+_OTLP_FACTORIES = (_otlp_exporter, _fail_fast_otlp_exporter)
+
+
+def _batch_processor(exporter: SpanExporter, service_name: str, endpoint: str) -> SpanProcessor:
+    """Create the default SDK batch span processor."""
+    return BatchSpanProcessor(exporter)
+
+
+class TracerPipeline:
+    """A tracer provider, exporter and span processor shared by many agents."""
+
+    def __init__(self,
+                 service_name: str,
+                 endpoint: str,
+                 exporter: SpanExporter,
+                 processor_factory: Optional[ProcessorFactory] = None,
+                 protocol: str = GRPC):
+        """
+        Build the export pipeline for one service and endpoint.
+
+        Args:
+            service_name: The name of the service
+            endpoint: OTLP endpoint for exporting telemetry
+            exporter: Span exporter that receives finished spans
+            processor_factory: Builds the span processor feeding the
+                exporter; defaults to the SDK batch span processor
+            protocol: OTLP transport of the exporter
+        """
+        self.service_name = service_name
+        self.endpoint = endpoint
+        self.protocol = protocol
+        self.exporter = exporter
+
+        # Agent identity is carried on spans, so the resource only
+        # describes the service and can be shared by every agent.
+        resource = Resource.create({"service.name": service_name})
+
+        self.provider = TracerProvider(resource=resource)
+        processor_factory = processor_factory or _batch_processor
+        if getattr(processor_factory, "takes_protocol", False):
+            self.processor = processor_factory(exporter, service_name, endpoint, protocol)
+        else:
+            self.processor = processor_factory(exporter, service_name, endpoint)
+        # Spans dropped by a tail sampler are filtered out before the
+        # batch processor queues them for export
+        self.provider.add_span_processor(TailSamplingSpanProcessor(self.processor))
+
+    def get_tracer(self, name: str) -> trace.Tracer:
+        """
+        Get a tracer that exports through this pipeline.
+
+        Args:
+            name: Instrumentation scope name for the tracer
+
+        Returns:
+            A tracer bound to the pipeline's provider
+        """
+        return self.provider.get_tracer(name)
+
+    def shutdown(self):
+        """Flush pending spans and stop the export thread."""
+        self.provider.shutdown()
+
+
+class PipelineRegistry:
+    """Process-wide registry holding one pipeline per (service_name, endpoint, protocol)."""
+
+    def __init__(self,
+                 exporter_factory: Optional[Callable[[str], SpanExporter]] = None,
+                 processor_factory: Optional[ProcessorFactory] = None):
+        """
+        Initialize the pipeline registry.
+
+        Args:
+            exporter_factory: Callable creating a span exporter for an
+                endpoint. Defaults to the OTLP exporter for the protocol of
+                each pipeline; custom factories are called with the
+                endpoint alone and choose their own transport.
+            processor_factory: Callable creating the span processor of a
+                pipeline. Defaults to the SDK batch span processor.
+        """
+        self.exporter_factory = exporter_factory or _otlp_exporter
+        self.processor_factory = processor_factory or _batch_processor
+        self._pipelines: Dict[Tuple[str, str, str], TracerPipeline] = {}
+        self._lock = threading.Lock()
+
+    def get(self, service_name: str, endpoint: str, protocol: str = GRPC) -> TracerPipeline:
+        """
+        Get the pipeline for a service and endpoint, creating it on first use.
+
+        Args:
+            service_name: The name of the service
+            endpoint: OTLP endpoint for exporting telemetry
+            protocol: OTLP transport, ``grpc`` or ``http/protobuf``
+
+        Returns:
+            The shared pipeline for this (service_name, endpoint, protocol)
+        """
+        key = (service_name, endpoint, protocol)
+        pipeline = self._pipelines.get(key)
+        if pipeline is not None:
+            return pipeline
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"protocol must be one of {PROTOCOLS}")
+
+        with self._lock:
+            pipeline = self._pipelines.get(key)
+            if pipeline is None:
+                pipeline = TracerPipeline(service_name, endpoint, self._create_exporter(endpoint, protocol),
+                                          self.processor_factory, protocol)
+                self._pipelines[key] = pipeline
+
+                # Keep spans from other libraries flowing somewhere useful
+                # by installing the first pipeline as the global provider.
+                if isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+                    trace.set_tracer_provider(pipeline.provider)
+
+        return pipeline
+
+    def _create_exporter(self, endpoint: str, protocol: str) -> SpanExporter:
+        if self.exporter_factory in _OTLP_FACTORIES:
+            return self.exporter_factory(endpoint, protocol)
+        return self.exporter_factory(endpoint)
+
+    def shutdown(self):
+        """Shut down and forget every registered pipeline."""
+        with self._lock:
+            pipelines = list(self._pipelines.values())
+            self._pipelines.clear()
+
+        for pipeline in pipelines:
+            pipeline.shutdown()
+
+    def __len__(self) -> int:
+        return len(self._pipelines)
+
+
+_registry = PipelineRegistry()
+
+
+def get_registry() -> PipelineRegistry:
+    """Return the process-wide pipeline registry."""
+    return _registry
+
+
+def get_pipeline(service_name: str, endpoint: str, protocol: str = GRPC) -> TracerPipeline:
+    """
+    Get the shared tracer pipeline for a service and endpoint.
+
+    Args:
+        service_name: The name of the service
+        endpoint: OTLP endpoint for exporting telemetry
+        protocol: OTLP transport, ``grpc`` or ``http/protobuf``
+
+    Returns:
+        The process-wide pipeline for this (service_name, endpoint, protocol)
+    """
+    return _registry.get(service_name, endpoint, protocol)
+
+
+def configure_export(max_queue_size: int = 2048,
+                     overflow: str = DROP_OLDEST,
+                     block_timeout: float = 1.0,
+                     spill_dir: Optional[str] = None,
+                     **options):
+    """
+    Export spans of pipelines created from now on through a bounded queue.
+
+    Each new pipeline gets a :class:`BufferedSpanProcessor`, and the default
+    OTLP exporter is switched to a single-attempt one so that a slow or
+    unreachable endpoint never holds up the export thread.
+
+    Args:
+        max_queue_size: Capacity of each pipeline's in-memory queue
+        overflow: One of ``drop_oldest``, ``drop_newest`` or ``block``
+        block_timeout: Seconds ``block`` waits for room
+        spill_dir: Directory for spill logs, one subdirectory per pipeline;
+            None drops overflowing spans instead
+        **options: Further ``BufferedSpanProcessor`` arguments
+    """
+    def processor_factory(exporter: SpanExporter, service_name: str, endpoint: str,
+                          protocol: str = GRPC) -> SpanProcessor:
+        pipeline_spill_dir = None
+        if spill_dir is not None:
+            # Stable per pipeline so a restarted process replays its own
+            # spill, and apart per protocol so that no pipeline replays
+            # another's batches through the wrong exporter
+            key = f"{service_name}\0{endpoint}\0{protocol}"
+            digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+            pipeline_spill_dir = os.path.join(spill_dir, digest)
+        return BufferedSpanProcessor(exporter,
+                                     max_queue_size=max_queue_size,
+                                     overflow=overflow,
+                                     block_timeout=block_timeout,
+                                     spill_dir=pipeline_spill_dir,
+                                     **options)
+
+    processor_factory.takes_protocol = True
+    registry = get_registry()
+    registry.processor_factory = processor_factory
+    if registry.exporter_factory is _otlp_exporter:
+        registry.exporter_factory = _fail_fast_otlp_exporter
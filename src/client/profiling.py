@@ -0,0 +1,209 @@
+"""Sampling profiler for agent runs.
+
+One daemon thread per profiler wakes at a fixed interval while runs are in
+progress and reads the stacks of their threads with
+``sys._current_frames()``. Each run is marked by the frame of its profiling
+wrapper; a sampled stack belongs to the runs whose marker frames it passes
+through, and only the frames above the marker are kept. Stacks are counted
+per run as tuples of code objects and rendered as folded stacks, one
+``root;...;leaf count`` line per distinct stack, when the run ends.
+
+Sync runs are sampled for their whole wall time, blocking calls included.
+An async run shares its event loop thread with other tasks, so it is
+sampled only while the loop is executing it, not while it awaits.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+
+# Span attributes carrying a run's profile
+PROFILE_ATTRIBUTE = "agent.profile.folded"
+PROFILE_PATH_ATTRIBUTE = "agent.profile.path"
+PROFILE_SAMPLES_ATTRIBUTE = "agent.profile.samples"
+
+# Frame standing in for stacks beyond a run's distinct stack limit
+_TRUNCATED = "[truncated]"
+
+
+def frame_label(code: CodeType) -> str:
+    """
+    Name a stack frame in folded output.
+
+    Args:
+        code: The frame's code object
+
+    Returns:
+        ``qualified.name (file.py:line)``, without the separators of the
+        folded format
+    """
+    name = getattr(code, "co_qualname", code.co_name)
+    label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label.replace(";", ",")
+
+
+class RunProfile:
+    """Stack samples of one run in progress."""
+
+    __slots__ = ("thread_id", "marker", "stacks", "samples")
+
+    def __init__(self, thread_id: int, marker: FrameType):
+        self.thread_id = thread_id
+        self.marker = marker
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def folded(self, max_stacks: Optional[int] = None) -> str:
+        """
+        Render the samples as folded stacks.
+
+        Args:
+            max_stacks: Keep only this many of the most frequent stacks;
+                the rest are counted under a ``[truncated]`` frame
+
+        Returns:
+            One ``root;...;leaf count`` line per stack, most frequent first
+        """
+        stacks = self.stacks.most_common()
+        lines = []
+        truncated = 0
+        for i, (stack, count) in enumerate(stacks):
+            if max_stacks is not None and i >= max_stacks:
+                truncated += count
+                continue
+            lines.append(";".join(label if isinstance(label, str) else frame_label(label)
+                                  for label in reversed(stack)) + f" {count}")
+        if truncated:
+            lines.append(f"{_TRUNCATED} {truncated}")
+        return "\n".join(lines)
+
+
+class StackSampler:
+    """Sample the stacks of agent runs at a low, fixed rate."""
+
+    def __init__(self,
+                 interval: float = 0.02,
+                 max_depth: int = 128,
+                 max_stacks: int = 2000,
+                 directory: Optional[str] = None):
+        """
+        Initialize the sampler; its thread starts with the first run.
+
+        Args:
+            interval: Seconds between samples
+            max_depth: Frames kept per sample, nearest the leaf
+            max_stacks: Distinct stacks kept per run; further stacks are
+                counted under a ``[truncated]`` frame, and only the most
+                frequent ones are attached to a span
+            directory: Write each run's folded stacks to a file here and
+                put its path on the span, instead of the stacks themselves
+        """
+        if interval <= 0 or max_depth < 1 or max_stacks < 1:
+            raise ValueError("interval, max_depth and max_stacks must be positive")
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.directory = directory
+        self.samples_taken = 0
+        self.sampling_seconds = 0.0
+        self._runs: Dict[int, RunProfile] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, marker: FrameType) -> RunProfile:
+        """
+        Start sampling a run.
+
+        Args:
+            marker: Frame of the wrapper calling the run; frames below it
+                are not part of the run
+
+        Returns:
+            The run's profile, to pass to :meth:`finish`
+        """
+        run = RunProfile(threading.get_ident(), marker)
+        with self._condition:
+            self._runs[id(marker)] = run
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sample_loop, name="nexushive-profiler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return run
+
+    def finish(self, run: RunProfile, name: Optional[str] = None) -> Dict[str, object]:
+        """
+        Stop sampling a run.
+
+        Args:
+            run: Profile returned by :meth:`start`
+            name: File name stem when writing to ``directory``
+
+        Returns:
+            Span attributes with the sample count and either the folded
+            stacks or the path of the file holding them; no attributes if
+            nothing was sampled
+        """
+        with self._condition:
+            self._runs.pop(id(run.marker), None)
+        run.marker = None
+        if not run.samples:
+            return {}
+        attributes: Dict[str, object] = {PROFILE_SAMPLES_ATTRIBUTE: run.samples}
+        if self.directory is None:
+            attributes[PROFILE_ATTRIBUTE] = run.folded(self.max_stacks)
+            return attributes
+        path = os.path.join(self.directory, f"{name or id(run)}.folded")
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(run.folded())
+            f.write("\n")
+        attributes[PROFILE_PATH_ATTRIBUTE] = path
+        return attributes
+
+    def overhead(self) -> float:
+        """CPU time spent taking samples per second of sampling, a bound on the slowdown of runs."""
+        return self.sampling_seconds / max(self.samples_taken * self.interval, 1e-9)
+
+    def _sample_loop(self):
+        condition = self._condition
+        while True:
+            with condition:
+                while not self._runs:
+                    condition.wait()
+            # Sleep outside the lock so that runs start and end freely
+            time.sleep(self.interval)
+            began = time.thread_time()
+            self._sample()
+            self.sampling_seconds += time.thread_time() - began
+            self.samples_taken += 1
+
+    def _sample(self):
+        frames = sys._current_frames()
+        with self._condition:
+            runs = self._runs
+            if not runs:
+                return
+            threads = {run.thread_id for run in runs.values()}
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                stack: List[CodeType] = []
+                while frame is not None:
+                    run = runs.get(id(frame))
+                    if run is not None and run.marker is frame:
+                        self._add(run, stack)
+                    elif len(stack) < self.max_depth:
+                        stack.append(frame.f_code)
+                    frame = frame.f_back
+
+    def _add(self, run: RunProfile, stack: List[CodeType]):
+        run.samples += 1
+        key: Tuple = tuple(stack)
+        if key in run.stacks or len(run.stacks) < self.max_stacks:
+            run.stacks[key] += 1
+        else:
+            run.stacks[(_TRUNCATED,)] += 1
+
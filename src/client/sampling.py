@@ -0,0 +1,207 @@
+"""Head and tail sampling for agent.run spans."""
+
+import random
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+
+# Span attribute marking a finished span that the tail sampler dropped.
+# Marked spans are discarded before reaching the exporter, so the
+# attribute itself is never serialized.
+DROPPED_ATTRIBUTE = "sampling.dropped"
+
+# Name of the span covering one agent run
+RUN_SPAN_NAME = "agent.run"
+
+
+class HeadSampler:
+    """Ratio-based sampling decided before an agent run starts."""
+
+    def __init__(self, ratio: float = 1.0, agent_ratios: Optional[Dict[str, float]] = None):
+        """
+        Initialize the head sampler.
+
+        Args:
+            ratio: Fraction of runs to trace for agents without their own ratio
+            agent_ratios: Per agent_id sampling ratios overriding ``ratio``
+        """
+        self.ratio = _check_ratio(ratio)
+        self.agent_ratios = {agent_id: _check_ratio(r) for agent_id, r in (agent_ratios or {}).items()}
+
+    def set_ratio(self, agent_id: str, ratio: float):
+        """
+        Set the sampling ratio for one agent.
+
+        Args:
+            agent_id: The agent to configure
+            ratio: Fraction of that agent's runs to trace
+        """
+        self.agent_ratios[agent_id] = _check_ratio(ratio)
+
+    def should_sample(self, agent_id: str) -> bool:
+        """
+        Decide whether a run of an agent should be traced.
+
+        Args:
+            agent_id: The agent about to run
+
+        Returns:
+            True if the run should get a span
+        """
+        ratio = self.agent_ratios.get(agent_id, self.ratio)
+        return ratio >= 1.0 or random.random() < ratio
+
+
+class TailSampler:
+    """Sampling decided after an agent run, based on its outcome.
+
+    Errors and runs slower than the configured latency percentile are
+    always kept; other runs are kept with probability ``keep_ratio``.
+    The percentile is estimated over a fixed-size window of recent
+    latencies, so memory use is bounded.
+    """
+
+    def __init__(self,
+                 percentile: float = 95.0,
+                 keep_ratio: float = 0.1,
+                 window_size: int = 1024,
+                 recompute_every: int = 64):
+        """
+        Initialize the tail sampler.
+
+        Args:
+            percentile: Latency percentile above which runs are always kept
+            keep_ratio: Fraction of fast, successful runs to keep
+            window_size: Number of recent latencies used for the percentile
+            recompute_every: Runs between recomputations of the threshold
+        """
+        if not 0.0 <= percentile <= 100.0:
+            raise ValueError("percentile must be between 0 and 100")
+        if window_size < 1 or recompute_every < 1:
+            raise ValueError("window_size and recompute_every must be positive")
+
+        self.percentile = percentile
+        self.keep_ratio = _check_ratio(keep_ratio)
+        self.recompute_every = recompute_every
+        self.threshold_ms: Optional[float] = None
+        self._window = deque(maxlen=window_size)
+        self._since_recompute = 0
+
+    def should_keep(self, latency_ms: float, error: bool = False) -> bool:
+        """
+        Decide whether a finished run's span should be exported.
+
+        Args:
+            latency_ms: Latency of the run in milliseconds
+            error: Whether the run raised an error
+
+        Returns:
+            True if the span should be exported
+        """
+        self._window.append(latency_ms)
+        self._since_recompute += 1
+        if self._since_recompute >= self.recompute_every:
+            self._recompute_threshold()
+
+        if error:
+            return True
+        # Until enough latencies are seen, every run counts as interesting
+        if self.threshold_ms is None or latency_ms >= self.threshold_ms:
+            return True
+        return random.random() < self.keep_ratio
+
+    def _recompute_threshold(self):
+        """Re-estimate the latency threshold from the window."""
+        self._since_recompute = 0
+        latencies = sorted(self._window)
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100.0))
+        self.threshold_ms = latencies[index]
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """Span processor that drops spans marked by a tail sampler.
+
+    Wraps the exporting processor so dropped spans are never queued
+    or serialized. Child spans of a run, such as the step and tool spans
+    of deep instrumentation, end before the run's sampling decision is
+    made; they are held until their ``agent.run`` span ends and then
+    dropped or passed on with it.
+    """
+
+    def __init__(self, delegate: SpanProcessor, dropped_runs: int = 1024):
+        """
+        Initialize the filtering processor.
+
+        Args:
+            delegate: The processor receiving spans that are kept
+            dropped_runs: Number of recently dropped runs remembered, so
+                that children ending after their run are dropped too
+        """
+        self.delegate = delegate
+        self._lock = threading.Lock()
+        # Children ended so far, per run in progress
+        self._held: Dict[int, List[ReadableSpan]] = {}
+        # Innermost run of each span started inside one, by span id
+        self._runs: Dict[int, int] = {}
+        self.dropped_runs = dropped_runs
+        # Recently dropped runs, oldest first
+        self._dropped: Dict[int, None] = {}
+
+    def on_start(self, span: Span, parent_context: Optional[Context] = None):
+        parent = span.parent
+        is_run = span.name == RUN_SPAN_NAME
+        if is_run or parent is not None:
+            span_id = span.context.span_id
+            with self._lock:
+                run = None
+                if parent is not None:
+                    run = parent.span_id if parent.span_id in self._held else self._runs.get(parent.span_id)
+                if run is not None:
+                    self._runs[span_id] = run
+                if is_run:
+                    self._held[span_id] = []
+        self.delegate.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan):
+        dropped = bool(span.attributes and span.attributes.get(DROPPED_ATTRIBUTE))
+        if not self._held and not self._runs:
+            if not dropped:
+                self.delegate.on_end(span)
+            return
+
+        span_id = span.context.span_id
+        with self._lock:
+            run = self._runs.pop(span_id, None)
+            children = self._held.pop(span_id, None)
+            if dropped:
+                self._dropped[span_id] = None
+                if len(self._dropped) > self.dropped_runs:
+                    del self._dropped[next(iter(self._dropped))]
+                return
+            if run is not None:
+                if run in self._held:
+                    # Decided together with the enclosing run
+                    self._held[run].extend(children or ())
+                    self._held[run].append(span)
+                    return
+                if run in self._dropped:
+                    return
+        for child in children or ():
+            self.delegate.on_end(child)
+        self.delegate.on_end(span)
+
+    def shutdown(self):
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
+
+
+def _check_ratio(ratio: float) -> float:
+    """Validate a sampling ratio."""
+    if not 0.0 <= ratio <= 1.0:
+        raise ValueError("sampling ratio must be between 0.0 and 1.0")
+    return ratio
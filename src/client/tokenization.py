@@ -0,0 +1,322 @@
+"""Token counting for agent inputs and outputs."""
+
+import base64
+import heapq
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional
+
+# Pre-tokenization pattern approximating the cl100k family: contractions,
+# words with an optional leading space or symbol, up to three digits,
+# punctuation runs and whitespace
+_PRETOKENIZE = re.compile(
+    r"""'(?i:[sdmt]|ll|ve|re)"""
+    r"""|[^\r\n\w]?[^\W\d_]+"""
+    r"""|\d{1,3}"""
+    r"""| ?[^\s\w]+[\r\n]*"""
+    r"""| ?_+"""
+    r"""|\s*[\r\n]+"""
+    r"""|\s+(?!\S)"""
+    r"""|\s+"""
+)
+
+# Merge ranks bundled with the package, in tiktoken's "<base64> <rank>" format
+DEFAULT_RANKS_PATH = os.path.join(os.path.dirname(__file__), "bpe_ranks.tiktoken")
+
+# Largest slice of text split at once when counting words
+_WORD_COUNT_CHUNK = 4096
+
+# Words longer than this many bytes are estimated instead of merged, so
+# that long unbroken runs of letters cost linear time and stay out of the
+# word cache
+_MAX_BPE_BYTES = 256
+_BYTES_PER_TOKEN = 4
+
+# Memory held by one CachedTokenCounter entry: the key tuple and its two
+# ints, the count and the OrderedDict's linked node
+_CACHE_ENTRY_BYTES = 200
+
+
+class TokenCounter:
+    """Interface for counting tokens in agent inputs and outputs.
+
+    Subclasses implement :meth:`count` for plain text; chat message lists
+    are handled here by counting each message's content plus a fixed
+    per-message overhead.
+    """
+
+    # Tokens added around every chat message and to prime the reply
+    tokens_per_message = 3
+    tokens_per_reply = 3
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens in a piece of text.
+
+        Args:
+            text: Text to count
+
+        Returns:
+            Number of tokens
+        """
+        raise NotImplementedError
+
+    def count_messages(self, messages: Iterable[Dict[str, Any]]) -> int:
+        """
+        Count the tokens in a list of chat messages.
+
+        Args:
+            messages: Messages with ``role`` and ``content`` keys, where
+                content is a string or a list of ``{"text": ...}`` parts
+
+        Returns:
+            Number of tokens, including per-message overhead
+        """
+        total = self.tokens_per_reply
+        for message in messages:
+            total += self.tokens_per_message
+            for key, value in message.items():
+                if key == "content" and not isinstance(value, str):
+                    for part in value or ():
+                        text = part.get("text") if isinstance(part, dict) else None
+                        if isinstance(text, str):
+                            total += self.count(text)
+                elif isinstance(value, str):
+                    total += self.count(value)
+        return total
+
+    def count_input(self, value: Any) -> Optional[int]:
+        """
+        Count tokens in an agent input or output of unknown shape.
+
+        Args:
+            value: A string, a list of chat messages or anything else
+
+        Returns:
+            Number of tokens, or None if the value cannot be counted
+        """
+        if isinstance(value, str):
+            return self.count(value)
+        if isinstance(value, (list, tuple)) and value and all(isinstance(m, dict) for m in value):
+            return self.count_messages(value)
+        return None
+
+
+class WhitespaceTokenCounter(TokenCounter):
+    """Count whitespace-separated words, in bounded memory."""
+
+    def count(self, text: str) -> int:
+        return _count_words(text)
+
+
+class ByteBPETokenCounter(TokenCounter):
+    """Byte-level BPE token counter that works fully offline.
+
+    Merge ranks are read from a tiktoken-format file. The bundled ranks
+    are a small vocabulary trained on English technical prose, so counts
+    are an estimate, roughly twice those of production tokenizers; point
+    ``ranks_path`` at a model's own ``.tiktoken`` file for close counts.
+    Words longer than 256 bytes are estimated at four bytes per token.
+    """
+
+    def __init__(self, ranks_path: Optional[str] = None, word_cache_size: int = 65536):
+        """
+        Initialize the BPE counter.
+
+        Args:
+            ranks_path: Path to a tiktoken-format ranks file. Defaults to
+                the ranks bundled with the package.
+            word_cache_size: Number of pre-tokenized words whose counts
+                are memoized; only words up to 256 bytes are cached
+        """
+        self.ranks_path = ranks_path or DEFAULT_RANKS_PATH
+        self.ranks = load_ranks(self.ranks_path)
+        self._count_word = lru_cache(maxsize=word_cache_size)(self._bpe_count)
+
+    def count(self, text: str) -> int:
+        count_word = self._count_word
+        total = 0
+        for word in _PRETOKENIZE.findall(text):
+            # Characters are at most four bytes, so short words skip encoding
+            if len(word) * 4 <= _MAX_BPE_BYTES:
+                total += count_word(word)
+            else:
+                size = len(word.encode("utf-8"))
+                total += count_word(word) if size <= _MAX_BPE_BYTES else -(-size // _BYTES_PER_TOKEN)
+        return total
+
+    def _bpe_count(self, word: str) -> int:
+        """Count the BPE tokens of a single pre-tokenized word."""
+        piece = word.encode("utf-8")
+        ranks = self.ranks
+        if piece in ranks:
+            return 1
+
+        # Merge the adjacent pair with the lowest rank, leftmost first, until
+        # none is left. Parts are a linked list indexed by their first byte
+        # and candidate pairs sit in a heap; a popped pair is stale unless
+        # both of its parts are still unmerged.
+        n = len(piece)
+        parts = [piece[i:i + 1] for i in range(n)]
+        following = list(range(1, n + 1))
+        preceding = list(range(-1, n - 1))
+        heap = []
+        for i in range(n - 1):
+            rank = ranks.get(parts[i] + parts[i + 1])
+            if rank is not None:
+                heap.append((rank, i, i + 1, len(parts[i]) + 1))
+        heapq.heapify(heap)
+
+        count = n
+        while heap:
+            _, left, right, size = heapq.heappop(heap)
+            if parts[left] is None or parts[right] is None or following[left] != right \
+                    or len(parts[left]) + len(parts[right]) != size:
+                continue
+            merged = parts[left] + parts[right]
+            parts[left] = merged
+            parts[right] = None
+            after = following[right]
+            following[left] = after
+            if after < n:
+                preceding[after] = left
+            count -= 1
+
+            before = preceding[left]
+            if before >= 0:
+                rank = ranks.get(parts[before] + merged)
+                if rank is not None:
+                    heapq.heappush(heap, (rank, before, left, len(parts[before]) + len(merged)))
+            if after < n:
+                rank = ranks.get(merged + parts[after])
+                if rank is not None:
+                    heapq.heappush(heap, (rank, left, after, len(merged) + len(parts[after])))
+        return count
+
+
+class CachedTokenCounter(TokenCounter):
+    """Memoize another counter's results in a bounded LRU.
+
+    Texts are keyed by length and content hash, so repeated system
+    prompts, templates and chat messages are tokenized once. Keys never
+    hold the text itself, so every entry takes the same memory whatever
+    the size of the text it counts.
+    """
+
+    def __init__(self, counter: TokenCounter, max_entries: int = 4096, min_length: int = 64,
+                 max_bytes: int = 1024 * 1024):
+        """
+        Initialize the caching counter.
+
+        Args:
+            counter: The counter whose results are cached
+            max_entries: Maximum number of cached texts; the least
+                recently used entry is evicted beyond this
+            min_length: Texts shorter than this are counted directly,
+                since caching them costs more than counting
+            max_bytes: Memory budget of the cache; the least recently
+                used entries are evicted beyond this
+        """
+        if max_entries < 1 or max_bytes < _CACHE_ENTRY_BYTES:
+            raise ValueError("max_entries and max_bytes must allow at least one entry")
+        self.counter = counter
+        self.max_entries = min(max_entries, max_bytes // _CACHE_ENTRY_BYTES)
+        self.max_bytes = max_bytes
+        self.min_length = min_length
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[tuple, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def bytes(self) -> int:
+        """Approximate memory held by the cached entries."""
+        return len(self._cache) * _CACHE_ENTRY_BYTES
+
+    def count(self, text: str) -> int:
+        if len(text) < self.min_length:
+            return self.counter.count(text)
+
+        key = (len(text), hash(text))
+        with self._lock:
+            count = self._cache.get(key)
+            if count is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return count
+
+        count = self.counter.count(text)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = count
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return count
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+def load_ranks(path: str) -> Dict[bytes, int]:
+    """
+    Load BPE merge ranks from a tiktoken-format file.
+
+    Args:
+        path: File with one ``<base64 token> <rank>`` pair per line
+
+    Returns:
+        Mapping from token bytes to merge rank
+    """
+    ranks = {}
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+_default_counter: Optional[TokenCounter] = None
+_default_lock = threading.Lock()
+
+
+def default_token_counter() -> TokenCounter:
+    """Return the shared, cached BPE counter used by default."""
+    global _default_counter
+    if _default_counter is None:
+        with _default_lock:
+            if _default_counter is None:
+                _default_counter = CachedTokenCounter(ByteBPETokenCounter())
+    return _default_counter
+
+
+def _count_words(text: str) -> int:
+    """
+    Count whitespace-separated words in bounded memory.
+
+    Equivalent to ``len(text.split())``, but long texts are split one
+    whitespace-aligned chunk at a time so the temporary list stays small.
+
+    Args:
+        text: Text to count
+
+    Returns:
+        Number of words in the text
+    """
+    length = len(text)
+    if length <= _WORD_COUNT_CHUNK:
+        return len(text.split())
+
+    count = 0
+    start = 0
+    while start < length:
+        end = start + _WORD_COUNT_CHUNK
+        # Never cut a word in two
+        while end < length and not text[end].isspace():
+            end += 1
+        count += len(text[start:end].split())
+        start = end
+    return count
@@ -0,0 +1,419 @@
+"""Client-side pre-aggregation of agent metrics."""
+
+import logging
+import threading
+import weakref
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of attribute sets kept in the intern table
+_INTERN_LIMIT = 10_000
+
+# Attribute value of measurements folded into an overflow set
+OTHER = "other"
+
+# Distinct dropped attribute keys remembered per instrument
+_MAX_DROPPED_KEYS = 100
+
+
+class AttributeSet:
+    """An immutable, hashable set of metric attributes.
+
+    Build these once with :func:`intern_attributes` and reuse them, so that
+    recording a measurement does not rebuild or rehash a dict.
+    """
+
+    __slots__ = ("key", "attributes", "_hash")
+
+    def __init__(self, key: Tuple[Tuple[str, Any], ...]):
+        """
+        Initialize an attribute set.
+
+        Args:
+            key: Attribute items sorted by key, with hashable values
+        """
+        self.key = key
+        self.attributes = dict(key)
+        self._hash = hash(key)
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, AttributeSet) and self.key == other.key
+
+    def __repr__(self) -> str:
+        return f"AttributeSet({self.attributes!r})"
+
+    def with_attribute(self, name: str, value: Any) -> "AttributeSet":
+        """
+        Return the interned set extended with one more attribute.
+
+        Args:
+            name: Attribute name
+            value: Attribute value
+
+        Returns:
+            The interned attribute set including ``name``
+        """
+        attributes = dict(self.key)
+        attributes[name] = value
+        return intern_attributes(attributes)
+
+
+_interned: Dict[Tuple[Tuple[str, Any], ...], AttributeSet] = {}
+_intern_lock = threading.Lock()
+
+EMPTY_ATTRIBUTES = AttributeSet(())
+
+
+def attribute_key(attributes: Mapping[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    """
+    Get the sorted, hashable items identifying a mapping of attributes.
+
+    Args:
+        attributes: Metric attributes
+
+    Returns:
+        Attribute items sorted by key, with list values made tuples
+    """
+    return tuple(sorted(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in attributes.items()
+    ))
+
+
+def intern_attributes(attributes: Optional[Mapping[str, Any]]) -> AttributeSet:
+    """
+    Get the shared attribute set for a mapping of attributes.
+
+    Args:
+        attributes: Metric attributes, or None for no attributes
+
+    Returns:
+        An interned, hashable attribute set
+    """
+    if isinstance(attributes, AttributeSet):
+        return attributes
+    if not attributes:
+        return EMPTY_ATTRIBUTES
+    return _intern_key(attribute_key(attributes))
+
+
+def _intern_key(key: Tuple[Tuple[str, Any], ...]) -> AttributeSet:
+    """Get the shared attribute set for sorted attribute items."""
+    attribute_set = _interned.get(key)
+    if attribute_set is None:
+        if not key:
+            return EMPTY_ATTRIBUTES
+        attribute_set = AttributeSet(key)
+        with _intern_lock:
+            # Past the limit the set still works, it just is not shared
+            if len(_interned) < _INTERN_LIMIT:
+                attribute_set = _interned.setdefault(key, attribute_set)
+    return attribute_set
+
+
+class _Series:
+    """Attribute sets admitted for one instrument."""
+
+    __slots__ = ("limit", "admitted", "resolved", "overflowed", "dropped_keys", "examples")
+
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        # Admitted attribute sets by their (allowlisted) items
+        self.admitted: Dict[Tuple[Tuple[str, Any], ...], AttributeSet] = {}
+        # Caller attribute sets already mapped to an admitted set
+        self.resolved: Dict[AttributeSet, AttributeSet] = {}
+        self.overflowed = 0
+        self.dropped_keys: Set[str] = set()
+        self.examples: List[Dict[str, Any]] = []
+
+
+class CardinalityLimiter:
+    """Bound the number of attribute sets recorded per instrument.
+
+    Attribute keys outside the allowlist are dropped. Once an instrument
+    has ``max_series`` distinct attribute sets, measurements with a new set
+    are folded into an overflow set with the same keys and every value
+    ``"other"``. Only admitted sets are interned, so a caller passing
+    request ids grows neither the SDK aggregation nor the intern table.
+    """
+
+    def __init__(self,
+                 max_series: Optional[int] = 2000,
+                 allowed_keys: Optional[Iterable[str]] = None,
+                 instrument_limits: Optional[Mapping[str, Optional[int]]] = None,
+                 max_examples: int = 10):
+        """
+        Initialize the cardinality limiter.
+
+        Args:
+            max_series: Distinct attribute sets per instrument, or None for
+                no cap. The default matches the SDK's own limit.
+            allowed_keys: Attribute keys to keep, or None to keep all.
+                Without an allowlist, callers inventing attribute names
+                still get one overflow set per combination of names.
+            instrument_limits: Caps overriding ``max_series`` per
+                instrument name
+            max_examples: Overflowed attribute sets kept per instrument
+                for :meth:`report`
+        """
+        self.max_series = max_series
+        self.allowed_keys = frozenset(allowed_keys) if allowed_keys is not None else None
+        self.instrument_limits = dict(instrument_limits or {})
+        self.max_examples = max_examples
+        self._series: Dict[str, _Series] = {}
+        self._lock = threading.Lock()
+
+    def limit(self, instrument: str, attributes: Optional[Mapping[str, Any]]) -> AttributeSet:
+        """
+        Map the attributes of a measurement to an admitted attribute set.
+
+        Args:
+            instrument: Name of the instrument being recorded
+            attributes: Attribute dict or interned set of the measurement
+
+        Returns:
+            The interned attribute set to record the measurement with
+        """
+        series = self._series.get(instrument)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(
+                    instrument, _Series(self.instrument_limits.get(instrument, self.max_series)))
+
+        if isinstance(attributes, AttributeSet):
+            resolved = series.resolved.get(attributes)
+            if resolved is not None:
+                return resolved
+            key = attributes.key
+        else:
+            key = attribute_key(attributes) if attributes else ()
+
+        if self.allowed_keys is not None:
+            kept = tuple(item for item in key if item[0] in self.allowed_keys)
+            if len(kept) != len(key):
+                self._drop_keys(series, key)
+                key = kept
+
+        attribute_set = series.admitted.get(key)
+        if attribute_set is None:
+            with self._lock:
+                attribute_set = series.admitted.get(key)
+                if attribute_set is None:
+                    if series.limit is not None and len(series.admitted) >= series.limit:
+                        return self._overflow(series, key)
+                    attribute_set = _intern_key(key)
+                    series.admitted[key] = attribute_set
+
+        # Interned inputs are bounded by the intern table; cache their mapping
+        if isinstance(attributes, AttributeSet) and len(series.resolved) < _INTERN_LIMIT:
+            series.resolved[attributes] = attribute_set
+        return attribute_set
+
+    def admitted(self, instrument: str, attribute_set: AttributeSet) -> bool:
+        """
+        Check whether an attribute set was admitted rather than overflowed.
+
+        Args:
+            instrument: Name of the instrument
+            attribute_set: Attribute set returned by :meth:`limit`
+
+        Returns:
+            True if the set counts against the instrument's cap
+        """
+        series = self._series.get(instrument)
+        return series is not None and series.admitted.get(attribute_set.key) is attribute_set
+
+    def _drop_keys(self, series: _Series, key: Tuple[Tuple[str, Any], ...]):
+        dropped = series.dropped_keys
+        if len(dropped) < _MAX_DROPPED_KEYS:
+            dropped.update(name for name, _ in key if name not in self.allowed_keys)
+
+    def _overflow(self, series: _Series, key: Tuple[Tuple[str, Any], ...]) -> AttributeSet:
+        """Count an overflowing measurement and return its overflow set."""
+        if series.overflowed == 0:
+            logger.warning("Attribute set limit of %d reached; folding new sets into %r",
+                           series.limit, OTHER)
+        series.overflowed += 1
+        if len(series.examples) < self.max_examples:
+            series.examples.append(dict(key))
+        return _intern_key(tuple((name, OTHER) for name, _ in key))
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Report the attribute sets and keys dropped per instrument.
+
+        Returns:
+            Mapping from instrument name to its ``series`` count, ``limit``,
+            ``overflowed`` measurements, ``dropped_keys`` outside the
+            allowlist and up to ``max_examples`` overflowed ``examples``
+        """
+        with self._lock:
+            return {
+                instrument: {
+                    "series": len(series.admitted),
+                    "limit": series.limit,
+                    "overflowed": series.overflowed,
+                    "dropped_keys": sorted(series.dropped_keys),
+                    "examples": list(series.examples),
+                }
+                for instrument, series in self._series.items()
+            }
+
+
+class _Accumulator:
+    """Pending measurements recorded by one thread."""
+
+    __slots__ = ("lock", "sums", "samples", "sketches", "thread")
+
+    def __init__(self):
+        # Only contended while a flush drains this accumulator
+        self.lock = threading.Lock()
+        self.sums: Dict[Tuple[Any, AttributeSet], float] = {}
+        self.samples: Dict[Tuple[Any, AttributeSet], List[float]] = {}
+        self.sketches: Dict[Tuple[Any, Any], Any] = {}
+        self.thread = weakref.ref(threading.current_thread())
+
+
+class MetricAggregator:
+    """Per-thread accumulators merged into OTel instruments on flush.
+
+    Each recording thread writes to its own accumulator, so the hot path
+    costs a dict lookup and an add under an uncontended lock. :meth:`flush`
+    merges every thread's deltas and hands them to the instruments once.
+    Latency sketches are kept per thread the same way and merged into
+    their shared sketch sets on flush.
+    """
+
+    def __init__(self, max_pending_samples: int = 4096):
+        """
+        Initialize the aggregator.
+
+        Args:
+            max_pending_samples: Histogram samples buffered per instrument
+                and attribute set before a thread records them itself
+        """
+        self.max_pending_samples = max_pending_samples
+        self._local = threading.local()
+        self._accumulators: List[_Accumulator] = []
+        self._registry_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def _accumulator(self) -> _Accumulator:
+        """Return the calling thread's accumulator, creating it if needed."""
+        try:
+            return self._local.accumulator
+        except AttributeError:
+            accumulator = _Accumulator()
+            self._local.accumulator = accumulator
+            with self._registry_lock:
+                self._accumulators.append(accumulator)
+            return accumulator
+
+    def add(self, instrument: Any, attributes: AttributeSet, amount: float):
+        """
+        Accumulate a counter increment.
+
+        Args:
+            instrument: Counter the total is flushed into
+            attributes: Interned attribute set of the measurement
+            amount: Amount to add
+        """
+        accumulator = self._accumulator()
+        key = (instrument, attributes)
+        with accumulator.lock:
+            sums = accumulator.sums
+            sums[key] = sums.get(key, 0) + amount
+
+    def record(self, instrument: Any, attributes: AttributeSet, value: float):
+        """
+        Buffer a histogram sample.
+
+        Args:
+            instrument: Histogram the sample is flushed into
+            attributes: Interned attribute set of the measurement
+            value: Sample value
+        """
+        accumulator = self._accumulator()
+        key = (instrument, attributes)
+        with accumulator.lock:
+            pending = accumulator.samples.get(key)
+            if pending is None:
+                accumulator.samples[key] = [value]
+                return
+            pending.append(value)
+            if len(pending) < self.max_pending_samples:
+                return
+            del accumulator.samples[key]
+
+        # The buffer is full: record it now rather than grow without bound
+        for sample in pending:
+            instrument.record(sample, attributes.attributes)
+
+    def sketch(self, sketches: Any, key: Tuple[Any, ...], value: float):
+        """
+        Add a sample to the calling thread's sketch of a sketch set.
+
+        Args:
+            sketches: ``LatencySketches`` the sketch is merged into on
+                :meth:`flush` or :meth:`merge_sketches`
+            key: Key of the sketch within the set
+            value: Sample value
+        """
+        accumulator = self._accumulator()
+        with accumulator.lock:
+            sketch = accumulator.sketches.get((sketches, key))
+            if sketch is None:
+                sketch = accumulator.sketches[(sketches, key)] = sketches.new_sketch()
+            sketch.add(value)
+
+    def merge_sketches(self):
+        """Merge every thread's pending sketches into their sketch sets, e.g. before a query."""
+        with self._registry_lock:
+            accumulators = list(self._accumulators)
+        for accumulator in accumulators:
+            with accumulator.lock:
+                pending, accumulator.sketches = accumulator.sketches, {}
+            _merge_sketches(pending)
+
+    def flush(self):
+        """Merge all pending deltas and record them into their instruments."""
+        with self._flush_lock:
+            with self._registry_lock:
+                accumulators = list(self._accumulators)
+
+            sums: Dict[Tuple[Any, AttributeSet], float] = {}
+            samples: Dict[Tuple[Any, AttributeSet], List[float]] = {}
+            finished = []
+            for accumulator in accumulators:
+                with accumulator.lock:
+                    pending_sums, accumulator.sums = accumulator.sums, {}
+                    pending_samples, accumulator.samples = accumulator.samples, {}
+                    pending_sketches, accumulator.sketches = accumulator.sketches, {}
+                if accumulator.thread() is None or not accumulator.thread().is_alive():
+                    finished.append(accumulator)
+
+                for key, amount in pending_sums.items():
+                    sums[key] = sums.get(key, 0) + amount
+                for key, values in pending_samples.items():
+                    samples.setdefault(key, []).extend(values)
+                _merge_sketches(pending_sketches)
+
+            if finished:
+                with self._registry_lock:
+                    self._accumulators = [a for a in self._accumulators if a not in finished]
+
+            for (instrument, attributes), amount in sums.items():
+                instrument.add(amount, attributes.attributes)
+            for (instrument, attributes), values in samples.items():
+                for value in values:
+                    instrument.record(value, attributes.attributes)
+
+
+def _merge_sketches(pending: Dict[Tuple[Any, Any], Any]):
+    """Merge drained per-thread sketches into their sketch sets."""
+    for (sketches, key), sketch in pending.items():
+        sketches.merge_sketch(key, sketch)
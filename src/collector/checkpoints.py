@@ -0,0 +1,186 @@
+"""Crash-safe on-disk store of per-question evaluation results."""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    dataset TEXT NOT NULL,
+    agent_version TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    correct INTEGER NOT NULL,
+    f1 REAL NOT NULL,
+    latency_ms REAL,
+    error TEXT,
+    result TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (dataset, agent_version, question_id)
+)
+"""
+
+
+def question_fingerprint(question: Dict[str, Any]) -> str:
+    """
+    Hash a question's content.
+
+    Args:
+        question: Question dict
+
+    Returns:
+        Hex digest that changes whenever any field of the question changes
+    """
+    payload = json.dumps(question, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class CheckpointStore:
+    """Per-question results in SQLite, keyed by dataset, agent version and question id.
+
+    The database runs in WAL mode and every result is committed as it
+    arrives, so a crashed or pre-empted run loses at most the questions
+    that were in flight. Each row stores a fingerprint of the question, so
+    questions edited since they were scored count as not completed.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open or create a checkpoint store.
+
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL with NORMAL sync survives process crashes without an fsync per row
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def record(self,
+               dataset: str,
+               agent_version: str,
+               fingerprint: str,
+               result: Dict[str, Any]):
+        """
+        Store the result of one question, replacing any earlier one.
+
+        Args:
+            dataset: Dataset name
+            agent_version: Version of the agent that produced the result
+            fingerprint: ``question_fingerprint`` of the question
+            result: Scored result with ``id``, ``correct``, ``f1``,
+                ``latency_ms`` and ``error``
+        """
+        row = (
+            dataset,
+            agent_version,
+            str(result["id"]),
+            fingerprint,
+            int(result["correct"]),
+            result["f1"],
+            result["latency_ms"],
+            result["error"],
+            json.dumps(result, default=str),
+            time.time(),
+        )
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self._conn.commit()
+
+    def completed(self, dataset: str, agent_version: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the successfully completed questions of a run.
+
+        Questions that ended in an error are left out so they are retried.
+
+        Args:
+            dataset: Dataset name
+            agent_version: Agent version
+
+        Returns:
+            Mapping of question id to ``{"fingerprint", "result"}``
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question_id, fingerprint, result FROM results "
+                "WHERE dataset = ? AND agent_version = ? AND error IS NULL",
+                (dataset, agent_version),
+            ).fetchall()
+        return {
+            question_id: {"fingerprint": fingerprint, "result": json.loads(result)}
+            for question_id, fingerprint, result in rows
+        }
+
+    def versions(self, dataset: str) -> List[str]:
+        """
+        List the agent versions with results for a dataset.
+
+        Args:
+            dataset: Dataset name
+
+        Returns:
+            Agent versions, sorted
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT agent_version FROM results WHERE dataset = ? ORDER BY agent_version",
+                (dataset,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def compare(self,
+                dataset: str,
+                base_version: str,
+                new_version: str,
+                question_ids: Optional[Iterable[Any]] = None) -> Dict[str, Any]:
+        """
+        Compare two agent versions on the questions both have answered.
+
+        Args:
+            dataset: Dataset name
+            base_version: Reference agent version
+            new_version: Agent version under test
+            question_ids: Restrict the comparison to these questions
+
+        Returns:
+            Dictionary with the number of shared ``questions``, both
+            accuracies and the ids of ``fixed`` and ``regressed`` questions
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT base.question_id, base.correct, new.correct FROM results AS base "
+                "JOIN results AS new ON new.dataset = base.dataset AND new.question_id = base.question_id "
+                "AND new.fingerprint = base.fingerprint "
+                "WHERE base.dataset = ? AND base.agent_version = ? AND new.agent_version = ?",
+                (dataset, base_version, new_version),
+            ).fetchall()
+        if question_ids is not None:
+            wanted = {str(question_id) for question_id in question_ids}
+            rows = [row for row in rows if row[0] in wanted]
+
+        total = len(rows)
+        return {
+            "questions": total,
+            "base_accuracy": sum(row[1] for row in rows) / total if total else 0.0,
+            "new_accuracy": sum(row[2] for row in rows) / total if total else 0.0,
+            "fixed": [row[0] for row in rows if row[2] and not row[1]],
+            "regressed": [row[0] for row in rows if row[1] and not row[2]],
+        }
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "CheckpointStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,332 @@
+"""Cost accounting for agent runs from a local model pricing table.
+
+Cost is linear in token counts, so spend is aggregated as token totals per
+(agent, service, model, time bucket) and priced from those totals. A price
+change therefore re-prices history exactly, without revisiting any run.
+Batch pricing over stored spans looks prices up once per distinct model and
+computes every row with numpy, which is imported only when needed.
+"""
+
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+# Span attributes naming the model of a run and its priced cost
+MODEL_ATTRIBUTE = "agent.model"
+COST_ATTRIBUTE = "agent.cost"
+
+LEDGER_KEYS = ("agent_id", "service_name", "model", "bucket")
+
+# Suffix of a dated or pinned release of a priced model
+_RELEASE_SUFFIX = re.compile(r"[-@:](\d|latest)")
+
+
+class PricingTable:
+    """Input and output token prices per model.
+
+    Model names are matched exactly, then without a ``provider/`` prefix,
+    then as a release of the longest priced name they start with, so that
+    ``gpt-4o-2024-08-06`` uses the price of ``gpt-4o`` while
+    ``gpt-4o-mini`` needs a price of its own.
+    """
+
+    def __init__(self, prices: Mapping[str, Mapping[str, float]], per_tokens: int = 1_000_000,
+                 currency: str = "USD"):
+        """
+        Initialize the pricing table.
+
+        Args:
+            prices: Per model name, the ``input`` and ``output`` price of
+                ``per_tokens`` tokens
+            per_tokens: Number of tokens the prices are quoted for
+            currency: Currency of the prices, for reporting
+        """
+        if per_tokens <= 0:
+            raise ValueError("per_tokens must be positive")
+        self.per_tokens = per_tokens
+        self.currency = currency
+        self.prices = {model: (float(price.get("input", 0.0)) / per_tokens,
+                               float(price.get("output", 0.0)) / per_tokens)
+                       for model, price in prices.items()}
+        # Longest names first, for prefix matching
+        self._prefixes = sorted(self.prices, key=len, reverse=True)
+        self._resolved: Dict[str, Optional[Tuple[float, float]]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "PricingTable":
+        """
+        Load a pricing table from a JSON file.
+
+        The file holds ``{"models": {name: {"input": price, "output": price}}}``
+        and optionally ``per_tokens`` (default one million) and ``currency``.
+
+        Args:
+            path: Path of the JSON file
+
+        Returns:
+            The pricing table
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["models"], per_tokens=data.get("per_tokens", 1_000_000),
+                   currency=data.get("currency", "USD"))
+
+    def price(self, model: Optional[str]) -> Optional[Tuple[float, float]]:
+        """
+        Get the per-token prices of a model.
+
+        Args:
+            model: Model name
+
+        Returns:
+            Input and output price of a single token, or None if the model
+            is not priced
+        """
+        if not model:
+            return None
+        try:
+            return self._resolved[model]
+        except KeyError:
+            pass
+
+        price = self.prices.get(model)
+        if price is None:
+            name = model.rpartition("/")[2]
+            price = self.prices.get(name)
+            if price is None:
+                price = next((self.prices[prefix] for prefix in self._prefixes
+                              if name.startswith(prefix) and _RELEASE_SUFFIX.match(name, len(prefix))), None)
+        with self._lock:
+            # Unknown names from callers are not cached without bound
+            if len(self._resolved) < 10_000:
+                self._resolved[model] = price
+        return price
+
+    def cost(self, model: Optional[str], tokens_input: int, tokens_output: int) -> Optional[float]:
+        """
+        Price one run.
+
+        Args:
+            model: Model name
+            tokens_input: Input tokens of the run
+            tokens_output: Output tokens of the run
+
+        Returns:
+            The cost, or None if the model is not priced
+        """
+        price = self.price(model)
+        if price is None:
+            return None
+        return tokens_input * price[0] + tokens_output * price[1]
+
+    def costs(self, model_codes, model_values, tokens_input, tokens_output):
+        """
+        Price many runs at once.
+
+        Models are dictionary-encoded as in :class:`~.spanstore.SpanStore`
+        scans, so prices are looked up once per distinct model.
+
+        Args:
+            model_codes: Integer index into ``model_values`` per run
+            model_values: Distinct model names
+            tokens_input: Input tokens per run
+            tokens_output: Output tokens per run
+
+        Returns:
+            A float64 array of costs, NaN for runs of unpriced models
+        """
+        import numpy as np
+
+        prices = np.array([self.price(str(model)) or (np.nan, np.nan) for model in model_values],
+                          dtype=np.float64).reshape(-1, 2)
+        codes = np.asarray(model_codes, dtype=np.int64)
+        return (np.asarray(tokens_input, dtype=np.float64) * prices[codes, 0]
+                + np.asarray(tokens_output, dtype=np.float64) * prices[codes, 1])
+
+
+class _Spend:
+    """Running totals of one (agent, service, model, bucket) key."""
+
+    __slots__ = ("runs", "tokens_input", "tokens_output")
+
+    def __init__(self):
+        self.runs = 0
+        self.tokens_input = 0
+        self.tokens_output = 0
+
+
+class CostLedger:
+    """Spend aggregated incrementally per agent, service, model and time bucket."""
+
+    def __init__(self, pricing: PricingTable, bucket_seconds: float = 3600.0):
+        """
+        Initialize an empty ledger.
+
+        Args:
+            pricing: Prices applied to the token totals
+            bucket_seconds: Width of the time buckets runs are added to
+        """
+        if bucket_seconds <= 0:
+            raise ValueError("bucket_seconds must be positive")
+        self.pricing = pricing
+        self.bucket_ns = int(bucket_seconds * 1e9)
+        self._spend: Dict[Tuple[str, str, str, int], _Spend] = {}
+        self._lock = threading.Lock()
+
+    def add(self, agent_id: str, service_name: str, model: str, tokens_input: int, tokens_output: int,
+            end_time_ns: Optional[int] = None) -> Optional[float]:
+        """
+        Add one run.
+
+        Args:
+            agent_id: The run's ``agent.id``
+            service_name: The run's service
+            model: The run's model, or an empty string if unknown
+            tokens_input: Input tokens of the run
+            tokens_output: Output tokens of the run
+            end_time_ns: End of the run in epoch nanoseconds; defaults to now
+
+        Returns:
+            The cost of the run, or None if its model is not priced
+        """
+        end_time_ns = time.time_ns() if end_time_ns is None else end_time_ns
+        key = (agent_id, service_name, model, end_time_ns // self.bucket_ns)
+        with self._lock:
+            spend = self._spend.get(key)
+            if spend is None:
+                spend = self._spend[key] = _Spend()
+            spend.runs += 1
+            spend.tokens_input += tokens_input
+            spend.tokens_output += tokens_output
+        return self.pricing.cost(model, tokens_input, tokens_output)
+
+    def add_many(self, runs: Iterable[Tuple[str, str, str, int, int, int]]) -> int:
+        """
+        Add runs given as tuples, under one lock acquisition.
+
+        Args:
+            runs: ``(agent_id, service_name, model, tokens_input,
+                tokens_output, end_time_ns)`` per run
+
+        Returns:
+            Number of runs added
+        """
+        bucket_ns = self.bucket_ns
+        added = 0
+        with self._lock:
+            spend_by_key = self._spend
+            for agent_id, service_name, model, tokens_input, tokens_output, end_time_ns in runs:
+                key = (agent_id, service_name, model, end_time_ns // bucket_ns)
+                spend = spend_by_key.get(key)
+                if spend is None:
+                    spend = spend_by_key[key] = _Spend()
+                spend.runs += 1
+                spend.tokens_input += tokens_input
+                spend.tokens_output += tokens_output
+                added += 1
+        return added
+
+    def add_spans(self, spans: Sequence[Any]) -> int:
+        """
+        Add finished ``agent.run`` spans.
+
+        Args:
+            spans: SDK ``ReadableSpan`` objects
+
+        Returns:
+            Number of runs added
+        """
+        runs = []
+        for span in spans:
+            if span.name != "agent.run":
+                continue
+            attributes = span.attributes or {}
+            runs.append((str(attributes.get("agent.id", "")),
+                         str(span.resource.attributes.get("service.name", "")),
+                         str(attributes.get(MODEL_ATTRIBUTE, "")),
+                         int(attributes.get("agent.tokens.input", 0)),
+                         int(attributes.get("agent.tokens.output", 0)),
+                         span.end_time))
+        return self.add_many(runs)
+
+    def spend(self,
+              by: Sequence[str] = ("agent_id",),
+              start_ns: Optional[int] = None,
+              end_ns: Optional[int] = None) -> Dict[Tuple, Dict[str, float]]:
+        """
+        Total spend grouped by some of the ledger keys.
+
+        Args:
+            by: Keys to group by: ``agent_id``, ``service_name``, ``model``
+                or ``bucket`` (the bucket start in epoch nanoseconds)
+            start_ns: Inclusive lower bound on bucket start
+            end_ns: Exclusive upper bound on bucket start
+
+        Returns:
+            Per tuple of key values, ``runs``, ``tokens_input``,
+            ``tokens_output``, ``cost`` and ``unpriced_runs``, the runs of
+            models missing from the pricing table, which add no cost
+        """
+        positions = []
+        for name in by:
+            if name not in LEDGER_KEYS:
+                raise ValueError(f"Cannot group by {name!r}")
+            positions.append(LEDGER_KEYS.index(name))
+        with self._lock:
+            items = [(key, spend.runs, spend.tokens_input, spend.tokens_output)
+                     for key, spend in self._spend.items()]
+
+        result: Dict[Tuple, Dict[str, float]] = {}
+        for key, runs, tokens_input, tokens_output in items:
+            bucket_start = key[3] * self.bucket_ns
+            if start_ns is not None and bucket_start < start_ns:
+                continue
+            if end_ns is not None and bucket_start >= end_ns:
+                continue
+            values = key[:3] + (bucket_start,)
+            group = tuple(values[position] for position in positions)
+            totals = result.get(group)
+            if totals is None:
+                totals = result[group] = {"runs": 0, "tokens_input": 0, "tokens_output": 0,
+                                          "cost": 0.0, "unpriced_runs": 0}
+            totals["runs"] += runs
+            totals["tokens_input"] += tokens_input
+            totals["tokens_output"] += tokens_output
+            cost = self.pricing.cost(key[2], tokens_input, tokens_output)
+            if cost is None:
+                totals["unpriced_runs"] += runs
+            else:
+                totals["cost"] += cost
+        return result
+
+    def reprice(self, pricing: PricingTable):
+        """
+        Switch to new prices, which apply to all runs already added.
+
+        Args:
+            pricing: The new pricing table
+        """
+        self.pricing = pricing
+
+    def prune(self, before_ns: int) -> int:
+        """
+        Drop buckets that start before a time.
+
+        Args:
+            before_ns: Epoch nanoseconds; older buckets are removed
+
+        Returns:
+            Number of (agent, service, model, bucket) entries removed
+        """
+        with self._lock:
+            stale = [key for key in self._spend if key[3] * self.bucket_ns < before_ns]
+            for key in stale:
+                del self._spend[key]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._spend)
+
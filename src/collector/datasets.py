@@ -0,0 +1,192 @@
+"""Memory-mapped JSONL datasets for benchmark evaluation."""
+
+import json
+import mmap
+import os
+import struct
+from array import array
+from typing import Any, Dict, Iterator, Optional
+
+# Index file header: magic, format version, data file size and mtime, line count
+_INDEX_HEADER = struct.Struct("<8sIQqQ")
+_INDEX_MAGIC = b"NXHIDX\x00\x00"
+_INDEX_VERSION = 2
+
+# Byte values of the whitespace that may surround a JSON value
+_WHITESPACE = frozenset(b" \t\r\n")
+
+
+class JsonlDataset:
+    """A JSONL file of questions, memory-mapped and indexed by line.
+
+    The byte offset of every non-empty line is computed once and cached in
+    ``<path>.idx``, so opening a large dataset again is instant. Questions
+    are parsed only when accessed, either by iteration or by index.
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        """
+        Open a JSONL dataset.
+
+        Args:
+            path: Path to the JSONL file, one question object per line
+            index_path: Where to cache the offset index; defaults to
+                ``path + ".idx"``
+        """
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._offsets = self._load_index()
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load_index(self) -> array:
+        """Read the cached index if it matches the file, else rebuild it."""
+        size, mtime_ns = self._signature()
+        try:
+            with open(self.index_path, "rb") as f:
+                header = f.read(_INDEX_HEADER.size)
+                magic, version, cached_size, cached_mtime, count = _INDEX_HEADER.unpack(header)
+                if (magic, version, cached_size, cached_mtime) == (_INDEX_MAGIC, _INDEX_VERSION, size, mtime_ns):
+                    offsets = array("Q")
+                    offsets.frombytes(f.read())
+                    if len(offsets) == count:
+                        return offsets
+        except (OSError, struct.error):
+            pass
+
+        offsets = self._build_index()
+        try:
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, size, mtime_ns, len(offsets)))
+                f.write(offsets.tobytes())
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # Read-only location: keep the index in memory only
+            pass
+        return offsets
+
+    def _build_index(self) -> array:
+        """
+        Scan the file for line starts.
+
+        Returns:
+            Start offsets of all non-blank lines
+        """
+        data = self._mmap
+        size = len(data)
+        offsets = array("Q")
+        position = 0
+        while position < size:
+            end = data.find(b"\n", position)
+            if end == -1:
+                end = size
+            # Skip lines holding only whitespace, such as bare CRLF endings;
+            # only lines not opening with a JSON value need a closer look
+            if end > position and (data[position] not in _WHITESPACE or data[position:end].strip()):
+                offsets.append(position)
+            position = end + 1
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        """
+        Parse one question.
+
+        Args:
+            index: Position of the question, negative values count from the end
+
+        Returns:
+            The question dict, with ``id`` defaulting to its position
+        """
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("dataset index out of range")
+
+        start = self._offsets[index]
+        end = self._mmap.find(b"\n", start)
+        if end == -1:
+            end = len(self._mmap)
+        question = json.loads(self._mmap[start:end])
+        if isinstance(question, dict):
+            question.setdefault("id", index)
+        return question
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def shard(self, start: int, stop: Optional[int] = None) -> "DatasetShard":
+        """
+        Get a lazy view over a range of questions.
+
+        Args:
+            start: First question index
+            stop: One past the last question index; defaults to the end
+
+        Returns:
+            A view that parses questions only when accessed
+        """
+        return DatasetShard(self, range(len(self))[start:stop])
+
+    def split(self, worker: int, num_workers: int) -> "DatasetShard":
+        """
+        Get one worker's contiguous share of the dataset.
+
+        Args:
+            worker: Worker number, from 0 to ``num_workers - 1``
+            num_workers: Total number of workers
+
+        Returns:
+            The worker's shard; shards of all workers cover the dataset once
+        """
+        if not 0 <= worker < num_workers:
+            raise ValueError("worker must be between 0 and num_workers - 1")
+        length = len(self)
+        return self.shard(length * worker // num_workers, length * (worker + 1) // num_workers)
+
+    def close(self):
+        """Unmap and close the dataset file."""
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "JsonlDataset":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DatasetShard:
+    """A lazy range of questions from a :class:`JsonlDataset`."""
+
+    def __init__(self, dataset: JsonlDataset, indices: range):
+        """
+        Initialize the shard.
+
+        Args:
+            dataset: The underlying dataset
+            indices: Question indices covered by the shard
+        """
+        self.dataset = dataset
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return self.dataset[self.indices[index]]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in self.indices:
+            yield self.dataset[index]
@@ -1,22 +1,142 @@
 """Evaluation components for agent performance."""
 
-from typing import Any, Dict, List, Optional, Union
+import asyncio
+import concurrent.futures
+import logging
+import re
+import time
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from .checkpoints import CheckpointStore, question_fingerprint
+from .datasets import JsonlDataset
+from .executors import Executor, ThreadExecutor
+from .judging import RateLimiter, VerdictCache, build_request, parse_verdicts, post_json, verdict_key
+from .sketch import LatencySketch
+
+logger = logging.getLogger(__name__)
+
+_NUMBER = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+_ARTICLES = re.compile(r"\b(a|an|the)\b")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_answer(text: Any) -> str:
+    """
+    Normalize an answer for comparison.
+    
+    Lowercases, strips punctuation and articles and collapses whitespace.
+    
+    Args:
+        text: Answer to normalize
+        
+    Returns:
+        The normalized answer
+    """
+    text = _PUNCTUATION.sub(" ", str(text).lower())
+    return " ".join(_ARTICLES.sub(" ", text).split())
+
+
+def extract_number(text: Any) -> Optional[float]:
+    """
+    Extract the final number from an answer, GSM8K style.
+    
+    Args:
+        text: Answer text
+        
+    Returns:
+        The last number in the text, or None if there is none
+    """
+    text = str(text)
+    if "####" in text:
+        text = text.rsplit("####", 1)[1]
+    matches = _NUMBER.findall(text)
+    if not matches:
+        return None
+    try:
+        return float(matches[-1].replace(",", ""))
+    except ValueError:
+        return None
+
+
+def score_prediction(prediction: Any, reference: Any) -> Tuple[bool, float]:
+    """
+    Score a prediction against a reference answer.
+    
+    Numeric references are compared by their final number; other answers
+    by normalized exact match. F1 is the token overlap of the normalized
+    answers.
+    
+    Args:
+        prediction: The agent's answer
+        reference: The gold answer
+        
+    Returns:
+        Tuple of (correct, f1)
+    """
+    if prediction is None:
+        return False, 0.0
+    
+    reference_number = extract_number(reference)
+    if reference_number is not None:
+        prediction_number = extract_number(prediction)
+        correct = prediction_number is not None and abs(prediction_number - reference_number) < 1e-6
+    else:
+        correct = normalize_answer(prediction) == normalize_answer(reference)
+    
+    prediction_tokens = normalize_answer(prediction).split()
+    reference_tokens = normalize_answer(reference).split()
+    common = sum((Counter(prediction_tokens) & Counter(reference_tokens)).values())
+    if correct:
+        f1 = 1.0
+    elif common == 0:
+        f1 = 0.0
+    else:
+        precision = common / len(prediction_tokens)
+        recall = common / len(reference_tokens)
+        f1 = 2 * precision * recall / (precision + recall)
+    return correct, f1
 
 
 class LLMJudge:
     """LLM-based judge for evaluating agent responses."""
     
-    def __init__(self, model_name: str = "gpt-4", endpoint: Optional[str] = None):
+    DEFAULT_CRITERIA = ("correctness", "relevance", "completeness", "clarity")
+    
+    def __init__(self,
+                 model_name: str = "gpt-4",
+                 endpoint: Optional[str] = None,
+                 api_key: Optional[str] = None,
+                 batch_size: int = 8,
+                 max_concurrency: int = 4,
+                 requests_per_second: Optional[float] = None,
+                 cache_path: Optional[str] = None,
+                 timeout: float = 60.0):
         """
         Initialize an LLM-based judge for evaluating agent responses.
         
         Args:
             model_name: Name of the LLM model to use for evaluation
-            endpoint: Optional API endpoint for the LLM
+            endpoint: Optional OpenAI-compatible chat completions URL; without
+                one, every response gets a fixed placeholder verdict
+            api_key: Optional bearer token for the endpoint
+            batch_size: Items packed into each judge request
+            max_concurrency: Judge requests in flight at once
+            requests_per_second: Cap on the judge request rate, or None
+            cache_path: SQLite file caching verdicts across runs, or None
+            timeout: Seconds allowed per judge request
         """
+        if batch_size < 1 or max_concurrency < 1:
+            raise ValueError("batch_size and max_concurrency must be positive")
         self.model_name = model_name
         self.endpoint = endpoint
-        # In a real implementation, this would initialize an LLM client
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.timeout = timeout
+        self.cache = VerdictCache(cache_path) if cache_path else None
+        self.requests_sent = 0
         
     def evaluate_response(self, 
                           query: str, 
@@ -35,20 +155,110 @@ class LLMJudge:
         Returns:
             Dictionary with evaluation results
         """
-        # Default criteria if none provided
-        if criteria is None:
-            criteria = ["correctness", "relevance", "completeness", "clarity"]
+        item = {"query": query, "response": response, "reference": reference}
+        return self.evaluate_many([item], criteria)[0]
+    
+    def evaluate_many(self,
+                      items: Iterable[Dict[str, Any]],
+                      criteria: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Evaluate many responses in batched, concurrent judge requests.
+        
+        Args:
+            items: Dicts with ``query``, ``response`` and optional ``reference``
+            criteria: List of evaluation criteria
             
-        # This is a placeholder that would use the LLM to evaluate
-        # In a real implementation, this would prompt the LLM with the query,
-        # response, and criteria to get a structured evaluation
+        Returns:
+            One verdict per item, in order, each with ``overall_score``,
+            ``scores`` and ``feedback``
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.aevaluate_many(items, criteria))
+        # asyncio.run cannot nest inside a running loop; give the requests a
+        # loop of their own on a worker thread
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, self.aevaluate_many(items, criteria)).result()
+    
+    async def aevaluate_many(self,
+                             items: Iterable[Dict[str, Any]],
+                             criteria: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Async variant of :meth:`evaluate_many` for callers inside an event loop.
         
-        # Mock result
-        return {
-            "overall_score": 0.85,  # 0.0 to 1.0
-            "scores": {criterion: 0.85 for criterion in criteria},
-            "feedback": "This is placeholder feedback for agent evaluation."
+        Cached verdicts and duplicate items are resolved before any request
+        is sent. The remaining items are packed ``batch_size`` at a time into
+        requests that run concurrently under the rate limit.
+        """
+        criteria = list(criteria or self.DEFAULT_CRITERIA)
+        items = list(items)
+        keys = [
+            verdict_key(self.model_name, criteria, item["query"], item["response"], item.get("reference"))
+            for item in items
+        ]
+        # Placeholder verdicts must never be cached
+        cache = self.cache if self.endpoint is not None else None
+        verdicts = cache.get_many(list(set(keys))) if cache is not None else {}
+        
+        # Judge each distinct uncached item once
+        todo = {}
+        for key, item in zip(keys, items):
+            if key not in verdicts:
+                todo.setdefault(key, item)
+        todo_keys = list(todo)
+        batches = [todo_keys[i:i + self.batch_size] for i in range(0, len(todo_keys), self.batch_size)]
+        
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = RateLimiter(self.requests_per_second)
+        
+        async def judge(batch):
+            async with semaphore:
+                await limiter.acquire()
+                return await self._judge_batch(criteria, [todo[key] for key in batch])
+        
+        fresh = {}
+        for batch, results in zip(batches, await asyncio.gather(*(judge(batch) for batch in batches))):
+            for key, verdict in zip(batch, results):
+                if verdict is not None:
+                    fresh[key] = verdict
+        if cache is not None and fresh:
+            cache.put_many(fresh)
+        verdicts.update(fresh)
+        
+        missing = {
+            "overall_score": None,
+            "scores": {},
+            "feedback": "",
+            "error": "judge returned no verdict",
         }
+        return [dict(verdicts.get(key, missing)) for key in keys]
+    
+    async def _judge_batch(self,
+                           criteria: List[str],
+                           items: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Send one judge request; verdicts are None for items it left out or if it failed."""
+        if self.endpoint is None:
+            # Placeholder verdict until a judge endpoint is configured
+            return [{
+                "overall_score": 0.85,  # 0.0 to 1.0
+                "scores": {criterion: 0.85 for criterion in criteria},
+                "feedback": "This is placeholder feedback for agent evaluation."
+            } for _ in items]
+        
+        self.requests_sent += 1
+        payload = build_request(self.model_name, criteria, items)
+        try:
+            body = await asyncio.to_thread(post_json, self.endpoint, payload, self.api_key, self.timeout)
+        except (OSError, ValueError) as e:
+            # HTTP and connection errors after retries, or a reply that is
+            # not JSON; only this batch goes without verdicts
+            logger.warning("Judge request to %s failed: %s", self.endpoint, e)
+            return [None] * len(items)
+        try:
+            return parse_verdicts(body, criteria, len(items))
+        except (KeyError, IndexError, TypeError, ValueError):
+            return [None] * len(items)
 
 
 class BenchmarkEvaluator:
@@ -65,33 +275,180 @@ class BenchmarkEvaluator:
         self.dataset_name = dataset_name
         self.dataset_path = dataset_path
         self.questions = []
-        # In a real impl, this would load the dataset
+        # Set once dataset_path is loaded, which may hold no questions
+        self._dataset: Optional[JsonlDataset] = None
+        
+    def load_dataset(self) -> JsonlDataset:
+        """
+        Load the benchmark dataset.
+        
+        The JSONL file at ``dataset_path`` is memory-mapped and indexed, not
+        read into memory; questions are parsed as they are evaluated.
+        Standard datasets such as GSM8K must first be saved as a local
+        JSONL file with ``question`` and ``answer`` fields.
+        
+        Returns:
+            The loaded dataset, also stored in ``self.questions``
+        """
+        if self.dataset_path is None:
+            raise ValueError(f"No local file for dataset {self.dataset_name!r}; set dataset_path")
+        if self._dataset is not None:
+            self._dataset.close()
+        self._dataset = self.questions = JsonlDataset(self.dataset_path)
+        return self.questions
         
-    def load_dataset(self):
-        """Load the benchmark dataset."""
-        # Placeholder - would load from dataset_path or fetch standard dataset
-        pass
+    @property
+    def dataset_key(self) -> str:
+        """Name under which results are checkpointed."""
+        return self.dataset_name or self.dataset_path or "default"
         
-    def evaluate_agent(self, agent: Any) -> Dict[str, Any]:
+    def evaluate_agent(self,
+                       agent: Any,
+                       executor: Optional[Executor] = None,
+                       timeout: Optional[float] = None,
+                       retries: int = 0,
+                       questions: Optional[Iterable[Dict[str, Any]]] = None,
+                       checkpoint: Optional[CheckpointStore] = None,
+                       agent_version: Optional[str] = None) -> Dict[str, Any]:
         """
         Evaluate an agent against the benchmark dataset.
         
+        Questions are dicts with ``question`` and ``answer`` fields and an
+        optional ``id``. They are streamed through the executor and results
+        are kept in dataset order.
+        
+        With a checkpoint store, every result is saved as soon as it is
+        scored. A rerun with the same agent version skips questions already
+        answered without error, unless the question changed since, and the
+        report covers both the stored and the new results.
+        
         Args:
-            agent: The agent to evaluate
+            agent: The agent to evaluate; ``agent.run(question)`` may be
+                sync or async
+            executor: Execution backend; defaults to a thread pool
+            timeout: Seconds allowed per attempt, or None for no limit
+            retries: Extra attempts per question after a failure or timeout
+            questions: Questions to use instead of the loaded dataset, e.g.
+                one worker's ``JsonlDataset.split``
+            checkpoint: Store to save results to and resume from
+            agent_version: Version key for checkpointed results; required
+                with a checkpoint store, so that a new build of an agent
+                never resumes from an older build's results
             
         Returns:
-            Dictionary with evaluation results
+            Dictionary with accuracy, F1, throughput, the latency
+            distribution, per-question ``results`` and the number of
+            ``resumed`` questions taken from the checkpoint
+            
+        Raises:
+            ValueError: If ``checkpoint`` is given without ``agent_version``
+        """
+        if checkpoint is not None and not agent_version:
+            raise ValueError("agent_version is required when resuming from a checkpoint store")
+        executor = executor or ThreadExecutor()
+        if questions is None:
+            if self._dataset is None and not self.questions and self.dataset_path is not None:
+                self.load_dataset()
+            questions = self.questions
+        
+        completed = checkpoint.completed(self.dataset_key, agent_version) if checkpoint else {}
+        results = []
+        # Result slots of the questions handed to the executor, in order
+        pending = deque()
+        
+        def to_run():
+            for index, question in enumerate(questions):
+                if "id" not in question:
+                    question = dict(question, id=index)
+                fingerprint = None
+                if checkpoint is not None:
+                    fingerprint = question_fingerprint(question)
+                    stored = completed.get(str(question["id"]))
+                    if stored is not None and stored["fingerprint"] == fingerprint:
+                        results.append(stored["result"])
+                        continue
+                pending.append((len(results), fingerprint))
+                results.append(None)
+                yield question
+        
+        run = 0
+        start = time.perf_counter()
+        for question, outcome in executor.map(agent, to_run(), timeout=timeout, retries=retries):
+            correct, f1 = score_prediction(outcome["prediction"], question.get("answer"))
+            outcome["id"] = question["id"]
+            outcome["correct"] = correct
+            outcome["f1"] = f1
+            
+            slot, fingerprint = pending.popleft()
+            results[slot] = outcome
+            if checkpoint is not None:
+                checkpoint.record(self.dataset_key, agent_version, fingerprint, outcome)
+            run += 1
+        wall_time_s = time.perf_counter() - start
+        
+        report = self._summarize(results)
+        report.update(
+            throughput_qps=run / wall_time_s if wall_time_s > 0 else 0.0,
+            wall_time_s=wall_time_s,
+            resumed=len(results) - run,
+        )
+        return report
+    
+    def compare_agents(self,
+                       base_agent: Any,
+                       new_agent: Any,
+                       checkpoint: CheckpointStore,
+                       base_version: str,
+                       new_version: str,
+                       **kwargs) -> Dict[str, Any]:
         """
-        # Placeholder for evaluation logic
-        # In a real implementation, this would:
-        # 1. Run the agent on each question in the dataset
-        # 2. Evaluate the correctness of each answer
-        # 3. Compute metrics like accuracy, F1, etc.
+        Compare two agent versions on the benchmark dataset.
+        
+        Both versions are evaluated through the checkpoint store, so only
+        questions that either version has not answered yet, or that changed
+        since, are run.
+        
+        Args:
+            base_agent: Reference agent
+            new_agent: Agent under test
+            checkpoint: Store holding results of earlier runs
+            base_version: Version key of the reference agent
+            new_version: Version key of the agent under test
+            **kwargs: Further arguments to ``evaluate_agent``
+            
+        Returns:
+            Both reports and the per-question comparison from
+            ``CheckpointStore.compare``
+        """
+        base = self.evaluate_agent(base_agent, checkpoint=checkpoint, agent_version=base_version, **kwargs)
+        new = self.evaluate_agent(new_agent, checkpoint=checkpoint, agent_version=new_version, **kwargs)
+        comparison = checkpoint.compare(self.dataset_key, base_version, new_version,
+                                        question_ids=[result["id"] for result in new["results"]])
+        return {"base": base, "new": new, "comparison": comparison}
+    
+    @staticmethod
+    def _summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Aggregate scored per-question results."""
+        sketch = LatencySketch()
+        correct_answers = 0
+        f1_total = 0.0
+        errors = 0
+        for result in results:
+            correct_answers += result["correct"]
+            f1_total += result["f1"]
+            if result["error"] is not None:
+                errors += 1
+            else:
+                sketch.add(result["latency_ms"])
         
+        total = len(results)
         return {
-            "accuracy": 0.75,
-            "f1_score": 0.80,
-            "total_questions": len(self.questions),
-            "correct_answers": 0,  # would be calculated
-            "avg_latency_ms": 1200.0,
+            "accuracy": correct_answers / total if total else 0.0,
+            "f1_score": f1_total / total if total else 0.0,
+            "total_questions": total,
+            "correct_answers": correct_answers,
+            "errors": errors,
+            "avg_latency_ms": sketch.sum / sketch.count if sketch.count else 0.0,
+            "latency_ms": {f"p{int(q * 100)}": v for q, v in sketch.quantiles((0.5, 0.95, 0.99)).items()},
+            "results": results,
         }
@@ -0,0 +1,346 @@
+"""Execution backends for running agents over benchmark questions."""
+
+import asyncio
+import concurrent.futures
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Seconds between checks whether a queued attempt has started
+_START_POLL = 0.005
+
+
+def run_question(agent: Any, question: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run an agent on one question and time it.
+
+    Args:
+        agent: Agent with a sync or async ``run`` method
+        question: Question dict with a ``question`` field
+
+    Returns:
+        Dictionary with the ``prediction`` and ``latency_ms``
+    """
+    start = time.perf_counter()
+    prediction = agent.run(question["question"])
+    if inspect.isawaitable(prediction):
+        prediction = asyncio.run(prediction)
+    return {"prediction": prediction, "latency_ms": (time.perf_counter() - start) * 1000}
+
+
+def _failed(error: BaseException, attempts: int) -> Dict[str, Any]:
+    """Build the outcome of a question whose attempts all failed."""
+    if isinstance(error, (concurrent.futures.TimeoutError, asyncio.TimeoutError)):
+        message = "timeout"
+    else:
+        message = f"{type(error).__name__}: {error}"
+    return {"prediction": None, "latency_ms": None, "error": message, "attempts": attempts}
+
+
+class Executor:
+    """Interface for running an agent over questions.
+
+    Implementations pull questions lazily from the iterable, run up to a
+    fixed number concurrently and yield outcomes in dataset order. Each
+    question gets ``retries + 1`` attempts; ``timeout`` bounds each attempt
+    from the moment it starts running, and attempts that time out are
+    abandoned rather than waited for.
+    """
+
+    def map(self,
+            agent: Any,
+            questions: Iterable[Dict[str, Any]],
+            timeout: Optional[float] = None,
+            retries: int = 0) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Run an agent over questions.
+
+        Args:
+            agent: The agent to evaluate
+            questions: Questions, consumed lazily
+            timeout: Seconds allowed per attempt, or None for no limit
+            retries: Extra attempts after a failure or timeout
+
+        Returns:
+            Iterator of ``(question, outcome)`` pairs in the order of
+            ``questions``, where outcome has ``prediction``,
+            ``latency_ms``, ``error`` and ``attempts``
+        """
+        raise NotImplementedError
+
+
+class _PoolExecutor(Executor):
+    """Shared logic for concurrent.futures based executors."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+
+    def _create_pool(self, agent: Any) -> concurrent.futures.Executor:
+        raise NotImplementedError
+
+    def _submit(self, pool: concurrent.futures.Executor, agent: Any, question: Dict[str, Any]):
+        return pool.submit(run_question, agent, question)
+
+    def map(self, agent, questions, timeout=None, retries=0):
+        pool = self._create_pool(agent)
+        # Timed out attempts still holding a worker of the current pool
+        abandoned: List[_Attempt] = []
+        try:
+            in_flight = deque()
+            iterator = iter(questions)
+
+            def submit(question):
+                return _Attempt(self._submit(pool, agent, question), pool)
+
+            def fill():
+                # Keep every worker busy without reading the whole dataset
+                while len(in_flight) < self.max_workers * 2:
+                    question = next(iterator, None)
+                    if question is None:
+                        return
+                    in_flight.append((question, submit(question)))
+
+            def stuck():
+                # Running attempts cannot be stopped: the pool is stuck once
+                # abandoned and overdue attempts hold every worker
+                now = time.monotonic()
+                abandoned[:] = [attempt for attempt in abandoned if not attempt.future.done()]
+                overdue = sum(attempt.pool is pool and attempt.overdue(now, timeout) for _, attempt in in_flight)
+                return len(abandoned) + overdue >= self.max_workers
+
+            def result(attempt):
+                nonlocal pool
+                if timeout is None:
+                    return attempt.future.result()
+                # Time queued behind other attempts is not charged
+                while attempt.start() is None:
+                    if stuck():
+                        # Queued attempts are cancelled and resubmitted to a
+                        # fresh pool; the stuck workers are left behind
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        pool = self._create_pool(agent)
+                        abandoned.clear()
+                    try:
+                        return attempt.future.result(timeout=_START_POLL)
+                    except concurrent.futures.TimeoutError:
+                        continue
+                return attempt.future.result(timeout=max(0.0, attempt.started + timeout - time.monotonic()))
+
+            fill()
+            while in_flight:
+                question, attempt = in_flight.popleft()
+                attempts = 1
+                while True:
+                    try:
+                        outcome = result(attempt)
+                        outcome["error"] = None
+                        outcome["attempts"] = attempts
+                        break
+                    except concurrent.futures.CancelledError:
+                        # Queued on a pool that was replaced before it started
+                        attempt = submit(question)
+                        continue
+                    except Exception as e:
+                        if attempt.pool is pool and not attempt.future.done():
+                            abandoned.append(attempt)
+                        if attempts > retries:
+                            outcome = _failed(e, attempts)
+                            break
+                        attempts += 1
+                        attempt = submit(question)
+                fill()
+                yield question, outcome
+        finally:
+            # Never wait for attempts that timed out
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _Attempt:
+    """A submitted attempt and the time it was first seen running."""
+
+    __slots__ = ("future", "pool", "started")
+
+    def __init__(self, future: concurrent.futures.Future, pool: concurrent.futures.Executor):
+        self.future = future
+        self.pool = pool
+        self.started: Optional[float] = None
+
+    def start(self) -> Optional[float]:
+        """Monotonic start time, or None while the attempt is queued."""
+        if self.started is None and (self.future.running() or self.future.done()):
+            self.started = time.monotonic()
+        return self.started
+
+    def overdue(self, now: float, timeout: float) -> bool:
+        """Whether the attempt has been running for longer than ``timeout``."""
+        return self.start() is not None and not self.future.done() and now - self.started > timeout
+
+
+class ThreadExecutor(_PoolExecutor):
+    """Run questions on a thread pool; suited to I/O-bound agents."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize the thread executor.
+
+        Args:
+            max_workers: Number of threads; defaults to ``cpu_count + 4``
+        """
+        super().__init__(max_workers)
+
+    def _create_pool(self, agent):
+        return concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+
+
+_worker_agent: Any = None
+
+
+def _init_worker(agent: Any):
+    """Install the agent once per worker process."""
+    global _worker_agent
+    _worker_agent = agent
+
+
+def _run_in_worker(question: Dict[str, Any]) -> Dict[str, Any]:
+    return run_question(_worker_agent, question)
+
+
+class ProcessExecutor(_PoolExecutor):
+    """Run questions on a process pool; suited to CPU-bound agents.
+
+    The agent is pickled once per worker process, not once per question.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize the process executor.
+
+        Args:
+            max_workers: Number of processes; defaults to ``cpu_count``
+        """
+        super().__init__(max_workers or os.cpu_count() or 1)
+
+    def _create_pool(self, agent):
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=(agent,),
+        )
+
+    def _submit(self, pool, agent, question):
+        return pool.submit(_run_in_worker, question)
+
+
+class AsyncExecutor(Executor):
+    """Run questions on an asyncio event loop with a concurrency cap.
+
+    Async agents are awaited directly; sync agents run on a daemon thread
+    per attempt, so attempts that time out are abandoned rather than
+    waited for.
+    """
+
+    def __init__(self, concurrency: int = 32):
+        """
+        Initialize the asyncio executor.
+
+        Args:
+            concurrency: Maximum number of questions in flight
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be positive")
+        self.concurrency = concurrency
+
+    def map(self, agent, questions, timeout=None, retries=0):
+        loop = asyncio.new_event_loop()
+        try:
+            in_flight = deque()
+            iterator = iter(questions)
+
+            def fill():
+                while len(in_flight) < self.concurrency:
+                    question = next(iterator, None)
+                    if question is None:
+                        return
+                    task = loop.create_task(self._attempts(agent, question, timeout, retries))
+                    in_flight.append((question, task))
+
+            fill()
+            while in_flight:
+                question, task = in_flight.popleft()
+                outcome = loop.run_until_complete(task)
+                fill()
+                yield question, outcome
+        finally:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    async def _attempts(self, agent, question, timeout, retries):
+        """Run one question with retries and per-attempt timeouts."""
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                outcome = await asyncio.wait_for(self._run(agent, question), timeout)
+                outcome["error"] = None
+                outcome["attempts"] = attempts
+                return outcome
+            except Exception as e:
+                if attempts > retries:
+                    return _failed(e, attempts)
+
+    async def _run(self, agent, question):
+        start = time.perf_counter()
+        if inspect.iscoroutinefunction(agent.run):
+            prediction = await agent.run(question["question"])
+        else:
+            prediction = await _in_thread(agent.run, question["question"])
+        return {"prediction": prediction, "latency_ms": (time.perf_counter() - start) * 1000}
+
+
+def _in_thread(func: Any, *args: Any) -> "asyncio.Future":
+    """
+    Run a blocking call on its own daemon thread.
+
+    Unlike a pool, the call starts at once, so its timeout covers only its
+    own run, and a call that never returns neither holds up later attempts
+    nor the shutdown of the executor. The number of calls in flight is
+    already capped by the executor's concurrency.
+
+    Args:
+        func: Blocking callable
+        *args: Its arguments
+
+    Returns:
+        Future of the call's result on the running loop
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result, error):
+        if not future.done():
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def target():
+        try:
+            result, error = func(*args), None
+        except BaseException as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(resolve, result, error)
+        except RuntimeError:
+            # The loop closed after the attempt was abandoned
+            pass
+
+    threading.Thread(target=target, name="nexushive-attempt", daemon=True).start()
+    return future
@@ -0,0 +1,240 @@
+"""Transport, rate limiting and caching for LLM judge requests."""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional, Sequence
+
+JUDGE_INSTRUCTIONS = (
+    "You are an impartial judge of AI agent responses. Score every item on each "
+    "criterion from 0.0 (worst) to 1.0 (best), using the reference answer when one "
+    "is given. Reply with only a JSON array holding one object per item, in order: "
+    '{"index": <item index>, "scores": {<criterion>: <score>}, "feedback": <one sentence>}.'
+)
+
+# Status codes worth retrying: rate limited or transient server errors
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def verdict_key(model_name: str,
+                criteria: Sequence[str],
+                query: str,
+                response: str,
+                reference: Optional[str]) -> str:
+    """
+    Hash everything that determines a verdict.
+
+    Args:
+        model_name: Judge model
+        criteria: Evaluation criteria
+        query: The original user query
+        response: The agent's response
+        reference: Optional reference answer
+
+    Returns:
+        Hex digest used as the cache key
+    """
+    payload = json.dumps([model_name, list(criteria), query, response, reference])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build_request(model_name: str, criteria: Sequence[str], items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build a chat completions request judging several items at once.
+
+    Args:
+        model_name: Judge model
+        criteria: Evaluation criteria
+        items: Items with ``query``, ``response`` and ``reference``
+
+    Returns:
+        Request body for an OpenAI-compatible ``/chat/completions`` endpoint
+    """
+    numbered = [
+        {"index": index, "query": item["query"], "response": item["response"], "reference": item.get("reference")}
+        for index, item in enumerate(items)
+    ]
+    content = f"Criteria: {', '.join(criteria)}\nItems:\n{json.dumps(numbered)}"
+    return {
+        "model": model_name,
+        "temperature": 0,
+        "messages": [
+            {"role": "system", "content": JUDGE_INSTRUCTIONS},
+            {"role": "user", "content": content},
+        ],
+    }
+
+
+def parse_verdicts(body: Dict[str, Any], criteria: Sequence[str], count: int) -> List[Optional[Dict[str, Any]]]:
+    """
+    Extract per-item verdicts from a chat completions response.
+
+    Args:
+        body: Decoded response body
+        criteria: Evaluation criteria
+        count: Number of items in the request
+
+    Returns:
+        One verdict per item, or None for items the judge left out
+    """
+    content = body["choices"][0]["message"]["content"].strip()
+    if content.startswith("```"):
+        content = content.strip("`")
+        content = content[content.find("\n") + 1:]
+    entries = json.loads(content)
+    if isinstance(entries, dict):
+        entries = entries.get("verdicts", [])
+
+    verdicts: List[Optional[Dict[str, Any]]] = [None] * count
+    for position, entry in enumerate(entries):
+        # Malformed entries leave their item without a verdict
+        if not isinstance(entry, dict):
+            continue
+        index = entry.get("index", position)
+        if not isinstance(index, int) or not 0 <= index < count:
+            continue
+        raw_scores = entry.get("scores", {})
+        if not isinstance(raw_scores, dict):
+            continue
+        try:
+            scores = {criterion: float(raw_scores.get(criterion, 0.0)) for criterion in criteria}
+        except (TypeError, ValueError):
+            continue
+        verdicts[index] = {
+            "overall_score": sum(scores.values()) / len(scores) if scores else 0.0,
+            "scores": scores,
+            "feedback": entry.get("feedback", ""),
+        }
+    return verdicts
+
+
+class RateLimiter:
+    """Space out request starts to at most ``rate`` per second."""
+
+    def __init__(self, rate: Optional[float]):
+        """
+        Initialize the limiter.
+
+        Args:
+            rate: Requests per second, or None for no limit
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait for the next free request slot."""
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class VerdictCache:
+    """Judge verdicts in SQLite, keyed by :func:`verdict_key`."""
+
+    def __init__(self, path: str):
+        """
+        Open or create a verdict cache.
+
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, verdict TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up cached verdicts.
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            Mapping of the keys found to their verdicts
+        """
+        found = {}
+        with self._lock:
+            # Stay under SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, verdict FROM verdicts WHERE key IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, json.loads(verdict)) for key, verdict in rows)
+        return found
+
+    def put_many(self, verdicts: Dict[str, Dict[str, Any]]):
+        """
+        Store verdicts.
+
+        Args:
+            verdicts: Mapping of cache key to verdict
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?)",
+                [(key, json.dumps(verdict)) for key, verdict in verdicts.items()],
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+
+def post_json(url: str,
+              payload: Dict[str, Any],
+              api_key: Optional[str] = None,
+              timeout: float = 60.0,
+              max_retries: int = 3) -> Dict[str, Any]:
+    """
+    POST a JSON body and decode the JSON reply, retrying transient errors.
+
+    Args:
+        url: Endpoint URL
+        payload: Request body
+        api_key: Optional bearer token
+        timeout: Seconds allowed per attempt
+        max_retries: Extra attempts after a 429, a 5xx or a connection error
+
+    Returns:
+        The decoded response body
+    """
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    data = json.dumps(payload).encode("utf-8")
+
+    for attempt in range(max_retries + 1):
+        request = urllib.request.Request(url, data=data, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as reply:
+                return json.loads(reply.read())
+        except urllib.error.HTTPError as e:
+            if e.code not in _RETRY_STATUS or attempt == max_retries:
+                raise
+            retry_after = e.headers.get("Retry-After")
+            time.sleep(float(retry_after) if retry_after and retry_after.isdigit() else 0.5 * 2 ** attempt)
+        except (urllib.error.URLError, TimeoutError):
+            if attempt == max_retries:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
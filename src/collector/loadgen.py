@@ -0,0 +1,150 @@
+"""Load generator for the OTLP receiver.
+
+Sends pre-encoded OTLP/HTTP trace exports of synthetic ``agent.run`` spans
+over several keep-alive connections and reports the sustained span rate.
+Run ``python -m nexushive.collector.loadgen --help`` for options.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional
+
+from opentelemetry.proto.collector.trace.v1 import trace_service_pb2
+from opentelemetry.proto.common.v1 import common_pb2
+from opentelemetry.proto.trace.v1 import trace_pb2
+
+
+def _attribute(key: str, value) -> common_pb2.KeyValue:
+    if isinstance(value, str):
+        return common_pb2.KeyValue(key=key, value=common_pb2.AnyValue(string_value=value))
+    if isinstance(value, float):
+        return common_pb2.KeyValue(key=key, value=common_pb2.AnyValue(double_value=value))
+    return common_pb2.KeyValue(key=key, value=common_pb2.AnyValue(int_value=value))
+
+
+def build_request(spans: int, agents: int = 100, end_time_ns: Optional[int] = None,
+                  error_rate: float = 0.02, seed: Optional[int] = None) -> trace_service_pb2.ExportTraceServiceRequest:
+    """
+    Build an OTLP trace export of synthetic agent runs.
+
+    Args:
+        spans: Number of ``agent.run`` spans
+        agents: Number of distinct ``agent.id`` values
+        end_time_ns: End time of the spans; defaults to now
+        error_rate: Fraction of failed runs
+        seed: Random seed
+
+    Returns:
+        The export request, with span shapes matching the client's spans
+    """
+    rng = random.Random(seed)
+    end_time_ns = time.time_ns() if end_time_ns is None else end_time_ns
+    scope_spans = trace_pb2.ScopeSpans()
+    for _ in range(spans):
+        latency_ms = rng.lognormvariate(5, 1)
+        attributes = [
+            _attribute("agent.id", f"agent-{rng.randrange(agents)}"),
+            _attribute("agent.tokens.input", rng.randrange(10, 2000)),
+            _attribute("agent.tokens.output", rng.randrange(10, 500)),
+            _attribute("agent.latency_ms", latency_ms),
+        ]
+        status = trace_pb2.Status()
+        if rng.random() < error_rate:
+            attributes.append(_attribute("agent.error", "synthetic failure"))
+            status.code = trace_pb2.Status.STATUS_CODE_ERROR
+        scope_spans.spans.append(trace_pb2.Span(
+            trace_id=rng.randbytes(16),
+            span_id=rng.randbytes(8),
+            name="agent.run",
+            kind=trace_pb2.Span.SPAN_KIND_INTERNAL,
+            start_time_unix_nano=end_time_ns - int(latency_ms * 1e6),
+            end_time_unix_nano=end_time_ns,
+            attributes=attributes,
+            status=status,
+        ))
+    resource_spans = trace_pb2.ResourceSpans(scope_spans=[scope_spans])
+    resource_spans.resource.attributes.append(_attribute("service.name", "loadgen"))
+    return trace_service_pb2.ExportTraceServiceRequest(resource_spans=[resource_spans])
+
+
+async def _send(host: str, port: int, payloads: List[bytes], deadline: float, counts: Dict[str, int],
+                spans_per_request: int):
+    """Post payloads over one keep-alive connection until the deadline."""
+    reader, writer = await asyncio.open_connection(host, port)
+    head = (f"POST /v1/traces HTTP/1.1\r\nHost: {host}:{port}\r\n"
+            "Content-Type: application/x-protobuf\r\n")
+    try:
+        i = 0
+        while time.perf_counter() < deadline:
+            payload = payloads[i % len(payloads)]
+            i += 1
+            writer.write(f"{head}Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            if length:
+                await reader.readexactly(length)
+            if status_line.split(b" ", 2)[1:2] == [b"200"]:
+                counts["requests"] += 1
+                counts["spans"] += spans_per_request
+            else:
+                counts["errors"] += 1
+    finally:
+        writer.close()
+
+
+async def generate_load(host: str = "127.0.0.1", port: int = 4318, duration: float = 5.0,
+                        connections: int = 4, spans_per_request: int = 512, agents: int = 100) -> Dict[str, float]:
+    """
+    Send trace exports for a fixed time and measure the accepted rate.
+
+    Payloads are encoded up front, so the measured rate is bounded by the
+    receiver rather than by request construction.
+
+    Args:
+        host: Receiver host
+        port: Receiver OTLP/HTTP port
+        duration: Seconds to send for
+        connections: Concurrent keep-alive connections
+        spans_per_request: Spans per export, 512 matching the SDK's batches
+        agents: Distinct agent ids in the spans
+
+    Returns:
+        ``requests``, ``spans``, ``errors``, ``seconds`` and ``spans_per_second``
+    """
+    payloads = [build_request(spans_per_request, agents, seed=seed).SerializeToString() for seed in range(8)]
+    counts = {"requests": 0, "spans": 0, "errors": 0}
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(_send(host, port, payloads, deadline, counts, spans_per_request)
+                           for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    return dict(counts, seconds=elapsed, spans_per_second=counts["spans"] / elapsed)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Send synthetic agent spans to an OTLP/HTTP receiver.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--spans-per-request", type=int, default=512)
+    parser.add_argument("--agents", type=int, default=100)
+    args = parser.parse_args(argv)
+    result = asyncio.run(generate_load(args.host, args.port, args.duration, args.connections,
+                                       args.spans_per_request, args.agents))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
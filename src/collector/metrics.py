@@ -1,82 +1,314 @@
 """Metrics collection for agent telemetry."""
 
+import logging
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Optional, Tuple, Union
+
 from opentelemetry import metrics
 from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+from opentelemetry.sdk.metrics.export import MetricExportResult, MetricReader, PeriodicExportingMetricReader
+from opentelemetry.sdk.metrics.view import ExponentialBucketHistogramAggregation, View
 from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
 from opentelemetry.sdk.resources import Resource
 
+from ..client.grpc_exporter import FailFastExportMixin
+from .aggregation import AttributeSet, CardinalityLimiter, MetricAggregator, intern_attributes
+from .sketch import LatencySketch, LatencySketches
+
+if TYPE_CHECKING:
+    from .shared import SharedMetricStore
+
+Attributes = Union[dict, AttributeSet, None]
+
+logger = logging.getLogger(__name__)
+
+# Cached (attribute set, error type or cache result) pairs of record_error
+# and record_cache
+_MAX_ERROR_SETS = 10_000
+
+
+class _FailFastOTLPMetricExporter(FailFastExportMixin, OTLPMetricExporter):
+    """OTLP metric exporter that makes a single attempt per export.
+
+    The stock exporter retries an unreachable endpoint for up to a minute,
+    stalling the reader thread and shutdown. Exported metrics are
+    cumulative, so the next successful export carries everything a failed
+    one held and there is nothing to retry or spill.
+    """
+
+    _success = MetricExportResult.SUCCESS
+    _failure = MetricExportResult.FAILURE
+
+
+class _FlushingMetricReader(PeriodicExportingMetricReader):
+    """Periodic reader that flushes pre-aggregated metrics before collecting."""
+
+    def __init__(self, exporter, on_collect: Callable[[], None], **kwargs):
+        # Set before the base class starts its export thread
+        self._on_collect = on_collect
+        super().__init__(exporter, **kwargs)
+
+    def collect(self, timeout_millis: float = 10_000) -> None:
+        self._on_collect()
+        super().collect(timeout_millis=timeout_millis)
+
 
 class AgentMetricsCollector:
     """Collect and export metrics for agent performance."""
-    
-    def __init__(self, service_name: str, endpoint: str = "http://localhost:4317"):
+
+    def __init__(self,
+                 service_name: str,
+                 endpoint: str = "http://localhost:4317",
+                 pre_aggregate: bool = True,
+                 metric_reader: Optional[MetricReader] = None,
+                 relative_accuracy: float = 0.01,
+                 shared_store: Optional["SharedMetricStore"] = None,
+                 cardinality_limiter: Optional[CardinalityLimiter] = None):
         """
         Initialize the metrics collector.
-        
+
         Args:
             service_name: Name of the service collecting metrics
             endpoint: OTLP endpoint for metrics export
+            pre_aggregate: Accumulate measurements per thread and hand
+                merged deltas to the SDK at export time
+            metric_reader: Optional reader replacing the periodic OTLP
+                reader. Call :meth:`flush` before collecting from it when
+                pre-aggregating.
+            relative_accuracy: Relative error of the local latency sketches
+            shared_store: Record into a store shared by worker processes
+                instead of exporting from this process; a single
+                :class:`SharedMetricsExporter` exports the merged totals
+            cardinality_limiter: Bounds the attribute sets of each
+                instrument; defaults to a limiter of 2000 sets per
+                instrument that keeps every attribute key
         """
         self.service_name = service_name
-        
+        self.cardinality_limiter = cardinality_limiter or CardinalityLimiter()
+        self._error_attributes: Dict[Optional[Tuple[AttributeSet, str]], AttributeSet] = {}
+        self._cache_attributes: Dict[Optional[Tuple[AttributeSet, str]], AttributeSet] = {}
+        self.latency_sketches = LatencySketches(relative_accuracy)
+        self.shared = shared_store.recorder() if shared_store is not None else None
+        if self.shared is not None:
+            # No provider, reader or export connection in worker processes
+            self.aggregator = None
+            self.meter_provider = None
+            return
+        self.aggregator = MetricAggregator() if pre_aggregate else None
+
         # Set up metrics pipeline
         resource = Resource.create({"service.name": service_name})
-        metric_reader = PeriodicExportingMetricReader(
-            OTLPMetricExporter(endpoint=endpoint)
+        if metric_reader is None:
+            metric_reader = _FlushingMetricReader(
+                _FailFastOTLPMetricExporter(endpoint=endpoint),
+                on_collect=self.flush,
+            )
+
+        # Export latencies as exponential histograms: fixed explicit bounds
+        # cannot resolve latencies from tens of milliseconds to minutes
+        latency_view = View(
+            instrument_name="agent.latency",
+            aggregation=ExponentialBucketHistogramAggregation(),
         )
-        
-        meter_provider = MeterProvider(resource=resource, metric_readers=[metric_reader])
+        meter_provider = MeterProvider(resource=resource,
+                                       metric_readers=[metric_reader],
+                                       views=[latency_view])
         metrics.set_meter_provider(meter_provider)
-        
-        self.meter = metrics.get_meter(__name__)
-        
+
+        self.meter_provider = meter_provider
+        self.meter = meter_provider.get_meter(__name__)
+
         # Create metrics
         self.token_counter = self.meter.create_counter(
             name="agent.tokens",
             description="Number of tokens processed by the agent",
             unit="tokens",
         )
-        
+
         self.latency_histogram = self.meter.create_histogram(
             name="agent.latency",
             description="Latency of agent operations",
             unit="ms",
         )
-        
+
         self.error_counter = self.meter.create_counter(
             name="agent.errors",
             description="Number of errors encountered by the agent",
         )
-        
-    def record_tokens(self, count: int, attributes: dict = None):
+
+        self.cache_counter = self.meter.create_counter(
+            name="agent.cache.lookups",
+            description="Response cache lookups by result",
+        )
+
+        self.cache_saved_counter = self.meter.create_counter(
+            name="agent.cache.saved",
+            description="Agent run latency saved by response cache hits",
+            unit="ms",
+        )
+
+    def attributes(self, attributes: dict) -> AttributeSet:
+        """
+        Intern an attribute dict for repeated recording.
+
+        Args:
+            attributes: Metric attributes
+
+        Returns:
+            A reusable attribute set accepted by the ``record_*`` methods
+        """
+        return intern_attributes(attributes)
+
+    def cardinality_report(self) -> Dict[str, Dict[str, object]]:
+        """
+        Report attribute sets folded or stripped by the cardinality limiter.
+
+        Returns:
+            Per instrument name, see :meth:`CardinalityLimiter.report`
+        """
+        return self.cardinality_limiter.report()
+
+    def record_tokens(self, count: int, attributes: Attributes = None):
         """
         Record token usage.
-        
+
         Args:
             count: Number of tokens to record
             attributes: Additional attributes for the metric
         """
-        self.token_counter.add(count, attributes or {})
-        
-    def record_latency(self, latency_ms: float, attributes: dict = None):
+        attribute_set = self.cardinality_limiter.limit("agent.tokens", attributes)
+        if self.shared is not None:
+            self.shared.add("agent.tokens", attribute_set, count)
+        elif self.aggregator is not None:
+            self.aggregator.add(self.token_counter, attribute_set, count)
+        else:
+            self.token_counter.add(count, attribute_set.attributes)
+
+    def record_latency(self, latency_ms: float, attributes: Attributes = None):
         """
         Record latency measurement.
-        
+
         Args:
             latency_ms: Latency in milliseconds
             attributes: Additional attributes for the metric
         """
-        self.latency_histogram.record(latency_ms, attributes or {})
-        
-    def record_error(self, error_type: str, attributes: dict = None):
+        attribute_set = self.cardinality_limiter.limit("agent.latency", attributes)
+        key = (self.service_name, attribute_set.attributes.get("agent.id"))
+        if self.aggregator is not None:
+            # Per-thread sketches, merged on flush or query
+            self.aggregator.sketch(self.latency_sketches, key, latency_ms)
+        else:
+            self.latency_sketches.add(*key, latency_ms)
+        if self.shared is not None:
+            self.shared.record("agent.latency", attribute_set, latency_ms)
+        elif self.aggregator is not None:
+            self.aggregator.record(self.latency_histogram, attribute_set, latency_ms)
+        else:
+            self.latency_histogram.record(latency_ms, attribute_set.attributes)
+
+    def record_error(self, error_type: str, attributes: Attributes = None):
         """
         Record an error occurrence.
-        
+
         Args:
             error_type: Type of error encountered
             attributes: Additional attributes for the metric
         """
-        attr = attributes or {}
-        attr["error.type"] = error_type
-        self.error_counter.add(1, attr)
+        # Interned callers reuse the extended set; dicts are limited each time
+        key = (attributes, error_type) if isinstance(attributes, AttributeSet) else None
+        attribute_set = self._error_attributes.get(key)
+        if attribute_set is None:
+            attribute_set = self.cardinality_limiter.limit("agent.errors", {**_as_dict(attributes),
+                                                                             "error.type": error_type})
+            # Overflowing sets are not cached so that they stay counted
+            if (key is not None and len(self._error_attributes) < _MAX_ERROR_SETS
+                    and self.cardinality_limiter.admitted("agent.errors", attribute_set)):
+                self._error_attributes[key] = attribute_set
+
+        if self.shared is not None:
+            self.shared.add("agent.errors", attribute_set, 1)
+        elif self.aggregator is not None:
+            self.aggregator.add(self.error_counter, attribute_set, 1)
+        else:
+            self.error_counter.add(1, attribute_set.attributes)
+
+    def record_cache(self, match: Optional[str], saved_ms: float = 0.0, attributes: Attributes = None):
+        """
+        Record a response cache lookup.
+
+        Args:
+            match: How the lookup hit, ``exact`` or ``semantic``, or None
+                for a miss
+            saved_ms: Run latency saved by a hit
+            attributes: Additional attributes for the metric
+        """
+        result = match or "miss"
+        key = (attributes, result) if isinstance(attributes, AttributeSet) else None
+        attribute_set = self._cache_attributes.get(key)
+        if attribute_set is None:
+            attribute_set = self.cardinality_limiter.limit("agent.cache.lookups", {**_as_dict(attributes),
+                                                                                    "cache.result": result})
+            if (key is not None and len(self._cache_attributes) < _MAX_ERROR_SETS
+                    and self.cardinality_limiter.admitted("agent.cache.lookups", attribute_set)):
+                self._cache_attributes[key] = attribute_set
+
+        if self.shared is not None:
+            self.shared.add("agent.cache.lookups", attribute_set, 1)
+        elif self.aggregator is not None:
+            self.aggregator.add(self.cache_counter, attribute_set, 1)
+        else:
+            self.cache_counter.add(1, attribute_set.attributes)
+        if match is None or saved_ms <= 0:
+            return
+
+        saved_set = self.cardinality_limiter.limit("agent.cache.saved", attributes)
+        if self.shared is not None:
+            self.shared.add("agent.cache.saved", saved_set, saved_ms)
+        elif self.aggregator is not None:
+            self.aggregator.add(self.cache_saved_counter, saved_set, saved_ms)
+        else:
+            self.cache_saved_counter.add(saved_ms, saved_set.attributes)
+
+    def latency_sketch(self, agent_id: Optional[str] = None) -> Optional[LatencySketch]:
+        """
+        Get the local latency sketch of an agent.
+
+        Args:
+            agent_id: The agent's ``agent.id`` attribute, or None for
+                latencies recorded without one
+
+        Returns:
+            The agent's sketch, or None if nothing was recorded
+        """
+        if self.aggregator is not None:
+            self.aggregator.merge_sketches()
+        return self.latency_sketches.get(self.service_name, agent_id)
+
+    def latency_quantiles(self,
+                          agent_id: Optional[str] = None,
+                          quantiles: Iterable[float] = (0.5, 0.95, 0.99)) -> Dict[float, Optional[float]]:
+        """
+        Query latency percentiles of an agent from its local sketch.
+
+        Args:
+            agent_id: The agent's ``agent.id`` attribute
+            quantiles: Quantiles between 0 and 1
+
+        Returns:
+            Mapping from quantile to latency in milliseconds, with None
+            values if nothing was recorded
+        """
+        if self.aggregator is not None:
+            self.aggregator.merge_sketches()
+        return self.latency_sketches.quantiles(self.service_name, agent_id, quantiles)
+
+    def flush(self):
+        """Hand all pre-aggregated measurements to the SDK instruments."""
+        if self.aggregator is not None:
+            self.aggregator.flush()
+
+
+def _as_dict(attributes: Attributes) -> dict:
+    """Return plain attributes for direct SDK calls."""
+    if isinstance(attributes, AttributeSet):
+        return attributes.attributes
+    return attributes or {}
@@ -0,0 +1,272 @@
+"""Merge agent run profiles and render them as speedscope or flame graphs.
+
+Profiles are folded stacks, one ``root;...;leaf count`` line per distinct
+stack, as written by the client's stack sampler to span attributes or
+files. Run ``python -m nexushive.collector.profiles --help`` for the
+command-line tool.
+"""
+
+import argparse
+import html
+import json
+import os
+import sys
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from ..client.profiling import PROFILE_ATTRIBUTE, PROFILE_PATH_ATTRIBUTE
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+FORMATS = ("folded", "speedscope", "svg")
+
+_ROW_HEIGHT = 16
+_MIN_WIDTH_PX = 0.5
+
+
+def parse_folded(lines: Iterable[str]) -> Dict[str, int]:
+    """
+    Parse folded stacks.
+
+    Args:
+        lines: ``root;...;leaf count`` lines; blank lines are skipped
+
+    Returns:
+        Sample count per folded stack
+    """
+    stacks: Dict[str, int] = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        stack, _, count = line.rpartition(" ")
+        if not stack:
+            raise ValueError(f"Not a folded stack line: {line!r}")
+        stacks[stack] = stacks.get(stack, 0) + int(count)
+    return stacks
+
+
+def load_folded(path: str) -> Dict[str, int]:
+    """
+    Load a folded stack file, or every ``.folded`` file in a directory.
+
+    Args:
+        path: File or directory
+
+    Returns:
+        Sample count per folded stack
+    """
+    if os.path.isdir(path):
+        return merge_profiles(load_folded(os.path.join(path, name))
+                              for name in sorted(os.listdir(path)) if name.endswith(".folded"))
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_folded(f)
+
+
+def merge_profiles(profiles: Iterable[Dict[str, int]]) -> Dict[str, int]:
+    """
+    Add up the samples of several profiles.
+
+    Args:
+        profiles: Sample counts per folded stack
+
+    Returns:
+        The summed counts
+    """
+    merged: Dict[str, int] = {}
+    for profile in profiles:
+        for stack, count in profile.items():
+            merged[stack] = merged.get(stack, 0) + count
+    return merged
+
+
+def profiles_from_spans(spans: Iterable[Any]) -> Dict[str, int]:
+    """
+    Merge the profiles of finished runs.
+
+    Args:
+        spans: SDK ``ReadableSpan`` objects; profiles are read from their
+            folded stack attribute or from the file their path attribute
+            names
+
+    Returns:
+        Sample count per folded stack over all runs
+    """
+    profiles = []
+    for span in spans:
+        attributes = span.attributes or {}
+        if PROFILE_ATTRIBUTE in attributes:
+            profiles.append(parse_folded(str(attributes[PROFILE_ATTRIBUTE]).splitlines()))
+        elif PROFILE_PATH_ATTRIBUTE in attributes and os.path.exists(attributes[PROFILE_PATH_ATTRIBUTE]):
+            profiles.append(load_folded(attributes[PROFILE_PATH_ATTRIBUTE]))
+    return merge_profiles(profiles)
+
+
+def to_folded(stacks: Dict[str, int]) -> str:
+    """
+    Render a profile as folded stacks, the input of flamegraph.pl.
+
+    Args:
+        stacks: Sample count per folded stack
+
+    Returns:
+        Lines sorted by stack, so that merged files diff cleanly
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def to_speedscope(stacks: Dict[str, int], name: str = "agent runs",
+                  interval_ms: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Render a profile in speedscope's file format.
+
+    Args:
+        stacks: Sample count per folded stack
+        name: Profile name shown by speedscope
+        interval_ms: Sampling interval; weights are then milliseconds
+            instead of sample counts
+
+    Returns:
+        A JSON-serializable sampled profile
+    """
+    frames: List[Dict[str, str]] = []
+    indexes: Dict[str, int] = {}
+    samples = []
+    weights = []
+    for stack, count in sorted(stacks.items()):
+        sample = []
+        for label in stack.split(";"):
+            index = indexes.get(label)
+            if index is None:
+                index = indexes[label] = len(frames)
+                frames.append(_speedscope_frame(label))
+            sample.append(index)
+        samples.append(sample)
+        weights.append(count * interval_ms if interval_ms is not None else count)
+    return {
+        "$schema": SPEEDSCOPE_SCHEMA,
+        "name": name,
+        "exporter": "nexushive",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds" if interval_ms is not None else "none",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+def _speedscope_frame(label: str) -> Dict[str, Any]:
+    """Split ``name (file.py:line)`` labels into speedscope frame fields."""
+    name, _, location = label.partition(" (")
+    file, _, line = location.rstrip(")").rpartition(":")
+    if file and line.isdigit():
+        return {"name": name, "file": file, "line": int(line)}
+    return {"name": label}
+
+
+class _Node:
+    """A frame in the merged call tree."""
+
+    __slots__ = ("total", "children")
+
+    def __init__(self):
+        self.total = 0
+        self.children: Dict[str, "_Node"] = {}
+
+
+def to_flamegraph_svg(stacks: Dict[str, int], title: str = "agent runs", width: int = 1200) -> str:
+    """
+    Render a profile as a static flame graph.
+
+    Args:
+        stacks: Sample count per folded stack
+        title: Heading of the graph
+        width: Width of the image in pixels
+
+    Returns:
+        An SVG document; hovering a frame shows its samples and share
+    """
+    root = _Node()
+    depth = 0
+    for stack, count in stacks.items():
+        node = root
+        node.total += count
+        labels = stack.split(";")
+        depth = max(depth, len(labels))
+        for label in labels:
+            node = node.children.setdefault(label, _Node())
+            node.total += count
+
+    total = max(root.total, 1)
+    scale = (width - 20) / total
+    top = 40
+    height = top + (depth + 1) * _ROW_HEIGHT + 10
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="11">',
+        f'<text x="{width / 2}" y="24" text-anchor="middle" font-size="16">{html.escape(title)}</text>',
+    ]
+
+    def draw(node: _Node, label: str, x: float, level: int):
+        rect_width = node.total * scale
+        if rect_width < _MIN_WIDTH_PX:
+            return
+        # Root at the bottom, as in flamegraph.pl
+        y = height - 10 - (level + 1) * _ROW_HEIGHT
+        share = 100.0 * node.total / total
+        tooltip = html.escape(f"{label} ({node.total} samples, {share:.2f}%)")
+        parts.append(f'<g><title>{tooltip}</title><rect x="{x:.1f}" y="{y}" width="{rect_width:.1f}" '
+                     f'height="{_ROW_HEIGHT - 1}" fill="{_color(label)}" rx="2"/>')
+        # Roughly 7 px per monospace character
+        chars = int(rect_width / 7) - 1
+        if chars >= 3:
+            text = label if len(label) <= chars else label[:chars - 2] + ".."
+            parts.append(f'<text x="{x + 3:.1f}" y="{y + _ROW_HEIGHT - 4}">{html.escape(text)}</text>')
+        parts.append("</g>")
+        for child_label, child in sorted(node.children.items()):
+            draw(child, child_label, x, level + 1)
+            x += child.total * scale
+
+    draw(root, "all", 10.0, 0)
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def _color(label: str) -> str:
+    """Warm color derived from the frame name, stable across renders."""
+    hashed = zlib.crc32(label.partition(" (")[0].encode("utf-8"))
+    return f"rgb({205 + hashed % 50},{(hashed >> 8) % 180 + 50},{(hashed >> 16) % 55})"
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Merge agent run profiles and render them.")
+    parser.add_argument("inputs", nargs="+", help="folded stack files or directories of them")
+    parser.add_argument("--format", choices=FORMATS, default="speedscope")
+    parser.add_argument("--output", "-o", help="output file; standard output by default")
+    parser.add_argument("--title", default="agent runs")
+    parser.add_argument("--interval-ms", type=float, help="sampling interval, to weight speedscope samples by time")
+    args = parser.parse_args(argv)
+
+    stacks = merge_profiles(load_folded(path) for path in args.inputs)
+    if args.format == "folded":
+        rendered = to_folded(stacks)
+    elif args.format == "speedscope":
+        rendered = json.dumps(to_speedscope(stacks, args.title, args.interval_ms))
+    else:
+        rendered = to_flamegraph_svg(stacks, args.title)
+
+    if args.output is None:
+        sys.stdout.write(rendered)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(rendered)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""Local asyncio OTLP receiver feeding rolling-window aggregates.
+
+The receiver accepts OTLP over HTTP (``/v1/traces`` and ``/v1/metrics``,
+protobuf or JSON, optionally gzipped) and, when a gRPC port is given, over
+gRPC. Finished ``agent.run`` spans and the agent metrics exported by
+:class:`AgentMetricsCollector` are folded into :class:`RollingWindows` as
+they arrive; spans and metrics go to separate windows so a service sending
+both is not counted twice. ``GET /v1/windows?seconds=60`` returns the
+current per-agent windows as JSON for dashboards. With a
+:class:`CostLedger`, runs are also priced and ``GET /v1/costs`` returns
+spend grouped by agent, service, model or time bucket.
+"""
+
+import asyncio
+import gzip
+import json
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from google.protobuf import json_format
+from google.protobuf.message import DecodeError
+from opentelemetry.proto.collector.metrics.v1 import metrics_service_pb2
+from opentelemetry.proto.collector.trace.v1 import trace_service_pb2
+from opentelemetry.proto.metrics.v1 import metrics_pb2
+from opentelemetry.proto.trace.v1 import trace_pb2
+
+from ..client.caching import CACHE_HIT_ATTRIBUTE
+from .costs import MODEL_ATTRIBUTE, CostLedger
+from .sketch import LatencySketch
+from .windows import RollingWindows
+
+_STATUS_ERROR = trace_pb2.Status.STATUS_CODE_ERROR
+_CUMULATIVE = metrics_pb2.AGGREGATION_TEMPORALITY_CUMULATIVE
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 415: "Unsupported Media Type"}
+
+
+def _number(value) -> float:
+    """Numeric value of an OTLP ``AnyValue``."""
+    return value.double_value if value.WhichOneof("value") == "double_value" else value.int_value
+
+
+def _attribute_key(attributes) -> Tuple[Tuple[str, bytes], ...]:
+    return tuple(sorted((kv.key, kv.value.SerializeToString()) for kv in attributes))
+
+
+class OTLPReceiver:
+    """Receive OTLP spans and metrics and keep rolling-window aggregates."""
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 http_port: Optional[int] = 4318,
+                 grpc_port: Optional[int] = None,
+                 span_windows: Optional[RollingWindows] = None,
+                 metric_windows: Optional[RollingWindows] = None,
+                 span_names: Optional[Iterable[str]] = ("agent.run",),
+                 max_body_bytes: int = 32 * 1024 * 1024,
+                 cost_ledger: Optional[CostLedger] = None):
+        """
+        Initialize the receiver.
+
+        Args:
+            host: Interface to listen on
+            http_port: Port of the OTLP/HTTP listener, 0 for any free port,
+                or None to disable it
+            grpc_port: Port of the OTLP/gRPC listener, 0 for any free port,
+                or None to disable it
+            span_windows: Windows fed by spans; defaults to one-second
+                buckets over fifteen minutes
+            metric_windows: Windows fed by agent metrics
+            span_names: Names of the spans counted as runs, or None for all
+            max_body_bytes: Largest accepted HTTP request body
+            cost_ledger: Optional ledger the spend of received runs is
+                added to
+        """
+        self.host = host
+        self.http_port = http_port
+        self.grpc_port = grpc_port
+        self.span_windows = span_windows or RollingWindows()
+        self.metric_windows = metric_windows or RollingWindows()
+        self.span_names = frozenset(span_names) if span_names is not None else None
+        self.max_body_bytes = max_body_bytes
+        self.cost_ledger = cost_ledger
+        self.requests = 0
+        self.bad_requests = 0
+        self.spans_received = 0
+        self.spans_accepted = 0
+        self.points_received = 0
+        # Last cumulative value and arrival time per metric stream, to turn
+        # exports into deltas; ordered from least to most recently seen
+        self._cumulative: Dict[tuple, Tuple[object, int]] = {}
+        # Streams starting before this may have been seen and forgotten
+        self._started_ns = time.time_ns()
+        self._http_server: Optional[asyncio.AbstractServer] = None
+        self._grpc_server = None
+
+    async def __aenter__(self) -> "OTLPReceiver":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def start(self):
+        """Start listening; the bound ports replace any port 0."""
+        if self.http_port is not None:
+            self._http_server = await asyncio.start_server(self._serve_http, self.host, self.http_port)
+            self.http_port = self._http_server.sockets[0].getsockname()[1]
+        if self.grpc_port is not None:
+            self._grpc_server = self._make_grpc_server()
+            self.grpc_port = self._grpc_server.add_insecure_port(f"{self.host}:{self.grpc_port}")
+            await self._grpc_server.start()
+
+    async def stop(self):
+        """Stop listening and close open connections."""
+        if self._http_server is not None:
+            self._http_server.close()
+            await self._http_server.wait_closed()
+            self._http_server = None
+        if self._grpc_server is not None:
+            await self._grpc_server.stop(grace=1.0)
+            self._grpc_server = None
+
+    async def serve_forever(self):
+        """Start and serve until cancelled."""
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+    def ingest_traces(self, request: trace_service_pb2.ExportTraceServiceRequest) -> int:
+        """
+        Add the runs in an OTLP trace export to the span windows.
+
+        Args:
+            request: Decoded export request
+
+        Returns:
+            Number of spans added
+        """
+        names = self.span_names
+        runs = []
+        priced = [] if self.cost_ledger is not None else None
+        received = 0
+        for resource_spans in request.resource_spans:
+            if priced is not None:
+                service_name = next((kv.value.string_value for kv in resource_spans.resource.attributes
+                                     if kv.key == "service.name"), "")
+            for scope_spans in resource_spans.scope_spans:
+                received += len(scope_spans.spans)
+                for span in scope_spans.spans:
+                    if names is not None and span.name not in names:
+                        continue
+                    agent_id = model = ""
+                    latency_ms = None
+                    tokens_input = tokens_output = 0
+                    error = span.status.code == _STATUS_ERROR
+                    cached = False
+                    for attribute in span.attributes:
+                        key = attribute.key
+                        if key == "agent.id":
+                            agent_id = attribute.value.string_value
+                        elif key == "agent.latency_ms":
+                            latency_ms = _number(attribute.value)
+                        elif key == "agent.tokens.input":
+                            tokens_input = int(_number(attribute.value))
+                        elif key == "agent.tokens.output":
+                            tokens_output = int(_number(attribute.value))
+                        elif key == "agent.error":
+                            error = True
+                        elif key == MODEL_ATTRIBUTE:
+                            model = attribute.value.string_value
+                        elif key == CACHE_HIT_ATTRIBUTE:
+                            cached = attribute.value.bool_value
+                    end_time = span.end_time_unix_nano
+                    if latency_ms is None:
+                        latency_ms = (end_time - span.start_time_unix_nano) / 1e6
+                    runs.append((agent_id, end_time, latency_ms, tokens_input, tokens_output, error))
+                    if priced is not None:
+                        # Runs answered from the response cache used no model tokens
+                        if cached:
+                            priced.append((agent_id, service_name, model, 0, 0, end_time))
+                        else:
+                            priced.append((agent_id, service_name, model, tokens_input, tokens_output, end_time))
+        accepted = self.span_windows.add_many(runs)
+        if priced:
+            self.cost_ledger.add_many(priced)
+        self.spans_received += received
+        self.spans_accepted += accepted
+        return accepted
+
+    def ingest_metrics(self, request: metrics_service_pb2.ExportMetricsServiceRequest) -> int:
+        """
+        Add agent token, error and latency metrics to the metric windows.
+
+        Cumulative streams are converted to deltas against the previous
+        export of the same stream.
+
+        Args:
+            request: Decoded export request
+
+        Returns:
+            Number of data points added
+        """
+        self._forget_idle_streams()
+        added = 0
+        for resource_metrics in request.resource_metrics:
+            for scope_metrics in resource_metrics.scope_metrics:
+                for metric in scope_metrics.metrics:
+                    kind = metric.WhichOneof("data")
+                    if metric.name in ("agent.tokens", "agent.errors") and kind == "sum":
+                        cumulative = metric.sum.aggregation_temporality == _CUMULATIVE
+                        for point in metric.sum.data_points:
+                            added += self._add_count(metric.name, point, cumulative)
+                    elif metric.name == "agent.latency" and kind == "exponential_histogram":
+                        histogram = metric.exponential_histogram
+                        cumulative = histogram.aggregation_temporality == _CUMULATIVE
+                        for point in histogram.data_points:
+                            added += self._add_latency(point, cumulative)
+        self.points_received += added
+        return added
+
+    def _delta(self, name: str, point, value, cumulative: bool):
+        """Delta of a data point's value, or None for a stream's first cumulative point."""
+        if not cumulative:
+            return value
+        key = (name, point.start_time_unix_nano, _attribute_key(point.attributes))
+        previous, _ = self._cumulative.pop(key, (None, 0))
+        self._cumulative[key] = (value, time.time_ns())
+        if previous is None:
+            # A stream starting now carries everything since its start time
+            return value if point.start_time_unix_nano >= self._started_ns else None
+        if isinstance(value, LatencySketch):
+            return value.since(previous)
+        return value - previous
+
+    def _forget_idle_streams(self):
+        """Drop cumulative streams not exported to for longer than the metric windows reach."""
+        cutoff = time.time_ns() - int(self.metric_windows.horizon_seconds * 1e9)
+        cumulative = self._cumulative
+        while cumulative:
+            key = next(iter(cumulative))
+            seen_ns = cumulative[key][1]
+            if seen_ns >= cutoff:
+                break
+            del cumulative[key]
+            # Should the stream come back, its first point is not mistaken
+            # for everything since its start
+            self._started_ns = max(self._started_ns, seen_ns + 1)
+
+    def _add_count(self, name: str, point, cumulative: bool) -> int:
+        value = point.as_double if point.WhichOneof("value") == "as_double" else point.as_int
+        delta = self._delta(name, point, value, cumulative)
+        if not delta:
+            return 0
+        attributes = {kv.key: kv.value for kv in point.attributes}
+        agent_id = attributes["agent.id"].string_value if "agent.id" in attributes else ""
+        if name == "agent.errors":
+            return self.metric_windows.add_counts(agent_id, point.time_unix_nano, errors=int(delta))
+        output = "token.type" in attributes and attributes["token.type"].string_value == "output"
+        return self.metric_windows.add_counts(agent_id, point.time_unix_nano,
+                                              tokens_input=0 if output else int(delta),
+                                              tokens_output=int(delta) if output else 0)
+
+    def _add_latency(self, point, cumulative: bool) -> int:
+        sketch = LatencySketch.from_buckets(
+            point.scale, point.positive.offset, point.positive.bucket_counts, point.zero_count,
+            point.sum, point.min if point.HasField("min") else float("inf"),
+            point.max if point.HasField("max") else float("-inf"))
+        delta = self._delta("agent.latency", point, sketch, cumulative)
+        if delta is None or not delta.count:
+            return 0
+        agent_id = next((kv.value.string_value for kv in point.attributes if kv.key == "agent.id"), "")
+        return self.metric_windows.add_counts(agent_id, point.time_unix_nano, count=delta.count, latency=delta)
+
+    def windows(self, seconds: float, source: str = "spans") -> Dict[str, Dict[str, float]]:
+        """
+        Current per-agent statistics over the last ``seconds``.
+
+        Args:
+            seconds: Window length
+            source: ``"spans"`` or ``"metrics"``
+
+        Returns:
+            Mapping from agent id to window statistics
+        """
+        if source not in ("spans", "metrics"):
+            raise ValueError("source must be 'spans' or 'metrics'")
+        windows = self.span_windows if source == "spans" else self.metric_windows
+        return windows.snapshot(seconds)
+
+    def costs(self, by: Iterable[str] = ("agent_id",), seconds: Optional[float] = None) -> List[Dict[str, object]]:
+        """
+        Spend of the received runs.
+
+        Args:
+            by: Ledger keys to group by: ``agent_id``, ``service_name``,
+                ``model`` or ``bucket``
+            seconds: Only count buckets starting within the last
+                ``seconds``; None for all
+
+        Returns:
+            One dict per group with its key values and totals
+        """
+        if self.cost_ledger is None:
+            raise ValueError("the receiver has no cost ledger")
+        by = tuple(by)
+        start_ns = None if seconds is None else time.time_ns() - int(seconds * 1e9)
+        return [dict(zip(by, group), **totals)
+                for group, totals in sorted(self.cost_ledger.spend(by, start_ns).items())]
+
+    async def _serve_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve HTTP/1.1 requests on one keep-alive connection."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    return
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = request_line.split(" ", 2)
+                headers = {}
+                for line in header_lines:
+                    if line:
+                        name, _, value = line.partition(":")
+                        headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body_bytes:
+                    await self._respond(writer, 413, b"", close=True)
+                    return
+                body = await reader.readexactly(length) if length else b""
+                status, content_type, payload = self._handle(method, target, headers, body)
+                close = headers.get("connection", "").lower() == "close"
+                await self._respond(writer, status, payload, content_type, close)
+                if close:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            return
+        finally:
+            writer.close()
+
+    def _handle(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Tuple[int, str, bytes]:
+        """Route one HTTP request; returns status, content type and body."""
+        url = urlsplit(target)
+        if url.path == "/v1/windows":
+            if method != "GET":
+                return 405, "text/plain", b""
+            query = parse_qs(url.query)
+            try:
+                result = self.windows(float(query.get("seconds", ["60"])[0]), query.get("source", ["spans"])[0])
+            except ValueError as e:
+                return 400, "text/plain", str(e).encode()
+            return 200, "application/json", json.dumps(result).encode()
+        if url.path == "/v1/costs":
+            if method != "GET":
+                return 405, "text/plain", b""
+            query = parse_qs(url.query)
+            try:
+                seconds = query.get("seconds")
+                result = self.costs(query.get("by", ["agent_id"])[0].split(","),
+                                    float(seconds[0]) if seconds else None)
+            except ValueError as e:
+                return 400, "text/plain", str(e).encode()
+            return 200, "application/json", json.dumps(result).encode()
+
+        routes = {
+            "/v1/traces": (trace_service_pb2.ExportTraceServiceRequest, self.ingest_traces,
+                           trace_service_pb2.ExportTraceServiceResponse),
+            "/v1/metrics": (metrics_service_pb2.ExportMetricsServiceRequest, self.ingest_metrics,
+                            metrics_service_pb2.ExportMetricsServiceResponse),
+        }
+        if url.path not in routes:
+            return 404, "text/plain", b""
+        if method != "POST":
+            return 405, "text/plain", b""
+        request_type, ingest, response_type = routes[url.path]
+
+        self.requests += 1
+        content_type = headers.get("content-type", "application/x-protobuf").split(";")[0]
+        try:
+            if headers.get("content-encoding") == "gzip":
+                body = gzip.decompress(body)
+            if content_type == "application/json":
+                request = json_format.Parse(body, request_type(), ignore_unknown_fields=True)
+            elif content_type == "application/x-protobuf":
+                request = request_type.FromString(body)
+            else:
+                self.bad_requests += 1
+                return 415, "text/plain", b""
+        except (DecodeError, json_format.ParseError, OSError, EOFError) as e:
+            self.bad_requests += 1
+            return 400, "text/plain", str(e).encode()
+
+        ingest(request)
+        if content_type == "application/json":
+            return 200, "application/json", b"{}"
+        return 200, "application/x-protobuf", response_type().SerializeToString()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, body: bytes,
+                       content_type: str = "text/plain", close: bool = False):
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                + ("Connection: close\r\n" if close else "")
+                + "\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    def _make_grpc_server(self):
+        """gRPC server for the OTLP trace and metrics services."""
+        # Imported here so HTTP-only receivers do not load grpc
+        import grpc
+        from opentelemetry.proto.collector.metrics.v1 import metrics_service_pb2_grpc
+        from opentelemetry.proto.collector.trace.v1 import trace_service_pb2_grpc
+
+        receiver = self
+
+        class TraceService(trace_service_pb2_grpc.TraceServiceServicer):
+            async def Export(self, request, context):
+                receiver.requests += 1
+                receiver.ingest_traces(request)
+                return trace_service_pb2.ExportTraceServiceResponse()
+
+        class MetricsService(metrics_service_pb2_grpc.MetricsServiceServicer):
+            async def Export(self, request, context):
+                receiver.requests += 1
+                receiver.ingest_metrics(request)
+                return metrics_service_pb2.ExportMetricsServiceResponse()
+
+        server = grpc.aio.server(options=[("grpc.max_receive_message_length", self.max_body_bytes)])
+        trace_service_pb2_grpc.add_TraceServiceServicer_to_server(TraceService(), server)
+        metrics_service_pb2_grpc.add_MetricsServiceServicer_to_server(MetricsService(), server)
+        return server
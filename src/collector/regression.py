@@ -0,0 +1,283 @@
+"""Regression comparison of two agent versions on the same questions.
+
+Both versions answer the same questions, so every metric is compared on
+paired per-question values: each bootstrap resample draws one set of
+questions and evaluates both versions on it. A block of resamples is one
+matrix of drawn question indices: the delta of means is the mean of the
+drawn per-question differences, and a quantile is a partition of the drawn
+ranks of values sorted once, with no Python loop over resamples.
+"""
+
+import json
+import math
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from .evaluation import BenchmarkEvaluator
+from .executors import Executor
+
+REPORT_SCHEMA = 1
+
+# Metric name, per-question value, statistic and whether higher is better
+METRICS = (
+    ("accuracy", "correct", "mean", True),
+    ("latency_p50_ms", "latency_ms", 0.5, False),
+    ("latency_p95_ms", "latency_ms", 0.95, False),
+    ("tokens", "tokens", "mean", False),
+)
+
+# Largest resample matrix built at once, in cells
+_CHUNK_CELLS = 1 << 22
+
+
+def _statistic(values: np.ndarray, statistic: Union[str, float]) -> float:
+    if statistic == "mean":
+        return float(values.mean())
+    return float(np.quantile(values, statistic, method="inverted_cdf"))
+
+
+def _ranks(values: np.ndarray) -> np.ndarray:
+    """Rank of each value in ascending order, as int32 for cheap partitions."""
+    ranks = np.empty(values.shape[0], dtype=np.int32)
+    ranks[np.argsort(values, kind="stable")] = np.arange(values.shape[0], dtype=np.int32)
+    return ranks
+
+
+def _resampled_quantile(draws: np.ndarray, values: np.ndarray, ranks: np.ndarray, q: float) -> np.ndarray:
+    """Inverted-CDF quantile of each row of drawn question indices."""
+    # The quantile is the k-th smallest draw; partitioning integer ranks is
+    # cheaper than partitioning the values and maps back through a sort
+    k = max(1, math.ceil(q * draws.shape[1])) - 1
+    drawn = np.partition(ranks[draws], k, axis=1)[:, k]
+    return np.sort(values)[drawn]
+
+
+def paired_bootstrap(base: Iterable[float],
+                     new: Iterable[float],
+                     statistic: Union[str, float] = "mean",
+                     resamples: int = 10_000,
+                     confidence: float = 0.95,
+                     seed: Optional[int] = 0) -> Dict[str, Any]:
+    """
+    Bootstrap the difference of a statistic between paired samples.
+
+    Args:
+        base: Per-question values of the reference version
+        new: Per-question values of the version under test, in the same order
+        statistic: ``"mean"`` or a quantile between 0 and 1
+        resamples: Number of bootstrap resamples
+        confidence: Coverage of the percentile confidence interval
+        seed: Seed of the resampling, for reproducible reports
+
+    Returns:
+        Dictionary with both observed statistics, their ``delta`` (new
+        minus base), the interval ``ci_low`` and ``ci_high`` of the delta,
+        the two-sided ``p_value`` of no difference and the number of
+        paired ``samples``; statistics are None without samples
+    """
+    base = np.asarray(base, dtype=np.float64)
+    new = np.asarray(new, dtype=np.float64)
+    if base.shape != new.shape or base.ndim != 1:
+        raise ValueError("base and new must be paired one-dimensional samples")
+    if statistic != "mean" and not 0.0 <= statistic <= 1.0:
+        raise ValueError("statistic must be 'mean' or a quantile between 0 and 1")
+    if resamples < 1 or not 0.0 < confidence < 1.0:
+        raise ValueError("resamples must be positive and confidence between 0 and 1")
+
+    n = base.shape[0]
+    if n == 0:
+        return {"base": None, "new": None, "delta": None, "ci_low": None, "ci_high": None,
+                "p_value": None, "samples": 0}
+
+    observed = _statistic(new, statistic) - _statistic(base, statistic)
+    rng = np.random.default_rng(seed)
+    if statistic == "mean":
+        differences = new - base
+    else:
+        base_ranks, new_ranks = _ranks(base), _ranks(new)
+    deltas = np.empty(resamples)
+    chunk = max(1, _CHUNK_CELLS // n)
+    for start in range(0, resamples, chunk):
+        rows = min(chunk, resamples - start)
+        draws = rng.integers(0, n, size=(rows, n), dtype=np.int32)
+        if statistic == "mean":
+            deltas[start:start + rows] = differences[draws].mean(axis=1)
+        else:
+            deltas[start:start + rows] = (_resampled_quantile(draws, new, new_ranks, statistic)
+                                          - _resampled_quantile(draws, base, base_ranks, statistic))
+
+    alpha = 1.0 - confidence
+    ci_low, ci_high = np.quantile(deltas, (alpha / 2, 1.0 - alpha / 2))
+    # The centred bootstrap distribution approximates the delta under no
+    # difference; count resamples at least as far from it as observed
+    extreme = np.count_nonzero(np.abs(deltas - observed) >= abs(observed) - 1e-12)
+    return {
+        "base": _statistic(base, statistic),
+        "new": _statistic(new, statistic),
+        "delta": observed,
+        "ci_low": float(ci_low),
+        "ci_high": float(ci_high),
+        "p_value": float(extreme + 1) / (resamples + 1),
+        "samples": n,
+    }
+
+
+class RegressionHarness:
+    """Compare two agent versions on a question set with bootstrap statistics."""
+
+    def __init__(self,
+                 questions: Iterable[Dict[str, Any]],
+                 executor: Optional[Executor] = None,
+                 resamples: int = 10_000,
+                 confidence: float = 0.95,
+                 seed: Optional[int] = 0,
+                 token_counter: Any = None,
+                 timeout: Optional[float] = None,
+                 retries: int = 0):
+        """
+        Initialize the harness.
+
+        Args:
+            questions: Dicts with ``question`` and ``answer`` fields and an
+                optional ``id``, answered by both versions
+            executor: Execution backend; defaults to a thread pool
+            resamples: Number of bootstrap resamples per metric
+            confidence: Confidence of the intervals; a change is significant
+                when its p-value is below one minus this
+            seed: Seed of the resampling
+            token_counter: Counter for the tokens of each answer; defaults
+                to the client's default counter
+            timeout: Seconds allowed per attempt, or None for no limit
+            retries: Extra attempts per question after a failure or timeout
+        """
+        self.questions = list(questions)
+        self.executor = executor
+        self.resamples = resamples
+        self.confidence = confidence
+        self.seed = seed
+        if token_counter is None:
+            from ..client.tokenization import default_token_counter
+            token_counter = default_token_counter()
+        self.token_counter = token_counter
+        self.timeout = timeout
+        self.retries = retries
+
+    def run(self, agent: Any) -> List[Dict[str, Any]]:
+        """
+        Answer every question with one agent.
+
+        Args:
+            agent: The agent; ``agent.run(question)`` may be sync or async
+
+        Returns:
+            Scored per-question results in question order, each with the
+            ``tokens`` of its answer
+        """
+        evaluator = BenchmarkEvaluator()
+        report = evaluator.evaluate_agent(agent, self.executor, timeout=self.timeout, retries=self.retries,
+                                          questions=self.questions)
+        results = report["results"]
+        for result in results:
+            prediction = result["prediction"]
+            result["tokens"] = self.token_counter.count(str(prediction)) if prediction is not None else 0
+        return results
+
+    def compare(self,
+                base_agent: Any,
+                new_agent: Any,
+                base_version: str = "base",
+                new_version: str = "new") -> Dict[str, Any]:
+        """
+        Run both agents and compare them.
+
+        Args:
+            base_agent: Reference agent
+            new_agent: Agent under test
+            base_version: Name of the reference version in the report
+            new_version: Name of the version under test in the report
+
+        Returns:
+            The report from :meth:`compare_results`
+        """
+        return self.compare_results(self.run(base_agent), self.run(new_agent), base_version, new_version)
+
+    def compare_results(self,
+                        base_results: List[Dict[str, Any]],
+                        new_results: List[Dict[str, Any]],
+                        base_version: str = "base",
+                        new_version: str = "new") -> Dict[str, Any]:
+        """
+        Compare per-question results of two versions.
+
+        Results are paired by question ``id``. Accuracy and tokens cover
+        every shared question; latencies cover those both versions answered
+        without error.
+
+        Args:
+            base_results: Results of the reference version
+            new_results: Results of the version under test
+            base_version: Name of the reference version in the report
+            new_version: Name of the version under test in the report
+
+        Returns:
+            A JSON-serializable report with per-metric statistics, the
+            ``regressions`` and ``improvements`` that are significant, and
+            ``passed``, which is false if any metric regressed
+        """
+        new_by_id = {str(result["id"]): result for result in new_results}
+        pairs = [(base, new_by_id[str(base["id"])]) for base in base_results if str(base["id"]) in new_by_id]
+
+        alpha = 1.0 - self.confidence
+        metrics = {}
+        regressions = []
+        improvements = []
+        for name, field, statistic, higher_is_better in METRICS:
+            paired = [(base[field], new[field]) for base, new in pairs
+                      if base.get(field) is not None and new.get(field) is not None]
+            base_values = [float(value) for value, _ in paired]
+            new_values = [float(value) for _, value in paired]
+            result = paired_bootstrap(base_values, new_values, statistic, self.resamples, self.confidence,
+                                      self.seed)
+            verdict = "unchanged"
+            if result["p_value"] is not None and result["p_value"] < alpha and result["delta"] != 0:
+                better = (result["delta"] > 0) == higher_is_better
+                verdict = "improved" if better else "regressed"
+                (improvements if better else regressions).append(name)
+            result["higher_is_better"] = higher_is_better
+            result["significant"] = verdict != "unchanged"
+            result["verdict"] = verdict
+            metrics[name] = result
+
+        return {
+            "schema": REPORT_SCHEMA,
+            "base_version": base_version,
+            "new_version": new_version,
+            "questions": len(pairs),
+            "resamples": self.resamples,
+            "confidence": self.confidence,
+            "seed": self.seed,
+            "errors": {
+                "base": sum(base["error"] is not None for base, _ in pairs),
+                "new": sum(new["error"] is not None for _, new in pairs),
+            },
+            "metrics": metrics,
+            "fixed": [new["id"] for base, new in pairs if new["correct"] and not base["correct"]],
+            "regressed": [new["id"] for base, new in pairs if base["correct"] and not new["correct"]],
+            "regressions": regressions,
+            "improvements": improvements,
+            "passed": not regressions,
+        }
+
+
+def write_report(report: Dict[str, Any], path: str):
+    """
+    Save a comparison report as JSON, for release gating.
+
+    Args:
+        report: Report from :meth:`RegressionHarness.compare`
+        path: File to write
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
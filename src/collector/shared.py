@@ -0,0 +1,562 @@
+"""Shared-memory metric store for multi-process agent workers.
+
+Worker processes (gunicorn or multiprocessing workers) record counters
+and latency histograms into one shared-memory segment instead of running
+a MeterProvider each; a single exporter reads the merged totals and sends
+them over one OTLP connection, however many workers there are.
+
+The store is a file in ``/dev/shm`` mapped into every process. It holds one row of values per worker. A worker only ever writes
+its own row, so recording needs no lock: it is a dict lookup and an add
+into a typed memoryview. A file lock is only taken to register a new
+series or claim a row. Rows of workers that exited are folded into a
+shared retired row, so their counts stay in the cumulative totals.
+Histograms use fixed exponential buckets, the layout of
+:class:`LatencySketch`, so the exporter sends them as exponential
+histograms.
+"""
+
+import fcntl
+import hashlib
+import json
+import math
+import mmap
+import os
+import secrets
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from opentelemetry.sdk.metrics.export import (
+    AggregationTemporality,
+    ExponentialHistogram,
+    Metric,
+    MetricExporter,
+    MetricsData,
+    NumberDataPoint,
+    ResourceMetrics,
+    ScopeMetrics,
+    Sum,
+)
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.util.instrumentation import InstrumentationScope
+
+from .aggregation import AttributeSet, intern_attributes
+from .sketch import LatencySketch
+
+COUNTER = 1
+HISTOGRAM = 2
+
+_MAGIC = 0x4E58484D  # "NXHM"
+_HEADER_FIELDS = 16
+(_F_MAGIC, _F_WORKERS, _F_SERIES, _F_HISTOGRAMS, _F_BUCKETS, _F_SCALE, _F_LOW_INDEX,
+ _F_COUNTERS_USED, _F_HISTOGRAMS_USED, _F_DROPPED, _F_ARENA_USED, _F_START_NS) = range(12)
+_KEY_BYTES = 256
+_ENTRY_FIELDS = 5  # kind, digest, dense index, key offset, key length
+# Per histogram and row: count, sum, min, max, zero count
+_STATS = 5
+
+# Units and descriptions of the agent instruments, as AgentMetricsCollector creates them
+INSTRUMENTS = {
+    "agent.tokens": ("tokens", "Number of tokens processed by the agent"),
+    "agent.latency": ("ms", "Latency of agent operations"),
+    "agent.errors": ("", "Number of errors encountered by the agent"),
+}
+
+_recorders: "weakref.WeakSet[SharedMetricsRecorder]" = weakref.WeakSet()
+
+
+def _reset_recorders_after_fork():
+    # A forked child must not keep writing into its parent's row
+    for recorder in list(_recorders):
+        recorder._row = None
+
+
+os.register_at_fork(after_in_child=_reset_recorders_after_fork)
+
+
+class _Layout:
+    """Byte offsets of the regions of a store segment."""
+
+    def __init__(self, workers: int, series: int, histograms: int, buckets: int):
+        rows = workers + 1
+        self.table_size = 2 * (series + histograms)
+        offset = _HEADER_FIELDS * 8
+        self.pids = offset
+        offset += workers * 8
+        self.table = offset
+        offset += self.table_size * _ENTRY_FIELDS * 8
+        self.arena = offset
+        self.arena_size = (series + histograms) * _KEY_BYTES
+        offset += self.arena_size
+        self.counters = offset
+        offset += rows * series * 8
+        self.stats = offset
+        offset += rows * histograms * _STATS * 8
+        self.buckets = offset
+        offset += rows * histograms * buckets * 8
+        self.size = offset
+
+
+class SharedMetricStore:
+    """Counters and histograms shared by worker processes.
+
+    Create the store in the parent (e.g. gunicorn's master) before workers
+    start, or attach to it by name from unrelated processes.
+    """
+
+    def __init__(self, name: Optional[str] = None, create: bool = True, max_workers: int = 64,
+                 max_series: int = 4096, max_histograms: int = 128, histogram_scale: int = 4,
+                 histogram_range: Tuple[float, float] = (0.01, 1e7)):
+        """
+        Create or attach to a store.
+
+        Args:
+            name: File name under ``/dev/shm``; a unique name is generated if None
+            create: Create the segment, or attach to an existing one
+            max_workers: Worker rows; rows of exited workers are reused
+            max_series: Distinct counter series (instrument and attributes)
+            max_histograms: Distinct histogram series
+            histogram_scale: Exponential bucket scale; 4 gives quantiles
+                within about 2%
+            histogram_range: Smallest and largest value resolved by the
+                buckets; values outside fall into the end buckets
+
+        Series beyond the limits are dropped and counted in :attr:`dropped_series`.
+        """
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        self.name = name or f"nexushive-metrics-{os.getpid()}-{secrets.token_hex(4)}"
+        self.path = os.path.join(directory, self.name)
+        if create:
+            low = math.ceil(math.log2(histogram_range[0]) * 2 ** histogram_scale) - 1
+            high = math.ceil(math.log2(histogram_range[1]) * 2 ** histogram_scale) - 1
+            buckets = high - low + 1
+            layout = _Layout(max_workers, max_series, max_histograms, buckets)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            # Sparse: pages are only allocated once written
+            os.ftruncate(self._fd, layout.size)
+            self._mmap = mmap.mmap(self._fd, layout.size)
+            header = memoryview(self._mmap)[:_HEADER_FIELDS * 8].cast("q")
+            header[_F_WORKERS] = max_workers
+            header[_F_SERIES] = max_series
+            header[_F_HISTOGRAMS] = max_histograms
+            header[_F_BUCKETS] = buckets
+            header[_F_SCALE] = histogram_scale
+            header[_F_LOW_INDEX] = low
+            header[_F_START_NS] = time.time_ns()
+            header[_F_MAGIC] = _MAGIC
+        else:
+            self._fd = os.open(self.path, os.O_RDWR)
+            self._mmap = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+            header = memoryview(self._mmap)[:_HEADER_FIELDS * 8].cast("q")
+            if header[_F_MAGIC] != _MAGIC:
+                raise ValueError(f"{self.path} is not a shared metric store")
+
+        self._header = header
+        self.max_workers = header[_F_WORKERS]
+        self.max_series = header[_F_SERIES]
+        self.max_histograms = header[_F_HISTOGRAMS]
+        self.buckets = header[_F_BUCKETS]
+        self.scale = header[_F_SCALE]
+        self.low_index = header[_F_LOW_INDEX]
+        self.start_time_ns = header[_F_START_NS]
+        self.layout = _Layout(self.max_workers, self.max_series, self.max_histograms, self.buckets)
+
+        buf, layout = memoryview(self._mmap), self.layout
+        self._pids = buf[layout.pids:layout.table].cast("q")
+        self._table = buf[layout.table:layout.arena].cast("q")
+        self._arena = buf[layout.arena:layout.counters]
+        self.counters = buf[layout.counters:layout.stats].cast("d")
+        self.stats = buf[layout.stats:layout.buckets].cast("d")
+        self.bucket_counts = buf[layout.buckets:layout.size].cast("q")
+        self._buf = buf
+        self._thread_lock = threading.Lock()
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedMetricStore":
+        """Attach to an existing store by name."""
+        return cls(name, create=False)
+
+    @property
+    def dropped_series(self) -> int:
+        """Series not recorded because the store was full."""
+        return self._header[_F_DROPPED]
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive access across processes, for registration and folding."""
+        # A fresh open file per acquisition, since forked processes share
+        # inherited descriptors and with them their flock
+        with self._thread_lock, open(self.path, "rb") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def recorder(self) -> "SharedMetricsRecorder":
+        """Recorder writing this process's measurements into the store."""
+        return SharedMetricsRecorder(self)
+
+    def register(self, kind: int, name: str, attributes: AttributeSet) -> int:
+        """
+        Find or add a series.
+
+        Args:
+            kind: ``COUNTER`` or ``HISTOGRAM``
+            name: Instrument name
+            attributes: Interned attribute set
+
+        Returns:
+            Dense index of the series among series of its kind, or -1 if
+            the store is full
+        """
+        key = json.dumps([kind, name, attributes.key], separators=(",", ":")).encode()
+        if len(key) > _KEY_BYTES:
+            raise ValueError(f"Attributes of {name} too long for the shared store")
+        digest = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little", signed=True)
+        table, size = self._table, self.layout.table_size
+        with self._locked():
+            slot = digest % size
+            while table[slot * _ENTRY_FIELDS]:
+                entry = slot * _ENTRY_FIELDS
+                if table[entry + 1] == digest and self._key(entry) == key:
+                    return table[entry + 2]
+                slot = (slot + 1) % size
+
+            used_field, limit = ((_F_COUNTERS_USED, self.max_series) if kind == COUNTER
+                                 else (_F_HISTOGRAMS_USED, self.max_histograms))
+            dense = self._header[used_field]
+            if dense >= limit:
+                self._header[_F_DROPPED] += 1
+                return -1
+            offset = self._header[_F_ARENA_USED]
+            self._arena[offset:offset + len(key)] = key
+            self._header[_F_ARENA_USED] = offset + len(key)
+            entry = slot * _ENTRY_FIELDS
+            table[entry + 1] = digest
+            table[entry + 2] = dense
+            table[entry + 3] = offset
+            table[entry + 4] = len(key)
+            table[entry] = kind
+            self._header[used_field] = dense + 1
+            return dense
+
+    def _key(self, entry: int) -> bytes:
+        offset, length = self._table[entry + 3], self._table[entry + 4]
+        return bytes(self._arena[offset:offset + length])
+
+    def claim_row(self) -> int:
+        """
+        Claim a worker row for the calling process.
+
+        Returns:
+            The row index
+
+        Raises:
+            RuntimeError: If every row belongs to a live process
+        """
+        pid = os.getpid()
+        with self._locked():
+            for row, owner in enumerate(self._pids):
+                if owner == pid:
+                    return row
+            self._retire_exited()
+            for row, owner in enumerate(self._pids):
+                if owner == 0:
+                    self._pids[row] = pid
+                    return row
+        raise RuntimeError(f"All {self.max_workers} worker rows of the shared metric store are in use")
+
+    def _retire_exited(self):
+        """Fold the rows of exited workers into the retired row; call locked."""
+        for row, pid in enumerate(self._pids):
+            if pid and not _alive(pid):
+                self._fold(row)
+                self._pids[row] = 0
+
+    def _fold(self, row: int):
+        retired = self.max_workers
+        series, histograms, buckets = self.max_series, self.max_histograms, self.buckets
+        counters, stats, counts = self.counters, self.stats, self.bucket_counts
+        for i in range(self._header[_F_COUNTERS_USED]):
+            value = counters[row * series + i]
+            if value:
+                counters[retired * series + i] += value
+                counters[row * series + i] = 0.0
+        for h in range(self._header[_F_HISTOGRAMS_USED]):
+            source = (row * histograms + h) * _STATS
+            if not stats[source]:
+                continue
+            _merge_stats(stats, (retired * histograms + h) * _STATS, stats, source)
+            stats[source:source + _STATS] = memoryview(bytes(_STATS * 8)).cast("d")
+            source = (row * histograms + h) * buckets
+            target = (retired * histograms + h) * buckets
+            for b in range(buckets):
+                if counts[source + b]:
+                    counts[target + b] += counts[source + b]
+                    counts[source + b] = 0
+
+    def series(self) -> List[Tuple[int, str, AttributeSet, int]]:
+        """All registered series as ``(kind, name, attributes, dense index)``."""
+        result = []
+        table = self._table
+        for slot in range(self.layout.table_size):
+            entry = slot * _ENTRY_FIELDS
+            if table[entry]:
+                kind, name, key = json.loads(self._key(entry))
+                attributes = {item[0]: tuple(item[1]) if isinstance(item[1], list) else item[1] for item in key}
+                result.append((kind, name, intern_attributes(attributes), table[entry + 2]))
+        return result
+
+    def totals(self) -> Tuple[Dict[Tuple[str, AttributeSet], float], Dict[Tuple[str, AttributeSet], LatencySketch]]:
+        """
+        Merge every row into cumulative totals.
+
+        Returns:
+            Counter totals and histogram sketches, keyed by instrument name
+            and attribute set
+        """
+        with self._locked():
+            self._retire_exited()
+            rows = [row for row, pid in enumerate(self._pids) if pid] + [self.max_workers]
+            counters: Dict[Tuple[str, AttributeSet], float] = {}
+            histograms: Dict[Tuple[str, AttributeSet], LatencySketch] = {}
+            for kind, name, attributes, index in self.series():
+                if kind == COUNTER:
+                    counters[(name, attributes)] = sum(self.counters[row * self.max_series + index] for row in rows)
+                else:
+                    sketch = self._sketch(index, rows)
+                    if sketch.count:
+                        histograms[(name, attributes)] = sketch
+            return counters, histograms
+
+    def _sketch(self, index: int, rows: List[int]) -> LatencySketch:
+        stats = [0.0, 0.0, 0.0, 0.0, 0.0]
+        counts = [0] * self.buckets
+        for row in rows:
+            position = (row * self.max_histograms + index) * _STATS
+            if not self.stats[position]:
+                continue
+            _merge_stats(stats, 0, self.stats, position)
+            start = (row * self.max_histograms + index) * self.buckets
+            counts = [a + b for a, b in zip(counts, self.bucket_counts[start:start + self.buckets])]
+        count, total, minimum, maximum, zero_count = stats
+        return LatencySketch.from_buckets(self.scale, self.low_index, counts, int(zero_count), total,
+                                          minimum if count else math.inf, maximum if count else -math.inf)
+
+    def close(self):
+        """Unmap the store; it stays available to other processes."""
+        for view in (self._header, self._pids, self._table, self._arena, self.counters, self.stats,
+                     self.bucket_counts, self._buf):
+            view.release()
+        self._mmap.close()
+        os.close(self._fd)
+
+    def unlink(self):
+        """Remove the store once every process is done with it."""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # An exited child keeps its pid until its parent reaps it
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as stat:
+            return stat.read().rsplit(b")", 1)[1].split()[0] != b"Z"
+    except OSError:
+        return True
+
+
+def _merge_stats(target, t: int, source, s: int):
+    """Merge histogram count, sum, min, max and zero count."""
+    if not target[t]:
+        target[t + 2] = source[s + 2]
+        target[t + 3] = source[s + 3]
+    else:
+        target[t + 2] = min(target[t + 2], source[s + 2])
+        target[t + 3] = max(target[t + 3], source[s + 3])
+    target[t] += source[s]
+    target[t + 1] += source[s + 1]
+    target[t + 4] += source[s + 4]
+
+
+class SharedMetricsRecorder:
+    """Records one process's measurements into its row of a store."""
+
+    def __init__(self, store: SharedMetricStore):
+        """
+        Initialize the recorder; its row is claimed on first use.
+
+        Args:
+            store: The shared store
+        """
+        self.store = store
+        self._row: Optional[int] = None
+        self._indexes: Dict[Tuple[int, str, AttributeSet], int] = {}
+        self._factor = 2.0 ** store.scale
+        # Threads of one worker share its row
+        self._lock = threading.Lock()
+        _recorders.add(self)
+
+    def _claim(self):
+        self._row = self.store.claim_row()
+
+    def _index(self, kind: int, name: str, attributes: AttributeSet) -> int:
+        key = (kind, name, attributes)
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = self.store.register(kind, name, attributes)
+        return index
+
+    def add(self, name: str, attributes: AttributeSet, amount: float):
+        """
+        Add to a counter.
+
+        Args:
+            name: Instrument name
+            attributes: Interned attribute set
+            amount: Amount to add
+        """
+        if self._row is None:
+            self._claim()
+        index = self._indexes.get((COUNTER, name, attributes))
+        if index is None:
+            index = self._index(COUNTER, name, attributes)
+        if index >= 0:
+            with self._lock:
+                self.store.counters[self._row * self.store.max_series + index] += amount
+
+    def record(self, name: str, attributes: AttributeSet, value: float):
+        """
+        Record a histogram value.
+
+        Args:
+            name: Instrument name
+            attributes: Interned attribute set
+            value: The value, e.g. a latency in milliseconds
+        """
+        if self._row is None:
+            self._claim()
+        index = self._indexes.get((HISTOGRAM, name, attributes))
+        if index is None:
+            index = self._index(HISTOGRAM, name, attributes)
+        if index < 0:
+            return
+        store = self.store
+        series = self._row * store.max_histograms + index
+        if value > 0.0:
+            bucket = math.ceil(math.log2(value) * self._factor) - 1 - store.low_index
+            bucket = series * store.buckets + (0 if bucket < 0 else min(bucket, store.buckets - 1))
+        else:
+            bucket = -1
+        stats = store.stats
+        position = series * _STATS
+        with self._lock:
+            if stats[position]:
+                if value < stats[position + 2]:
+                    stats[position + 2] = value
+                if value > stats[position + 3]:
+                    stats[position + 3] = value
+            else:
+                stats[position + 2] = stats[position + 3] = value
+            stats[position] += 1
+            stats[position + 1] += value
+            if bucket < 0:
+                stats[position + 4] += 1
+            else:
+                store.bucket_counts[bucket] += 1
+
+
+class SharedMetricsExporter:
+    """Exports the merged totals of a store from a single process.
+
+    Runs a background thread exporting cumulative sums and exponential
+    histograms every ``interval`` seconds, so the number of export
+    connections does not depend on the number of workers.
+    """
+
+    def __init__(self, store: SharedMetricStore, exporter: Optional[MetricExporter] = None,
+                 service_name: str = "agent-service", endpoint: str = "http://localhost:4317",
+                 interval: float = 60.0):
+        """
+        Initialize the exporter.
+
+        Args:
+            store: The shared store
+            exporter: Metric exporter; defaults to a fail-fast OTLP/gRPC exporter
+            service_name: ``service.name`` of the exported resource
+            endpoint: OTLP endpoint of the default exporter
+            interval: Seconds between exports
+        """
+        if exporter is None:
+            from .metrics import _FailFastOTLPMetricExporter
+            exporter = _FailFastOTLPMetricExporter(endpoint=endpoint)
+        self.store = store
+        self.exporter = exporter
+        self.interval = interval
+        self.resource = Resource.create({"service.name": service_name})
+        self.scope = InstrumentationScope(__name__)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def collect(self) -> MetricsData:
+        """Merge the store into one cumulative export."""
+        now = time.time_ns()
+        start = self.store.start_time_ns
+        counters, histograms = self.store.totals()
+        points: Dict[str, list] = {}
+        for (name, attributes), value in counters.items():
+            points.setdefault(name, []).append(NumberDataPoint(
+                attributes=attributes.attributes, start_time_unix_nano=start, time_unix_nano=now,
+                value=int(value) if float(value).is_integer() else value))
+        histogram_points: Dict[str, list] = {}
+        for (name, attributes), sketch in histograms.items():
+            histogram_points.setdefault(name, []).append(sketch.to_data_point(attributes.attributes, start, now))
+
+        metrics = []
+        for name, data_points in points.items():
+            unit, description = INSTRUMENTS.get(name, ("", ""))
+            metrics.append(Metric(name=name, description=description, unit=unit, data=Sum(
+                data_points=data_points, aggregation_temporality=AggregationTemporality.CUMULATIVE,
+                is_monotonic=True)))
+        for name, data_points in histogram_points.items():
+            unit, description = INSTRUMENTS.get(name, ("", ""))
+            metrics.append(Metric(name=name, description=description, unit=unit, data=ExponentialHistogram(
+                data_points=data_points, aggregation_temporality=AggregationTemporality.CUMULATIVE)))
+        return MetricsData(resource_metrics=[ResourceMetrics(
+            resource=self.resource, schema_url="",
+            scope_metrics=[ScopeMetrics(scope=self.scope, metrics=metrics, schema_url="")])])
+
+    def export(self) -> Any:
+        """Collect and export once; returns the exporter's result."""
+        return self.exporter.export(self.collect())
+
+    def start(self):
+        """Start exporting periodically in a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="nexushive-shared-metrics", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def shutdown(self):
+        """Export a final time and shut the exporter down."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.export()
+        self.exporter.shutdown()
@@ -0,0 +1,444 @@
+"""Mergeable relative-error quantile sketches for agent latencies."""
+
+import math
+import struct
+import sys
+import threading
+from array import array
+from typing import Any, Dict, Iterable, Optional
+
+from opentelemetry.sdk.metrics.export import Buckets, ExponentialHistogramDataPoint
+
+# Finest scale used by OpenTelemetry exponential histograms
+MAX_SCALE = 20
+
+_HEADER = struct.Struct("<iiqQQddd?")
+
+
+def scale_for_accuracy(relative_accuracy: float) -> int:
+    """
+    Pick the coarsest exponential-histogram scale meeting an accuracy.
+
+    Bucket boundaries grow by ``base = 2 ** (2 ** -scale)``, and estimating
+    a quantile from its bucket has relative error at most
+    ``(base - 1) / (base + 1)``.
+
+    Args:
+        relative_accuracy: Maximum relative error of quantile estimates
+
+    Returns:
+        The smallest scale whose buckets satisfy the accuracy
+    """
+    if not 0.0 < relative_accuracy < 1.0:
+        raise ValueError("relative_accuracy must be between 0 and 1")
+    for scale in range(-4, MAX_SCALE + 1):
+        base = 2.0 ** (2.0 ** -scale)
+        if (base - 1) / (base + 1) <= relative_accuracy:
+            return scale
+    return MAX_SCALE
+
+
+class LatencySketch:
+    """Relative-error quantile sketch with exponential-histogram buckets.
+
+    Positive values are counted in buckets ``(base**i, base**(i+1)]``, the
+    same layout OpenTelemetry uses for exponential histograms, so a sketch
+    exports without loss. Bucket counts live in one contiguous array; when
+    the range would exceed ``max_buckets`` the lowest buckets are collapsed,
+    which only affects the accuracy of the lowest quantiles.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048,
+                 scale: Optional[int] = None):
+        """
+        Initialize an empty sketch.
+
+        Args:
+            relative_accuracy: Maximum relative error of quantile estimates
+            max_buckets: Upper bound on the number of stored buckets
+            scale: Explicit bucket scale, overriding ``relative_accuracy``
+        """
+        if max_buckets < 1:
+            raise ValueError("max_buckets must be positive")
+        self.scale = scale_for_accuracy(relative_accuracy) if scale is None else scale
+        self.max_buckets = max_buckets
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zero_count = 0
+        self.collapsed = False
+        self._factor = 2.0 ** self.scale
+        self._offset = 0
+        self._counts = array("Q")
+
+    @property
+    def relative_accuracy(self) -> float:
+        """Guaranteed relative error of quantile estimates."""
+        base = 2.0 ** (2.0 ** -self.scale)
+        return (base - 1) / (base + 1)
+
+    def add(self, value: float, count: int = 1):
+        """
+        Add a value to the sketch.
+
+        Args:
+            value: The value, e.g. a latency in milliseconds
+            count: Number of times the value was observed
+        """
+        self.count += count
+        self.sum += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+        if value <= 0.0:
+            self.zero_count += count
+            return
+        self._add_to_bucket(math.ceil(math.log2(value) * self._factor) - 1, count)
+
+    def _add_to_bucket(self, index: int, count: int):
+        """Increment one bucket, growing or collapsing the store as needed."""
+        counts = self._counts
+        if not counts:
+            self._offset = index
+            counts.append(count)
+            return
+
+        position = index - self._offset
+        if 0 <= position < len(counts):
+            counts[position] += count
+            return
+
+        if position < 0 and self.collapsed:
+            # The store is full and the low end already absorbs outliers
+            counts[0] += count
+            return
+        if position >= len(counts):
+            counts.frombytes(bytes(counts.itemsize * (position - len(counts) + 1)))
+        else:
+            counts[0:0] = array("Q", bytes(counts.itemsize * -position))
+            self._offset = index
+            position = 0
+        counts[position] += count
+
+        if len(counts) > self.max_buckets:
+            self._collapse_lowest()
+
+    def _collapse_lowest(self):
+        """Fold the lowest buckets into the lowest retained one."""
+        counts = self._counts
+        excess = len(counts) - self.max_buckets
+        folded = sum(counts[:excess + 1])
+        del counts[:excess]
+        counts[0] = folded
+        self._offset += excess
+        self.collapsed = True
+
+    def merge(self, other: "LatencySketch"):
+        """
+        Merge another sketch into this one.
+
+        Sketches with different scales are merged at the coarser scale, so
+        the result keeps the weaker of the two accuracy guarantees.
+
+        Args:
+            other: Sketch to merge; it is not modified
+        """
+        if other.count == 0:
+            return
+        if other.scale < self.scale:
+            self._downscale(self.scale - other.scale)
+        shift = other.scale - self.scale
+
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        self.collapsed = self.collapsed or other.collapsed
+        for position, bucket_count in enumerate(other._counts):
+            if bucket_count:
+                self._add_to_bucket((other._offset + position) >> shift, bucket_count)
+
+    def _downscale(self, steps: int):
+        """Halve the bucket resolution ``steps`` times."""
+        old_offset, old_counts = self._offset, self._counts
+        self.scale -= steps
+        self._factor = 2.0 ** self.scale
+        self._counts = array("Q")
+        for position, bucket_count in enumerate(old_counts):
+            if bucket_count:
+                self._add_to_bucket((old_offset + position) >> steps, bucket_count)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile.
+
+        Args:
+            q: Quantile between 0 and 1, e.g. 0.95 for p95
+
+        Returns:
+            The estimated value, or None if the sketch is empty
+        """
+        if not 0.0 <= q <= 1.0:
+            raise ValueError("quantile must be between 0 and 1")
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return min(max(0.0, self.min), self.max)
+
+        seen = self.zero_count
+        base = 2.0 ** (2.0 ** -self.scale)
+        for position, bucket_count in enumerate(self._counts):
+            seen += bucket_count
+            if seen > rank:
+                lower = base ** (self._offset + position)
+                estimate = 2.0 * lower * base / (1.0 + base)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def quantiles(self, qs: Iterable[float] = (0.5, 0.95, 0.99)) -> Dict[float, Optional[float]]:
+        """
+        Estimate several quantiles.
+
+        Args:
+            qs: Quantiles between 0 and 1
+
+        Returns:
+            Mapping from quantile to estimated value
+        """
+        return {q: self.quantile(q) for q in qs}
+
+    def to_data_point(self, attributes: Optional[Dict[str, Any]] = None,
+                      start_time_unix_nano: int = 0,
+                      time_unix_nano: int = 0) -> ExponentialHistogramDataPoint:
+        """
+        Convert the sketch to an OpenTelemetry exponential histogram point.
+
+        Args:
+            attributes: Attributes of the data point
+            start_time_unix_nano: Start of the aggregation interval
+            time_unix_nano: End of the aggregation interval
+
+        Returns:
+            An exponential histogram data point with the sketch's buckets
+        """
+        return ExponentialHistogramDataPoint(
+            attributes=attributes or {},
+            start_time_unix_nano=start_time_unix_nano,
+            time_unix_nano=time_unix_nano,
+            count=self.count,
+            sum=self.sum,
+            scale=self.scale,
+            zero_count=self.zero_count,
+            positive=Buckets(offset=self._offset, bucket_counts=list(self._counts)),
+            negative=Buckets(offset=0, bucket_counts=[]),
+            flags=0,
+            min=self.min if self.count else 0.0,
+            max=self.max if self.count else 0.0,
+        )
+
+    @classmethod
+    def from_buckets(cls, scale: int, offset: int, bucket_counts: Iterable[int], zero_count: int = 0,
+                     total: float = 0.0, minimum: float = math.inf, maximum: float = -math.inf,
+                     max_buckets: int = 2048) -> "LatencySketch":
+        """
+        Build a sketch from exponential-histogram buckets, e.g. an OTLP point.
+
+        Args:
+            scale: Bucket scale
+            offset: Index of the first bucket
+            bucket_counts: Counts of consecutive positive buckets
+            zero_count: Count of values at or below zero
+            total: Sum of all values
+            minimum: Smallest value, if known
+            maximum: Largest value, if known
+            max_buckets: Bucket bound of the sketch
+
+        Returns:
+            The sketch holding those buckets
+        """
+        sketch = cls(max_buckets=max_buckets, scale=scale)
+        for position, bucket_count in enumerate(bucket_counts):
+            if bucket_count:
+                sketch._add_to_bucket(offset + position, bucket_count)
+        sketch.zero_count = zero_count
+        sketch.count = zero_count + sum(sketch._counts)
+        sketch.sum = total
+        sketch.min = minimum
+        sketch.max = maximum
+        return sketch
+
+    def since(self, earlier: "LatencySketch") -> "LatencySketch":
+        """
+        Values added after an earlier state of this sketch.
+
+        Turns successive cumulative exports into deltas. The minimum and
+        maximum of the result are the cumulative ones, which still bound it.
+
+        Args:
+            earlier: This sketch as it was before, at the same or a finer scale
+
+        Returns:
+            A sketch of the difference
+        """
+        if earlier.scale > self.scale:
+            earlier = LatencySketch.from_bytes(earlier.to_bytes())
+            earlier._downscale(earlier.scale - self.scale)
+        delta = LatencySketch(max_buckets=self.max_buckets, scale=self.scale)
+        earlier_counts, earlier_offset = earlier._counts, earlier._offset
+        for position, bucket_count in enumerate(self._counts):
+            before = position + self._offset - earlier_offset
+            if 0 <= before < len(earlier_counts):
+                bucket_count -= earlier_counts[before]
+            if bucket_count > 0:
+                delta._add_to_bucket(self._offset + position, bucket_count)
+        delta.zero_count = max(self.zero_count - earlier.zero_count, 0)
+        delta.count = delta.zero_count + sum(delta._counts)
+        delta.sum = self.sum - earlier.sum
+        delta.min = self.min
+        delta.max = self.max
+        return delta
+
+    def to_bytes(self) -> bytes:
+        """Serialize the sketch, e.g. to ship it from a worker process."""
+        header = _HEADER.pack(self.scale, self.max_buckets, self._offset, self.count,
+                              self.zero_count, self.sum, self.min, self.max, self.collapsed)
+        return header + self._counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LatencySketch":
+        """
+        Deserialize a sketch produced by :meth:`to_bytes`.
+
+        Args:
+            data: Serialized sketch
+
+        Returns:
+            The reconstructed sketch
+        """
+        (scale, max_buckets, offset, count, zero_count,
+         total, minimum, maximum, collapsed) = _HEADER.unpack_from(data)
+        sketch = cls(max_buckets=max_buckets, scale=scale)
+        sketch._offset = offset
+        sketch.count = count
+        sketch.zero_count = zero_count
+        sketch.sum = total
+        sketch.min = minimum
+        sketch.max = maximum
+        sketch.collapsed = collapsed
+        sketch._counts.frombytes(data[_HEADER.size:])
+        return sketch
+
+    @property
+    def bucket_count(self) -> int:
+        """Number of stored buckets."""
+        return len(self._counts)
+
+    def memory_bytes(self) -> int:
+        """Approximate memory used by the sketch and its bucket array."""
+        return sys.getsizeof(self) + sys.getsizeof(self.__dict__) + sys.getsizeof(self._counts)
+
+
+class LatencySketches:
+    """Thread-safe latency sketches keyed by (service, agent_id)."""
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        """
+        Initialize the sketch set.
+
+        Args:
+            relative_accuracy: Relative accuracy of each sketch
+            max_buckets: Bucket bound of each sketch
+        """
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._sketches: Dict[tuple, LatencySketch] = {}
+        self._lock = threading.Lock()
+
+    def add(self, service: str, agent_id: Optional[str], value: float):
+        """
+        Add a latency for one agent.
+
+        Args:
+            service: Service name
+            agent_id: Agent identifier, or None for unattributed latencies
+            value: Latency in milliseconds
+        """
+        key = (service, agent_id)
+        with self._lock:
+            sketch = self._sketches.get(key)
+            if sketch is None:
+                sketch = LatencySketch(self.relative_accuracy, self.max_buckets)
+                self._sketches[key] = sketch
+            sketch.add(value)
+
+    def new_sketch(self) -> LatencySketch:
+        """Create an empty sketch with this set's accuracy, e.g. for a per-thread buffer."""
+        return LatencySketch(self.relative_accuracy, self.max_buckets)
+
+    def merge_sketch(self, key: tuple, sketch: LatencySketch):
+        """
+        Merge a sketch of one agent into the set.
+
+        Args:
+            key: ``(service, agent_id)`` of the sketch
+            sketch: Sketch recorded elsewhere, e.g. by one thread
+        """
+        with self._lock:
+            mine = self._sketches.get(key)
+            if mine is None:
+                self._sketches[key] = sketch
+            else:
+                mine.merge(sketch)
+
+    def get(self, service: str, agent_id: Optional[str]) -> Optional[LatencySketch]:
+        """Return the sketch for one agent, if any latencies were recorded."""
+        return self._sketches.get((service, agent_id))
+
+    def quantiles(self, service: str, agent_id: Optional[str],
+                  qs: Iterable[float] = (0.5, 0.95, 0.99)) -> Dict[float, Optional[float]]:
+        """
+        Estimate latency quantiles of one agent.
+
+        Args:
+            service: Service name
+            agent_id: Agent identifier
+            qs: Quantiles between 0 and 1
+
+        Returns:
+            Mapping from quantile to estimate, with None values if the
+            agent has no recorded latencies
+        """
+        with self._lock:
+            sketch = self._sketches.get((service, agent_id))
+            if sketch is None:
+                return {q: None for q in qs}
+            return sketch.quantiles(qs)
+
+    def merge(self, other: "LatencySketches"):
+        """
+        Merge every sketch of another set into this one.
+
+        Args:
+            other: Sketches recorded elsewhere, e.g. in another worker
+        """
+        with self._lock:
+            for key, sketch in other._sketches.items():
+                mine = self._sketches.get(key)
+                if mine is None:
+                    mine = LatencySketch(max_buckets=sketch.max_buckets, scale=sketch.scale)
+                    self._sketches[key] = mine
+                mine.merge(sketch)
+
+    def items(self):
+        """Return ``((service, agent_id), sketch)`` pairs."""
+        with self._lock:
+            return list(self._sketches.items())
+
+    def __len__(self) -> int:
+        return len(self._sketches)
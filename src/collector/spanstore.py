@@ -0,0 +1,441 @@
+"""Local columnar storage and vectorized queries for agent.run spans.
+
+Spans are stored column by column in compressed ``.npz`` files under
+hourly partitions, ``<directory>/date=YYYY-MM-DD/hour=HH/part-*.npz``.
+String columns are dictionary-encoded: an ``int32`` code per row plus a
+``<name>.values`` array holding each distinct string once. Queries prune
+partitions by time, load only the columns they need and aggregate with
+numpy, so no per-span Python objects are created.
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.trace import StatusCode
+
+if TYPE_CHECKING:
+    from .costs import PricingTable
+
+# Columns holding dictionary-encoded strings
+STRING_COLUMNS = ("agent_id", "service_name", "model")
+NUMERIC_COLUMNS = {
+    "start_time": np.int64,
+    "end_time": np.int64,
+    "latency_ms": np.float64,
+    "tokens_input": np.int64,
+    "tokens_output": np.int64,
+    "error": np.bool_,
+    "trace_id_hi": np.uint64,
+    "trace_id_lo": np.uint64,
+    "span_id": np.uint64,
+}
+# Group-by keys computed from the start time
+TIME_KEYS = {"day": "datetime64[D]", "hour": "datetime64[h]"}
+
+_HOUR_NS = 3600 * 10**9
+_file_sequence = itertools.count()
+
+
+def _partition_dir(directory: str, hour: int) -> str:
+    stamp = datetime.fromtimestamp(hour * 3600, tz=timezone.utc)
+    return os.path.join(directory, f"date={stamp:%Y-%m-%d}", f"hour={stamp:%H}")
+
+
+def write_partition(directory: str, columns: Dict[str, Any]) -> List[str]:
+    """
+    Write span columns as compressed files, one per hourly partition.
+
+    Args:
+        directory: Root directory of the span store
+        columns: Equal-length arrays for every numeric column and, for each
+            string column, either an array of strings or ``int32`` codes
+            plus a ``<name>.values`` array. Missing string columns are
+            stored as empty strings.
+
+    Returns:
+        Paths of the files written
+    """
+    columns = dict(columns)
+    rows = len(columns["start_time"])
+    for name in STRING_COLUMNS:
+        if name not in columns:
+            columns[name] = np.zeros(rows, dtype=np.int32)
+            columns[f"{name}.values"] = np.array([""])
+        elif f"{name}.values" not in columns:
+            values, codes = np.unique(np.asarray(columns[name], dtype=str), return_inverse=True)
+            columns[name] = codes.astype(np.int32)
+            columns[f"{name}.values"] = values
+
+    start_time = np.asarray(columns["start_time"], dtype=np.int64)
+    hours = start_time // _HOUR_NS
+    paths = []
+    for hour in np.unique(hours):
+        rows = hours == hour
+        part = {}
+        for name, dtype in NUMERIC_COLUMNS.items():
+            part[name] = np.asarray(columns[name], dtype=dtype)[rows]
+        for name in STRING_COLUMNS:
+            part[name] = np.asarray(columns[name], dtype=np.int32)[rows]
+            part[f"{name}.values"] = np.asarray(columns[f"{name}.values"], dtype=str)
+
+        partition = _partition_dir(directory, int(hour))
+        os.makedirs(partition, exist_ok=True)
+        path = os.path.join(partition, f"part-{time.time_ns()}-{os.getpid()}-{next(_file_sequence)}.npz")
+        # Write under a temporary name so readers never see a partial file
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(f, **part)
+        os.replace(path + ".tmp", path)
+        paths.append(path)
+    return paths
+
+
+class ColumnarSpanExporter(SpanExporter):
+    """Span exporter writing agent.run spans to a local columnar store.
+
+    Spans are buffered in memory and written once ``rows_per_file`` have
+    accumulated, or on flush and shutdown. Use it through
+    ``PipelineRegistry(exporter_factory=lambda endpoint: ColumnarSpanExporter(path))``
+    and query the files with :class:`SpanStore`.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 rows_per_file: int = 65536,
+                 span_names: Sequence[str] = ("agent.run",)):
+        """
+        Initialize the exporter.
+
+        Args:
+            directory: Root directory of the span store
+            rows_per_file: Spans buffered before a file is written
+            span_names: Names of the spans to keep; others are ignored
+        """
+        self.directory = directory
+        self.rows_per_file = rows_per_file
+        self.span_names = frozenset(span_names)
+        self._lock = threading.Lock()
+        self._rows: List[Tuple] = []
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        rows = []
+        for span in spans:
+            if span.name not in self.span_names:
+                continue
+            attributes = span.attributes or {}
+            latency_ms = attributes.get("agent.latency_ms")
+            if latency_ms is None:
+                latency_ms = (span.end_time - span.start_time) / 1e6
+            trace_id = span.context.trace_id
+            rows.append((
+                span.start_time,
+                span.end_time,
+                latency_ms,
+                attributes.get("agent.tokens.input", 0),
+                attributes.get("agent.tokens.output", 0),
+                span.status.status_code is StatusCode.ERROR or "agent.error" in attributes,
+                trace_id >> 64,
+                trace_id & 0xFFFFFFFFFFFFFFFF,
+                span.context.span_id,
+                str(attributes.get("agent.id", "")),
+                str(span.resource.attributes.get("service.name", "")),
+                str(attributes.get("agent.model", "")),
+            ))
+
+        with self._lock:
+            self._rows.extend(rows)
+            if len(self._rows) < self.rows_per_file:
+                return SpanExportResult.SUCCESS
+            rows, self._rows = self._rows, []
+        return self._write(rows)
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        with self._lock:
+            rows, self._rows = self._rows, []
+        return self._write(rows) is SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        self.force_flush()
+
+    def _write(self, rows: List[Tuple]) -> SpanExportResult:
+        if not rows:
+            return SpanExportResult.SUCCESS
+        fields = list(zip(*rows))
+        columns = {name: np.array(values, dtype=dtype)
+                   for (name, dtype), values in zip(NUMERIC_COLUMNS.items(), fields)}
+        for name, values in zip(STRING_COLUMNS, fields[len(NUMERIC_COLUMNS):]):
+            columns[name] = values
+        try:
+            write_partition(self.directory, columns)
+        except OSError:
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+
+def _to_ns(value: Any) -> Optional[int]:
+    """Convert a datetime, epoch seconds or None to epoch nanoseconds."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 10**9)
+    return int(value * 10**9)
+
+
+def _factorize(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Like ``np.unique(codes, return_inverse=True)``, by counting when the range is small."""
+    if len(codes) == 0:
+        return codes[:0], codes[:0].astype(np.int64)
+    low = codes.min()
+    span = int(codes.max() - low) + 1
+    if span > 4 * len(codes) + 1024:
+        values, inverse = np.unique(codes, return_inverse=True)
+        return values, inverse.reshape(-1)
+    shifted = codes - low
+    present = np.bincount(shifted, minlength=span) > 0
+    index = np.cumsum(present) - 1
+    return np.flatnonzero(present) + low, index[shifted]
+
+
+def _group_quantiles(groups: np.ndarray, values: np.ndarray, count: int,
+                     quantiles: Sequence[float]) -> Dict[float, np.ndarray]:
+    """Linearly interpolated quantiles of ``values`` within each non-empty group."""
+    # Sort by value, then stably by group (a radix sort on integers), so
+    # each group's values form a contiguous ordered run
+    order = np.argsort(values)
+    order = order[np.argsort(groups[order], kind="stable")]
+    ordered = values[order]
+    sizes = np.bincount(groups, minlength=count)
+    starts = np.cumsum(sizes) - sizes
+    result = {}
+    for q in quantiles:
+        position = starts + q * (sizes - 1)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        fraction = position - low
+        result[q] = ordered[low] * (1 - fraction) + ordered[high] * fraction
+    return result
+
+
+class SpanStore:
+    """Vectorized queries over a directory written by :class:`ColumnarSpanExporter`."""
+
+    def __init__(self, directory: str):
+        """
+        Open a span store.
+
+        Args:
+            directory: Root directory of the span store
+        """
+        self.directory = directory
+
+    def files(self, start: Any = None, end: Any = None) -> List[str]:
+        """
+        List data files whose hourly partition overlaps a time range.
+
+        Args:
+            start: Inclusive lower bound, as a datetime or epoch seconds
+            end: Exclusive upper bound, as a datetime or epoch seconds
+
+        Returns:
+            Paths of the matching files, oldest partition first
+        """
+        start_ns, end_ns = _to_ns(start), _to_ns(end)
+        paths = []
+        if not os.path.isdir(self.directory):
+            return paths
+        for date_dir in sorted(os.listdir(self.directory)):
+            if not date_dir.startswith("date="):
+                continue
+            for hour_dir in sorted(os.listdir(os.path.join(self.directory, date_dir))):
+                if not hour_dir.startswith("hour="):
+                    continue
+                stamp = datetime.strptime(f"{date_dir[5:]} {hour_dir[5:]}", "%Y-%m-%d %H")
+                hour_start = int(stamp.replace(tzinfo=timezone.utc).timestamp()) * 10**9
+                if start_ns is not None and hour_start + _HOUR_NS <= start_ns:
+                    continue
+                if end_ns is not None and hour_start >= end_ns:
+                    continue
+                partition = os.path.join(self.directory, date_dir, hour_dir)
+                paths.extend(os.path.join(partition, name)
+                             for name in sorted(os.listdir(partition)) if name.endswith(".npz"))
+        return paths
+
+    def scan(self,
+             columns: Optional[Iterable[str]] = None,
+             start: Any = None,
+             end: Any = None,
+             agent_ids: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Load columns of the spans in a time range.
+
+        String columns come back dictionary-encoded: ``int32`` codes under
+        the column name and the distinct strings under ``<name>.values``.
+
+        Args:
+            columns: Columns to load; defaults to all
+            start: Inclusive lower bound on span start, datetime or epoch seconds
+            end: Exclusive upper bound on span start, datetime or epoch seconds
+            agent_ids: Keep only spans of these agents
+
+        Returns:
+            Mapping of column name to array
+        """
+        wanted = list(columns) if columns is not None else list(NUMERIC_COLUMNS) + list(STRING_COLUMNS)
+        unknown = set(wanted) - set(NUMERIC_COLUMNS) - set(STRING_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {sorted(unknown)}")
+        start_ns, end_ns = _to_ns(start), _to_ns(end)
+        needed = set(wanted)
+        if start_ns is not None or end_ns is not None:
+            needed.add("start_time")
+        if agent_ids is not None:
+            needed.add("agent_id")
+
+        chunks: Dict[str, List[np.ndarray]] = defaultdict(list)
+        dictionaries: Dict[str, List[np.ndarray]] = defaultdict(list)
+        for path in self.files(start, end):
+            with np.load(path) as data:
+                keep = None
+                if start_ns is not None or end_ns is not None:
+                    start_time = data["start_time"]
+                    keep = np.ones(len(start_time), dtype=bool)
+                    if start_ns is not None:
+                        keep &= start_time >= start_ns
+                    if end_ns is not None:
+                        keep &= start_time < end_ns
+                if agent_ids is not None:
+                    values = data["agent_id.values"]
+                    match = np.isin(data["agent_id"], np.flatnonzero(np.isin(values, list(agent_ids))))
+                    keep = match if keep is None else keep & match
+                for name in needed:
+                    if name in data.files:
+                        column = data[name]
+                        values = data[f"{name}.values"] if name in STRING_COLUMNS else None
+                    else:
+                        # A string column added after the file was written
+                        column = np.zeros(len(data["start_time"]), dtype=np.int32)
+                        values = np.array([""])
+                    chunks[name].append(column if keep is None else column[keep])
+                    if name in STRING_COLUMNS:
+                        dictionaries[name].append(values)
+
+        result = {}
+        for name in wanted:
+            if name in STRING_COLUMNS:
+                result[name], result[f"{name}.values"] = self._merge_dictionaries(
+                    chunks[name], dictionaries[name])
+            elif chunks[name]:
+                result[name] = np.concatenate(chunks[name])
+            else:
+                result[name] = np.empty(0, dtype=NUMERIC_COLUMNS[name])
+        return result
+
+    @staticmethod
+    def _merge_dictionaries(codes: List[np.ndarray], values: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-encode per-file dictionary codes against one shared dictionary."""
+        if not codes:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=str)
+        merged = np.unique(np.concatenate(values))
+        remapped = [np.searchsorted(merged, file_values)[file_codes].astype(np.int32)
+                    for file_codes, file_values in zip(codes, values)]
+        return np.concatenate(remapped), merged
+
+    def aggregate(self,
+                  by: Sequence[str] = ("agent_id",),
+                  start: Any = None,
+                  end: Any = None,
+                  agent_ids: Optional[Iterable[str]] = None,
+                  quantiles: Sequence[float] = (0.5, 0.95, 0.99),
+                  pricing: Optional["PricingTable"] = None) -> Dict[str, np.ndarray]:
+        """
+        Group spans and compute per-group statistics.
+
+        Args:
+            by: Group-by keys: ``agent_id``, ``service_name``, ``model``,
+                ``day`` or ``hour``
+            start: Inclusive lower bound on span start, datetime or epoch seconds
+            end: Exclusive upper bound on span start, datetime or epoch seconds
+            agent_ids: Keep only spans of these agents
+            quantiles: Latency quantiles to compute
+            pricing: Also price every run from its model and token counts,
+                so historical spend can be re-priced with new prices
+
+        Returns:
+            Columns with one row per group: the keys, ``count``, ``errors``,
+            ``error_rate``, ``latency_mean_ms``, ``latency_p<q>_ms`` per
+            quantile, ``tokens_input`` and ``tokens_output``. With
+            ``pricing``, also ``cost`` and ``unpriced_runs``, the runs
+            whose model has no price and which add no cost.
+        """
+        for key in by:
+            if key not in STRING_COLUMNS and key not in TIME_KEYS:
+                raise ValueError(f"Cannot group by {key!r}")
+        columns = {"latency_ms", "tokens_input", "tokens_output", "error"}
+        columns.update(key for key in by if key in STRING_COLUMNS)
+        if any(key in TIME_KEYS for key in by):
+            columns.add("start_time")
+        if pricing is not None:
+            columns.add("model")
+        data = self.scan(columns, start, end, agent_ids)
+
+        # Turn each key into integer codes, then combine them into one group id
+        key_codes = []
+        for key in by:
+            if key in STRING_COLUMNS:
+                key_codes.append(data[key].astype(np.int64))
+            else:
+                key_codes.append(data["start_time"].astype("datetime64[ns]").astype(TIME_KEYS[key]).astype(np.int64))
+        # Mixed-radix combination of the per-key codes avoids a row-wise unique
+        rows = len(data["latency_ms"])
+        combined = np.zeros(rows, dtype=np.int64)
+        key_values = []
+        for codes in key_codes:
+            values, inverse = _factorize(codes)
+            combined = combined * len(values) + inverse
+            key_values.append(values)
+        combined_values, groups = _factorize(combined)
+        count = len(combined_values)
+
+        # Decode each group's key codes from the combined value
+        unique_keys = np.empty((count, len(by)), dtype=np.int64)
+        remainder = combined_values
+        for position in range(len(by) - 1, -1, -1):
+            radix = len(key_values[position])
+            unique_keys[:, position] = key_values[position][remainder % radix]
+            remainder = remainder // radix
+
+        result: Dict[str, np.ndarray] = {}
+        for position, key in enumerate(by):
+            codes = unique_keys[:, position]
+            if key in STRING_COLUMNS:
+                result[key] = data[f"{key}.values"][codes]
+            else:
+                result[key] = codes.astype(TIME_KEYS[key])
+
+        sizes = np.bincount(groups, minlength=count)
+        errors = np.bincount(groups, weights=data["error"], minlength=count).astype(np.int64)
+        latency_sum = np.bincount(groups, weights=data["latency_ms"], minlength=count)
+        result["count"] = sizes
+        result["errors"] = errors
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result["error_rate"] = errors / sizes
+            result["latency_mean_ms"] = latency_sum / sizes
+        for q, values in _group_quantiles(groups, data["latency_ms"], count, quantiles).items():
+            result[f"latency_p{q * 100:g}_ms"] = values
+        result["tokens_input"] = np.bincount(groups, weights=data["tokens_input"], minlength=count).astype(np.int64)
+        result["tokens_output"] = np.bincount(groups, weights=data["tokens_output"], minlength=count).astype(np.int64)
+        if pricing is not None:
+            costs = pricing.costs(data["model"], data["model.values"], data["tokens_input"], data["tokens_output"])
+            unpriced = np.isnan(costs)
+            result["cost"] = np.bincount(groups, weights=np.where(unpriced, 0.0, costs), minlength=count)
+            result["unpriced_runs"] = np.bincount(groups, weights=unpriced, minlength=count).astype(np.int64)
+        return result
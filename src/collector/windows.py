@@ -0,0 +1,264 @@
+"""Time-bucketed rolling windows of per-agent run statistics.
+
+Each agent has a ring of fixed-width time buckets. A run is added to the
+bucket of its end time, updating that bucket's counts, token totals and
+latency sketch in place, so no individual runs are kept. A window query
+combines the buckets it covers, which costs O(buckets) however many runs
+they hold. Buckets older than the ring are reused for new time slots.
+"""
+
+import math
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from .sketch import LatencySketch
+
+
+class _Ring:
+    """Bucket ring of one agent, as parallel per-slot lists."""
+
+    __slots__ = ("epochs", "count", "errors", "tokens_input", "tokens_output", "latency_sum", "sketches")
+
+    def __init__(self, size: int):
+        self.epochs = [-1] * size
+        self.count = [0] * size
+        self.errors = [0] * size
+        self.tokens_input = [0] * size
+        self.tokens_output = [0] * size
+        self.latency_sum = [0.0] * size
+        self.sketches: List[Optional[LatencySketch]] = [None] * size
+
+    def reset(self, slot: int, epoch: int):
+        self.epochs[slot] = epoch
+        self.count[slot] = 0
+        self.errors[slot] = 0
+        self.tokens_input[slot] = 0
+        self.tokens_output[slot] = 0
+        self.latency_sum[slot] = 0.0
+        self.sketches[slot] = None
+
+
+class RollingWindows:
+    """Per-agent run statistics over sliding time windows."""
+
+    def __init__(self, bucket_seconds: float = 1.0, buckets: int = 900,
+                 relative_accuracy: float = 0.01):
+        """
+        Initialize empty windows.
+
+        Args:
+            bucket_seconds: Width of each time bucket, the resolution of
+                window boundaries
+            buckets: Number of buckets kept per agent; windows can reach
+                ``bucket_seconds * buckets`` into the past
+            relative_accuracy: Relative error of latency quantiles
+        """
+        if bucket_seconds <= 0 or buckets < 1:
+            raise ValueError("bucket_seconds and buckets must be positive")
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.relative_accuracy = relative_accuracy
+        self.late_runs = 0
+        self._bucket_ns = int(bucket_seconds * 1e9)
+        self._newest = -1
+        self._rings: Dict[str, _Ring] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def horizon_seconds(self) -> float:
+        """Longest window that can be queried."""
+        return self.bucket_seconds * self.buckets
+
+    def add(self, agent_id: str, end_time_ns: int, latency_ms: Optional[float] = None,
+            tokens_input: int = 0, tokens_output: int = 0, error: bool = False) -> bool:
+        """
+        Add one finished run.
+
+        Args:
+            agent_id: The agent's ``agent.id``
+            end_time_ns: End of the run, in nanoseconds since the epoch
+            latency_ms: Run latency in milliseconds, if known
+            tokens_input: Input tokens of the run
+            tokens_output: Output tokens of the run
+            error: Whether the run failed
+
+        Returns:
+            False if the run is older than the oldest kept bucket
+        """
+        with self._lock:
+            return self._add(agent_id, end_time_ns, latency_ms, tokens_input, tokens_output, error)
+
+    def add_many(self, runs: Iterable[tuple]) -> int:
+        """
+        Add runs under a single lock acquisition.
+
+        Args:
+            runs: ``(agent_id, end_time_ns, latency_ms, tokens_input,
+                tokens_output, error)`` tuples
+
+        Returns:
+            Number of runs added
+        """
+        added = 0
+        add = self._add
+        with self._lock:
+            for run in runs:
+                added += add(*run)
+        return added
+
+    def _add(self, agent_id, end_time_ns, latency_ms, tokens_input, tokens_output, error) -> bool:
+        ring = self._slot_ring(agent_id)
+        slot = self._slot(ring, end_time_ns // self._bucket_ns)
+        if slot < 0:
+            return False
+        ring.count[slot] += 1
+        if error:
+            ring.errors[slot] += 1
+        ring.tokens_input[slot] += tokens_input
+        ring.tokens_output[slot] += tokens_output
+        if latency_ms is not None:
+            ring.latency_sum[slot] += latency_ms
+            sketch = ring.sketches[slot]
+            if sketch is None:
+                sketch = ring.sketches[slot] = LatencySketch(self.relative_accuracy)
+            sketch.add(latency_ms)
+        return True
+
+    def add_counts(self, agent_id: str, time_ns: int, count: int = 0, errors: int = 0,
+                   tokens_input: int = 0, tokens_output: int = 0,
+                   latency: Optional[LatencySketch] = None) -> bool:
+        """
+        Add pre-aggregated measurements, e.g. a metric export interval.
+
+        Args:
+            agent_id: The agent's ``agent.id``
+            time_ns: Time of the measurements, in nanoseconds since the epoch
+            count: Number of runs
+            errors: Number of failed runs
+            tokens_input: Input tokens
+            tokens_output: Output tokens
+            latency: Sketch of the interval's latencies, merged into the bucket
+
+        Returns:
+            False if the time is older than the oldest kept bucket
+        """
+        with self._lock:
+            ring = self._slot_ring(agent_id)
+            slot = self._slot(ring, time_ns // self._bucket_ns)
+            if slot < 0:
+                return False
+            ring.count[slot] += count
+            ring.errors[slot] += errors
+            ring.tokens_input[slot] += tokens_input
+            ring.tokens_output[slot] += tokens_output
+            if latency is not None and latency.count:
+                ring.latency_sum[slot] += latency.sum
+                sketch = ring.sketches[slot]
+                if sketch is None:
+                    sketch = ring.sketches[slot] = LatencySketch(self.relative_accuracy)
+                sketch.merge(latency)
+            return True
+
+    def _slot_ring(self, agent_id: str) -> _Ring:
+        ring = self._rings.get(agent_id)
+        if ring is None:
+            ring = self._rings[agent_id] = _Ring(self.buckets)
+        return ring
+
+    def _slot(self, ring: _Ring, epoch: int) -> int:
+        """Slot holding a bucket epoch, resetting a stale one; -1 if too old."""
+        if epoch > self._newest:
+            self._newest = epoch
+        elif epoch <= self._newest - self.buckets:
+            self.late_runs += 1
+            return -1
+        slot = epoch % self.buckets
+        current = ring.epochs[slot]
+        if current != epoch:
+            if current > epoch:
+                # The slot already moved on to a newer time
+                self.late_runs += 1
+                return -1
+            ring.reset(slot, epoch)
+        return slot
+
+    def agents(self) -> List[str]:
+        """Agents with any runs recorded."""
+        with self._lock:
+            return list(self._rings)
+
+    def window(self, agent_id: str, seconds: float, now_ns: Optional[int] = None,
+               quantiles: Iterable[float] = (0.5, 0.95, 0.99)) -> Dict[str, float]:
+        """
+        Statistics of one agent over the last ``seconds``.
+
+        Args:
+            agent_id: The agent's ``agent.id``
+            seconds: Window length, rounded up to whole buckets and capped
+                at :attr:`horizon_seconds`
+            now_ns: End of the window; defaults to the current time
+            quantiles: Latency quantiles between 0 and 1
+
+        Returns:
+            ``count``, ``errors``, ``error_rate``, ``tokens_input``,
+            ``tokens_output``, ``tokens_per_second``, ``runs_per_second``,
+            ``latency_mean_ms`` and ``latency_p{q}_ms`` per quantile, with
+            None where there are no runs
+        """
+        now_ns = time.time_ns() if now_ns is None else now_ns
+        now_epoch = now_ns // self._bucket_ns
+        width = min(max(1, math.ceil(seconds / self.bucket_seconds)), self.buckets)
+        oldest = now_epoch - width + 1
+
+        count = errors = tokens_input = tokens_output = 0
+        latency_sum = 0.0
+        latency = LatencySketch(self.relative_accuracy)
+        with self._lock:
+            ring = self._rings.get(agent_id)
+            if ring is not None:
+                epochs = ring.epochs
+                for epoch in range(oldest, now_epoch + 1):
+                    slot = epoch % self.buckets
+                    if epochs[slot] != epoch:
+                        continue
+                    count += ring.count[slot]
+                    errors += ring.errors[slot]
+                    tokens_input += ring.tokens_input[slot]
+                    tokens_output += ring.tokens_output[slot]
+                    latency_sum += ring.latency_sum[slot]
+                    if ring.sketches[slot] is not None:
+                        latency.merge(ring.sketches[slot])
+
+        # The newest bucket is only partly elapsed
+        elapsed = max((now_ns - oldest * self._bucket_ns) / 1e9, self.bucket_seconds * 1e-3)
+        result = {
+            "count": count,
+            "errors": errors,
+            "error_rate": errors / count if count else None,
+            "tokens_input": tokens_input,
+            "tokens_output": tokens_output,
+            "tokens_per_second": (tokens_input + tokens_output) / elapsed,
+            "runs_per_second": count / elapsed,
+            "latency_mean_ms": latency_sum / latency.count if latency.count else None,
+        }
+        for q, value in latency.quantiles(quantiles).items():
+            result[f"latency_p{q * 100:g}_ms"] = value
+        return result
+
+    def snapshot(self, seconds: float, now_ns: Optional[int] = None,
+                 quantiles: Iterable[float] = (0.5, 0.95, 0.99)) -> Dict[str, Dict[str, float]]:
+        """
+        Statistics of every agent over the same window.
+
+        Args:
+            seconds: Window length
+            now_ns: End of the window; defaults to the current time
+            quantiles: Latency quantiles between 0 and 1
+
+        Returns:
+            Mapping from agent id to the result of :meth:`window`
+        """
+        now_ns = time.time_ns() if now_ns is None else now_ns
+        quantiles = tuple(quantiles)
+        return {agent_id: self.window(agent_id, seconds, now_ns, quantiles) for agent_id in self.agents()}
@@ -0,0 +1 @@
+"""Benchmarks for nexushive-agent-insights."""
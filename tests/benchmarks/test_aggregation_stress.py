@@ -0,0 +1,81 @@
+"""Stress benchmark for pre-aggregated metric recording.
+
+Run with ``pytest tests/benchmarks -s`` to see the report.
+"""
+
+import threading
+import time
+import unittest
+
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+from nexushive.collector.metrics import AgentMetricsCollector
+
+THREADS = 16
+RECORDS_PER_THREAD = 20_000
+AGENTS = 8
+
+
+def _token_total(reader):
+    total = 0
+    data = reader.get_metrics_data()
+    for resource_metrics in (data.resource_metrics if data else ()):
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                if metric.name == "agent.tokens":
+                    total += sum(point.value for point in metric.data.data_points)
+    return total
+
+
+def _run(pre_aggregate):
+    """Record from many threads while flushing concurrently; return (ns/record, total)."""
+    reader = InMemoryMetricReader()
+    collector = AgentMetricsCollector("bench", pre_aggregate=pre_aggregate, metric_reader=reader)
+    attribute_sets = [collector.attributes({"agent.id": f"agent-{i}"}) for i in range(AGENTS)]
+    done = threading.Event()
+
+    def work(index):
+        attributes = attribute_sets[index % AGENTS]
+        for _ in range(RECORDS_PER_THREAD):
+            collector.record_tokens(1, attributes)
+
+    def flusher():
+        while not done.is_set():
+            collector.flush()
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(THREADS)]
+    flush_thread = threading.Thread(target=flusher)
+    flush_thread.start()
+    start = time.perf_counter_ns()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter_ns() - start
+    done.set()
+    flush_thread.join()
+    collector.flush()
+
+    return elapsed / (THREADS * RECORDS_PER_THREAD), _token_total(reader)
+
+
+class TestAggregationStress(unittest.TestCase):
+    """Concurrent recording with and without pre-aggregation."""
+
+    def test_concurrent_recording(self):
+        """Totals are exact and the per-record cost is reported."""
+        expected = THREADS * RECORDS_PER_THREAD
+        direct_ns, direct_total = _run(pre_aggregate=False)
+        aggregated_ns, aggregated_total = _run(pre_aggregate=True)
+
+        print(f"\n{THREADS} threads x {RECORDS_PER_THREAD} records")
+        print(f"  direct SDK calls {direct_ns:8.0f} ns/record")
+        print(f"  pre-aggregated   {aggregated_ns:8.0f} ns/record")
+
+        self.assertEqual(direct_total, expected)
+        self.assertEqual(aggregated_total, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
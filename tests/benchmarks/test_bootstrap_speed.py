@@ -0,0 +1,55 @@
+"""Benchmark bootstrap comparisons of agent versions.
+
+Run with ``pytest tests/benchmarks -s`` to see the report.
+"""
+
+import time
+import unittest
+
+import numpy as np
+
+from nexushive.collector.regression import paired_bootstrap
+
+RESAMPLES = 10_000
+
+
+def _loop_bootstrap(base, new, statistic, resamples, seed=0):
+    """One resample at a time, as a reference for the vectorized version."""
+    rng = np.random.default_rng(seed)
+    n = len(base)
+    deltas = np.empty(resamples)
+    for i in range(resamples):
+        draw = rng.integers(0, n, n)
+        if statistic == "mean":
+            deltas[i] = new[draw].mean() - base[draw].mean()
+        else:
+            deltas[i] = (np.quantile(new[draw], statistic, method="inverted_cdf")
+                         - np.quantile(base[draw], statistic, method="inverted_cdf"))
+    return deltas
+
+
+class TestBootstrapSpeed(unittest.TestCase):
+    """Thousands of paired resamples over typical question sets."""
+
+    def test_speed(self):
+        """A full comparison of one metric takes at most a few seconds."""
+        rng = np.random.default_rng(1)
+        print(f"\n{RESAMPLES:,} resamples per metric")
+        print(f"{'questions':>10} {'statistic':>9} {'vectorized s':>13} {'loop s':>8}")
+        for n in (200, 1000, 5000):
+            base = rng.lognormal(7, 1, n)
+            new = base * rng.lognormal(0.02, 0.1, n)
+            for statistic in ("mean", 0.95):
+                start = time.perf_counter()
+                paired_bootstrap(base, new, statistic, RESAMPLES)
+                vectorized_s = time.perf_counter() - start
+                # Time a tenth of the resamples in the loop and scale up
+                start = time.perf_counter()
+                _loop_bootstrap(base, new, statistic, RESAMPLES // 10)
+                loop_s = (time.perf_counter() - start) * 10
+                print(f"{n:10d} {str(statistic):>9} {vectorized_s:13.2f} {loop_s:8.2f}")
+                self.assertLess(vectorized_s, 10.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
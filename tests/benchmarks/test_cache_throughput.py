@@ -0,0 +1,87 @@
+"""Benchmark agent throughput with the response cache.
+
+Queries repeat with a Zipf-like skew and vary in case and spacing, as
+user traffic does. Run with ``pytest tests/benchmarks -s`` to see the
+report.
+"""
+
+import hashlib
+import random
+import time
+import unittest
+
+from opentelemetry.sdk.trace import TracerProvider
+
+from nexushive.client.caching import ResponseCache
+from nexushive.client.instrumentation import AgentInstrumentor
+
+QUERIES = 2_000
+DISTINCT = 300
+DELAY = 0.002
+DIMENSIONS = 256
+
+
+def agent_run(input):
+    time.sleep(DELAY)
+    return f"Answer to {input.strip()}"
+
+
+def embed(text):
+    """Deterministic stand-in for a local embedding model."""
+    rng = random.Random(hashlib.blake2b(" ".join(text.lower().split()).encode()).digest())
+    return [rng.gauss(0.0, 1.0) for _ in range(DIMENSIONS)]
+
+
+def _workload():
+    rng = random.Random(5)
+    weights = [1.0 / (rank + 1) for rank in range(DISTINCT)]
+    queries = []
+    for index in rng.choices(range(DISTINCT), weights, k=QUERIES):
+        query = f"What is the status of order {index}?"
+        if rng.random() < 0.3:
+            query = "  " + query.upper()
+        queries.append(query)
+    return queries
+
+
+def _run(cache):
+    instrumentor = AgentInstrumentor("bench", "bench-agent", fast_path=True, cache=cache)
+    # Measure the cache, not the export pipeline
+    instrumentor.tracer = TracerProvider().get_tracer(__name__)
+    run = instrumentor.wrap_agent(agent_run)
+    queries = _workload()
+    start = time.perf_counter()
+    for query in queries:
+        run(input=query)
+    return len(queries) / (time.perf_counter() - start)
+
+
+class TestCacheThroughput(unittest.TestCase):
+    """Throughput of a slow agent with and without the cache."""
+
+    def test_throughput(self):
+        """Caching repeated queries multiplies throughput."""
+        results = {
+            "no cache": (_run(None), None),
+        }
+        for label, cache in (("exact", ResponseCache()), ("exact + embeddings", ResponseCache(embed=embed))):
+            results[label] = (_run(cache), cache.stats())
+
+        print(f"\n{QUERIES} queries over {DISTINCT} distinct questions, {DELAY * 1000:.0f} ms per agent call")
+        print(f"{'cache':>20} {'runs/s':>8} {'hit rate':>9} {'saved s':>8} {'MB':>6}")
+        for label, (throughput, stats) in results.items():
+            if stats is None:
+                print(f"{label:>20} {throughput:8.0f}")
+            else:
+                print(f"{label:>20} {throughput:8.0f} {stats['hit_rate']:9.2f} {stats['saved_ms'] / 1000:8.2f} "
+                      f"{stats['bytes'] / 1e6:6.2f}")
+
+        baseline = results["no cache"][0]
+        for label in ("exact", "exact + embeddings"):
+            throughput, stats = results[label]
+            self.assertGreater(stats["hit_rate"], 0.8)
+            self.assertGreater(throughput, 2 * baseline)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""Benchmark evaluation throughput across execution backends.
+
+Run with ``pytest tests/benchmarks -s`` to see the report.
+"""
+
+import asyncio
+import time
+import unittest
+
+from nexushive.collector.evaluation import BenchmarkEvaluator
+from nexushive.collector.executors import AsyncExecutor, ProcessExecutor, ThreadExecutor
+
+QUESTIONS = [{"id": i, "question": f"What is {i} + {i}?", "answer": str(2 * i)} for i in range(200)]
+DELAY = 0.01
+
+
+class SlowAgent:
+    """Mock agent dominated by model latency."""
+
+    def run(self, question):
+        time.sleep(DELAY)
+        return str(2 * int(question.split()[2]))
+
+
+class SlowAsyncAgent:
+    """Async mock agent dominated by model latency."""
+
+    async def run(self, question):
+        await asyncio.sleep(DELAY)
+        return str(2 * int(question.split()[2]))
+
+
+class TestEvaluationSpeedup(unittest.TestCase):
+    """Compare sequential evaluation with the concurrent backends."""
+
+    def test_speedup(self):
+        """Concurrent backends beat one-at-a-time evaluation."""
+        evaluator = BenchmarkEvaluator()
+        evaluator.questions = QUESTIONS
+        runs = [
+            ("sequential", SlowAgent(), ThreadExecutor(max_workers=1)),
+            ("threads x16", SlowAgent(), ThreadExecutor(max_workers=16)),
+            ("processes x4", SlowAgent(), ProcessExecutor(max_workers=4)),
+            ("asyncio x64", SlowAsyncAgent(), AsyncExecutor(concurrency=64)),
+        ]
+
+        print(f"\n{len(QUESTIONS)} questions, {DELAY * 1000:.0f} ms per answer")
+        throughput = {}
+        for label, agent, executor in runs:
+            report = evaluator.evaluate_agent(agent, executor)
+            throughput[label] = report["throughput_qps"]
+            print(f"  {label:13s} {report['throughput_qps']:8.1f} q/s  "
+                  f"p50 {report['latency_ms']['p50']:6.1f} ms  "
+                  f"p99 {report['latency_ms']['p99']:6.1f} ms  accuracy {report['accuracy']:.2f}")
+            self.assertEqual(report["accuracy"], 1.0)
+
+        self.assertGreater(throughput["threads x16"], 4 * throughput["sequential"])
+        self.assertGreater(throughput["asyncio x64"], 4 * throughput["sequential"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""Benchmark instrumentation cost as the number of agents grows.
+
+Run with ``pytest tests/benchmarks -s`` to see the report.
+"""
+
+import threading
+import time
+import tracemalloc
+import unittest
+
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+
+from nexushive.client import pipeline
+from nexushive.client.instrumentation import AgentInstrumentor
+
+AGENT_COUNTS = [1, 10, 100, 500]
+ENDPOINT = "http://localhost:4317"
+
+
+def _measure(build, n):
+    """Build n instrumentors and return (threads, peak KiB, ms) added."""
+    threads_before = threading.active_count()
+    tracemalloc.start()
+    start = time.perf_counter()
+    built = [build(i) for i in range(n)]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return built, threading.active_count() - threads_before, peak / 1024, elapsed_ms
+
+
+def _legacy_pipeline(i):
+    """Per-agent provider, exporter and processor, as before the registry."""
+    provider = TracerProvider(resource=Resource.create({"service.name": "bench", "agent.id": str(i)}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=ENDPOINT)))
+    return provider
+
+
+class TestPipelineScaling(unittest.TestCase):
+    """Compare shared pipelines against one pipeline per agent."""
+
+    def test_shared_pipeline_scaling(self):
+        """Thread count stays flat while agents are added."""
+        print("\nshared pipeline: agents, threads, peak KiB, ms")
+        for n in AGENT_COUNTS:
+            registry = pipeline.PipelineRegistry()
+            original = pipeline._registry
+            pipeline._registry = registry
+            try:
+                _, threads, peak_kib, elapsed_ms = _measure(
+                    lambda i: AgentInstrumentor("bench", f"agent-{i}", ENDPOINT), n)
+            finally:
+                pipeline._registry = original
+                registry.shutdown()
+
+            print(f"  {n:5d} {threads:8d} {peak_kib:10.1f} {elapsed_ms:8.2f}")
+            self.assertLessEqual(threads, 1)
+
+    def test_legacy_pipeline_scaling(self):
+        """Baseline: one provider, exporter and thread per agent."""
+        print("\nper-agent pipeline: agents, threads, peak KiB, ms")
+        for n in AGENT_COUNTS[:3]:
+            providers, threads, peak_kib, elapsed_ms = _measure(_legacy_pipeline, n)
+            for provider in providers:
+                provider.shutdown()
+
+            print(f"  {n:5d} {threads:8d} {peak_kib:10.1f} {elapsed_ms:8.2f}")
+            self.assertGreaterEqual(threads, n)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""Benchmark the slowdown of agent runs under the stack sampler.
+
+Runs are CPU-bound, the worst case for a sampler that needs the GIL to
+read stacks. Run with ``pytest tests/benchmarks -s`` to see the report.
+"""
+
+import time
+import unittest
+
+from opentelemetry.sdk.trace import TracerProvider
+
+from nexushive.client.instrumentation import AgentInstrumentor
+from nexushive.client.profiling import StackSampler
+
+RUNS = 10
+REPEATS = 5
+
+# Sampler CPU time per second of sampling allowed at the default interval
+OVERHEAD_BUDGET = 0.05
+
+
+def _work(depth):
+    if depth:
+        return _work(depth - 1)
+    return sum(i * i for i in range(100_000))
+
+
+def agent_run(input):
+    total = 0
+    for _ in range(10):
+        total += _work(20)
+    return str(total)
+
+
+def _runner(profiler):
+    instrumentor = AgentInstrumentor("bench", "bench-agent", fast_path=True, profiler=profiler)
+    # Measure the sampler, not the export pipeline
+    instrumentor.tracer = TracerProvider().get_tracer(__name__)
+    return instrumentor.wrap_agent(agent_run)
+
+
+def _seconds(run):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        run(input="go")
+    return time.perf_counter() - start
+
+
+class TestProfilerOverhead(unittest.TestCase):
+    """Run time with and without sampling at several rates."""
+
+    def test_overhead(self):
+        """Sampling at the default rate stays within the overhead budget."""
+        baseline_run = _runner(None)
+        samplers = {interval: StackSampler(interval=interval) for interval in (0.1, 0.02, 0.005, 0.001)}
+        runs = {interval: _runner(sampler) for interval, sampler in samplers.items()}
+        # Alternate the configurations so that drift in machine speed
+        # affects them alike, and keep the best of each
+        baseline = float("inf")
+        best = dict.fromkeys(runs, float("inf"))
+        for _ in range(REPEATS):
+            baseline = min(baseline, _seconds(baseline_run))
+            for interval, run in runs.items():
+                best[interval] = min(best[interval], _seconds(run))
+
+        print(f"\n{RUNS} CPU-bound runs, {baseline / RUNS * 1000:.1f} ms each without profiling")
+        print(f"{'interval ms':>12} {'slowdown':>9} {'sampler CPU':>12} {'samples/run':>12}")
+        for interval, sampler in samplers.items():
+            print(f"{interval * 1000:12.0f} {best[interval] / baseline - 1:9.1%} {sampler.overhead():12.2%} "
+                  f"{sampler.samples_taken / (RUNS * REPEATS):12.1f}")
+
+        # Wall-clock slowdowns of a few percent are within the noise of a
+        # shared machine; the sampler's own CPU time is the stable measure
+        self.assertLess(samplers[StackSampler().interval].overhead(), OVERHEAD_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""Benchmark span ingestion of the OTLP receiver on one core.
+
+The receiver runs in its own process, driven by the bundled load
+generator. Run with ``pytest tests/benchmarks -s`` to see the report.
+"""
+
+import asyncio
+import multiprocessing
+import time
+import unittest
+
+from nexushive.collector.loadgen import generate_load
+from nexushive.collector.receiver import OTLPReceiver
+
+DURATION = 3.0
+CONNECTIONS = 4
+AGENTS = 100
+
+
+def _serve(ports, queries):
+    """Run a receiver, report its port, then answer one window query."""
+    async def main():
+        async with OTLPReceiver(http_port=0) as receiver:
+            ports.put(receiver.http_port)
+            await asyncio.to_thread(queries.get)
+            start = time.perf_counter()
+            windows = receiver.windows(60)
+            elapsed = time.perf_counter() - start
+            ports.put((receiver.spans_accepted, len(windows), elapsed))
+
+    asyncio.run(main())
+
+
+class TestReceiverThroughput(unittest.TestCase):
+    """Sustained spans per second into one receiver process."""
+
+    def test_throughput(self):
+        """The receiver keeps up with tens of thousands of spans per second."""
+        context = multiprocessing.get_context("spawn")
+        ports, queries = context.Queue(), context.Queue()
+        server = context.Process(target=_serve, args=(ports, queries), daemon=True)
+        server.start()
+        try:
+            port = ports.get(timeout=30)
+            result = asyncio.run(generate_load(port=port, duration=DURATION, connections=CONNECTIONS,
+                                               agents=AGENTS))
+            queries.put("query")
+            accepted, agents, query_s = ports.get(timeout=30)
+        finally:
+            server.join(timeout=10)
+            server.kill()
+
+        print(f"\n{result['spans']:,} spans in {result['seconds']:.1f} s over {CONNECTIONS} connections: "
+              f"{result['spans_per_second']:,.0f} spans/s")
+        print(f"  60 s windows of {agents} agents in {query_s * 1000:.1f} ms")
+        self.assertEqual(result["errors"], 0)
+        self.assertEqual(accepted, result["spans"])
+        self.assertGreater(result["spans_per_second"], 10_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
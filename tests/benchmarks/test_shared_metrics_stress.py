@@ -0,0 +1,79 @@
+"""Multi-process stress benchmark for the shared-memory metric store.
+
+Run with ``pytest tests/benchmarks -s`` to see the report.
+"""
+
+import multiprocessing
+import time
+import unittest
+
+from nexushive.collector.aggregation import intern_attributes
+from nexushive.collector.metrics import AgentMetricsCollector
+from nexushive.collector.shared import SharedMetricStore, SharedMetricsExporter
+
+from tests.unit.test_shared import CapturingExporter
+
+WORKERS = 8
+RECORDS_PER_WORKER = 50_000
+AGENTS = 16
+
+
+def _work(name, worker, start, results):
+    store = SharedMetricStore.attach(name)
+    collector = AgentMetricsCollector("bench", shared_store=store)
+    attribute_sets = [collector.attributes({"agent.id": f"agent-{i}"}) for i in range(AGENTS)]
+    start.wait()
+    # CPU time, since workers may share cores
+    began = time.process_time_ns()
+    for i in range(RECORDS_PER_WORKER):
+        attributes = attribute_sets[(worker + i) % AGENTS]
+        collector.record_tokens(1, attributes)
+        collector.record_latency(float(i % 1000 + 1), attributes)
+    results.put(time.process_time_ns() - began)
+    store.close()
+
+
+class TestSharedMetricsStress(unittest.TestCase):
+    """Concurrent workers recording while one exporter collects."""
+
+    def test_workers_and_exporter(self):
+        """Totals are exact with concurrent exports, over one exporter."""
+        store = SharedMetricStore(max_workers=WORKERS)
+        exporter = CapturingExporter()
+        shared_exporter = SharedMetricsExporter(store, exporter, interval=0.05)
+        context = multiprocessing.get_context("fork")
+        start, results = context.Event(), context.Queue()
+        workers = [context.Process(target=_work, args=(store.name, i, start, results)) for i in range(WORKERS)]
+        try:
+            for worker in workers:
+                worker.start()
+            shared_exporter.start()
+            began = time.perf_counter()
+            start.set()
+            elapsed_ns = [results.get(timeout=120) for _ in workers]
+            for worker in workers:
+                worker.join()
+            wall = time.perf_counter() - began
+            shared_exporter.shutdown()
+
+            counters, histograms = store.totals()
+        finally:
+            store.close()
+            store.unlink()
+
+        records = WORKERS * RECORDS_PER_WORKER
+        per_record = sum(elapsed_ns) / records / 2
+        print(f"\n{WORKERS} processes x {RECORDS_PER_WORKER} token and latency records")
+        print(f"  {per_record:6.0f} ns CPU per record in each worker, {2 * records / wall:,.0f} records/s overall")
+        print(f"  {len(exporter.exports)} exports over 1 exporter while recording")
+
+        self.assertEqual(sum(value for (name, _), value in counters.items() if name == "agent.tokens"), records)
+        self.assertEqual(sum(sketch.count for sketch in histograms.values()), records)
+        self.assertEqual(len(histograms), AGENTS)
+        sketch = histograms[("agent.latency", intern_attributes({"agent.id": "agent-0"}))]
+        self.assertAlmostEqual(sketch.quantile(0.5), 500, delta=15)
+        self.assertGreater(len(exporter.exports), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
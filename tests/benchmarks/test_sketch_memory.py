@@ -0,0 +1,52 @@
+"""Benchmark latency sketch memory and accuracy.
+
+Run with ``pytest tests/benchmarks -s`` to see the report.
+"""
+
+import random
+import time
+import tracemalloc
+import unittest
+
+from nexushive.collector.sketch import LatencySketch
+
+SAMPLES = [10_000, 50_000, 200_000]
+
+
+class TestSketchMemory(unittest.TestCase):
+    """Memory per sketch stays bounded as samples grow."""
+
+    def test_memory_per_sketch(self):
+        """Report bytes, buckets and p99 error against sample count."""
+        rng = random.Random(1)
+        print("\nsamples, buckets, bytes, peak bytes, p99 rel. error, ns/add")
+        for n in SAMPLES:
+            # 50 ms to several minutes
+            values = [min(rng.lognormvariate(7.5, 1.8) + 50.0, 600_000.0) for _ in range(n)]
+
+            sketch = LatencySketch(relative_accuracy=0.01)
+            start = time.perf_counter_ns()
+            for value in values:
+                sketch.add(value)
+            elapsed = time.perf_counter_ns() - start
+
+            # Peak allocation while building the same sketch again
+            tracemalloc.start()
+            traced = LatencySketch(relative_accuracy=0.01)
+            for value in values:
+                traced.add(value)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            exact = sorted(values)[int(0.99 * (n - 1))]
+            error = abs(sketch.quantile(0.99) - exact) / exact
+            print(f"  {n:8d} {sketch.bucket_count:6d} {sketch.memory_bytes():8d} {peak:8d} "
+                  f"{error:10.5f} {elapsed / n:8.0f}")
+
+            self.assertLessEqual(error, 0.01)
+            self.assertLessEqual(sketch.bucket_count, sketch.max_buckets)
+            self.assertLess(peak, 64 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
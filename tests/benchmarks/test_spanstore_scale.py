@@ -0,0 +1,80 @@
+"""Benchmark span store queries over millions of spans.
+
+Run with ``pytest tests/benchmarks -s`` to see the report.
+"""
+
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from nexushive.collector.costs import PricingTable
+from nexushive.collector.spanstore import SpanStore, write_partition
+
+SPANS = 2_000_000
+AGENTS = 50
+FILES = 16
+START = 1_767_225_600 * 10**9  # 2026-01-01T00:00:00Z
+MODELS = np.array(["gpt-4o", "gpt-4o-mini", "claude-3-5-sonnet-20241022", "local-llama"])
+PRICES = {"gpt-4o": {"input": 2.5, "output": 10.0}, "gpt-4o-mini": {"input": 0.15, "output": 0.6},
+          "claude-3-5-sonnet": {"input": 3.0, "output": 15.0}}
+REPRICED = dict(PRICES, **{"gpt-4o": {"input": 1.25, "output": 5.0}})
+
+
+class TestSpanStoreScale(unittest.TestCase):
+    """Group-bys and percentiles over a few million stored spans."""
+
+    def test_scale(self):
+        """Queries stay within seconds for millions of spans."""
+        rng = np.random.default_rng(1)
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            per_file = SPANS // FILES
+            agent_names = np.array([f"agent-{i}" for i in range(AGENTS)])
+            for part in range(FILES):
+                # Each flush covers the next slice of a week, like an exporter
+                # writing spans as they arrive
+                week = 7 * 86400 * 10**9
+                offset = START + part * week // FILES
+                start_time = offset + np.sort(rng.integers(0, week // FILES, per_file))
+                write_partition(directory, {
+                    "start_time": start_time,
+                    "end_time": start_time + 10**6,
+                    "latency_ms": rng.lognormal(5, 1, per_file),
+                    "tokens_input": rng.integers(10, 2000, per_file),
+                    "tokens_output": rng.integers(10, 500, per_file),
+                    "error": rng.random(per_file) < 0.02,
+                    "trace_id_hi": rng.integers(0, 2**63, per_file),
+                    "trace_id_lo": rng.integers(0, 2**63, per_file),
+                    "span_id": rng.integers(0, 2**63, per_file),
+                    "agent_id": rng.integers(0, AGENTS, per_file).astype(np.int32),
+                    "agent_id.values": agent_names,
+                    "service_name": np.zeros(per_file, dtype=np.int32),
+                    "service_name.values": np.array(["svc"]),
+                    "model": rng.integers(0, len(MODELS), per_file).astype(np.int32),
+                    "model.values": MODELS,
+                })
+            write_s = time.perf_counter() - start
+
+            store = SpanStore(directory)
+            print(f"\n{SPANS:,} spans in {len(store.files())} files, written in {write_s:.1f} s")
+            queries = [
+                ("latency by agent", dict(by=["agent_id"])),
+                ("tokens per day", dict(by=["day"])),
+                ("errors by agent and hour", dict(by=["agent_id", "hour"])),
+                ("cost by agent and day", dict(by=["agent_id", "day"], pricing=PricingTable(PRICES))),
+                ("re-priced cost by model", dict(by=["model"], pricing=PricingTable(REPRICED))),
+            ]
+            for label, query in queries:
+                start = time.perf_counter()
+                result = store.aggregate(**query)
+                elapsed = time.perf_counter() - start
+                print(f"  {label:25s} {len(result['count']):6d} groups  {elapsed * 1000:7.0f} ms  "
+                      f"{SPANS / elapsed / 1e6:5.1f} M spans/s")
+                self.assertEqual(int(result["count"].sum()), SPANS)
+                self.assertLess(elapsed, 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
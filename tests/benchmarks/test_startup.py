@@ -0,0 +1,99 @@
+"""Startup cost of importing and enabling the client.
+
+Each scenario runs in a fresh interpreter under ``python -X importtime`` and
+reports the import time of ``nexushive.client``, the time to instrument the
+first agent and the peak RSS. Run with ``pytest tests/benchmarks -s`` to see
+the report.
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+REPEATS = 5
+
+# Budgets for importing the package and for instrumenting with tracing
+# disabled; both must stay free of OpenTelemetry
+IMPORT_BUDGET_MS = 25.0
+RSS_BUDGET_KB = 4096
+
+SCENARIO = """
+import os, sys, time
+import nexushive.client
+class Agent:
+    def run(self, input):
+        return input
+began = time.perf_counter()
+agent = nexushive.client.instrument_agent(Agent(), {options})
+agent.run(input="hi")
+instrument_ms = (time.perf_counter() - began) * 1e3
+heavy = sorted({{m.split(".")[0] for m in sys.modules}} & {{"opentelemetry", "grpc", "requests"}})
+print(instrument_ms, {peak_rss}, ",".join(heavy), flush=True)
+# Skip the exit-time flush, which would retry against a missing collector
+os._exit(0)
+"""
+
+# Peak RSS in kB. ru_maxrss would carry over the peak of the forking
+# pytest process across exec, so read the high-water mark of this process.
+PEAK_RSS = "int(open('/proc/self/status').read().split('VmHWM:')[1].split()[0])"
+
+SCENARIOS = {
+    "import only": None,
+    "disabled": "enabled=False",
+    "http/protobuf": "protocol='http/protobuf', endpoint='http://127.0.0.1:4318/v1/traces'",
+    "grpc": "endpoint='127.0.0.1:4317'",
+}
+
+
+def _run(code):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, check=True,
+                            capture_output=True, text=True)
+    import_us = None
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == "nexushive.client":
+            import_us = int(fields[1])
+    return import_us, result.stdout.split()
+
+
+def measure(options):
+    """Best of REPEATS runs of a scenario."""
+    if options is None:
+        code = f"import nexushive.client\nprint(0.0, {PEAK_RSS}, '')"
+    else:
+        code = SCENARIO.format(options=options, peak_rss=PEAK_RSS)
+    best = None
+    for _ in range(REPEATS):
+        import_us, (instrument_ms, rss_kb, *heavy) = _run(code)
+        run = (import_us / 1e3, float(instrument_ms), int(rss_kb), heavy[0] if heavy else "")
+        best = run if best is None else (min(best[0], run[0]), min(best[1], run[1]), min(best[2], run[2]), run[3])
+    return best
+
+
+class TestStartup(unittest.TestCase):
+    """Import time and memory of short-lived processes using the client."""
+
+    def test_startup(self):
+        """The package and the disabled mode stay cheap; tracing loads on first use."""
+        baseline_kb = min(int(_run(f"print({PEAK_RSS})")[1][0]) for _ in range(REPEATS))
+        results = {name: measure(options) for name, options in SCENARIOS.items()}
+
+        print(f"\nbare interpreter: {baseline_kb / 1024:.1f} MB peak RSS")
+        print(f"{'scenario':>14} {'import ms':>10} {'instrument ms':>14} {'RSS MB':>8}  loaded")
+        for name, (import_ms, instrument_ms, rss_kb, heavy) in results.items():
+            print(f"{name:>14} {import_ms:10.1f} {instrument_ms:14.1f} {rss_kb / 1024:8.1f}  {heavy or '-'}")
+
+        for name in ("import only", "disabled"):
+            import_ms, _, rss_kb, heavy = results[name]
+            self.assertEqual(heavy, "")
+            self.assertLess(import_ms, IMPORT_BUDGET_MS)
+            self.assertLess(rss_kb - baseline_kb, RSS_BUDGET_KB)
+        self.assertNotIn("grpc", results["http/protobuf"][3])
+        self.assertIn("grpc", results["grpc"][3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Micro-benchmark per-call overhead of the agent wrappers.
+
+Run with ``pytest tests/benchmarks -s`` to see the report.
+"""
+
+import asyncio
+import time
+import unittest
+
+from opentelemetry.sdk.trace import TracerProvider
+
+from nexushive.client.instrumentation import AgentInstrumentor
+
+CALLS = 5_000
+REPEATS = 5
+PROMPT = "Summarize the quarterly report for the operations team. " * 20
+RESPONSE = "The quarterly report shows steady growth across regions. " * 10
+
+
+def run(input):
+    return RESPONSE
+
+
+async def run_async(input):
+    return RESPONSE
+
+
+def _instrumentor(fast_path):
+    instrumentor = AgentInstrumentor("bench", "bench-agent", fast_path=fast_path)
+    # Measure instrumentation only, not the export pipeline
+    instrumentor.tracer = TracerProvider().get_tracer(__name__)
+    return instrumentor
+
+
+def _ns_per_call(func):
+    """Best-of-REPEATS mean time per call."""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter_ns()
+        for _ in range(CALLS):
+            func(input=PROMPT)
+        best = min(best, (time.perf_counter_ns() - start) / CALLS)
+    return best
+
+
+def _ns_per_async_call(func):
+    """Best-of-REPEATS mean time per awaited call."""
+    async def loop():
+        best = float("inf")
+        for _ in range(REPEATS):
+            start = time.perf_counter_ns()
+            for _ in range(CALLS):
+                await func(input=PROMPT)
+            best = min(best, (time.perf_counter_ns() - start) / CALLS)
+        return best
+
+    return asyncio.run(loop())
+
+
+class TestWrapperOverhead(unittest.TestCase):
+    """Report wrapper overhead against an uninstrumented baseline."""
+
+    def _report(self, label, baseline, default, fast):
+        print(f"\n{label}: baseline {baseline:.0f} ns/call")
+        print(f"  default   {default - baseline:10.0f} ns overhead")
+        print(f"  fast path {fast - baseline:10.0f} ns overhead")
+
+    def test_sync_overhead(self):
+        """Sync wrapper overhead in nanoseconds per call."""
+        baseline = _ns_per_call(run)
+        default = _ns_per_call(_instrumentor(False).wrap_agent(run))
+        fast = _ns_per_call(_instrumentor(True).wrap_agent(run))
+
+        self._report("sync", baseline, default, fast)
+        self.assertLess(fast, default)
+
+    def test_async_overhead(self):
+        """Async wrapper overhead in nanoseconds per call."""
+        baseline = _ns_per_async_call(run_async)
+        default = _ns_per_async_call(_instrumentor(False).wrap_async_agent(run_async))
+        fast = _ns_per_async_call(_instrumentor(True).wrap_async_agent(run_async))
+
+        self._report("async", baseline, default, fast)
+        self.assertLess(fast, default)
+
+
+if __name__ == "__main__":
+    unittest.main()
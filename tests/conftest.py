@@ -3,14 +3,23 @@
 import pytest
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from nexushive.client import pipeline
 
 
 @pytest.fixture(autouse=True)
-def setup_opentelemetry():
+def setup_opentelemetry(monkeypatch):
     """Configure OpenTelemetry with no-op tracer for tests."""
     # Set up a no-op tracer provider to prevent real telemetry during tests
     trace.set_tracer_provider(TracerProvider())
+
+    # Instrumentors share pipelines from the registry; give each test a
+    # fresh registry that keeps spans in memory instead of exporting them
+    registry = pipeline.PipelineRegistry(exporter_factory=lambda endpoint: InMemorySpanExporter())
+    monkeypatch.setattr(pipeline, "_registry", registry)
     yield
+    registry.shutdown()
     # Reset is not strictly necessary since each test has its own process,
     # but included for completeness
-    trace._TRACER_PROVIDER = None
\ No newline at end of file
+    trace._TRACER_PROVIDER = None
@@ -1,9 +1,14 @@
 """Tests for the public API."""
 
+import asyncio
+import os
+import subprocess
+import sys
 import unittest
 from unittest.mock import MagicMock, patch
 
 from nexushive.client.api import instrument_agent
+from nexushive.client.pipeline import get_pipeline
 
 
 class TestApiInstrument(unittest.TestCase):
@@ -61,5 +66,94 @@ class TestApiInstrument(unittest.TestCase):
         self.assertEqual(agent.run, mock_wrapped_run)
 
 
+
+class TestRunDetection(unittest.TestCase):
+    """Test that each kind of run method gets a span covering its work."""
+    
+    def finished_spans(self, service):
+        pipeline = get_pipeline(service, "http://localhost:4317")
+        pipeline.processor.force_flush()
+        return pipeline.exporter.get_finished_spans()
+    
+    def test_coroutine_run(self):
+        """Test that the span of an async run includes the awaited work."""
+        class AsyncAgent:
+            async def run(self, input):
+                await asyncio.sleep(0.05)
+                return "done"
+        
+        agent = instrument_agent(AsyncAgent(), "detect-async")
+        self.assertEqual(asyncio.run(agent.run(input="hi")), "done")
+        
+        span, = self.finished_spans("detect-async")
+        self.assertGreaterEqual(span.attributes["agent.latency_ms"], 50)
+    
+    def test_generator_run(self):
+        """Test that generator runs are spanned until exhausted."""
+        class StreamingAgent:
+            def run(self, input):
+                yield "a"
+                yield "b"
+        
+        agent = instrument_agent(StreamingAgent(), "detect-stream")
+        self.assertEqual(list(agent.run(input="hi")), ["a", "b"])
+        
+        span, = self.finished_spans("detect-stream")
+        self.assertEqual(span.attributes["agent.stream.chunks"], 2)
+    
+    def test_async_generator_run(self):
+        """Test async generator runs."""
+        class AsyncStreamingAgent:
+            async def run(self, input):
+                yield "a"
+        
+        async def consume(agent):
+            return [chunk async for chunk in agent.run(input="hi")]
+        
+        agent = instrument_agent(AsyncStreamingAgent(), "detect-async-stream")
+        self.assertEqual(asyncio.run(consume(agent)), ["a"])
+        
+        span, = self.finished_spans("detect-async-stream")
+        self.assertEqual(span.attributes["agent.stream.chunks"], 1)
+
+
+def run_python(code, **env):
+    """Run code in a fresh interpreter and return its stdout."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path), **env)
+    return subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                          capture_output=True, text=True).stdout
+
+
+LOADED = "import sys; print(sorted({m.split('.')[0] for m in sys.modules} & {'opentelemetry', 'grpc', 'requests'}))"
+
+
+class TestLazyLoading(unittest.TestCase):
+    """Test that OpenTelemetry only loads when an agent is instrumented."""
+
+    AGENT = ("from nexushive.client import instrument_agent\n"
+             "class Agent:\n"
+             "    def run(self, input):\n"
+             "        return input\n")
+
+    def test_import_loads_nothing_heavy(self):
+        """Test that importing the package does not import OpenTelemetry."""
+        self.assertEqual(run_python("import nexushive.client\n" + LOADED), "[]\n")
+
+    def test_disabled(self):
+        """Test that disabled instrumentation returns the agent untouched."""
+        code = self.AGENT + ("agent = Agent()\n"
+                             "run = agent.run\n"
+                             "assert instrument_agent(agent, enabled=False).run == run\n"
+                             "assert instrument_agent(agent).run == run\n") + LOADED
+        self.assertEqual(run_python(code, OTEL_SDK_DISABLED="true"), "[]\n")
+
+    def test_http_protocol_skips_grpc(self):
+        """Test that the HTTP/protobuf exporter is used without importing grpc."""
+        code = self.AGENT + ("agent = instrument_agent(Agent(), protocol='http/protobuf',\n"
+                             "                         endpoint='http://127.0.0.1:4318/v1/traces')\n"
+                             "assert agent.run(input='hi') == 'hi'\n") + LOADED
+        self.assertEqual(run_python(code), "['opentelemetry', 'requests']\n")
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""Tests for the agent response cache."""
+
+import asyncio
+import unittest
+
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+from nexushive.client.api import instrument_agent
+from nexushive.client.caching import ResponseCache, normalize_text
+from nexushive.client.pipeline import get_pipeline
+from nexushive.collector.costs import CostLedger, PricingTable
+from nexushive.collector.loadgen import build_request
+from nexushive.collector.metrics import AgentMetricsCollector
+from nexushive.collector.receiver import OTLPReceiver
+
+VOCABULARY = ("weather", "paris", "london", "today", "tomorrow", "what", "is", "the")
+
+
+def embed(text):
+    """Bag-of-words embedding over a tiny vocabulary."""
+    words = normalize_text(text).replace("?", "").split()
+    return [float(words.count(word)) for word in VOCABULARY]
+
+
+class Clock:
+    """Manually advanced clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingAgent:
+    """Agent counting how often it is called."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def run(self, input, **kwargs):
+        self.calls += 1
+        return f"answer {self.calls}"
+
+
+def _points(reader, name):
+    points = {}
+    data = reader.get_metrics_data()
+    for resource_metrics in (data.resource_metrics if data else ()):
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                if metric.name == name:
+                    for point in metric.data.data_points:
+                        points[tuple(sorted(point.attributes.items()))] = point
+    return points
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test lookups, expiry and eviction."""
+
+    def setUp(self):
+        """Set up a cache on a manual clock."""
+        self.clock = Clock()
+        self.cache = ResponseCache(ttl_seconds=60, clock=self.clock)
+
+    def remember(self, *args, value="cached", latency_ms=100.0, **kwargs):
+        lookup = self.cache.lookup(args, kwargs)
+        self.assertFalse(lookup.hit)
+        self.cache.store(lookup, value, latency_ms)
+
+    def test_exact_match_normalizes_input(self):
+        """Test that case and whitespace do not matter but other arguments do."""
+        self.remember(input="What is  the weather?", language="en")
+
+        lookup = self.cache.lookup((), {"language": "en", "input": "what is the\\nWEATHER?".replace("\\n", "\n")})
+        self.assertEqual((lookup.hit, lookup.match, lookup.value), (True, "exact", "cached"))
+        self.assertGreater(lookup.saved_ms, 99.0)
+        self.assertFalse(self.cache.lookup((), {"input": "what is the weather?", "language": "fr"}).hit)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_ttl(self):
+        """Test that entries expire."""
+        self.remember("question")
+        self.clock.now = 59.0
+        self.assertTrue(self.cache.lookup(("question",), {}).hit)
+        self.clock.now = 60.0
+        self.assertFalse(self.cache.lookup(("question",), {}).hit)
+        self.assertEqual((self.cache.stats()["expirations"], len(self.cache)), (1, 0))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = self.cache = ResponseCache(max_entries=2)
+        self.remember("a")
+        self.remember("b")
+        self.assertTrue(cache.lookup(("a",), {}).hit)
+        self.remember("c")
+
+        self.assertTrue(cache.lookup(("a",), {}).hit)
+        self.assertFalse(cache.lookup(("b",), {}).hit)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_memory_budget(self):
+        """Test that the byte budget evicts entries and rejects oversized ones."""
+        cache = self.cache = ResponseCache(max_bytes=4000)
+        for i in range(10):
+            self.remember(f"q{i}", value="x" * 1000)
+
+        self.assertLessEqual(cache.bytes, 4000)
+        self.assertEqual(len(cache), 3)
+        lookup = cache.lookup(("huge",), {})
+        self.assertFalse(cache.store(lookup, "x" * 5000, 1.0))
+        cache.clear()
+        self.assertEqual((len(cache), cache.bytes), (0, 0))
+
+
+class TestSemanticMatching(unittest.TestCase):
+    """Test similarity matches over the embedding index."""
+
+    def setUp(self):
+        """Set up a cache with a bag-of-words embedding."""
+        self.cache = ResponseCache(embed=embed, similarity_threshold=0.8)
+        lookup = self.cache.lookup((), {"input": "what is the weather in paris today?", "units": "metric"})
+        self.cache.store(lookup, "sunny", 50.0)
+
+    def test_near_repeat(self):
+        """Test that a reworded question with the same other arguments hits."""
+        lookup = self.cache.lookup((), {"input": "the weather in paris today", "units": "metric"})
+        self.assertEqual((lookup.match, lookup.value), ("semantic", "sunny"))
+        self.assertGreaterEqual(lookup.similarity, 0.8)
+        self.assertEqual(lookup.attributes()["agent.cache.match"], "semantic")
+
+    def test_dissimilar_or_other_context(self):
+        """Test that different questions and other arguments miss."""
+        self.assertFalse(self.cache.lookup((), {"input": "weather in london tomorrow", "units": "metric"}).hit)
+        self.assertFalse(self.cache.lookup((), {"input": "the weather in paris today", "units": "imperial"}).hit)
+
+    def test_evicted_rows_are_reused(self):
+        """Test that evicted entries leave the index."""
+        cache = ResponseCache(max_entries=1, embed=embed)
+        for question in ("weather in paris", "weather in london", "what is the weather today"):
+            cache.store(cache.lookup((question,), {}), question, 1.0)
+
+        self.assertFalse(cache.lookup(("paris weather",), {}).hit)
+        self.assertEqual(cache.lookup(("today what is the weather",), {}).value, "what is the weather today")
+        self.assertEqual(len(cache._rows), 2)
+
+
+class TestInstrumentedCache(unittest.TestCase):
+    """Test the cache installed by instrument_agent."""
+
+    def finished_spans(self, service):
+        pipeline = get_pipeline(service, "http://localhost:4317")
+        pipeline.processor.force_flush()
+        return pipeline.exporter.get_finished_spans()
+
+    def test_repeated_runs(self):
+        """Test that repeats skip the agent and are marked on their spans."""
+        for fast_path in (False, True):
+            service = f"cache-{fast_path}"
+            agent = instrument_agent(CountingAgent(), service, fast_path=fast_path, cache=ResponseCache(),
+                                     pricing=PricingTable({"m": {"input": 1.0, "output": 1.0}}), model="m")
+
+            self.assertEqual(agent.run(input="Hello"), "answer 1")
+            self.assertEqual(agent.run(input="  hello "), "answer 1")
+            self.assertEqual(agent.calls, 1)
+
+            miss, hit = self.finished_spans(service)
+            self.assertFalse(miss.attributes["agent.cache.hit"])
+            self.assertGreater(miss.attributes["agent.cost"], 0)
+            self.assertTrue(hit.attributes["agent.cache.hit"])
+            self.assertEqual(hit.attributes["agent.cache.match"], "exact")
+            self.assertIn("agent.cache.saved_ms", hit.attributes)
+            self.assertEqual(hit.attributes["agent.cost"], 0.0)
+
+    def test_async_runs_and_metrics(self):
+        """Test caching async runs and recording hit and miss metrics."""
+        class AsyncAgent:
+            def __init__(self):
+                self.calls = 0
+
+            async def run(self, input):
+                self.calls += 1
+                await asyncio.sleep(0.01)
+                return "done"
+
+        reader = InMemoryMetricReader()
+        metrics = AgentMetricsCollector("cache-metrics", metric_reader=reader)
+        agent = instrument_agent(AsyncAgent(), "cache-async", agent_id="a", cache=ResponseCache(metrics=metrics))
+
+        async def main():
+            for _ in range(3):
+                await agent.run(input="same")
+
+        asyncio.run(main())
+        self.assertEqual(agent.calls, 1)
+
+        metrics.flush()
+        lookups = _points(reader, "agent.cache.lookups")
+        self.assertEqual(lookups[(("agent.id", "a"), ("cache.result", "exact"))].value, 2)
+        self.assertEqual(lookups[(("agent.id", "a"), ("cache.result", "miss"))].value, 1)
+        self.assertGreater(_points(reader, "agent.cache.saved")[(("agent.id", "a"),)].value, 15)
+
+    def test_streams_are_not_cached(self):
+        """Test that streaming runs always reach the agent."""
+        class StreamingAgent(CountingAgent):
+            def run(self, input):
+                self.calls += 1
+                return iter(["a", "b"])
+
+        class GeneratorAgent(CountingAgent):
+            def run(self, input):
+                self.calls += 1
+                yield "a"
+                yield "b"
+
+        for agent_class in (StreamingAgent, GeneratorAgent):
+            agent = instrument_agent(agent_class(), "cache-stream", cache=ResponseCache())
+            for _ in range(2):
+                self.assertEqual(list(agent.run(input="x")), ["a", "b"])
+            self.assertEqual(agent.calls, 2)
+
+
+class TestReceivedCacheHits(unittest.TestCase):
+    """Test spend of cached runs at the receiver."""
+
+    def test_cached_runs_cost_nothing(self):
+        """Test that runs answered from the cache add runs but no tokens to the ledger."""
+        receiver = OTLPReceiver(http_port=None, cost_ledger=CostLedger(PricingTable({"m": {"input": 1.0}})))
+        request = build_request(10, agents=1, seed=2)
+        for i, span in enumerate(request.resource_spans[0].scope_spans[0].spans):
+            span.attributes.add(key="agent.model").value.string_value = "m"
+            span.attributes.add(key="agent.cache.hit").value.bool_value = i % 2 == 0
+        receiver.ingest_traces(request)
+
+        totals, = receiver.costs(())
+        self.assertEqual(totals["runs"], 10)
+        self.assertLess(totals["tokens_input"], sum(
+            kv.value.int_value for span in request.resource_spans[0].scope_spans[0].spans
+            for kv in span.attributes if kv.key == "agent.tokens.input"))
+
+
+if __name__ == "__main__":
+    unittest.main()
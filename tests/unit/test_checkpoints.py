@@ -0,0 +1,114 @@
+"""Tests for resumable evaluation runs."""
+
+import os
+import tempfile
+import unittest
+
+from nexushive.collector.checkpoints import CheckpointStore
+from nexushive.collector.evaluation import BenchmarkEvaluator
+from nexushive.collector.executors import ThreadExecutor
+
+QUESTIONS = [{"id": f"q{i}", "question": f"What is {i} + {i}?", "answer": str(2 * i)} for i in range(10)]
+
+
+class CountingAgent:
+    """Agent recording which questions it was asked."""
+
+    def __init__(self, offset=0, crash_after=None):
+        self.offset = offset
+        self.crash_after = crash_after
+        self.asked = []
+
+    def run(self, question):
+        if self.crash_after is not None and len(self.asked) >= self.crash_after:
+            raise KeyboardInterrupt
+        self.asked.append(question)
+        a = int(question.split()[2])
+        # Off by ``offset`` on odd numbers
+        return str(2 * a + (self.offset if a % 2 else 0))
+
+
+class TestCheckpointStore(unittest.TestCase):
+    """Test checkpointed evaluation."""
+
+    def setUp(self):
+        """Open a fresh store."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = CheckpointStore(os.path.join(self.tmp.name, "runs.db"))
+        self.evaluator = BenchmarkEvaluator(dataset_name="arith")
+        self.evaluator.questions = list(QUESTIONS)
+        self.executor = ThreadExecutor(max_workers=1)
+
+    def tearDown(self):
+        """Close and remove the store."""
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_resume_after_crash(self):
+        """Test that a rerun only asks the questions that were not stored."""
+        with self.assertRaises(KeyboardInterrupt):
+            self.evaluator.evaluate_agent(CountingAgent(crash_after=4), self.executor,
+                                          checkpoint=self.store, agent_version="v1")
+        self.assertEqual(len(self.store.completed("arith", "v1")), 4)
+
+        agent = CountingAgent()
+        report = self.evaluator.evaluate_agent(agent, self.executor, checkpoint=self.store, agent_version="v1")
+
+        self.assertEqual(len(agent.asked), 6)
+        self.assertEqual(report["resumed"], 4)
+        self.assertEqual(report["total_questions"], 10)
+        self.assertEqual(report["accuracy"], 1.0)
+        self.assertEqual([r["id"] for r in report["results"]], [q["id"] for q in QUESTIONS])
+
+    def test_changed_questions_rerun(self):
+        """Test that edited questions are not taken from the store."""
+        self.evaluator.evaluate_agent(CountingAgent(), self.executor, checkpoint=self.store, agent_version="v1")
+        self.evaluator.questions[3] = dict(QUESTIONS[3], question="What is 30 + 30?", answer="60")
+
+        agent = CountingAgent()
+        report = self.evaluator.evaluate_agent(agent, self.executor, checkpoint=self.store, agent_version="v1")
+
+        self.assertEqual(agent.asked, ["What is 30 + 30?"])
+        self.assertEqual(report["accuracy"], 1.0)
+
+    def test_errors_are_retried(self):
+        """Test that failed questions count as not completed."""
+        class BrokenAgent:
+            def run(self, question):
+                raise RuntimeError("down")
+
+        report = self.evaluator.evaluate_agent(BrokenAgent(), self.executor, checkpoint=self.store, agent_version="v1")
+        self.assertEqual(report["errors"], 10)
+
+        agent = CountingAgent()
+        report = self.evaluator.evaluate_agent(agent, self.executor, checkpoint=self.store, agent_version="v1")
+        self.assertEqual(len(agent.asked), 10)
+        self.assertEqual(report["errors"], 0)
+
+    def test_checkpoint_requires_version(self):
+        """Test that a checkpoint store is never keyed by the agent class alone."""
+        with self.assertRaises(ValueError):
+            self.evaluator.evaluate_agent(CountingAgent(), self.executor, checkpoint=self.store)
+        self.assertEqual(self.store.versions("arith"), [])
+
+    def test_compare_agents(self):
+        """Test that comparing versions reuses stored results."""
+        base, new = CountingAgent(), CountingAgent(offset=1)
+        first = self.evaluator.compare_agents(base, new, self.store, "v1", "v2", executor=self.executor)
+
+        self.assertEqual(first["comparison"]["questions"], 10)
+        self.assertEqual(first["comparison"]["base_accuracy"], 1.0)
+        self.assertEqual(first["comparison"]["new_accuracy"], 0.5)
+        self.assertEqual(first["comparison"]["regressed"], ["q1", "q3", "q5", "q7", "q9"])
+        self.assertEqual(self.store.versions("arith"), ["v1", "v2"])
+
+        self.evaluator.questions[0] = dict(QUESTIONS[0], question="What is 10 + 10?", answer="20")
+        base, new = CountingAgent(), CountingAgent(offset=1)
+        self.evaluator.compare_agents(base, new, self.store, "v1", "v2", executor=self.executor)
+
+        self.assertEqual(base.asked, ["What is 10 + 10?"])
+        self.assertEqual(new.asked, ["What is 10 + 10?"])
+
+
+if __name__ == "__main__":
+    unittest.main()
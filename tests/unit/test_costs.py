@@ -0,0 +1,253 @@
+"""Tests for cost accounting."""
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+import numpy as np
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from nexushive.client.api import instrument_agent
+from nexushive.client.pipeline import get_pipeline
+from nexushive.client.tokenization import WhitespaceTokenCounter
+from nexushive.collector.costs import CostLedger, PricingTable
+from nexushive.collector.loadgen import build_request
+from nexushive.collector.receiver import OTLPReceiver
+from nexushive.collector.spanstore import SpanStore, write_partition
+
+PRICES = {"gpt-4o": {"input": 2.5, "output": 10.0}, "gpt-4o-mini": {"input": 0.15, "output": 0.6}}
+HOUR = int(datetime(2026, 3, 1, 10, tzinfo=timezone.utc).timestamp()) * 10**9
+
+
+class TestPricingTable(unittest.TestCase):
+    """Test model price lookups."""
+
+    def setUp(self):
+        """Set up the pricing table."""
+        self.pricing = PricingTable(PRICES)
+
+    def test_model_matching(self):
+        """Test exact, provider-prefixed and dated model names."""
+        self.assertEqual(self.pricing.price("gpt-4o"), (2.5e-6, 1e-5))
+        self.assertEqual(self.pricing.price("openai/gpt-4o-mini"), self.pricing.price("gpt-4o-mini"))
+        self.assertEqual(self.pricing.price("gpt-4o-mini-2024-07-18"), self.pricing.price("gpt-4o-mini"))
+        self.assertIsNone(self.pricing.price("claude-x"))
+        self.assertIsNone(PricingTable({"gpt-4o": {"input": 1.0}}).price("gpt-4o-mini"))
+        self.assertIsNone(self.pricing.cost("", 10, 10))
+        self.assertAlmostEqual(self.pricing.cost("gpt-4o", 1000, 500), 0.0075)
+
+    def test_load(self):
+        """Test loading a JSON pricing file."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pricing.json")
+            with open(path, "w") as f:
+                json.dump({"per_tokens": 1000, "currency": "EUR", "models": {"m": {"input": 1.0, "output": 2.0}}}, f)
+            pricing = PricingTable.load(path)
+
+        self.assertEqual(pricing.currency, "EUR")
+        self.assertAlmostEqual(pricing.cost("m", 1000, 1000), 3.0)
+
+    def test_vectorized_costs(self):
+        """Test that batch pricing matches pricing each run."""
+        models = np.array(["gpt-4o", "unknown", "gpt-4o-mini"])
+        codes = np.array([0, 2, 1, 0])
+        tokens_input = np.array([100, 200, 300, 400])
+        tokens_output = np.array([10, 20, 30, 40])
+
+        costs = self.pricing.costs(codes, models, tokens_input, tokens_output)
+        for i, code in enumerate(codes):
+            expected = self.pricing.cost(models[code], tokens_input[i], tokens_output[i])
+            if expected is None:
+                self.assertTrue(np.isnan(costs[i]))
+            else:
+                self.assertAlmostEqual(costs[i], expected)
+
+
+class TestCostLedger(unittest.TestCase):
+    """Test incremental spend aggregation."""
+
+    def setUp(self):
+        """Add runs of two agents over two hours."""
+        self.ledger = CostLedger(PricingTable(PRICES))
+        for i in range(10):
+            self.ledger.add(f"agent-{i % 2}", "svc", "gpt-4o", 1000, 100, HOUR + i * 600 * 10**9)
+        self.ledger.add("agent-0", "svc", "mystery", 1000, 100, HOUR)
+
+    def test_spend_by_agent_and_bucket(self):
+        """Test grouping spend by agent and by hourly bucket."""
+        by_agent = self.ledger.spend(("agent_id",))
+        self.assertEqual(by_agent[("agent-0",)]["runs"], 6)
+        self.assertEqual(by_agent[("agent-0",)]["unpriced_runs"], 1)
+        self.assertAlmostEqual(by_agent[("agent-1",)]["cost"], 5 * 0.0035)
+
+        by_bucket = self.ledger.spend(("bucket",))
+        self.assertEqual(sorted(totals["runs"] for totals in by_bucket.values()), [4, 7])
+        later = self.ledger.spend(("service_name",), start_ns=HOUR + 3600 * 10**9)
+        self.assertEqual(later[("svc",)]["runs"], 4)
+
+    def test_reprice(self):
+        """Test that new prices apply exactly to runs already added."""
+        before = self.ledger.spend(())[()]["cost"]
+        self.ledger.reprice(PricingTable({"gpt-4o": {"input": 5.0, "output": 20.0}}))
+
+        self.assertAlmostEqual(self.ledger.spend(())[()]["cost"], 2 * before)
+        with self.assertRaises(ValueError):
+            self.ledger.spend(("region",))
+
+    def test_prune(self):
+        """Test dropping old buckets."""
+        self.assertEqual(self.ledger.prune(HOUR + 3600 * 10**9), 3)
+        self.assertEqual(self.ledger.spend(())[()]["runs"], 4)
+
+    def test_add_spans(self):
+        """Test adding finished SDK spans."""
+        exporter = InMemorySpanExporter()
+        provider = TracerProvider(resource=Resource.create({"service.name": "svc"}))
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        tracer = provider.get_tracer(__name__)
+        for _ in range(3):
+            attributes = {"agent.id": "a", "agent.model": "gpt-4o", "agent.tokens.input": 1000}
+            with tracer.start_as_current_span("agent.run", attributes=attributes):
+                with tracer.start_as_current_span("agent.step"):
+                    pass
+
+        ledger = CostLedger(PricingTable(PRICES))
+        self.assertEqual(ledger.add_spans(exporter.get_finished_spans()), 3)
+        self.assertAlmostEqual(ledger.spend(("model",))[("gpt-4o",)]["cost"], 3 * 0.0025)
+
+
+class TestStoredSpanCosts(unittest.TestCase):
+    """Test pricing spans in the columnar store."""
+
+    def setUp(self):
+        """Write one file with models and one written before the model column existed."""
+        self.tmp = tempfile.TemporaryDirectory()
+        n = 100
+        columns = {
+            "start_time": HOUR + np.arange(n) * 10**6,
+            "end_time": HOUR + np.arange(n) * 10**6 + 5,
+            "latency_ms": np.ones(n),
+            "tokens_input": np.full(n, 1000),
+            "tokens_output": np.full(n, 100),
+            "error": np.zeros(n, dtype=bool),
+            "trace_id_hi": np.zeros(n),
+            "trace_id_lo": np.arange(n),
+            "span_id": np.arange(n),
+            "agent_id": ["a"] * n,
+            "service_name": ["svc"] * n,
+        }
+        write_partition(self.tmp.name, dict(columns, model=["gpt-4o", "gpt-4o-mini"] * (n // 2)))
+        old, = write_partition(self.tmp.name, columns)
+        with np.load(old) as data:
+            kept = {name: data[name] for name in data.files if not name.startswith("model")}
+        np.savez_compressed(old, **kept)
+        self.store = SpanStore(self.tmp.name)
+
+    def tearDown(self):
+        """Remove the store."""
+        self.tmp.cleanup()
+
+    def test_cost_by_model(self):
+        """Test costs grouped by model, with runs lacking a model unpriced."""
+        result = self.store.aggregate(by=["model"], pricing=PricingTable(PRICES))
+
+        self.assertEqual(list(result["model"]), ["", "gpt-4o", "gpt-4o-mini"])
+        self.assertEqual(list(result["unpriced_runs"]), [100, 0, 0])
+        np.testing.assert_allclose(result["cost"], [0.0, 50 * 0.0035, 50 * 0.00021])
+
+    def test_reprice_history(self):
+        """Test re-pricing stored spans after a price change."""
+        old = self.store.aggregate(by=["day"], pricing=PricingTable(PRICES))
+        new = self.store.aggregate(by=["day"], pricing=PricingTable({"gpt-4o": {"input": 1.25, "output": 5.0}}))
+
+        self.assertAlmostEqual(new["cost"][0], 50 * 0.00175)
+        self.assertEqual(new["unpriced_runs"][0], old["unpriced_runs"][0] + 50)
+
+
+class TestInlineCost(unittest.TestCase):
+    """Test the cost attribute set by instrumented agents."""
+
+    def finished_spans(self, service):
+        pipeline = get_pipeline(service, "http://localhost:4317")
+        pipeline.processor.force_flush()
+        return pipeline.exporter.get_finished_spans()
+
+    def test_cost_attribute(self):
+        """Test that runs of a priced model carry their cost."""
+        class Model:
+            model_id = "gpt-4o"
+
+        class Agent:
+            model = Model()
+
+            def run(self, input):
+                return "one two"
+
+        for fast_path in (False, True):
+            service = f"cost-{fast_path}"
+            agent = instrument_agent(Agent(), service, pricing=PricingTable(PRICES), fast_path=fast_path,
+                                     token_counter=WhitespaceTokenCounter())
+            agent.run(input="a b c d")
+
+            span, = self.finished_spans(service)
+            self.assertEqual(span.attributes["agent.model"], "gpt-4o")
+            self.assertAlmostEqual(span.attributes["agent.cost"], 4 * 2.5e-6 + 2 * 1e-5)
+
+    def test_streamed_cost(self):
+        """Test that streamed runs are priced once the stream is consumed."""
+        class Agent:
+            def run(self, input):
+                yield "one"
+                yield "two"
+
+        agent = instrument_agent(Agent(), "cost-stream", pricing=PricingTable(PRICES), model="gpt-4o-mini",
+                                 token_counter=WhitespaceTokenCounter())
+        list(agent.run(input="a b"))
+
+        span, = self.finished_spans("cost-stream")
+        self.assertAlmostEqual(span.attributes["agent.cost"], 2 * 0.15e-6 + 2 * 0.6e-6)
+
+    def test_unpriced_model(self):
+        """Test that runs of unknown models get no cost."""
+        class Agent:
+            def run(self, input):
+                return "done"
+
+        agent = instrument_agent(Agent(), "cost-unknown", pricing=PricingTable(PRICES), model="local-llama")
+        agent.run(input="hi")
+
+        span, = self.finished_spans("cost-unknown")
+        self.assertEqual(span.attributes["agent.model"], "local-llama")
+        self.assertNotIn("agent.cost", span.attributes)
+
+
+class TestReceiverCosts(unittest.TestCase):
+    """Test pricing runs as the receiver ingests them."""
+
+    def test_ingest_and_query(self):
+        """Test that received runs are added to the ledger and served as JSON."""
+        receiver = OTLPReceiver(http_port=None, cost_ledger=CostLedger(PricingTable(PRICES)))
+        request = build_request(50, agents=2, seed=1)
+        for span in request.resource_spans[0].scope_spans[0].spans:
+            attribute = span.attributes.add(key="agent.model")
+            attribute.value.string_value = "gpt-4o"
+        receiver.ingest_traces(request)
+
+        rows = receiver.costs(("service_name", "model"))
+        self.assertEqual([(row["service_name"], row["model"], row["runs"]) for row in rows], [("loadgen", "gpt-4o", 50)])
+        self.assertGreater(rows[0]["cost"], 0)
+
+        status, _, body = receiver._handle("GET", "/v1/costs?by=agent_id&seconds=3600", {}, b"")
+        self.assertEqual(status, 200)
+        self.assertEqual(sum(row["runs"] for row in json.loads(body)), 50)
+        self.assertEqual(receiver._handle("GET", "/v1/costs?by=region", {}, b"")[0], 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Tests for memory-mapped datasets."""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from nexushive.collector.datasets import JsonlDataset
+from nexushive.collector.evaluation import BenchmarkEvaluator
+
+
+class TestJsonlDataset(unittest.TestCase):
+    """Test the JsonlDataset class."""
+
+    def setUp(self):
+        """Write a small JSONL dataset."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "questions.jsonl")
+        with open(self.path, "w") as f:
+            for i in range(10):
+                f.write(json.dumps({"question": f"What is {i} + {i}?", "answer": str(2 * i)}) + "\n")
+                if i == 4:
+                    f.write("\n")
+            f.write(json.dumps({"id": "last", "question": "q", "answer": "a"}))
+
+    def tearDown(self):
+        """Remove the dataset."""
+        self.tmp.cleanup()
+
+    def test_random_access(self):
+        """Test indexing, blank-line skipping and default ids."""
+        with JsonlDataset(self.path) as dataset:
+            self.assertEqual(len(dataset), 11)
+            self.assertEqual(dataset[3]["answer"], "6")
+            self.assertEqual(dataset[3]["id"], 3)
+            self.assertEqual(dataset[-1]["id"], "last")
+            with self.assertRaises(IndexError):
+                dataset[11]
+
+    def test_index_is_cached(self):
+        """Test that the offset index is written once and reused."""
+        JsonlDataset(self.path).close()
+        self.assertTrue(os.path.exists(self.path + ".idx"))
+
+        with patch.object(JsonlDataset, "_build_index") as build_index:
+            with JsonlDataset(self.path) as dataset:
+                self.assertEqual(len(dataset), 11)
+            build_index.assert_not_called()
+
+    def test_stale_index_is_rebuilt(self):
+        """Test that changing the file invalidates the cached index."""
+        JsonlDataset(self.path).close()
+        with open(self.path, "a") as f:
+            f.write("\n" + json.dumps({"question": "extra", "answer": "x"}) + "\n")
+        os.utime(self.path, ns=(0, 1))
+
+        with JsonlDataset(self.path) as dataset:
+            self.assertEqual(len(dataset), 12)
+            self.assertEqual(dataset[11]["question"], "extra")
+
+    def test_shards_cover_dataset(self):
+        """Test that worker splits partition the dataset."""
+        with JsonlDataset(self.path) as dataset:
+            shards = [dataset.split(worker, 3) for worker in range(3)]
+            ids = [question["id"] for shard in shards for question in shard]
+
+            self.assertEqual(ids, [question["id"] for question in dataset])
+            self.assertEqual(dataset.shard(2, 4)[1]["id"], 3)
+
+    def test_evaluator_loads_lazily(self):
+        """Test that evaluate_agent loads dataset_path on demand."""
+        class Agent:
+            def run(self, question):
+                return question
+
+        evaluator = BenchmarkEvaluator(dataset_path=self.path)
+        report = evaluator.evaluate_agent(Agent())
+
+        self.assertIsInstance(evaluator.questions, JsonlDataset)
+        self.assertEqual(report["total_questions"], 11)
+        evaluator.questions.close()
+
+    def test_whitespace_lines_are_skipped(self):
+        """Test that lines holding only whitespace are not indexed."""
+        path = os.path.join(self.tmp.name, "padded.jsonl")
+        with open(path, "wb") as f:
+            f.write(b'{"question": "a"}\r\n  \r\n\t\n {"question": "b"}\n   ')
+        with JsonlDataset(path) as dataset:
+            self.assertEqual([question["question"] for question in dataset], ["a", "b"])
+
+    def test_empty_dataset_loads_once(self):
+        """Test that an empty dataset is not reopened on every evaluation."""
+        class Agent:
+            def run(self, question):
+                return question
+
+        path = os.path.join(self.tmp.name, "empty.jsonl")
+        open(path, "w").close()
+        evaluator = BenchmarkEvaluator(dataset_path=path)
+        evaluator.evaluate_agent(Agent())
+        dataset = evaluator.questions
+        with patch.object(evaluator, "load_dataset") as load_dataset:
+            report = evaluator.evaluate_agent(Agent())
+
+        load_dataset.assert_not_called()
+        self.assertEqual(report["total_questions"], 0)
+        evaluator.load_dataset()
+        self.assertTrue(dataset._file.closed)
+        evaluator.questions.close()
+
+    def test_missing_dataset_path(self):
+        """Test that named datasets need a local file."""
+        with self.assertRaises(ValueError):
+            BenchmarkEvaluator(dataset_name="GSM8K").load_dataset()
+
+
+if __name__ == "__main__":
+    unittest.main()
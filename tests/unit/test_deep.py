@@ -0,0 +1,251 @@
+"""Tests for deep step, tool and model-call instrumentation."""
+
+import asyncio
+import unittest
+
+from opentelemetry import trace
+
+from nexushive.client import instrument_agent
+from nexushive.client.deep import LLM, STEP, TOOL, patch_agent, restore_method
+from nexushive.client.pipeline import get_pipeline
+from nexushive.client.sampling import HeadSampler, TailSampler
+
+
+class Usage:
+    def __init__(self, input_tokens, output_tokens):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+class Message:
+    def __init__(self, content):
+        self.content = content
+        self.token_usage = Usage(12, 4)
+
+
+class Model:
+    """Model with smolagents' generate/__call__ layout."""
+
+    model_id = "mock-model"
+
+    def generate(self, messages):
+        return Message("call the calculator")
+
+    def __call__(self, messages):
+        return self.generate(messages)
+
+
+class Tool:
+    """Tool with smolagents' __call__/forward layout."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, *args):
+        return self.forward(*args)
+
+    def forward(self, a, b):
+        return a + b
+
+
+class Step:
+    def __init__(self, step_number):
+        self.step_number = step_number
+
+
+class MultiStepAgent:
+    """Mock agent running a model call and a tool call per step."""
+
+    def __init__(self, steps=3):
+        self.steps = steps
+        self.model = Model()
+        self.tools = {"add": Tool("add")}
+
+    def step(self, memory_step):
+        self.model([{"role": "user", "content": "add"}])
+        return self.tools["add"](memory_step.step_number, 1)
+
+    def run(self, task):
+        return [self.step(Step(i)) for i in range(1, self.steps + 1)]
+
+
+class StreamingAgent(MultiStepAgent):
+    """Agent whose steps are generators, like smolagents' _step_stream."""
+
+    def step(self, memory_step):
+        yield self.model([{"role": "user", "content": "add"}])
+        yield self.tools["add"](memory_step.step_number, 1)
+
+    def run(self, task):
+        return [list(self.step(Step(i)))[-1] for i in range(1, self.steps + 1)]
+
+
+class AsyncAgent(MultiStepAgent):
+    """Agent with async steps."""
+
+    async def step(self, memory_step):
+        await asyncio.sleep(0)
+        return super().step(memory_step)
+
+    async def run(self, task):
+        return [await self.step(Step(i)) for i in range(1, self.steps + 1)]
+
+
+class AsyncStreamingAgent(MultiStepAgent):
+    """Agent whose steps are async generators."""
+
+    async def step(self, memory_step):
+        yield self.model([{"role": "user", "content": "add"}])
+        await asyncio.sleep(0)
+        yield self.tools["add"](memory_step.step_number, 1)
+
+    async def run(self, task):
+        results = []
+        for i in range(1, self.steps + 1):
+            async for item in self.step(Step(i)):
+                last = item
+            results.append(last)
+        return results
+
+
+class StreamingRunAgent(StreamingAgent):
+    """Agent whose run yields each step's result, like run(stream=True)."""
+
+    def run(self, task):
+        for i in range(1, self.steps + 1):
+            yield list(self.step(Step(i)))[-1]
+
+
+PATCHED = [(MultiStepAgent, "step"), (StreamingAgent, "step"), (AsyncAgent, "step"), (AsyncStreamingAgent, "step"),
+           (Model, "generate"), (Model, "__call__"), (Tool, "__call__")]
+
+
+def finished_spans(service):
+    pipeline = get_pipeline(service, "http://localhost:4317")
+    pipeline.processor.force_flush()
+    return pipeline.exporter.get_finished_spans()
+
+
+class TestDeepInstrumentation(unittest.TestCase):
+    """Test child spans under agent.run."""
+
+    def tearDown(self):
+        """Restore the patched mock classes."""
+        for cls, name in PATCHED:
+            restore_method(cls, name)
+
+    def check_tree(self, spans, steps=3):
+        by_name = {}
+        for span in spans:
+            by_name.setdefault(span.name, []).append(span)
+        run = by_name["agent.run"][0]
+        self.assertEqual(len(by_name[STEP]), steps)
+        self.assertEqual(len(by_name[LLM]), steps)
+        self.assertEqual(len(by_name[TOOL]), steps)
+
+        step_ids = {step.context.span_id for step in by_name[STEP]}
+        self.assertTrue(all(step.parent.span_id == run.context.span_id for step in by_name[STEP]))
+        self.assertTrue(all(span.parent.span_id in step_ids for span in by_name[LLM] + by_name[TOOL]))
+
+        self.assertEqual(sorted(step.attributes["agent.step.number"] for step in by_name[STEP]), [1, 2, 3])
+        self.assertEqual(by_name[TOOL][0].attributes["agent.tool.name"], "add")
+        self.assertEqual(by_name[LLM][0].attributes["agent.llm.model"], "mock-model")
+        self.assertEqual(by_name[LLM][0].attributes["agent.tokens.input"], 12)
+        self.assertEqual(by_name[STEP][0].attributes["agent.tokens.output"], 4)
+        self.assertTrue(all("agent.latency_ms" in span.attributes for span in spans))
+
+    def test_sync_steps(self):
+        """Test one span per step, model call and tool call."""
+        agent = instrument_agent(MultiStepAgent(), service_name="deep-sync", deep=True)
+
+        self.assertEqual(agent.run("task"), [2, 3, 4])
+        self.check_tree(finished_spans("deep-sync"))
+
+    def test_generator_steps(self):
+        """Test steps implemented as generators."""
+        agent = instrument_agent(StreamingAgent(), service_name="deep-gen", deep=True)
+
+        self.assertEqual(agent.run("task"), [2, 3, 4])
+        self.check_tree(finished_spans("deep-gen"))
+
+    def test_async_steps(self):
+        """Test async steps."""
+        agent = instrument_agent(AsyncAgent(), service_name="deep-async", deep=True)
+
+        self.assertEqual(asyncio.run(agent.run("task")), [2, 3, 4])
+        self.check_tree(finished_spans("deep-async"))
+
+    def test_async_generator_steps(self):
+        """Test steps implemented as async generators, leaving no context behind."""
+        agent = instrument_agent(AsyncStreamingAgent(), service_name="deep-async-gen", deep=True)
+
+        async def run():
+            result = await agent.run("task")
+            return result, trace.get_current_span().is_recording()
+
+        result, recording = asyncio.run(run())
+        self.assertEqual(result, [2, 3, 4])
+        self.assertFalse(recording)
+        self.check_tree(finished_spans("deep-async-gen"))
+
+    def test_streamed_run(self):
+        """Test steps run while the caller consumes a streamed run."""
+        agent = instrument_agent(StreamingRunAgent(), service_name="deep-stream", deep=True)
+
+        self.assertEqual(list(agent.run("task")), [2, 3, 4])
+        self.check_tree(finished_spans("deep-stream"))
+
+    def test_patches_classes_once(self):
+        """Test that further agents of the same classes add no patches."""
+        self.assertEqual(patch_agent(MultiStepAgent()), 4)
+        self.assertEqual(patch_agent(MultiStepAgent()), 0)
+
+    def test_no_spans_outside_runs(self):
+        """Test that patched classes are passive outside instrumented runs."""
+        instrument_agent(MultiStepAgent(), service_name="deep-idle", deep=True)
+        plain = MultiStepAgent()
+        plain.run("task")
+        Tool("add")(1, 2)
+
+        self.assertEqual(finished_spans("deep-idle"), ())
+
+    def test_head_sampled_runs(self):
+        """Test that unsampled runs get no child spans either."""
+        agent = instrument_agent(MultiStepAgent(), service_name="deep-sampled", deep=True,
+                                 head_sampler=HeadSampler(0.0))
+        agent.run("task")
+
+        self.assertEqual(finished_spans("deep-sampled"), ())
+
+    def test_tail_sampled_runs(self):
+        """Test that child spans are dropped or kept together with their run."""
+        for fast_path in (False, True):
+            service = f"deep-tail-{fast_path}"
+            tail_sampler = TailSampler(keep_ratio=0.0)
+            tail_sampler.threshold_ms = 1e9
+            agent = instrument_agent(MultiStepAgent(), service_name=service, deep=True, fast_path=fast_path,
+                                     tail_sampler=tail_sampler)
+            agent.run("task")
+            self.assertEqual(finished_spans(service), ())
+
+            agent.tools["add"].forward = lambda a, b: 1 / 0
+            with self.assertRaises(ZeroDivisionError):
+                agent.run("task")
+            spans = finished_spans(service)
+            self.assertEqual(spans[-1].name, "agent.run")
+            self.assertEqual({span.context.trace_id for span in spans}, {spans[-1].context.trace_id})
+            self.assertIn(TOOL, [span.name for span in spans])
+
+    def test_errors(self):
+        """Test that a failing tool marks its span."""
+        agent = instrument_agent(MultiStepAgent(), service_name="deep-error", deep=True)
+        agent.tools["add"].forward = lambda a, b: 1 / 0
+
+        with self.assertRaises(ZeroDivisionError):
+            agent.run("task")
+        tool_span = next(span for span in finished_spans("deep-error") if span.name == TOOL)
+        self.assertIn("division by zero", tool_span.attributes["agent.error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
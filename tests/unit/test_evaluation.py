@@ -0,0 +1,173 @@
+"""Tests for agent evaluation."""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from nexushive.collector.evaluation import BenchmarkEvaluator, extract_number, score_prediction
+from nexushive.collector.executors import AsyncExecutor, ProcessExecutor, ThreadExecutor
+
+QUESTIONS = [{"id": f"q{i}", "question": f"What is {i} + {i}?", "answer": f"#### {2 * i}"} for i in range(20)]
+
+
+class MockAgent:
+    """Agent answering 'What is a + b?' questions after a delay."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def run(self, question):
+        time.sleep(self.delay)
+        a = int(question.split()[2])
+        return f"The answer is {2 * a}"
+
+
+class MockAsyncAgent(MockAgent):
+    """Async variant of MockAgent."""
+
+    async def run(self, question):
+        await asyncio.sleep(self.delay)
+        a = int(question.split()[2])
+        return f"The answer is {2 * a}"
+
+
+class FlakyAgent(MockAgent):
+    """Agent failing the first attempt at every question."""
+
+    def __init__(self):
+        super().__init__()
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def run(self, question):
+        with self.lock:
+            first = question not in self.seen
+            self.seen.add(question)
+        if first:
+            raise RuntimeError("transient")
+        return super().run(question)
+
+
+class HangingAgent(MockAgent):
+    """Agent blocking until released."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def run(self, question):
+        self.release.wait(5.0)
+        return super().run(question)
+
+
+class TestScoring(unittest.TestCase):
+    """Test answer scoring."""
+
+    def test_numeric_answers(self):
+        """Test GSM8K-style final-number comparison."""
+        self.assertEqual(extract_number("so 3 apples, #### 1,234"), 1234.0)
+        self.assertEqual(score_prediction("The answer is 42.", "#### 42"), (True, 1.0))
+        self.assertFalse(score_prediction("The answer is 41", "#### 42")[0])
+
+    def test_text_answers(self):
+        """Test normalized exact match and token F1."""
+        self.assertEqual(score_prediction("The Eiffel Tower!", "eiffel tower"), (True, 1.0))
+        correct, f1 = score_prediction("the tall tower", "eiffel tower")
+        self.assertFalse(correct)
+        self.assertAlmostEqual(f1, 0.5)
+        self.assertEqual(score_prediction(None, "x"), (False, 0.0))
+
+
+class TestBenchmarkEvaluator(unittest.TestCase):
+    """Test the BenchmarkEvaluator class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.evaluator = BenchmarkEvaluator()
+        self.evaluator.questions = QUESTIONS
+
+    def _check(self, report):
+        self.assertEqual(report["accuracy"], 1.0)
+        self.assertEqual(report["total_questions"], 20)
+        self.assertEqual([r["id"] for r in report["results"]], [q["id"] for q in QUESTIONS])
+        self.assertGreater(report["throughput_qps"], 0)
+        self.assertIsNotNone(report["latency_ms"]["p95"])
+
+    def test_thread_executor(self):
+        """Test evaluation on a thread pool keeps dataset order."""
+        report = self.evaluator.evaluate_agent(MockAgent(0.01), ThreadExecutor(max_workers=8))
+
+        self._check(report)
+
+    def test_process_executor(self):
+        """Test evaluation on a process pool."""
+        report = self.evaluator.evaluate_agent(MockAgent(), ProcessExecutor(max_workers=2))
+
+        self._check(report)
+
+    def test_async_executor(self):
+        """Test evaluation of sync and async agents on the asyncio backend."""
+        self._check(self.evaluator.evaluate_agent(MockAsyncAgent(0.01), AsyncExecutor(concurrency=8)))
+        self._check(self.evaluator.evaluate_agent(MockAgent(0.01), AsyncExecutor(concurrency=8)))
+
+    def test_retries(self):
+        """Test that failed attempts are retried."""
+        for executor in (ThreadExecutor(4), AsyncExecutor(4)):
+            report = self.evaluator.evaluate_agent(FlakyAgent(), executor, retries=1)
+
+            self._check(report)
+            self.assertTrue(all(r["attempts"] == 2 for r in report["results"]))
+
+    def test_timeouts(self):
+        """Test that slow questions time out and count as errors."""
+        for executor in (ThreadExecutor(20), AsyncExecutor(20)):
+            report = self.evaluator.evaluate_agent(MockAsyncAgent(0.5), executor,
+                                                   timeout=0.05, questions=QUESTIONS[:3])
+
+            self.assertEqual(report["errors"], 3)
+            self.assertEqual(report["accuracy"], 0.0)
+            self.assertEqual(report["results"][0]["error"], "timeout")
+
+    def test_timeouts_bound_wall_time(self):
+        """Test that hung attempts are abandoned rather than waited for."""
+        for executor in (ThreadExecutor(2), AsyncExecutor(2)):
+            agent = HangingAgent()
+            start = time.perf_counter()
+            report = self.evaluator.evaluate_agent(agent, executor, timeout=0.2, retries=2,
+                                                   questions=QUESTIONS[:4])
+            elapsed = time.perf_counter() - start
+            agent.release.set()
+
+            self.assertEqual(report["errors"], 4)
+            self.assertTrue(all(r["attempts"] == 3 for r in report["results"]))
+            # Twelve 0.2 s attempts take 2.4 s even one after another; the
+            # agent itself would block for 5 s
+            self.assertLess(elapsed, 4.0)
+
+    def test_timeout_counts_from_attempt_start(self):
+        """Test that time queued behind other attempts is not charged."""
+        report = self.evaluator.evaluate_agent(MockAgent(0.1), ThreadExecutor(1), timeout=0.3,
+                                               questions=QUESTIONS[:6])
+
+        self.assertEqual(report["errors"], 0)
+
+    def test_streams_questions(self):
+        """Test that questions are pulled lazily from an iterator."""
+        pulled = []
+
+        def questions():
+            for question in QUESTIONS:
+                pulled.append(question["id"])
+                yield question
+
+        executor = ThreadExecutor(max_workers=2)
+        outcomes = executor.map(MockAgent(), questions())
+        next(outcomes)
+
+        self.assertLess(len(pulled), len(QUESTIONS))
+        outcomes.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
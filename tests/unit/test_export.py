@@ -0,0 +1,427 @@
+"""Tests for the buffered export stage against a fake OTLP gRPC server."""
+
+import builtins
+import os
+import pickle
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import grpc
+from opentelemetry.proto.collector.trace.v1 import trace_service_pb2, trace_service_pb2_grpc
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.trace import Status, StatusCode
+
+from nexushive.client import pipeline
+from nexushive.client.export import (
+    BLOCK,
+    DROP_NEWEST,
+    DROP_OLDEST,
+    BufferedSpanProcessor,
+    FailFastOTLPSpanExporter,
+    SpillLog,
+    decode_spans,
+    encode_spans,
+)
+from nexushive.client.http_exporter import FailFastOTLPHTTPSpanExporter
+
+
+class FakeTraceService(trace_service_pb2_grpc.TraceServiceServicer):
+    """OTLP trace service that can be slowed down or taken offline."""
+
+    def __init__(self):
+        self.latency = 0.0
+        self.down = False
+        self.lock = threading.Lock()
+        self.names = []
+
+    def Export(self, request, context):
+        if self.down:
+            context.abort(grpc.StatusCode.UNAVAILABLE, "collector offline")
+        time.sleep(self.latency)
+        with self.lock:
+            for resource_spans in request.resource_spans:
+                for scope_spans in resource_spans.scope_spans:
+                    self.names.extend(span.name for span in scope_spans.spans)
+        return trace_service_pb2.ExportTraceServiceResponse()
+
+
+class FakeHTTPTraceHandler(BaseHTTPRequestHandler):
+    """OTLP/HTTP trace endpoint answering 503 while the server is down."""
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        server.requests += 1
+        if server.down:
+            self.send_response(503)
+        else:
+            request = trace_service_pb2.ExportTraceServiceRequest.FromString(body)
+            for resource_spans in request.resource_spans:
+                for scope_spans in resource_spans.scope_spans:
+                    server.names.extend(span.name for span in scope_spans.spans)
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RecordingExporter(SpanExporter):
+    """In-memory exporter recording spans and their names."""
+
+    def __init__(self):
+        self.spans = []
+        self.names = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+        self.names.extend(span.name for span in spans)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def emit(processor, names):
+    """Finish one span per name through the processor."""
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer(__name__)
+    for name in names:
+        with tracer.start_as_current_span(name):
+            pass
+
+
+def wait_until(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class TestSpanCodec(unittest.TestCase):
+    """Test span serialization for the spill log."""
+
+    def test_round_trip(self):
+        """Test that spans survive encoding."""
+        exporter = RecordingExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        tracer = provider.get_tracer("scope", "1.2")
+        with tracer.start_as_current_span("parent"):
+            with tracer.start_as_current_span("child", attributes={"agent.id": "a", "n": [1, 2]}) as span:
+                span.add_event("retry", {"attempt": 2})
+                span.set_status(Status(StatusCode.ERROR, "boom"))
+
+        child, parent = decode_spans(encode_spans(exporter.spans))
+        self.assertEqual(child.name, "child")
+        self.assertEqual(child.parent.span_id, parent.context.span_id)
+        self.assertEqual(child.attributes["agent.id"], "a")
+        self.assertEqual(tuple(child.attributes["n"]), (1, 2))
+        self.assertEqual(child.events[0].attributes["attempt"], 2)
+        self.assertEqual(child.status.status_code, StatusCode.ERROR)
+        self.assertEqual(child.instrumentation_scope.version, "1.2")
+        self.assertEqual(child.end_time, exporter.spans[0].end_time)
+        provider.shutdown()
+
+    def test_spilled_batches_are_otlp(self):
+        """Test that batches are stored as OTLP requests and never unpickled."""
+        exporter = RecordingExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        with provider.get_tracer(__name__).start_as_current_span("run"):
+            pass
+        request = trace_service_pb2.ExportTraceServiceRequest.FromString(encode_spans(exporter.spans))
+        self.assertEqual(request.resource_spans[0].scope_spans[0].spans[0].name, "run")
+        provider.shutdown()
+
+        class Payload:
+            def __reduce__(self):
+                return exec, ("import builtins; builtins.spill_unpickled = True",)
+
+        with tempfile.TemporaryDirectory() as directory:
+            SpillLog(directory).append(pickle.dumps([Payload()]), 1)
+            processor = BufferedSpanProcessor(RecordingExporter(), spill_dir=directory, schedule_delay=60)
+            processor.force_flush()
+            processor.shutdown()
+
+        self.assertFalse(hasattr(builtins, "spill_unpickled"))
+
+
+class TestSpillLog(unittest.TestCase):
+    """Test replay of the spill log."""
+
+    def test_replay_keeps_unexported_batches(self):
+        """Test that a segment is only trimmed once its batches are exported."""
+        with tempfile.TemporaryDirectory() as directory:
+            spill = SpillLog(directory)
+            for i in range(3):
+                spill.append(b"batch%d" % i, 1)
+
+            def crash(payload):
+                raise RuntimeError("process died")
+
+            with self.assertRaises(RuntimeError):
+                spill.replay(crash)
+            self.assertEqual(SpillLog(directory).pending_spans, 3)
+
+            exported = []
+            self.assertEqual(spill.replay(lambda payload: exported.append(payload) or len(exported) < 2), 1)
+            self.assertEqual(SpillLog(directory).pending_spans, 2)
+
+            self.assertEqual(spill.replay(lambda payload: exported.append(payload) or True), 2)
+            self.assertEqual(exported, [b"batch0", b"batch1", b"batch1", b"batch2"])
+            self.assertEqual(os.listdir(directory), [])
+
+
+class TestOverflowPolicies(unittest.TestCase):
+    """Test the queue's overflow policies without a spill log."""
+
+    def run_policy(self, overflow):
+        exporter = RecordingExporter()
+        processor = BufferedSpanProcessor(exporter, max_queue_size=4, overflow=overflow,
+                                          block_timeout=0.05, schedule_delay=60)
+        start = time.perf_counter()
+        emit(processor, [f"s{i}" for i in range(10)])
+        elapsed = time.perf_counter() - start
+        processor.force_flush()
+        stats = processor.stats()
+        processor.shutdown()
+        return exporter.names, stats, elapsed
+
+    def test_drop_oldest(self):
+        """Test that the newest spans are kept."""
+        names, stats, _ = self.run_policy(DROP_OLDEST)
+
+        self.assertEqual(names, ["s6", "s7", "s8", "s9"])
+        self.assertEqual(stats["dropped_spans"], 6)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_drop_newest(self):
+        """Test that the oldest spans are kept."""
+        names, stats, _ = self.run_policy(DROP_NEWEST)
+
+        self.assertEqual(names, ["s0", "s1", "s2", "s3"])
+        self.assertEqual(stats["dropped_spans"], 6)
+
+    def test_block_with_timeout(self):
+        """Test that a full queue waits for room before giving up."""
+        names, stats, elapsed = self.run_policy(BLOCK)
+
+        self.assertEqual(names, ["s0", "s1", "s2", "s3"])
+        self.assertGreaterEqual(elapsed, 6 * 0.05)
+
+    def test_invalid_policy(self):
+        """Test that unknown policies are rejected."""
+        with self.assertRaises(ValueError):
+            BufferedSpanProcessor(RecordingExporter(), overflow="drop_random")
+
+
+class TestFakeCollector(unittest.TestCase):
+    """Test export to a fake OTLP collector with latency and outages."""
+
+    def setUp(self):
+        """Start the fake collector."""
+        self.service = FakeTraceService()
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        trace_service_pb2_grpc.add_TraceServiceServicer_to_server(self.service, self.server)
+        port = self.server.add_insecure_port("127.0.0.1:0")
+        self.server.start()
+        self.endpoint = f"127.0.0.1:{port}"
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Stop the fake collector."""
+        self.server.stop(None)
+        self.tmp.cleanup()
+
+    def processor(self, **kwargs):
+        exporter = FailFastOTLPSpanExporter(endpoint=self.endpoint, insecure=True, timeout=2)
+        options = dict(max_queue_size=16, max_export_batch_size=8, schedule_delay=0.02,
+                       retry_interval=0.05, spill_dir=self.tmp.name)
+        options.update(kwargs)
+        return BufferedSpanProcessor(exporter, **options)
+
+    def test_latency_does_not_block_callers(self):
+        """Test that a slow collector never slows down span creation."""
+        self.service.latency = 0.2
+        processor = self.processor()
+        names = [f"s{i}" for i in range(200)]
+
+        start = time.perf_counter()
+        emit(processor, names)
+        self.assertLess(time.perf_counter() - start, 0.2)
+
+        self.assertTrue(wait_until(lambda: len(self.service.names) == 200))
+        self.assertEqual(sorted(self.service.names), sorted(names))
+        self.assertEqual(processor.stats()["dropped_spans"], 0)
+        processor.shutdown()
+
+    def test_outage_spills_and_replays(self):
+        """Test that spans produced during an outage arrive after recovery."""
+        self.service.down = True
+        processor = self.processor()
+        names = [f"s{i}" for i in range(100)]
+        emit(processor, names)
+
+        self.assertTrue(wait_until(lambda: processor.stats()["failed_exports"] > 0))
+        stats = processor.stats()
+        self.assertGreater(stats["spilled_spans"], 0)
+        self.assertLessEqual(stats["queue_depth"], 16)
+        self.assertEqual(self.service.names, [])
+
+        self.service.down = False
+        self.assertTrue(wait_until(lambda: len(self.service.names) == 100))
+        stats = processor.stats()
+        self.assertEqual(sorted(self.service.names), sorted(names))
+        self.assertGreater(stats["replayed_spans"], 0)
+        self.assertEqual(stats["spill_depth"], 0)
+        self.assertEqual(stats["dropped_spans"], 0)
+        processor.shutdown()
+
+    def test_idle_processor_replays_after_recovery(self):
+        """Test that the spill log is replayed once the collector is back, without new spans."""
+        self.service.down = True
+        processor = self.processor()
+        emit(processor, [f"s{i}" for i in range(40)])
+        self.assertTrue(wait_until(lambda: processor.stats()["spill_depth"] == 40))
+
+        self.service.down = False
+        self.assertTrue(wait_until(lambda: len(self.service.names) == 40))
+        stats = processor.stats()
+        self.assertEqual(stats["replayed_spans"], 40)
+        self.assertEqual(stats["spill_depth"], 0)
+        processor.shutdown()
+
+    def test_spill_survives_restart(self):
+        """Test that spans spilled before shutdown are replayed by a new process."""
+        self.service.down = True
+        processor = self.processor()
+        emit(processor, [f"s{i}" for i in range(20)])
+        processor.shutdown()
+        self.assertEqual(self.service.names, [])
+
+        self.service.down = False
+        processor = self.processor()
+        self.assertTrue(processor.force_flush())
+
+        self.assertEqual(len(self.service.names), 20)
+        processor.shutdown()
+
+    def test_force_flush_reports_spilled_batches(self):
+        """Test that a flush whose batches were spilled reports failure."""
+        self.service.down = True
+        processor = self.processor(schedule_delay=60)
+        emit(processor, [f"s{i}" for i in range(4)])
+
+        self.assertFalse(processor.force_flush())
+        self.assertEqual(processor.stats()["spill_depth"], 4)
+        processor.shutdown()
+
+
+class TestFakeHTTPCollector(unittest.TestCase):
+    """Test the single-attempt OTLP/HTTP exporter."""
+
+    def setUp(self):
+        """Start the fake collector."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeHTTPTraceHandler)
+        self.server.down = False
+        self.server.requests = 0
+        self.server.names = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.endpoint = f"http://127.0.0.1:{self.server.server_port}/v1/traces"
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Stop the fake collector."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_outage_spills_and_replays(self):
+        """Test that failed batches are spilled without retrying on the export thread."""
+        self.server.down = True
+        exporter = FailFastOTLPHTTPSpanExporter(endpoint=self.endpoint, timeout=2)
+        processor = BufferedSpanProcessor(exporter, max_queue_size=16, max_export_batch_size=8,
+                                          schedule_delay=0.02, retry_interval=0.05, spill_dir=self.tmp.name)
+        names = [f"s{i}" for i in range(40)]
+
+        start = time.perf_counter()
+        emit(processor, names)
+        self.assertTrue(wait_until(lambda: processor.stats()["failed_exports"] > 0))
+        # The stock exporter would sleep a second before its first retry
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+        self.server.down = False
+        self.assertTrue(wait_until(lambda: len(self.server.names) == 40))
+        self.assertEqual(sorted(self.server.names), sorted(names))
+        processor.shutdown()
+
+    def test_unreachable_endpoint(self):
+        """Test that connection errors are reported as failed exports."""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        exporter = FailFastOTLPHTTPSpanExporter(endpoint=f"http://127.0.0.1:{port}/v1/traces", timeout=2)
+        spans = RecordingExporter()
+        emit(SimpleSpanProcessor(spans), ["s0"])
+
+        self.assertIs(exporter.export(spans.spans), SpanExportResult.FAILURE)
+
+
+class TestConfigureExport(unittest.TestCase):
+    """Test wiring the export stage into pipelines."""
+
+    def test_configure_export(self):
+        """Test that new pipelines use a buffered processor."""
+        with tempfile.TemporaryDirectory() as spill_dir:
+            pipeline.configure_export(max_queue_size=128, overflow=DROP_NEWEST, spill_dir=spill_dir)
+            processor = pipeline.get_pipeline("svc", "http://collector:4317").processor
+
+            self.assertIsInstance(processor, BufferedSpanProcessor)
+            self.assertEqual(processor.max_queue_size, 128)
+            self.assertTrue(processor.spill.directory.startswith(spill_dir))
+            pipeline.get_registry().shutdown()
+
+    def test_configure_export_http(self):
+        """Test that the single-attempt exporter matches the pipeline protocol."""
+        registry = pipeline.PipelineRegistry()
+        try:
+            with patch.object(pipeline, "_registry", registry):
+                pipeline.configure_export()
+                grpc_pipeline = pipeline.get_pipeline("svc", "localhost:4317")
+                http_pipeline = pipeline.get_pipeline("svc", "http://localhost:4318/v1/traces",
+                                                      pipeline.HTTP_PROTOBUF)
+
+            self.assertIsInstance(grpc_pipeline.exporter, FailFastOTLPSpanExporter)
+            self.assertIsInstance(http_pipeline.exporter, FailFastOTLPHTTPSpanExporter)
+        finally:
+            registry.shutdown()
+
+    def test_spill_dir_per_protocol(self):
+        """Test that pipelines differing only in protocol spill apart."""
+        registry = pipeline.PipelineRegistry()
+        try:
+            with tempfile.TemporaryDirectory() as spill_dir, patch.object(pipeline, "_registry", registry):
+                pipeline.configure_export(spill_dir=spill_dir)
+                grpc_pipeline = pipeline.get_pipeline("svc", "http://localhost:4318")
+                http_pipeline = pipeline.get_pipeline("svc", "http://localhost:4318", pipeline.HTTP_PROTOBUF)
+
+                self.assertNotEqual(grpc_pipeline.processor.spill.directory, http_pipeline.processor.spill.directory)
+                registry.shutdown()
+        finally:
+            registry.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
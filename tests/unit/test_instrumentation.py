@@ -1,13 +1,17 @@
 """Tests for agent instrumentation."""
 
+import asyncio
 import time
 import unittest
 from unittest.mock import MagicMock, patch
 
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
 
 from nexushive.client.instrumentation import AgentInstrumentor
+from nexushive.client.tokenization import WhitespaceTokenCounter
 
 
 class TestAgentInstrumentor(unittest.TestCase):
@@ -90,6 +94,221 @@ class TestAgentInstrumentor(unittest.TestCase):
         # Check that the error was recorded
         mock_span.record_exception.assert_called_once()
         mock_span.set_attribute.assert_any_call("agent.error", "test error")
+    
+    def test_error_status(self):
+        """Test that failed sync and async runs end with an ERROR status."""
+        exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        instrumentor = AgentInstrumentor("test-service", "test-agent-id")
+        instrumentor.tracer = provider.get_tracer(__name__)
+        
+        def error_func():
+            raise ValueError("test error")
+        
+        async def async_error_func():
+            raise ValueError("test error")
+        
+        with self.assertRaises(ValueError):
+            instrumentor.wrap_agent(error_func)()
+        with self.assertRaises(ValueError):
+            asyncio.run(instrumentor.wrap_async_agent(async_error_func)())
+        
+        spans = exporter.get_finished_spans()
+        self.assertEqual(len(spans), 2)
+        for span in spans:
+            self.assertEqual(span.status.status_code, trace.StatusCode.ERROR)
+            self.assertEqual(span.status.description, "test error")
+
+
+
+class TestFastPath(unittest.TestCase):
+    """Test the fast-path wrappers."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.instrumentor = AgentInstrumentor("test-service", "test-agent-id", fast_path=True,
+                                              token_counter=WhitespaceTokenCounter())
+        
+        # Create a spy tracer to check span attributes
+        self.mock_span = MagicMock()
+        self.instrumentor.tracer = MagicMock()
+        self.instrumentor.tracer.start_span.return_value = self.mock_span
+    
+    @patch('time.perf_counter_ns')
+    def test_batched_attributes(self, mock_perf_counter_ns):
+        """Test that attributes are set in one batch at start and end."""
+        mock_perf_counter_ns.side_effect = [1_000_000, 501_000_000]
+        
+        wrapped = self.instrumentor.wrap_agent(lambda input: "three word answer")
+        result = wrapped(input="two words")
+        
+        self.assertEqual(result, "three word answer")
+        self.instrumentor.tracer.start_span.assert_called_once_with(
+            "agent.run", attributes={"agent.id": "test-agent-id", "agent.tokens.input": 2})
+        self.mock_span.set_attributes.assert_called_once_with(
+            {"agent.latency_ms": 500.0, "agent.tokens.output": 3})
+        self.mock_span.set_attribute.assert_not_called()
+        self.mock_span.end.assert_called_once()
+    
+    def test_error_handling(self):
+        """Test that errors are recorded and the span is ended."""
+        def error_func():
+            raise ValueError("test error")
+        
+        wrapped = self.instrumentor.wrap_agent(error_func)
+        
+        with self.assertRaises(ValueError):
+            wrapped()
+        
+        self.mock_span.record_exception.assert_called_once()
+        attributes = self.mock_span.set_attributes.call_args[0][0]
+        self.assertEqual(attributes["agent.error"], "test error")
+        self.mock_span.end.assert_called_once()
+    
+    def test_cancelled_runs_end_the_span(self):
+        """Test that cancellation and interrupts still end the span."""
+        async def run(input):
+            await asyncio.sleep(10)
+        
+        async def cancel():
+            task = asyncio.ensure_future(self.instrumentor.wrap_async_agent(run)(input="hello"))
+            await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        
+        asyncio.run(cancel())
+        self.mock_span.end.assert_called_once()
+        
+        def interrupted(input):
+            raise KeyboardInterrupt
+        
+        with self.assertRaises(KeyboardInterrupt):
+            self.instrumentor.wrap_agent(interrupted)(input="hello")
+        self.assertEqual(self.mock_span.end.call_count, 2)
+        self.assertIs(trace.get_current_span(), trace.INVALID_SPAN)
+    
+    def test_async_wrapper(self):
+        """Test the async fast-path wrapper."""
+        async def run(input):
+            return "done"
+        
+        wrapped = self.instrumentor.wrap_async_agent(run)
+        result = asyncio.run(wrapped(input="hello"))
+        
+        self.assertEqual(result, "done")
+        attributes = self.mock_span.set_attributes.call_args[0][0]
+        self.assertEqual(attributes["agent.tokens.output"], 1)
+        self.mock_span.end.assert_called_once()
+
+
+
+class TestStreamingInstrumentation(unittest.TestCase):
+    """Test spans of runs that stream their response."""
+    
+    def setUp(self):
+        """Record spans in memory."""
+        self.exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(self.exporter))
+        self.instrumentor = AgentInstrumentor("test-service", "test-agent-id",
+                                              token_counter=WhitespaceTokenCounter())
+        self.instrumentor.tracer = provider.get_tracer(__name__)
+    
+    def span(self):
+        spans = self.exporter.get_finished_spans()
+        self.assertEqual(len(spans), 1)
+        return spans[0]
+    
+    def test_generator_run(self):
+        """Test that the span covers the whole stream and its metrics."""
+        consumed = []
+        
+        def run(input):
+            for chunk in ["one two", " three", " four five six"]:
+                time.sleep(0.01)
+                consumed.append(chunk)
+                yield chunk
+            return "summary"
+        
+        stream = self.instrumentor.wrap_stream_agent(run)(input="hi")
+        self.assertEqual(self.exporter.get_finished_spans(), ())
+        
+        # Chunks are passed on one at a time, not buffered
+        self.assertEqual(next(stream), "one two")
+        self.assertEqual(consumed, ["one two"])
+        self.assertEqual(self.exporter.get_finished_spans(), ())
+        with self.assertRaises(StopIteration) as stop:
+            while True:
+                next(stream)
+        self.assertEqual(stop.exception.value, "summary")
+        
+        attributes = self.span().attributes
+        self.assertEqual(attributes["agent.stream.chunks"], 3)
+        self.assertEqual(attributes["agent.tokens.output"], 6)
+        self.assertGreaterEqual(attributes["agent.stream.time_to_first_token_ms"], 10)
+        self.assertGreaterEqual(attributes["agent.stream.inter_token_latency_ms"], 10)
+        self.assertGreaterEqual(attributes["agent.latency_ms"], 30)
+    
+    def test_returned_generator(self):
+        """Test plain runs returning a generator, on both wrapper paths."""
+        def run(input):
+            return (word for word in ["a", "b"])
+        
+        for fast_path in (False, True):
+            self.exporter.clear()
+            self.instrumentor.fast_path = fast_path
+            stream = self.instrumentor.wrap_agent(run)(input="hi")
+            self.assertEqual(self.exporter.get_finished_spans(), ())
+            self.assertEqual(list(stream), ["a", "b"])
+            self.assertEqual(self.span().attributes["agent.stream.chunks"], 2)
+    
+    def test_async_generator_run(self):
+        """Test async generator runs."""
+        async def run(input):
+            for chunk in ["a b", "c"]:
+                await asyncio.sleep(0)
+                yield chunk
+        
+        async def consume():
+            return [chunk async for chunk in self.instrumentor.wrap_async_stream_agent(run)(input="hi")]
+        
+        self.assertEqual(asyncio.run(consume()), ["a b", "c"])
+        attributes = self.span().attributes
+        self.assertEqual(attributes["agent.stream.chunks"], 2)
+        self.assertEqual(attributes["agent.tokens.output"], 3)
+    
+    def test_stream_closed_early(self):
+        """Test that a stream abandoned by the consumer still ends the span."""
+        closed = []
+        
+        def run(input):
+            try:
+                yield from ["a", "b", "c"]
+            finally:
+                closed.append(True)
+        
+        stream = self.instrumentor.wrap_stream_agent(run)(input="hi")
+        next(stream)
+        stream.close()
+        
+        self.assertEqual(closed, [True])
+        self.assertEqual(self.span().attributes["agent.stream.chunks"], 1)
+    
+    def test_stream_error(self):
+        """Test that a failing stream records the error and what was streamed."""
+        def run(input):
+            yield "a"
+            raise ValueError("stream broke")
+        
+        with self.assertRaises(ValueError):
+            list(self.instrumentor.wrap_stream_agent(run)(input="hi"))
+        
+        span = self.span()
+        self.assertEqual(span.attributes["agent.error"], "stream broke")
+        self.assertEqual(span.attributes["agent.stream.chunks"], 1)
+        self.assertFalse(span.status.is_ok)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+"""Tests for the batched LLM judge against a local stub judge server."""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from nexushive.collector.evaluation import LLMJudge
+from nexushive.collector.judging import parse_verdicts
+
+
+class StubJudgeHandler(BaseHTTPRequestHandler):
+    """OpenAI-style chat completions endpoint scoring exact matches as 1.0."""
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(server.delay)
+            content = body["messages"][-1]["content"]
+            criteria = content.split("\n", 1)[0][len("Criteria: "):].split(", ")
+            items = json.loads(content.split("Items:\n", 1)[1])
+            server.batch_sizes.append(len(items))
+            if any(item["query"] in server.failing for item in items):
+                self.send_error(400)
+                return
+            verdicts = [{
+                "index": item["index"],
+                "scores": {c: float(item["response"] == item["reference"]) for c in criteria},
+                "feedback": "ok",
+            } for item in items]
+            reply = json.dumps({"choices": [{"message": {"role": "assistant", "content": json.dumps(verdicts)}}]})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(reply.encode())
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class TestLLMJudge(unittest.TestCase):
+    """Test the LLMJudge class."""
+
+    def setUp(self):
+        """Start the stub judge server."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubJudgeHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = self.server.active = self.server.max_active = 0
+        self.server.batch_sizes = []
+        self.server.delay = 0.0
+        self.server.failing = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.items = [{"query": f"q{i}", "response": str(i), "reference": str(i if i % 2 else -i)}
+                      for i in range(1, 11)]
+
+    def tearDown(self):
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_batches_requests(self):
+        """Test that items are packed into batch_size requests, in order."""
+        judge = LLMJudge(endpoint=self.endpoint, batch_size=4)
+        verdicts = judge.evaluate_many(self.items, criteria=["correctness"])
+
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(sorted(self.server.batch_sizes), [2, 4, 4])
+        self.assertEqual([v["overall_score"] for v in verdicts], [1.0 if i % 2 else 0.0 for i in range(1, 11)])
+
+    def test_disk_cache(self):
+        """Test that a rerun is served from the verdict cache."""
+        cache_path = os.path.join(self.tmp.name, "verdicts.db")
+        first = LLMJudge(endpoint=self.endpoint, cache_path=cache_path).evaluate_many(self.items)
+
+        judge = LLMJudge(endpoint=self.endpoint, cache_path=cache_path)
+        again = judge.evaluate_many(self.items + self.items[:2])
+
+        self.assertEqual(judge.requests_sent, 0)
+        self.assertEqual(again[:10], first)
+        self.assertEqual(again[10], first[0])
+
+        # Changing the criteria changes the key
+        judge.evaluate_many(self.items[:1], criteria=["clarity"])
+        self.assertEqual(judge.requests_sent, 1)
+
+    def test_concurrency_limit(self):
+        """Test that requests run concurrently up to max_concurrency."""
+        self.server.delay = 0.05
+        judge = LLMJudge(endpoint=self.endpoint, batch_size=1, max_concurrency=3)
+        judge.evaluate_many(self.items)
+
+        self.assertEqual(self.server.requests, 10)
+        self.assertLessEqual(self.server.max_active, 3)
+        self.assertGreater(self.server.max_active, 1)
+
+    def test_rate_limit(self):
+        """Test that request starts are spaced by the rate limit."""
+        judge = LLMJudge(endpoint=self.endpoint, batch_size=2, requests_per_second=50)
+        start = time.perf_counter()
+        judge.evaluate_many(self.items)
+
+        self.assertGreaterEqual(time.perf_counter() - start, 4 / 50)
+
+    def test_failed_batch_keeps_other_verdicts(self):
+        """Test that one failed request only costs its own batch."""
+        self.server.failing = {"q1"}
+        cache_path = os.path.join(self.tmp.name, "verdicts.db")
+        judge = LLMJudge(endpoint=self.endpoint, batch_size=4, cache_path=cache_path)
+        with self.assertLogs("nexushive.collector.evaluation", "WARNING"):
+            verdicts = judge.evaluate_many(self.items, criteria=["correctness"])
+
+        self.assertEqual([v.get("error") is not None for v in verdicts], [True] * 4 + [False] * 6)
+        self.assertEqual(len(judge.cache), 6)
+
+    def test_inside_event_loop(self):
+        """Test that the sync API works when called from a running loop."""
+        judge = LLMJudge(endpoint=self.endpoint)
+
+        async def main():
+            return judge.evaluate_response("q1", "1", criteria=["correctness"], reference="1")
+
+        self.assertEqual(asyncio.run(main())["overall_score"], 1.0)
+
+    def test_malformed_entries_are_skipped(self):
+        """Test that entries of the wrong shape leave only their item unjudged."""
+        entries = ["oops", {"index": 1, "scores": "high"}, {"index": 2, "scores": {"clarity": 0.5}}]
+        body = {"choices": [{"message": {"content": json.dumps(entries)}}]}
+
+        verdicts = parse_verdicts(body, ["clarity"], 3)
+
+        self.assertEqual(verdicts[:2], [None, None])
+        self.assertEqual(verdicts[2]["overall_score"], 0.5)
+
+    def test_placeholder_without_endpoint(self):
+        """Test the offline placeholder verdict."""
+        verdict = LLMJudge().evaluate_response("q", "r", criteria=["clarity"])
+
+        self.assertEqual(verdict["scores"], {"clarity": 0.85})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,214 @@
+"""Tests for agent metrics collection."""
+
+import threading
+import unittest
+
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+from nexushive.collector.aggregation import OTHER, CardinalityLimiter, intern_attributes
+from nexushive.collector.metrics import AgentMetricsCollector
+
+
+def _points(reader, name):
+    """Return {attributes: data point} for one metric."""
+    points = {}
+    data = reader.get_metrics_data()
+    for resource_metrics in (data.resource_metrics if data else ()):
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                if metric.name == name:
+                    for point in metric.data.data_points:
+                        points[tuple(sorted(point.attributes.items()))] = point
+    return points
+
+
+class TestAttributeInterning(unittest.TestCase):
+    """Test attribute set interning."""
+
+    def test_equal_dicts_share_one_set(self):
+        """Test that equal attribute dicts intern to the same object."""
+        a = intern_attributes({"agent.id": "a", "model": "m"})
+        b = intern_attributes({"model": "m", "agent.id": "a"})
+
+        self.assertIs(a, b)
+        self.assertIs(intern_attributes(a), a)
+        self.assertEqual(a.attributes, {"agent.id": "a", "model": "m"})
+
+
+class TestAgentMetricsCollector(unittest.TestCase):
+    """Test the AgentMetricsCollector class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.reader = InMemoryMetricReader()
+        self.collector = AgentMetricsCollector("test-service", metric_reader=self.reader)
+
+    def test_pre_aggregated_totals(self):
+        """Test that pre-aggregated counters are exact after a flush."""
+        attributes = self.collector.attributes({"agent.id": "a"})
+        for _ in range(10):
+            self.collector.record_tokens(5, attributes)
+        self.collector.record_tokens(1, {"agent.id": "b"})
+
+        self.assertEqual(_points(self.reader, "agent.tokens"), {})
+
+        self.collector.flush()
+        points = _points(self.reader, "agent.tokens")
+        self.assertEqual(points[(("agent.id", "a"),)].value, 50)
+        self.assertEqual(points[(("agent.id", "b"),)].value, 1)
+
+    def test_latency_samples_flushed(self):
+        """Test that buffered latencies reach the histogram."""
+        for latency in (10.0, 20.0, 30.0):
+            self.collector.record_latency(latency, {"agent.id": "a"})
+
+        self.collector.flush()
+        point = _points(self.reader, "agent.latency")[(("agent.id", "a"),)]
+        self.assertEqual(point.count, 3)
+        self.assertEqual(point.sum, 60.0)
+
+    def test_record_error_does_not_mutate_attributes(self):
+        """Test that error.type is added without touching the caller's dict."""
+        attributes = {"agent.id": "a"}
+        self.collector.record_error("Timeout", attributes)
+        self.collector.record_error("Timeout", attributes)
+
+        self.collector.flush()
+        self.assertEqual(attributes, {"agent.id": "a"})
+        points = _points(self.reader, "agent.errors")
+        self.assertEqual(points[(("agent.id", "a"), ("error.type", "Timeout"))].value, 2)
+
+    def test_threads_merge_exactly(self):
+        """Test that concurrent threads' deltas merge without loss."""
+        attributes = self.collector.attributes({"agent.id": "a"})
+
+        def work():
+            for _ in range(1000):
+                self.collector.record_tokens(1, attributes)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        self.collector.flush()
+        for thread in threads:
+            thread.join()
+        self.collector.flush()
+
+        point = _points(self.reader, "agent.tokens")[(("agent.id", "a"),)]
+        self.assertEqual(point.value, 8000)
+
+    def test_thread_latency_sketches_merge_on_query(self):
+        """Test that per-thread latency sketches are merged when queried."""
+        attributes = self.collector.attributes({"agent.id": "a"})
+
+        def work(offset):
+            for i in range(500):
+                self.collector.record_latency(offset + i % 10, attributes)
+
+        threads = [threading.Thread(target=work, args=(100.0 * n,)) for n in range(1, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.collector.latency_sketch("a").count, 2000)
+        self.assertAlmostEqual(self.collector.latency_quantiles("a", (0.0,))[0.0], 100.0, delta=1.0)
+        self.collector.record_latency(1000.0, attributes)
+        self.collector.flush()
+        self.assertEqual(self.collector.latency_sketch("a").count, 2001)
+
+    def test_direct_mode(self):
+        """Test that pre-aggregation can be disabled."""
+        reader = InMemoryMetricReader()
+        collector = AgentMetricsCollector("test-service", pre_aggregate=False, metric_reader=reader)
+        collector.record_tokens(3, {"agent.id": "a"})
+
+        self.assertEqual(_points(reader, "agent.tokens")[(("agent.id", "a"),)].value, 3)
+
+
+class TestCardinalityLimiter(unittest.TestCase):
+    """Test the CardinalityLimiter class."""
+
+    def test_overflow_folds_into_other(self):
+        """Test that sets past the cap share one overflow set."""
+        limiter = CardinalityLimiter(max_series=2)
+        a = limiter.limit("agent.tokens", {"agent.id": "a"})
+        limiter.limit("agent.tokens", {"agent.id": "b"})
+        c = limiter.limit("agent.tokens", {"agent.id": "c"})
+        d = limiter.limit("agent.tokens", intern_attributes({"agent.id": "d"}))
+
+        self.assertIs(a, intern_attributes({"agent.id": "a"}))
+        self.assertIs(c, d)
+        self.assertEqual(c.attributes, {"agent.id": OTHER})
+        self.assertIs(limiter.limit("agent.tokens", {"agent.id": "a"}), a)
+        # Caps are per instrument
+        self.assertEqual(limiter.limit("agent.latency", {"agent.id": "c"}).attributes, {"agent.id": "c"})
+        self.assertTrue(limiter.admitted("agent.tokens", a))
+        self.assertFalse(limiter.admitted("agent.tokens", c))
+
+    def test_allowlist_strips_keys(self):
+        """Test that keys outside the allowlist are dropped before counting sets."""
+        limiter = CardinalityLimiter(max_series=10, allowed_keys={"agent.id"})
+        sets = {limiter.limit("agent.tokens", {"agent.id": "a", "request.id": str(i)}) for i in range(100)}
+
+        self.assertEqual([s.attributes for s in sets], [{"agent.id": "a"}])
+        report = limiter.report()["agent.tokens"]
+        self.assertEqual((report["series"], report["overflowed"]), (1, 0))
+        self.assertEqual(report["dropped_keys"], ["request.id"])
+
+    def test_report(self):
+        """Test that overflowing measurements and examples are reported."""
+        limiter = CardinalityLimiter(max_series=1, instrument_limits={"agent.errors": 3}, max_examples=2)
+        for i in range(5):
+            limiter.limit("agent.tokens", {"request.id": str(i)})
+            limiter.limit("agent.errors", {"request.id": str(i)})
+
+        report = limiter.report()
+        self.assertEqual(report["agent.tokens"]["limit"], 1)
+        self.assertEqual(report["agent.tokens"]["overflowed"], 4)
+        self.assertEqual(report["agent.tokens"]["examples"], [{"request.id": "1"}, {"request.id": "2"}])
+        self.assertEqual((report["agent.errors"]["series"], report["agent.errors"]["overflowed"]), (3, 2))
+
+
+class TestCollectorCardinality(unittest.TestCase):
+    """Test the cardinality guard of AgentMetricsCollector."""
+
+    def test_exported_series_are_bounded(self):
+        """Test that a caller passing request ids cannot grow the exported series."""
+        reader = InMemoryMetricReader()
+        collector = AgentMetricsCollector("test-service", metric_reader=reader,
+                                          cardinality_limiter=CardinalityLimiter(max_series=3))
+        for i in range(50):
+            attributes = {"agent.id": "a", "request.id": str(i)}
+            collector.record_tokens(1, attributes)
+            collector.record_latency(10.0, attributes)
+            collector.record_error("timeout", attributes)
+        collector.flush()
+
+        tokens = _points(reader, "agent.tokens")
+        self.assertEqual(len(tokens), 4)
+        self.assertEqual(tokens[(("agent.id", OTHER), ("request.id", OTHER))].value, 47)
+        self.assertEqual(sum(point.value for point in tokens.values()), 50)
+        self.assertEqual(len(_points(reader, "agent.errors")), 4)
+        self.assertEqual(collector.latency_sketch(OTHER).count, 47)
+        self.assertEqual(collector.cardinality_report()["agent.latency"]["overflowed"], 47)
+
+    def test_interned_error_sets(self):
+        """Test that errors with interned attributes keep counting past the cap."""
+        reader = InMemoryMetricReader()
+        collector = AgentMetricsCollector("test-service", metric_reader=reader,
+                                          cardinality_limiter=CardinalityLimiter(max_series=1))
+        attributes = collector.attributes({"agent.id": "a"})
+        for _ in range(3):
+            collector.record_error("timeout", attributes)
+            collector.record_error("refused", attributes)
+        collector.flush()
+
+        errors = _points(reader, "agent.errors")
+        self.assertEqual(errors[(("agent.id", "a"), ("error.type", "timeout"))].value, 3)
+        self.assertEqual(errors[(("agent.id", OTHER), ("error.type", OTHER))].value, 3)
+        self.assertEqual(collector.cardinality_report()["agent.errors"]["overflowed"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
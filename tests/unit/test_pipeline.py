@@ -0,0 +1,100 @@
+"""Tests for shared tracer pipelines."""
+
+import threading
+import unittest
+
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from nexushive.client.instrumentation import AgentInstrumentor
+from nexushive.client.pipeline import HTTP_PROTOBUF, PipelineRegistry, get_registry
+
+
+class TestPipelineRegistry(unittest.TestCase):
+    """Test the PipelineRegistry class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.registry = PipelineRegistry(exporter_factory=lambda endpoint: InMemorySpanExporter())
+
+    def tearDown(self):
+        """Shut down pipelines created by the test."""
+        self.registry.shutdown()
+
+    def test_same_key_returns_same_pipeline(self):
+        """Test that a (service_name, endpoint) pair maps to one pipeline."""
+        first = self.registry.get("svc", "http://localhost:4317")
+        second = self.registry.get("svc", "http://localhost:4317")
+
+        self.assertIs(first, second)
+        self.assertEqual(len(self.registry), 1)
+
+    def test_distinct_keys_get_distinct_pipelines(self):
+        """Test that services and endpoints are isolated from each other."""
+        a = self.registry.get("svc-a", "http://localhost:4317")
+        b = self.registry.get("svc-b", "http://localhost:4317")
+        c = self.registry.get("svc-a", "http://collector:4317")
+
+        self.assertEqual(len({id(a), id(b), id(c)}), 3)
+        self.assertEqual(a.provider.resource.attributes["service.name"], "svc-a")
+
+    def test_protocols_get_distinct_pipelines(self):
+        """Test that the protocol is part of the pipeline key."""
+        grpc_pipeline = self.registry.get("svc", "localhost:4317")
+        http_pipeline = self.registry.get("svc", "localhost:4317", HTTP_PROTOBUF)
+
+        self.assertIsNot(grpc_pipeline, http_pipeline)
+        with self.assertRaises(ValueError):
+            self.registry.get("svc", "localhost:4317", "http/json")
+
+    def test_default_exporter_follows_protocol(self):
+        """Test that the default factory builds an HTTP exporter for http/protobuf."""
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        registry = PipelineRegistry()
+        try:
+            pipeline = registry.get("svc", "http://localhost:4318/v1/traces", HTTP_PROTOBUF)
+            self.assertIsInstance(pipeline.exporter, OTLPSpanExporter)
+            self.assertEqual(pipeline.exporter._endpoint, "http://localhost:4318/v1/traces")
+        finally:
+            registry.shutdown()
+
+    def test_shutdown_clears_registry(self):
+        """Test that shutdown forgets all pipelines."""
+        self.registry.get("svc", "http://localhost:4317")
+        self.registry.shutdown()
+
+        self.assertEqual(len(self.registry), 0)
+
+
+class TestSharedInstrumentors(unittest.TestCase):
+    """Test that instrumentors reuse the shared pipeline."""
+
+    def test_instrumentors_share_pipeline(self):
+        """Test that many agents do not create extra export threads."""
+        first = AgentInstrumentor("test-service", "agent-0")
+        threads_before = threading.active_count()
+
+        instrumentors = [AgentInstrumentor("test-service", f"agent-{i}") for i in range(1, 50)]
+
+        self.assertEqual(threading.active_count(), threads_before)
+        self.assertTrue(all(i.pipeline is first.pipeline for i in instrumentors))
+        self.assertEqual(len(get_registry()), 1)
+
+    def test_agent_id_on_spans(self):
+        """Test that agent identity travels as a span attribute."""
+        instrumentor_a = AgentInstrumentor("test-service", "agent-a")
+        instrumentor_b = AgentInstrumentor("test-service", "agent-b")
+
+        instrumentor_a.wrap_agent(lambda: "a")()
+        instrumentor_b.wrap_agent(lambda: "b")()
+
+        pipeline = instrumentor_a.pipeline
+        pipeline.provider.force_flush()
+        spans = pipeline.exporter.get_finished_spans()
+
+        self.assertEqual([s.attributes["agent.id"] for s in spans], ["agent-a", "agent-b"])
+        self.assertNotIn("agent.id", pipeline.provider.resource.attributes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+"""Tests for run profiling and profile rendering."""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+from nexushive.client.api import instrument_agent
+from nexushive.client.pipeline import get_pipeline
+from nexushive.client.profiling import StackSampler
+from nexushive.client.sampling import HeadSampler
+from nexushive.collector.profiles import (load_folded, main, merge_profiles, parse_folded, profiles_from_spans,
+                                          to_flamegraph_svg, to_folded, to_speedscope)
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def fetch():
+    time.sleep(0.1)
+
+
+class ProfiledAgent:
+    """Agent that computes, then waits on a slow call."""
+
+    def run(self, input):
+        spin(0.05)
+        fetch()
+        return "done"
+
+
+class TestStackSampler(unittest.TestCase):
+    """Test sampling the stacks of instrumented runs."""
+
+    def finished_spans(self, service):
+        pipeline = get_pipeline(service, "http://localhost:4317")
+        pipeline.processor.force_flush()
+        return pipeline.exporter.get_finished_spans()
+
+    def test_span_profile(self):
+        """Test that runs carry folded stacks of the agent's frames only."""
+        for fast_path in (False, True):
+            service = f"profile-{fast_path}"
+            agent = instrument_agent(ProfiledAgent(), service, fast_path=fast_path,
+                                     profiler=StackSampler(interval=0.005))
+            agent.run(input="go")
+
+            span, = self.finished_spans(service)
+            stacks = parse_folded(span.attributes["agent.profile.folded"].splitlines())
+            self.assertEqual(sum(stacks.values()), span.attributes["agent.profile.samples"])
+            self.assertTrue(all(stack.startswith("ProfiledAgent.run (test_profiling.py:") for stack in stacks))
+            fetch_samples = sum(count for stack, count in stacks.items() if "fetch" in stack)
+            self.assertGreater(fetch_samples, 5)
+            self.assertNotIn("wrapped_run", "".join(stacks))
+
+    def test_async_runs(self):
+        """Test that concurrent async runs are told apart on one loop."""
+        sampler = StackSampler(interval=0.005)
+
+        class AsyncAgent:
+            async def run(self, input):
+                if input == "busy":
+                    # Spin past the GIL switch interval, so that samples do
+                    # not all land on the loop's select between steps
+                    while sampler.samples_taken < 10:
+                        spin(0.03)
+                        await asyncio.sleep(0)
+                    self.done.set()
+                else:
+                    await self.done.wait()
+                return input
+
+        agent = instrument_agent(AsyncAgent(), "profile-async", profiler=sampler)
+
+        async def main():
+            agent.done = asyncio.Event()
+            await asyncio.gather(agent.run(input="busy"), agent.run(input="idle"))
+
+        asyncio.run(main())
+        spans = self.finished_spans("profile-async")
+        self.assertEqual(len(spans), 2)
+        # The idle run may catch a sample too, while it starts or resumes
+        busy, = [span for span in spans if "spin" in span.attributes.get("agent.profile.folded", "")]
+        self.assertNotIn("sleep", busy.attributes["agent.profile.folded"])
+
+    def test_directory_output(self):
+        """Test writing profiles to files named after their spans."""
+        with tempfile.TemporaryDirectory() as directory:
+            agent = instrument_agent(ProfiledAgent(), "profile-files", agent_id="a",
+                                     profiler=StackSampler(interval=0.005, directory=directory))
+            agent.run(input="go")
+            agent.run(input="again")
+
+            spans = self.finished_spans("profile-files")
+            paths = [span.attributes["agent.profile.path"] for span in spans]
+            self.assertEqual(sorted(paths), sorted(os.path.join(directory, name) for name in os.listdir(directory)))
+            self.assertTrue(os.path.basename(paths[0]).startswith("a-"))
+            merged = load_folded(directory)
+            self.assertEqual(merged, profiles_from_spans(spans))
+            self.assertEqual(sum(merged.values()), sum(span.attributes["agent.profile.samples"] for span in spans))
+
+    def test_unsampled_runs_are_not_profiled(self):
+        """Test that runs dropped by head sampling are neither sampled nor written."""
+        with tempfile.TemporaryDirectory() as directory:
+            sampler = StackSampler(interval=0.005, directory=directory)
+            agent = instrument_agent(ProfiledAgent(), "profile-unsampled", profiler=sampler,
+                                     head_sampler=HeadSampler(0.0))
+            agent.run(input="go")
+
+            self.assertEqual(os.listdir(directory), [])
+            self.assertEqual(sampler.samples_taken, 0)
+
+    def test_unsafe_agent_ids(self):
+        """Test that agent ids cannot lead profile files out of the directory."""
+        with tempfile.TemporaryDirectory() as directory:
+            agent = instrument_agent(ProfiledAgent(), "profile-unsafe", agent_id="../team/a b",
+                                     profiler=StackSampler(interval=0.005, directory=directory))
+            agent.run(input="go")
+
+            name, = os.listdir(directory)
+            self.assertTrue(name.startswith(".._team_a_b-"))
+
+    def test_write_errors_keep_the_run_result(self):
+        """Test that a profile that cannot be written does not fail the run."""
+        with tempfile.TemporaryDirectory() as directory:
+            blocked = os.path.join(directory, "file")
+            open(blocked, "w").close()
+            agent = instrument_agent(ProfiledAgent(), "profile-unwritable",
+                                     profiler=StackSampler(interval=0.005, directory=blocked))
+
+            with self.assertLogs("nexushive.client.instrumentation", "WARNING"):
+                self.assertEqual(agent.run(input="go"), "done")
+            span, = self.finished_spans("profile-unwritable")
+            self.assertNotIn("agent.profile.path", span.attributes)
+
+    def test_stack_limit(self):
+        """Test that rare stacks beyond the limit are folded together."""
+        sampler = StackSampler(interval=0.002, max_stacks=1)
+        instrument_agent(ProfiledAgent(), "profile-limit", profiler=sampler).run(input="go")
+
+        span, = self.finished_spans("profile-limit")
+        stacks = parse_folded(span.attributes["agent.profile.folded"].splitlines())
+        self.assertLessEqual(len(stacks), 2)
+        self.assertGreater(sampler.samples_taken, 0)
+        with self.assertRaises(ValueError):
+            StackSampler(interval=0)
+
+
+class TestProfileRendering(unittest.TestCase):
+    """Test merging and rendering folded stacks."""
+
+    def setUp(self):
+        """Set up two small profiles."""
+        self.first = {"run (a.py:1);spin (a.py:9)": 3, "run (a.py:1);fetch (b.py:4)": 5}
+        self.second = {"run (a.py:1);fetch (b.py:4)": 2, "[truncated]": 1}
+
+    def test_merge_and_folded(self):
+        """Test summing profiles and the folded round trip."""
+        merged = merge_profiles([self.first, self.second])
+        self.assertEqual(merged["run (a.py:1);fetch (b.py:4)"], 7)
+        self.assertEqual(parse_folded(to_folded(merged).splitlines()), merged)
+        with self.assertRaises(ValueError):
+            parse_folded(["12"])
+
+    def test_speedscope(self):
+        """Test the speedscope sampled profile."""
+        document = to_speedscope(self.first, interval_ms=10.0)
+        profile, = document["profiles"]
+        frames = document["shared"]["frames"]
+
+        self.assertEqual(profile["unit"], "milliseconds")
+        self.assertEqual(profile["endValue"], 80.0)
+        self.assertEqual(frames[0], {"name": "run", "file": "a.py", "line": 1})
+        for sample, weight in zip(profile["samples"], profile["weights"]):
+            stack = ";".join(f"{frames[i]['name']} ({frames[i]['file']}:{frames[i]['line']})" for i in sample)
+            self.assertEqual(self.first[stack] * 10.0, weight)
+
+    def test_flamegraph_svg(self):
+        """Test that the flame graph is valid SVG with a box per frame."""
+        svg = to_flamegraph_svg(merge_profiles([self.first, self.second]), title="a & b")
+        root = ElementTree.fromstring(svg)
+        titles = [element.text for element in root.iter("{http://www.w3.org/2000/svg}title")]
+
+        self.assertEqual(len(titles), 5)
+        self.assertIn("fetch (b.py:4) (7 samples, 63.64%)", titles)
+
+    def test_command_line(self):
+        """Test merging files into a speedscope document from the command line."""
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for i, profile in enumerate((self.first, self.second)):
+                paths.append(os.path.join(directory, f"{i}.folded"))
+                with open(paths[-1], "w") as f:
+                    f.write(to_folded(profile))
+            output = os.path.join(directory, "merged.speedscope.json")
+            main(paths + ["--format", "speedscope", "-o", output])
+            with open(output) as f:
+                document = json.load(f)
+
+        self.assertEqual(document["profiles"][0]["endValue"], 11)
+
+
+if __name__ == "__main__":
+    unittest.main()
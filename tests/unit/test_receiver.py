@@ -0,0 +1,172 @@
+"""Tests for the asyncio OTLP receiver."""
+
+import asyncio
+import gzip
+import json
+import time
+import unittest
+import urllib.request
+
+from google.protobuf import json_format
+from opentelemetry.proto.collector.metrics.v1 import metrics_service_pb2
+from opentelemetry.proto.common.v1 import common_pb2
+from opentelemetry.proto.metrics.v1 import metrics_pb2
+from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+
+from nexushive.collector.loadgen import build_request, generate_load
+from nexushive.collector.metrics import AgentMetricsCollector
+from nexushive.collector.receiver import OTLPReceiver
+from nexushive.collector.windows import RollingWindows
+
+
+def _post(url, body, headers):
+    request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.status
+
+
+class TestOTLPReceiver(unittest.IsolatedAsyncioTestCase):
+    """Test receiving spans and metrics over HTTP and gRPC."""
+
+    async def asyncSetUp(self):
+        """Listen on free ports."""
+        self.receiver = OTLPReceiver(http_port=0, grpc_port=0)
+        await self.receiver.start()
+        self.base = f"http://127.0.0.1:{self.receiver.http_port}"
+
+    async def asyncTearDown(self):
+        """Stop listening."""
+        await self.receiver.stop()
+
+    async def test_sdk_http_exporter(self):
+        """Test spans from the SDK's OTLP/HTTP exporter."""
+        provider = TracerProvider(resource=Resource.create({"service.name": "svc"}))
+        provider.add_span_processor(SimpleSpanProcessor(OTLPSpanExporter(endpoint=f"{self.base}/v1/traces")))
+        tracer = provider.get_tracer(__name__)
+
+        def run_agents():
+            for i in range(20):
+                attributes = {"agent.id": f"agent-{i % 2}", "agent.tokens.input": 5, "agent.latency_ms": 100.0 + i}
+                if i == 3:
+                    attributes["agent.error"] = "boom"
+                with tracer.start_as_current_span("agent.run", attributes=attributes):
+                    with tracer.start_as_current_span("agent.step"):
+                        pass
+            provider.shutdown()
+
+        await asyncio.to_thread(run_agents)
+
+        windows = self.receiver.windows(60)
+        self.assertEqual(sorted(windows), ["agent-0", "agent-1"])
+        self.assertEqual(windows["agent-0"]["count"], 10)
+        self.assertEqual(windows["agent-1"]["errors"], 1)
+        self.assertEqual(windows["agent-1"]["tokens_input"], 50)
+        self.assertEqual(self.receiver.spans_received, 40)
+        self.assertEqual(self.receiver.spans_accepted, 20)
+
+    async def test_json_gzip_and_window_endpoint(self):
+        """Test JSON and gzipped bodies and the JSON window query."""
+        request = build_request(10, agents=1, seed=1)
+        body = json_format.MessageToJson(request).encode()
+        status = await asyncio.to_thread(_post, f"{self.base}/v1/traces", body,
+                                         {"Content-Type": "application/json"})
+        self.assertEqual(status, 200)
+        status = await asyncio.to_thread(_post, f"{self.base}/v1/traces",
+                                         gzip.compress(request.SerializeToString()),
+                                         {"Content-Type": "application/x-protobuf", "Content-Encoding": "gzip"})
+        self.assertEqual(status, 200)
+
+        def query():
+            with urllib.request.urlopen(f"{self.base}/v1/windows?seconds=30", timeout=5) as response:
+                return json.load(response)
+
+        windows = await asyncio.to_thread(query)
+        self.assertEqual(list(windows), ["agent-0"])
+        self.assertEqual(windows["agent-0"]["count"], 20)
+
+    async def test_bad_requests(self):
+        """Test malformed bodies and unknown paths."""
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            await asyncio.to_thread(_post, f"{self.base}/v1/traces", b"\xff\xff",
+                                    {"Content-Type": "application/x-protobuf"})
+        self.assertEqual(error.exception.code, 400)
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            await asyncio.to_thread(_post, f"{self.base}/v1/logs", b"", {})
+        self.assertEqual(error.exception.code, 404)
+        self.assertEqual(self.receiver.bad_requests, 1)
+
+    async def test_grpc_metrics(self):
+        """Test cumulative metric exports turned into window deltas."""
+        reader = InMemoryMetricReader()
+        collector = AgentMetricsCollector("svc", metric_reader=reader)
+        exporter = OTLPMetricExporter(endpoint=f"127.0.0.1:{self.receiver.grpc_port}", insecure=True)
+        attributes = {"agent.id": "a"}
+
+        def record_and_export(latencies):
+            for latency in latencies:
+                collector.record_latency(latency, attributes)
+                collector.record_tokens(10, attributes)
+            collector.record_error("timeout", attributes)
+            collector.flush()
+            exporter.export(reader.get_metrics_data())
+
+        await asyncio.to_thread(record_and_export, [100.0, 200.0])
+        await asyncio.to_thread(record_and_export, [300.0])
+        exporter.shutdown()
+
+        result = self.receiver.windows(60, source="metrics")["a"]
+        self.assertEqual(result["count"], 3)
+        self.assertEqual(result["tokens_input"], 30)
+        self.assertEqual(result["errors"], 2)
+        self.assertAlmostEqual(result["latency_mean_ms"], 200.0)
+        self.assertAlmostEqual(result["latency_p50_ms"], 200.0, delta=4)
+
+    async def test_load_generator(self):
+        """Test that the load generator's spans all arrive."""
+        result = await generate_load(port=self.receiver.http_port, duration=0.5, connections=2,
+                                     spans_per_request=100, agents=5)
+
+        self.assertGreater(result["requests"], 0)
+        self.assertEqual(result["errors"], 0)
+        self.assertEqual(self.receiver.spans_accepted, result["spans"])
+        total = sum(window["count"] for window in self.receiver.windows(60).values())
+        self.assertEqual(total, result["spans"])
+
+
+def _token_export(agent_id, start_ns, total):
+    """Export request with one cumulative agent.tokens point."""
+    point = metrics_pb2.NumberDataPoint(
+        start_time_unix_nano=start_ns, time_unix_nano=time.time_ns(), as_int=total,
+        attributes=[common_pb2.KeyValue(key="agent.id", value=common_pb2.AnyValue(string_value=agent_id))])
+    metric = metrics_pb2.Metric(name="agent.tokens", sum=metrics_pb2.Sum(
+        aggregation_temporality=metrics_pb2.AGGREGATION_TEMPORALITY_CUMULATIVE, data_points=[point]))
+    return metrics_service_pb2.ExportMetricsServiceRequest(resource_metrics=[metrics_pb2.ResourceMetrics(
+        scope_metrics=[metrics_pb2.ScopeMetrics(metrics=[metric])])])
+
+
+class TestCumulativeStreams(unittest.TestCase):
+    """Test the state kept per cumulative metric stream."""
+
+    def test_idle_streams_are_forgotten(self):
+        """Test that streams idle past the window horizon are dropped without recounting them."""
+        receiver = OTLPReceiver(http_port=None, metric_windows=RollingWindows(bucket_seconds=0.05, buckets=2))
+        start_ns = time.time_ns()
+        self.assertEqual(receiver.ingest_metrics(_token_export("a", start_ns, 10)), 1)
+        time.sleep(0.15)
+
+        self.assertEqual(receiver.ingest_metrics(_token_export("b", time.time_ns(), 5)), 1)
+        self.assertEqual(len(receiver._cumulative), 1)
+
+        # The forgotten stream resumes from a new baseline
+        self.assertEqual(receiver.ingest_metrics(_token_export("a", start_ns, 12)), 0)
+        self.assertEqual(receiver.ingest_metrics(_token_export("a", start_ns, 15)), 1)
+        self.assertEqual(receiver.windows(0.1, source="metrics")["a"]["tokens_input"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+"""Tests for regression comparison of agent versions."""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from nexushive.client.tokenization import WhitespaceTokenCounter
+from nexushive.collector.regression import RegressionHarness, paired_bootstrap, write_report
+
+QUESTIONS = [{"id": f"q{i}", "question": f"What is {i} + {i}?", "answer": f"#### {2 * i}"} for i in range(40)]
+
+
+class Agent:
+    """Agent answering 'What is a + b?' questions, wrong on some of them."""
+
+    def __init__(self, delay=0.0, wrong_every=0, padding=0):
+        self.delay = delay
+        self.wrong_every = wrong_every
+        self.padding = padding
+
+    def run(self, question):
+        a = int(question.split()[2])
+        time.sleep(self.delay)
+        if self.wrong_every and a % self.wrong_every == 0:
+            return "I do not know"
+        return "well " * self.padding + f"The answer is {2 * a}"
+
+
+class TestPairedBootstrap(unittest.TestCase):
+    """Test bootstrap intervals and p-values."""
+
+    def setUp(self):
+        """Draw skewed latencies."""
+        self.rng = np.random.default_rng(3)
+        self.base = self.rng.lognormal(5, 1, 300)
+
+    def test_detects_shift(self):
+        """Test that a clear slowdown is significant and inside the interval."""
+        for statistic in ("mean", 0.5, 0.95):
+            result = paired_bootstrap(self.base, self.base * 1.2 + 5, statistic, resamples=2000)
+            self.assertGreater(result["delta"], 0)
+            self.assertLess(result["ci_low"], result["delta"])
+            self.assertGreater(result["ci_high"], result["delta"])
+            self.assertGreater(result["ci_low"], 0)
+            self.assertLess(result["p_value"], 0.01)
+
+    def test_no_difference(self):
+        """Test that identical samples give a zero delta and a p-value of one."""
+        result = paired_bootstrap(self.base, self.base, 0.95, resamples=500)
+        self.assertEqual((result["delta"], result["ci_low"], result["ci_high"]), (0.0, 0.0, 0.0))
+        self.assertEqual(result["p_value"], 1.0)
+
+    def test_noise_is_not_significant(self):
+        """Test that resampled noise rarely looks significant."""
+        significant = 0
+        for seed in range(20):
+            noise = self.base * self.rng.lognormal(0, 0.1, self.base.shape)
+            significant += paired_bootstrap(self.base, noise, seed=seed, resamples=500)["p_value"] < 0.05
+        self.assertLessEqual(significant, 3)
+
+    def test_quantiles_match_numpy(self):
+        """Test that resampled quantiles use the same definition as the observed ones."""
+        values = np.arange(1.0, 11.0)
+        result = paired_bootstrap(values, values + 1, 0.5, resamples=10)
+        self.assertEqual((result["base"], result["new"]), (5.0, 6.0))
+        self.assertTrue(all(delta == 1.0 for delta in (result["ci_low"], result["ci_high"])))
+
+    def test_invalid_arguments(self):
+        """Test rejected arguments and empty samples."""
+        with self.assertRaises(ValueError):
+            paired_bootstrap([1.0], [1.0, 2.0])
+        with self.assertRaises(ValueError):
+            paired_bootstrap([1.0], [1.0], 1.5)
+        self.assertIsNone(paired_bootstrap([], [])["p_value"])
+
+
+class TestRegressionHarness(unittest.TestCase):
+    """Test comparing two agents end to end."""
+
+    def setUp(self):
+        """Set up a harness counting whitespace tokens."""
+        self.harness = RegressionHarness(QUESTIONS, resamples=2000, token_counter=WhitespaceTokenCounter())
+
+    def run_agent(self, agent, latency_ms=10.0):
+        """Run an agent, replacing the measured latencies with a fixed one."""
+        results = self.harness.run(agent)
+        for result in results:
+            result["latency_ms"] = latency_ms
+        return results
+
+    def test_regression_report(self):
+        """Test that worse accuracy and longer answers fail the gate."""
+        report = self.harness.compare_results(self.run_agent(Agent()),
+                                              self.run_agent(Agent(wrong_every=3, padding=5)), "v1", "v2")
+
+        accuracy = report["metrics"]["accuracy"]
+        self.assertEqual((accuracy["base"], accuracy["samples"]), (1.0, 40))
+        self.assertAlmostEqual(accuracy["new"], 26 / 40)
+        self.assertEqual(accuracy["verdict"], "regressed")
+        # Padded answers gain five tokens; "I do not know" has as many as the base answer
+        self.assertAlmostEqual(report["metrics"]["tokens"]["delta"], 5 * 26 / 40)
+        self.assertEqual(sorted(report["regressions"]), ["accuracy", "tokens"])
+        self.assertFalse(report["passed"])
+        self.assertEqual(report["regressed"], [f"q{i}" for i in range(0, 40, 3)])
+        self.assertEqual(report["questions"], 40)
+
+    def test_improvement_passes(self):
+        """Test that an improved version passes and reports what it fixed."""
+        base = self.run_agent(Agent(wrong_every=4), latency_ms=12.0)
+        new = self.run_agent(Agent())
+        report = self.harness.compare_results(base, new)
+
+        self.assertEqual(report["improvements"], ["accuracy", "latency_p50_ms", "latency_p95_ms"])
+        self.assertTrue(report["passed"])
+        self.assertEqual(len(report["fixed"]), 10)
+        self.assertEqual(report["metrics"]["latency_p95_ms"]["samples"], 40)
+
+    def test_machine_readable(self):
+        """Test that the report round-trips through JSON."""
+        report = self.harness.compare(Agent(), Agent())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            write_report(report, path)
+            with open(path) as f:
+                loaded = json.load(f)
+
+        self.assertEqual(loaded, report)
+        self.assertEqual(loaded["schema"], 1)
+        self.assertEqual(loaded["metrics"]["accuracy"]["p_value"], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""Tests for agent.run span sampling."""
+
+import unittest
+from unittest.mock import patch
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from nexushive.client.instrumentation import AgentInstrumentor
+from nexushive.client.sampling import DROPPED_ATTRIBUTE, HeadSampler, TailSampler, TailSamplingSpanProcessor
+
+
+class TestHeadSampler(unittest.TestCase):
+    """Test the HeadSampler class."""
+
+    def test_per_agent_ratio(self):
+        """Test that per-agent ratios override the default ratio."""
+        sampler = HeadSampler(ratio=1.0, agent_ratios={"quiet": 0.0})
+
+        self.assertTrue(sampler.should_sample("chatty"))
+        self.assertFalse(sampler.should_sample("quiet"))
+
+        sampler.set_ratio("quiet", 1.0)
+        self.assertTrue(sampler.should_sample("quiet"))
+
+    @patch('random.random')
+    def test_ratio(self, mock_random):
+        """Test that the ratio is compared against a uniform draw."""
+        sampler = HeadSampler(ratio=0.25)
+
+        mock_random.return_value = 0.2
+        self.assertTrue(sampler.should_sample("agent"))
+        mock_random.return_value = 0.3
+        self.assertFalse(sampler.should_sample("agent"))
+
+    def test_invalid_ratio(self):
+        """Test that ratios outside [0, 1] are rejected."""
+        with self.assertRaises(ValueError):
+            HeadSampler(ratio=1.5)
+
+
+class TestTailSampler(unittest.TestCase):
+    """Test the TailSampler class."""
+
+    def test_keeps_slow_and_failed_runs(self):
+        """Test that errors and slow runs are kept and the rest dropped."""
+        sampler = TailSampler(percentile=90.0, keep_ratio=0.0, window_size=100, recompute_every=10)
+        for latency in range(100):
+            sampler.should_keep(float(latency))
+
+        self.assertEqual(sampler.threshold_ms, 90.0)
+        self.assertFalse(sampler.should_keep(5.0))
+        self.assertTrue(sampler.should_keep(5.0, error=True))
+        self.assertTrue(sampler.should_keep(95.0))
+
+    def test_window_is_bounded(self):
+        """Test that only a fixed number of latencies is retained."""
+        sampler = TailSampler(window_size=16)
+        for latency in range(1000):
+            sampler.should_keep(float(latency))
+
+        self.assertEqual(len(sampler._window), 16)
+
+
+class TestTailSamplingSpanProcessor(unittest.TestCase):
+    """Test filtering the spans of tail-dropped runs."""
+
+    def setUp(self):
+        """Set up a provider exporting through the filtering processor."""
+        self.exporter = InMemorySpanExporter()
+        self.provider = TracerProvider()
+        self.provider.add_span_processor(TailSamplingSpanProcessor(SimpleSpanProcessor(self.exporter)))
+        self.tracer = self.provider.get_tracer(__name__)
+
+    def test_nested_runs(self):
+        """Test that a dropped inner run takes its children, not the outer run's."""
+        with self.tracer.start_as_current_span("agent.run"):
+            with self.tracer.start_as_current_span("agent.step"):
+                with self.tracer.start_as_current_span("agent.run") as inner:
+                    with self.tracer.start_as_current_span("agent.tool"):
+                        pass
+                    inner.set_attribute(DROPPED_ATTRIBUTE, True)
+            self.assertEqual(self.exporter.get_finished_spans(), ())
+
+        self.assertEqual([span.name for span in self.exporter.get_finished_spans()], ["agent.step", "agent.run"])
+
+    def test_children_ending_after_a_dropped_run(self):
+        """Test that spans outliving a dropped run are dropped too."""
+        run = self.tracer.start_span("agent.run")
+        late = self.tracer.start_span("agent.tool", context=trace.set_span_in_context(run))
+        run.set_attribute(DROPPED_ATTRIBUTE, True)
+        run.end()
+        late.end()
+        self.tracer.start_span("other").end()
+
+        self.assertEqual([span.name for span in self.exporter.get_finished_spans()], ["other"])
+
+
+class TestSampledInstrumentor(unittest.TestCase):
+    """Test sampling applied by AgentInstrumentor."""
+
+    def _exported(self, instrumentor):
+        pipeline = instrumentor.pipeline
+        pipeline.provider.force_flush()
+        return pipeline.exporter.get_finished_spans()
+
+    def test_head_sampled_out_runs_have_no_span(self):
+        """Test that head-dropped runs execute without creating spans."""
+        for fast_path in (False, True):
+            instrumentor = AgentInstrumentor("test-service", "quiet", fast_path=fast_path,
+                                             head_sampler=HeadSampler(agent_ratios={"quiet": 0.0}))
+            wrapped = instrumentor.wrap_agent(lambda: "ok")
+
+            self.assertEqual(wrapped(), "ok")
+            self.assertEqual(len(self._exported(instrumentor)), 0)
+
+    def test_tail_dropped_spans_are_not_exported(self):
+        """Test that tail-dropped spans never reach the exporter."""
+        for fast_path in (False, True):
+            tail_sampler = TailSampler(keep_ratio=0.0)
+            tail_sampler.threshold_ms = 1e9
+            instrumentor = AgentInstrumentor("test-service", "agent", fast_path=fast_path,
+                                             tail_sampler=tail_sampler)
+            instrumentor.pipeline.exporter.clear()
+
+            def fail():
+                raise ValueError("boom")
+
+            instrumentor.wrap_agent(lambda: "ok")()
+            with self.assertRaises(ValueError):
+                instrumentor.wrap_agent(fail)()
+
+            spans = self._exported(instrumentor)
+            self.assertEqual(len(spans), 1)
+            self.assertEqual(spans[0].attributes["agent.error"], "boom")
+            self.assertNotIn("sampling.dropped", spans[0].attributes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""Tests for the shared-memory metric store."""
+
+import multiprocessing
+import unittest
+
+from opentelemetry.sdk.metrics.export import MetricExporter, MetricExportResult
+
+from nexushive.collector.aggregation import intern_attributes
+from nexushive.collector.metrics import AgentMetricsCollector
+from nexushive.collector.shared import SharedMetricStore, SharedMetricsExporter
+
+
+class CapturingExporter(MetricExporter):
+    """Keeps exported metrics in memory."""
+
+    def __init__(self):
+        super().__init__()
+        self.exports = []
+
+    def export(self, metrics_data, timeout_millis=10_000, **kwargs):
+        self.exports.append(metrics_data)
+        return MetricExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis=10_000):
+        return True
+
+    def shutdown(self, timeout_millis=30_000, **kwargs):
+        pass
+
+
+def _worker(name, agent, records):
+    store = SharedMetricStore.attach(name)
+    collector = AgentMetricsCollector("svc", shared_store=store)
+    attributes = collector.attributes({"agent.id": agent})
+    for i in range(records):
+        collector.record_tokens(2, attributes)
+        collector.record_latency(float(i % 100 + 1), attributes)
+    collector.record_error("timeout", attributes)
+    store.close()
+
+
+class TestSharedMetricStore(unittest.TestCase):
+    """Test the SharedMetricStore class."""
+
+    def setUp(self):
+        """Create a small store."""
+        self.store = SharedMetricStore(max_workers=4, max_series=8, max_histograms=4)
+
+    def tearDown(self):
+        """Remove the store."""
+        self.store.close()
+        self.store.unlink()
+
+    def test_counters_and_histograms(self):
+        """Test totals and sketches recorded in one process."""
+        recorder = self.store.recorder()
+        attributes = intern_attributes({"agent.id": "a"})
+        for value in range(1, 101):
+            recorder.add("agent.tokens", attributes, 3)
+            recorder.record("agent.latency", attributes, float(value))
+        recorder.record("agent.latency", attributes, 0.0)
+
+        counters, histograms = self.store.totals()
+        self.assertEqual(counters[("agent.tokens", attributes)], 300)
+        sketch = histograms[("agent.latency", attributes)]
+        self.assertEqual((sketch.count, sketch.zero_count, sketch.min, sketch.max), (101, 1, 0.0, 100.0))
+        self.assertAlmostEqual(sketch.quantile(0.5), 50.0, delta=1.5)
+
+    def test_series_shared_across_attachments(self):
+        """Test that the same series gets the same index from any process."""
+        other = SharedMetricStore.attach(self.store.name)
+        attributes = intern_attributes({"agent.id": "a", "tags": ["x", "y"]})
+        index = self.store.register(1, "agent.tokens", attributes)
+        self.assertEqual(other.register(1, "agent.tokens", attributes), index)
+        self.assertEqual(other.series(), [(1, "agent.tokens", attributes, index)])
+        other.close()
+
+    def test_series_limit(self):
+        """Test that series past the limit are dropped and counted."""
+        recorder = self.store.recorder()
+        for i in range(10):
+            recorder.add("agent.tokens", intern_attributes({"agent.id": str(i)}), 1)
+
+        counters, _ = self.store.totals()
+        self.assertEqual(len(counters), 8)
+        self.assertEqual(self.store.dropped_series, 2)
+
+    def test_workers(self):
+        """Test merged totals from more worker processes than rows."""
+        context = multiprocessing.get_context("fork")
+        for agent in ("a", "b", "a", "b", "a", "b"):
+            process = context.Process(target=_worker, args=(self.store.name, agent, 500))
+            process.start()
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        counters, histograms = self.store.totals()
+        a = intern_attributes({"agent.id": "a"})
+        self.assertEqual(counters[("agent.tokens", a)], 3 * 500 * 2)
+        self.assertEqual(counters[("agent.errors", a.with_attribute("error.type", "timeout"))], 3)
+        self.assertEqual(histograms[("agent.latency", a)].count, 1500)
+
+    def test_exporter(self):
+        """Test one cumulative export of the merged totals."""
+        collector = AgentMetricsCollector("svc", shared_store=self.store)
+        self.assertIsNone(collector.meter_provider)
+        collector.record_tokens(5, {"agent.id": "a"})
+        collector.record_latency(120.0, {"agent.id": "a"})
+        exporter = CapturingExporter()
+        shared_exporter = SharedMetricsExporter(self.store, exporter, service_name="svc")
+
+        shared_exporter.shutdown()
+        metrics = {metric.name: metric for metric in
+                   exporter.exports[0].resource_metrics[0].scope_metrics[0].metrics}
+        self.assertEqual(metrics["agent.tokens"].data.data_points[0].value, 5)
+        self.assertEqual(metrics["agent.tokens"].unit, "tokens")
+        latency = metrics["agent.latency"].data.data_points[0]
+        self.assertEqual((latency.count, latency.min, latency.max), (1, 120.0, 120.0))
+        self.assertEqual(dict(latency.attributes), {"agent.id": "a"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+"""Tests for latency sketches."""
+
+import random
+import unittest
+
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+from nexushive.collector.metrics import AgentMetricsCollector
+from nexushive.collector.sketch import LatencySketch, LatencySketches, scale_for_accuracy
+
+
+def _exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+class TestLatencySketch(unittest.TestCase):
+    """Test the LatencySketch class."""
+
+    def setUp(self):
+        """Generate latencies from 50 ms to several minutes."""
+        rng = random.Random(7)
+        self.values = [rng.lognormvariate(7.0, 1.5) + 50.0 for _ in range(20_000)]
+
+    def test_relative_accuracy(self):
+        """Test that quantiles are within the relative accuracy."""
+        sketch = LatencySketch(relative_accuracy=0.01)
+        for value in self.values:
+            sketch.add(value)
+
+        self.assertLessEqual(sketch.relative_accuracy, 0.01)
+        for q in (0.5, 0.95, 0.99):
+            exact = _exact_quantile(self.values, q)
+            self.assertAlmostEqual(sketch.quantile(q) / exact, 1.0, delta=0.01)
+
+    def test_merge_matches_single_sketch(self):
+        """Test that merged sketches equal one sketch over all values."""
+        whole = LatencySketch()
+        parts = [LatencySketch() for _ in range(4)]
+        for i, value in enumerate(self.values):
+            whole.add(value)
+            parts[i % 4].add(value)
+
+        merged = LatencySketch()
+        for part in parts:
+            merged.merge(part)
+
+        self.assertEqual(merged.count, whole.count)
+        self.assertEqual(merged.quantiles(), whole.quantiles())
+
+    def test_merge_different_scales(self):
+        """Test that merging keeps the coarser accuracy guarantee."""
+        fine = LatencySketch(relative_accuracy=0.005)
+        coarse = LatencySketch(relative_accuracy=0.05)
+        for value in self.values:
+            fine.add(value)
+        coarse.add(100.0)
+
+        fine.merge(coarse)
+        self.assertEqual(fine.scale, coarse.scale)
+        exact = _exact_quantile(self.values + [100.0], 0.5)
+        self.assertAlmostEqual(fine.quantile(0.5) / exact, 1.0, delta=0.05)
+
+    def test_bounded_buckets(self):
+        """Test that the bucket store never exceeds max_buckets."""
+        sketch = LatencySketch(relative_accuracy=0.01, max_buckets=400)
+        for value in self.values:
+            sketch.add(value)
+
+        self.assertEqual(sketch.bucket_count, 400)
+        self.assertTrue(sketch.collapsed)
+        exact = _exact_quantile(self.values, 0.99)
+        self.assertAlmostEqual(sketch.quantile(0.99) / exact, 1.0, delta=0.01)
+
+    def test_serialization_round_trip(self):
+        """Test that sketches survive serialization for cross-process merges."""
+        sketch = LatencySketch()
+        for value in self.values[:1000]:
+            sketch.add(value)
+        sketch.add(0.0)
+
+        restored = LatencySketch.from_bytes(sketch.to_bytes())
+        self.assertEqual(restored.quantiles(), sketch.quantiles())
+        self.assertEqual((restored.count, restored.zero_count), (1001, 1))
+
+    def test_exponential_histogram_point(self):
+        """Test conversion to an OTel exponential histogram data point."""
+        sketch = LatencySketch()
+        for value in (50.0, 75.0, 1200.0):
+            sketch.add(value)
+
+        point = sketch.to_data_point({"agent.id": "a"})
+        base = 2.0 ** (2.0 ** -point.scale)
+        self.assertEqual(point.count, 3)
+        self.assertEqual(sum(point.positive.bucket_counts), 3)
+        self.assertLess(base ** point.positive.offset, 50.0)
+        self.assertGreaterEqual(base ** (point.positive.offset + 1), 50.0)
+
+    def test_cumulative_delta(self):
+        """Test rebuilding from buckets and taking the delta of cumulative states."""
+        earlier = LatencySketch(relative_accuracy=0.001, max_buckets=1 << 16)
+        for value in self.values[:500]:
+            earlier.add(value)
+        # A cumulative sketch that has since moved to a coarser scale
+        later = LatencySketch(relative_accuracy=0.01, max_buckets=1 << 16)
+        later.merge(earlier)
+        fresh = LatencySketch(relative_accuracy=0.01)
+        for value in self.values[500:1000]:
+            later.add(value)
+            fresh.add(value)
+        point = later.to_data_point()
+        later = LatencySketch.from_buckets(point.scale, point.positive.offset, point.positive.bucket_counts,
+                                           point.zero_count, point.sum, point.min, point.max)
+
+        delta = later.since(earlier)
+        self.assertEqual(delta.count, 500)
+        self.assertAlmostEqual(delta.sum, fresh.sum)
+        self.assertEqual(delta.quantile(0.5), fresh.quantile(0.5))
+
+    def test_scale_for_accuracy(self):
+        """Test that finer accuracies give finer scales."""
+        self.assertLess(scale_for_accuracy(0.05), scale_for_accuracy(0.001))
+        self.assertIsNone(LatencySketch().quantile(0.5))
+
+
+class TestCollectorSketches(unittest.TestCase):
+    """Test latency sketches kept by AgentMetricsCollector."""
+
+    def test_per_agent_quantiles(self):
+        """Test that quantiles are kept per agent_id."""
+        collector = AgentMetricsCollector("test-service", metric_reader=InMemoryMetricReader())
+        for latency in range(1, 101):
+            collector.record_latency(float(latency), {"agent.id": "fast"})
+            collector.record_latency(float(latency * 100), {"agent.id": "slow"})
+
+        fast = collector.latency_quantiles("fast")
+        slow = collector.latency_quantiles("slow")
+        self.assertAlmostEqual(fast[0.5], 50.0, delta=1.0)
+        self.assertAlmostEqual(slow[0.99], 9900.0, delta=99.0)
+        self.assertEqual(collector.latency_quantiles("missing"), {0.5: None, 0.95: None, 0.99: None})
+
+    def test_sketch_sets_merge(self):
+        """Test merging sketch sets from several workers."""
+        workers = [LatencySketches() for _ in range(3)]
+        for i, worker in enumerate(workers):
+            worker.add("svc", "a", 10.0 * (i + 1))
+
+        merged = LatencySketches()
+        for worker in workers:
+            merged.merge(worker)
+
+        self.assertEqual(merged.get("svc", "a").count, 3)
+        self.assertAlmostEqual(merged.quantiles("svc", "a")[0.5], 20.0, delta=0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Tests for the local columnar span store."""
+
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+import numpy as np
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+
+from nexushive.collector.spanstore import ColumnarSpanExporter, SpanStore, write_partition
+
+DAY1 = int(datetime(2026, 3, 1, 10, tzinfo=timezone.utc).timestamp()) * 10**9
+DAY2 = int(datetime(2026, 3, 2, 23, tzinfo=timezone.utc).timestamp()) * 10**9
+
+
+class TestColumnarSpanExporter(unittest.TestCase):
+    """Test writing spans from a tracer."""
+
+    def test_writes_agent_run_spans(self):
+        """Test that agent.run spans are stored with their attributes."""
+        with tempfile.TemporaryDirectory() as directory:
+            exporter = ColumnarSpanExporter(directory, rows_per_file=3)
+            provider = TracerProvider(resource=Resource.create({"service.name": "svc"}))
+            provider.add_span_processor(SimpleSpanProcessor(exporter))
+            tracer = provider.get_tracer(__name__)
+            for i in range(5):
+                attributes = {"agent.id": f"agent-{i % 2}", "agent.tokens.input": 10, "agent.latency_ms": float(i)}
+                if i == 4:
+                    attributes["agent.error"] = "boom"
+                with tracer.start_as_current_span("agent.run", attributes=attributes):
+                    with tracer.start_as_current_span("tool.call"):
+                        pass
+            self.assertEqual(len(SpanStore(directory).files()), 1)
+            provider.shutdown()
+
+            store = SpanStore(directory)
+            self.assertEqual(len(store.files()), 2)
+            data = store.scan()
+            self.assertEqual(len(data["latency_ms"]), 5)
+            self.assertEqual(sorted(data["latency_ms"]), [0.0, 1.0, 2.0, 3.0, 4.0])
+            self.assertEqual(list(data["service_name.values"]), ["svc"])
+            self.assertEqual(int(data["error"].sum()), 1)
+            self.assertEqual(int(data["tokens_input"].sum()), 50)
+
+
+class TestSpanStore(unittest.TestCase):
+    """Test vectorized queries."""
+
+    def setUp(self):
+        """Write two days of synthetic spans in two files per day."""
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.latency = {"a": rng.exponential(100, 600), "b": rng.exponential(300, 400)}
+        for base in (DAY1, DAY2):
+            for agent, latency in self.latency.items():
+                half = len(latency) // 2
+                chunk = latency[:half] if base == DAY1 else latency[half:]
+                n = len(chunk)
+                write_partition(self.tmp.name, {
+                    "start_time": base + np.arange(n) * 10**6,
+                    "end_time": base + np.arange(n) * 10**6 + 5,
+                    "latency_ms": chunk,
+                    "tokens_input": np.full(n, 7),
+                    "tokens_output": np.full(n, 3),
+                    "error": np.arange(n) % 10 == 0,
+                    "trace_id_hi": np.zeros(n),
+                    "trace_id_lo": np.arange(n),
+                    "span_id": np.arange(n),
+                    "agent_id": [agent] * n,
+                    "service_name": ["svc"] * n,
+                })
+        self.store = SpanStore(self.tmp.name)
+
+    def tearDown(self):
+        """Remove the store."""
+        self.tmp.cleanup()
+
+    def test_partitions(self):
+        """Test the hourly directory layout and time pruning."""
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp.name, "date=2026-03-01", "hour=10")))
+        self.assertEqual(len(self.store.files()), 4)
+        self.assertEqual(len(self.store.files(start=datetime(2026, 3, 2, tzinfo=timezone.utc))), 2)
+
+    def test_latency_by_agent(self):
+        """Test grouped counts and percentiles against numpy."""
+        result = self.store.aggregate(by=["agent_id"])
+
+        self.assertEqual(list(result["agent_id"]), ["a", "b"])
+        self.assertEqual(list(result["count"]), [600, 400])
+        for row, agent in enumerate(["a", "b"]):
+            for q in (50, 95, 99):
+                self.assertAlmostEqual(result[f"latency_p{q}_ms"][row], np.percentile(self.latency[agent], q))
+            self.assertAlmostEqual(result["latency_mean_ms"][row], self.latency[agent].mean())
+
+    def test_tokens_and_errors_per_day(self):
+        """Test grouping by day and agent."""
+        result = self.store.aggregate(by=["day", "agent_id"])
+
+        self.assertEqual([str(day) for day in result["day"]], ["2026-03-01", "2026-03-01", "2026-03-02", "2026-03-02"])
+        self.assertEqual(list(result["tokens_input"]), [7 * 300, 7 * 200, 7 * 300, 7 * 200])
+        self.assertEqual(list(result["errors"]), [30, 20, 30, 20])
+        np.testing.assert_allclose(result["error_rate"], 0.1)
+
+    def test_filters(self):
+        """Test time and agent filters."""
+        end = datetime(2026, 3, 2, tzinfo=timezone.utc)
+        result = self.store.aggregate(by=[], end=end, agent_ids=["b"])
+
+        self.assertEqual(list(result["count"]), [200])
+        self.assertEqual(len(self.store.scan(["latency_ms"], start=end.timestamp())["latency_ms"]), 500)
+        with self.assertRaises(ValueError):
+            self.store.aggregate(by=["region"])
+
+    def test_empty_store(self):
+        """Test queries over a missing directory."""
+        store = SpanStore(os.path.join(self.tmp.name, "missing"))
+        self.assertEqual(len(store.aggregate()["count"]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
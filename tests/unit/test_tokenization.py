@@ -0,0 +1,138 @@
+"""Tests for token counting."""
+
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from nexushive.client.tokenization import (
+    ByteBPETokenCounter,
+    CachedTokenCounter,
+    WhitespaceTokenCounter,
+    _count_words,
+    default_token_counter,
+)
+
+
+class TestWhitespaceTokenCounter(unittest.TestCase):
+    """Test the WhitespaceTokenCounter class."""
+
+    def test_count_words_matches_split(self):
+        """Test that chunked word counting agrees with str.split."""
+        text = "alpha  beta\tgamma\n" * 2000 + "x" * 5000 + " tail"
+
+        self.assertEqual(_count_words(text), len(text.split()))
+        self.assertEqual(_count_words(""), 0)
+        self.assertEqual(WhitespaceTokenCounter().count("  two   words "), 2)
+
+
+class TestByteBPETokenCounter(unittest.TestCase):
+    """Test the ByteBPETokenCounter class."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Load the bundled ranks once."""
+        cls.counter = ByteBPETokenCounter()
+
+    def test_common_words_are_single_tokens(self):
+        """Test that frequent words merge into one token."""
+        self.assertEqual(self.counter.count("the"), 1)
+        self.assertEqual(self.counter.count(" function"), 1)
+
+    def test_counts_are_subword(self):
+        """Test that counts fall between characters and words."""
+        text = "Summarize the quarterly report for the operations team."
+        count = self.counter.count(text)
+
+        self.assertGreater(count, len(text.split()))
+        self.assertLess(count, len(text))
+
+    def test_long_words_are_linear(self):
+        """Test that long unbroken words are counted quickly and plausibly."""
+        start = time.perf_counter()
+        count = self.counter.count("x" * 20000)
+        mixed = self.counter.count("thequickbrownfox" * 700)
+
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(count, 5000)
+        self.assertGreater(mixed, 0)
+
+    def test_merges_are_lowest_rank_first(self):
+        """Test that the heap merge finds the same tokens as pairwise merging."""
+        word = "tokenization" * 10
+        parts = [bytes([b]) for b in word.encode("utf-8")]
+        while len(parts) > 1:
+            ranked = [(self.counter.ranks.get(parts[i] + parts[i + 1]), i) for i in range(len(parts) - 1)]
+            ranked = [(rank, i) for rank, i in ranked if rank is not None]
+            if not ranked:
+                break
+            _, i = min(ranked)
+            parts[i:i + 2] = [parts[i] + parts[i + 1]]
+
+        self.assertEqual(self.counter.count(word), len(parts))
+
+    def test_arbitrary_bytes(self):
+        """Test that any text can be counted, including non-ASCII."""
+        self.assertEqual(self.counter.count(""), 0)
+        self.assertGreater(self.counter.count("naïve 日本語 🚀"), 0)
+
+
+class TestCachedTokenCounter(unittest.TestCase):
+    """Test the CachedTokenCounter class."""
+
+    def test_repeated_texts_are_counted_once(self):
+        """Test that repeated texts hit the cache."""
+        inner = MagicMock()
+        inner.count.return_value = 7
+        counter = CachedTokenCounter(inner, min_length=0)
+
+        self.assertEqual(counter.count("system prompt"), 7)
+        self.assertEqual(counter.count("system prompt"), 7)
+        inner.count.assert_called_once_with("system prompt")
+        self.assertEqual((counter.hits, counter.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted."""
+        inner = MagicMock()
+        inner.count.side_effect = lambda text: len(text)
+        counter = CachedTokenCounter(inner, max_entries=2, min_length=0)
+
+        counter.count("a")
+        counter.count("bb")
+        counter.count("a")
+        counter.count("ccc")
+        counter.count("a")
+        counter.count("bb")
+
+        self.assertEqual(len(counter), 2)
+        self.assertEqual(inner.count.call_count, 4)
+
+    def test_byte_budget(self):
+        """Test that the cache holds no more entries than its byte budget allows."""
+        counter = CachedTokenCounter(WhitespaceTokenCounter(), min_length=0, max_bytes=2000)
+        for i in range(100):
+            counter.count("word " * (i + 1000))
+
+        self.assertLessEqual(counter.bytes, 2000)
+        self.assertGreater(len(counter), 0)
+
+    def test_count_messages(self):
+        """Test counting chat message lists."""
+        counter = CachedTokenCounter(WhitespaceTokenCounter(), min_length=0)
+        messages = [
+            {"role": "system", "content": "You are helpful."},
+            {"role": "user", "content": [{"type": "text", "text": "hello there"}]},
+        ]
+
+        # 3 reply tokens, 3 per message, roles and contents
+        self.assertEqual(counter.count_messages(messages), 3 + 3 + 1 + 3 + 3 + 1 + 2)
+        self.assertEqual(counter.count_input(messages), counter.count_messages(messages))
+        self.assertIsNone(counter.count_input(42))
+
+    def test_default_counter_is_shared(self):
+        """Test that the default counter is a process-wide cached BPE."""
+        self.assertIs(default_token_counter(), default_token_counter())
+        self.assertIsInstance(default_token_counter().counter, ByteBPETokenCounter)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Tests for rolling-window run statistics."""
+
+import random
+import unittest
+
+from nexushive.collector.sketch import LatencySketch
+from nexushive.collector.windows import RollingWindows
+
+SECOND = 10**9
+NOW = 1_767_225_600 * SECOND  # 2026-01-01T00:00:00Z
+
+
+class TestRollingWindows(unittest.TestCase):
+    """Test the RollingWindows class."""
+
+    def setUp(self):
+        """Ten-second ring of one-second buckets."""
+        self.windows = RollingWindows(bucket_seconds=1.0, buckets=10)
+
+    def test_window_totals(self):
+        """Test counts, rates and latency quantiles over a window."""
+        rng = random.Random(3)
+        latencies = [rng.expovariate(1 / 200) for _ in range(1000)]
+        for i, latency in enumerate(latencies):
+            self.windows.add("a", NOW - (i % 5) * SECOND, latency, tokens_input=10, tokens_output=5,
+                             error=i % 20 == 0)
+
+        result = self.windows.window("a", 5, now_ns=NOW + SECOND - 1)
+        self.assertEqual(result["count"], 1000)
+        self.assertEqual(result["errors"], 50)
+        self.assertAlmostEqual(result["error_rate"], 0.05)
+        self.assertEqual(result["tokens_input"], 10_000)
+        self.assertAlmostEqual(result["tokens_per_second"], 15_000 / 5, delta=1)
+        self.assertAlmostEqual(result["latency_mean_ms"], sum(latencies) / 1000)
+        exact = sorted(latencies)[int(0.95 * 999)]
+        self.assertAlmostEqual(result["latency_p95_ms"], exact, delta=exact * 0.02)
+
+        # Only the newest two buckets
+        self.assertEqual(self.windows.window("a", 2, now_ns=NOW + SECOND - 1)["count"], 400)
+
+    def test_expiry(self):
+        """Test that buckets leave the window and are reused."""
+        self.windows.add("a", NOW, 10.0)
+        self.assertEqual(self.windows.window("a", 10, now_ns=NOW)["count"], 1)
+        self.assertEqual(self.windows.window("a", 10, now_ns=NOW + 10 * SECOND)["count"], 0)
+
+        # The same slot, ten seconds later
+        self.windows.add("a", NOW + 10 * SECOND, 20.0)
+        result = self.windows.window("a", 10, now_ns=NOW + 10 * SECOND)
+        self.assertEqual(result["count"], 1)
+        self.assertEqual(result["latency_mean_ms"], 20.0)
+
+    def test_late_runs(self):
+        """Test that runs older than the ring are rejected."""
+        self.windows.add("a", NOW, 10.0)
+        self.assertFalse(self.windows.add("b", NOW - 10 * SECOND, 10.0))
+        self.assertTrue(self.windows.add("b", NOW - 9 * SECOND, 10.0))
+        self.assertEqual(self.windows.late_runs, 1)
+
+    def test_add_counts(self):
+        """Test pre-aggregated measurements with a latency sketch."""
+        sketch = LatencySketch()
+        for value in (10.0, 20.0, 30.0):
+            sketch.add(value)
+        self.windows.add_counts("a", NOW, count=3, errors=1, tokens_output=7, latency=sketch)
+
+        result = self.windows.window("a", 1, now_ns=NOW)
+        self.assertEqual(result["count"], 3)
+        self.assertEqual(result["tokens_output"], 7)
+        self.assertAlmostEqual(result["latency_mean_ms"], 20.0)
+
+    def test_snapshot(self):
+        """Test a window over every agent, and an empty agent."""
+        self.windows.add_many([("a", NOW, 1.0, 0, 0, False), ("b", NOW, 2.0, 0, 0, True)])
+
+        snapshot = self.windows.snapshot(5, now_ns=NOW)
+        self.assertEqual(sorted(snapshot), ["a", "b"])
+        self.assertEqual(snapshot["b"]["error_rate"], 1.0)
+        empty = self.windows.window("missing", 5, now_ns=NOW)
+        self.assertEqual(empty["count"], 0)
+        self.assertIsNone(empty["latency_p95_ms"])
+
+
+if __name__ == "__main__":
+    unittest.main()